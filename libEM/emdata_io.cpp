@@ -362,6 +362,92 @@ void EMData::write_image(const string & filename, int img_index,
 }
 
 
+int EMData::write_images(const string & filename, vector < EMData * >imgs,
+						 EMUtil::ImageType imgtype, bool header_only,
+						 EMUtil::EMDataType filestoragetype, bool use_host_endian)
+{
+	ENTERFUNC;
+
+	if (imgs.size() == 0) return 0;
+
+	if (imgtype == EMUtil::IMAGE_UNKNOWN) {
+		const char *ext = strrchr(filename.c_str(), '.');
+		if (ext) {
+			ext++;
+			imgtype = EMUtil::get_image_ext_type(ext);
+		}
+	}
+
+	// LST files carry per-image references and PNG closes itself on write, so these
+	// just go through the normal single image path
+	if (imgtype == EMUtil::IMAGE_LST || imgtype == EMUtil::IMAGE_LSTFAST || imgtype == EMUtil::IMAGE_PNG) {
+		int start = Util::is_file_exist(filename) ? EMUtil::get_image_count(filename) : 0;
+		for (size_t i = 0; i < imgs.size(); i++) {
+			if (!imgs[i]) throw NullPointerException("write_images: NULL image");
+			imgs[i]->write_image(filename, start + (int)i, imgtype, header_only, 0, filestoragetype, use_host_endian);
+		}
+		EXITFUNC;
+		return start;
+	}
+
+	bool exists = Util::is_file_exist(filename);
+	ImageIO *imageio = EMUtil::get_imageio(filename, ImageIO::READ_WRITE, imgtype);
+	if (!imageio) {
+		throw ImageFormatException("cannot create an image io");
+	}
+	if (imageio->is_single_image_format() && imgs.size() > 1) {
+		EMUtil::close_imageio(filename, imageio);
+		throw ImageWriteException(filename, "format only stores a single image");
+	}
+
+	int start = exists ? imageio->get_nimg() : 0;
+	if (start < 0) start = 0;
+
+	for (size_t i = 0; i < imgs.size(); i++) {
+		EMData *img = imgs[i];
+		if (!img) {
+			imageio->flush();
+			EMUtil::close_imageio(filename, imageio);
+			throw NullPointerException("write_images: NULL image");
+		}
+		if (img->is_complex() && img->is_shuffled()) img->fft_shuffle();
+
+		img->attr_dict["nx"] = img->nx;
+		img->attr_dict["ny"] = img->ny;
+		img->attr_dict["nz"] = img->nz;
+		img->attr_dict["changecount"] = img->changecount;
+		img->update_stat();
+
+		switch(filestoragetype) {
+		case EMUtil::EM_UINT:
+		case EMUtil::EM_USHORT:
+		case EMUtil::EM_SHORT:
+		case EMUtil::EM_CHAR:
+		case EMUtil::EM_UCHAR:
+			img->attr_dict["datatype"] = (int)filestoragetype;
+			break;
+		default:
+			img->attr_dict["datatype"] = (int)EMUtil::EM_FLOAT;	//default float
+		}
+
+		int idx = start + (int)i;
+		int err = imageio->write_header(img->attr_dict, idx, 0, filestoragetype, use_host_endian);
+		if (!err && !header_only) err = imageio->write_data(img->get_data(), idx, 0, filestoragetype, use_host_endian);
+		if (err) {
+			imageio->flush();
+			EMUtil::close_imageio(filename, imageio);
+			throw ImageWriteException(filename, "imageio write failed");
+		}
+	}
+
+	imageio->flush();
+	EMUtil::close_imageio(filename, imageio);
+	imageio = 0;
+	EXITFUNC;
+	return start;
+}
+
+
 void EMData::append_image(const string & filename,
 						  EMUtil::ImageType imgtype, bool header_only)
 {
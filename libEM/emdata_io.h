@@ -111,6 +111,30 @@ void write_image(const string & filename,
 				 bool use_host_endian = true);
 
 
+/** Write a set of images to one file, appending after any images already
+ * present. The ImageIO is opened, flushed and closed only once for the whole
+ * set, rather than once per image as with repeated write_image() calls.
+ *
+ * @param filename The image file name.
+ * @param imgs The images to write, in order.
+ * @param imgtype Write to the given image format type. if not
+ *        specified, use the 'filename' extension to decide.
+ * @param header_only To write only the header or both header and data.
+ * @param filestoragetype The image data type used in the output file.
+ * @param use_host_endian To write in the host computer byte order.
+ * @return The index of the first image written.
+ *
+ * @exception ImageFormatException
+ * @exception ImageWriteException
+ */
+static int write_images(const string & filename,
+				 vector < EMData * >imgs,
+				 EMUtil::ImageType imgtype = EMUtil::IMAGE_UNKNOWN,
+				 bool header_only = false,
+				 EMUtil::EMDataType filestoragetype = EMUtil::EM_FLOAT,
+				 bool use_host_endian = true);
+
+
 /** append to an image file; If the file doesn't exist, create one.
  *
  * @param filename The image file name.
@@ -63,6 +63,22 @@ const double EMConsts::pi = 3.141592653589793238462643383279502884197169399;
 const double EMConsts::deg2rad = pi/180.0;
 const double EMConsts::rad2deg = 180.0/pi;
 
+#ifdef _WIN32
+static MUTEX factory_mutex=CreateMutex(0, FALSE, 0);
+#else
+static pthread_mutex_t factory_mutex=PTHREAD_MUTEX_INITIALIZER;
+#endif
+
+void EMAN::factory_lock()
+{
+	Util::MUTEX_LOCK(&factory_mutex);
+}
+
+void EMAN::factory_unlock()
+{
+	Util::MUTEX_UNLOCK(&factory_mutex);
+}
+
 
 #include <sstream>
 using std::stringstream;
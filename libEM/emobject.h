@@ -752,12 +752,24 @@ namespace EMAN
 		map < string, InstanceType > my_dict;
 	};
 
+	/** Serializes construction of the Factory singletons and changes to their
+	 * contents, so the first get() from several threads at once builds exactly
+	 * one instance. Lookups in an existing Factory are read-only and unlocked.
+	 */
+	void factory_lock();
+	void factory_unlock();
+
 	template < class T > Factory < T > *Factory < T >::my_instance = 0;
 
 	template < class T > void Factory < T >::init()
 	{
 		if (!my_instance) {
-			my_instance = new Factory < T > ();
+			factory_lock();
+			if (!my_instance) {
+				Factory < T > *f = new Factory < T > ();
+				my_instance = f;
+			}
+			factory_unlock();
 		}
 	}
 
@@ -777,12 +789,14 @@ namespace EMAN
 		init();
 
 		string name = ClassType::NAME;
+		factory_lock();
 		typename map < string, InstanceType >::iterator fi =
 			my_instance->my_dict.find(name);
 
 		if (fi == my_instance->my_dict.end()) {
 			my_instance->my_dict[name] = &ClassType::NEW;
 		}
+		factory_unlock();
 	}
 
 	template < class T > T * Factory < T >::get(const string & instancename)
@@ -791,7 +805,7 @@ namespace EMAN
 		typename map < string, InstanceType >::iterator fi =
 			my_instance->my_dict.find(instancename);
 		if (fi != my_instance->my_dict.end()) {
-			return my_instance->my_dict[instancename] ();
+			return fi->second ();
 		}
 
 		string lower = instancename;
@@ -799,7 +813,7 @@ namespace EMAN
 
 		fi = my_instance->my_dict.find(lower);
 		if (fi != my_instance->my_dict.end()) {
-			return my_instance->my_dict[lower] ();
+			return fi->second ();
 		}
 
 		throw NotExistingObjectException(instancename, "The named object doesn't exist");
@@ -820,7 +834,7 @@ namespace EMAN
 		}
 
 		if (fi != my_instance->my_dict.end()) {
-			T *i = my_instance->my_dict[lower] ();
+			T *i = fi->second ();
 
 			const vector<string> para_keys = params.keys();
 //			std::cout << "the number of keys is " << para_keys.size() << std::endl; // PRB May 19th
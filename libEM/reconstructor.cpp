@@ -312,6 +312,30 @@ EMData *FourierReconstructorSimple2D::finish(bool)
 	return  ret;
 }
 
+void ReconstructorVolumeData::add_volume_data(const EMData* partial,const EMData* weight)
+{
+	if ( 0 == image || 0 == tmp_data ) throw NullPointerException("add_partial called before setup()");
+	if ( 0 == partial || 0 == weight || 0 == partial->get_const_data() || 0 == weight->get_const_data()) throw NullPointerException("The partial volume was null, was finish() already called?");
+
+	if (partial->get_xsize()!=image->get_xsize() || partial->get_ysize()!=image->get_ysize() || partial->get_zsize()!=image->get_zsize()
+		|| weight->get_xsize()!=tmp_data->get_xsize() || weight->get_ysize()!=tmp_data->get_ysize() || weight->get_zsize()!=tmp_data->get_zsize())
+		throw ImageDimensionException("The partial reconstruction does not match the size of this reconstruction");
+
+	// plain sums, so the result is the same as if all of the slices had been inserted here
+	float* rdata = image->get_data();
+	const float* pdata = partial->get_const_data();
+	size_t n = image->get_size();
+	for (size_t i=0; i<n; i++) rdata[i]+=pdata[i];
+
+	float* norm = tmp_data->get_data();
+	const float* pnorm = weight->get_const_data();
+	n = tmp_data->get_size();
+	for (size_t i=0; i<n; i++) norm[i]+=pnorm[i];
+
+	image->update();
+	tmp_data->update();
+}
+
 void ReconstructorVolumeData::normalize_threed(const bool sqrt_damp,const bool wiener)
 // normalizes the 3-D Fourier volume. Also imposes appropriate complex conjugate relationships
 {
@@ -668,6 +692,21 @@ EMData *FourierIterReconstructor::finish(bool doift) {
 	return ret;
 }
 
+void FourierIterReconstructor::add_partial(const Reconstructor* partial) {
+	const FourierIterReconstructor *p=dynamic_cast<const FourierIterReconstructor*>(partial);
+	if (!p) throw InvalidParameterException("add_partial requires another fourier_iter reconstructor");
+	add_volume_data(p->image,p->tmp_data);
+}
+
+void FourierIterReconstructor::add_partial(const EMData* partial,const EMData* weight) {
+	add_volume_data(partial,weight);
+}
+
+EMData* FourierIterReconstructor::get_partial(bool weights) const {
+	if ( 0 == image || 0 == tmp_data ) throw NullPointerException("get_partial called before setup() or after finish()");
+	return weights?tmp_data->copy():image->copy();
+}
+
 void FourierIterReconstructor::free_memory() {
 	if (image) delete image;
 	if (tmp_data) delete tmp_data;
@@ -975,6 +1014,24 @@ void FourierReconstructor::clear()
 	
 }
 
+void FourierReconstructor::add_partial(const Reconstructor* partial)
+{
+	const FourierReconstructor *p=dynamic_cast<const FourierReconstructor*>(partial);
+	if (!p) throw InvalidParameterException("add_partial requires another fourier reconstructor");
+	add_volume_data(p->image,p->tmp_data);
+}
+
+void FourierReconstructor::add_partial(const EMData* partial,const EMData* weight)
+{
+	add_volume_data(partial,weight);
+}
+
+EMData* FourierReconstructor::get_partial(bool weights) const
+{
+	if ( 0 == image || 0 == tmp_data ) throw NullPointerException("get_partial called before setup() or after finish()");
+	return weights?tmp_data->copy():image->copy();
+}
+
 EMData* FourierReconstructor::preprocess_slice( const EMData* const slice,  const Transform& t )
 {
 #ifdef EMAN2_USING_CUDA
@@ -176,6 +176,28 @@ namespace EMAN
 		*/
 		virtual void clear() {throw; }
 
+		/** Adds the unnormalized Fourier volume and weights accumulated by a second reconstructor into this one. The partial
+		 * reconstructor must be of the same type and size, set up with setup() (not seeded with data), and have had a disjoint
+		 * subset of the slices inserted. Since insertion is purely additive, merging partials before finish() gives the same
+		 * result as inserting every slice into one reconstructor. Used by e2make3dpar.py to give each thread its own volume.
+		 * @param partial the reconstructor to merge into this one, unchanged
+		 * @exception ImageDimensionException if the two volumes differ in size
+		 */
+		virtual void add_partial(const Reconstructor* partial) { throw InvalidCallException("add_partial not supported by this reconstructor"); }
+
+		/** As add_partial() above, but with the volume and weights passed explicitly as returned by get_partial(), eg - when
+		 * the partial reconstruction was done in a different process.
+		 * @param partial the unnormalized complex accumulation volume
+		 * @param weight the corresponding weight volume
+		 */
+		virtual void add_partial(const EMData* partial,const EMData* weight) { throw InvalidCallException("add_partial not supported by this reconstructor"); }
+
+		/** Returns a copy of the unnormalized accumulation volume (or of the weight volume if weights is set) prior to finish(),
+		 * for merging with add_partial().
+		 * @param weights return the weight volume rather than the Fourier volume
+		 */
+		virtual EMData* get_partial(bool weights=false) const { throw InvalidCallException("get_partial not supported by this reconstructor"); }
+
 		/** Print the current parameters to std::out
 		 */
 		void print_params() const
@@ -225,6 +247,12 @@ namespace EMAN
 			 */
 			const EMData* get_emdata() { return image; }
 		protected:
+			/** Sums a partial volume and its weights into image and tmp_data, which must already be allocated with
+			 * the same dimensions. Used to implement Reconstructor::add_partial()
+			 */
+			void add_volume_data(const EMData* partial,const EMData* weight);
+
+
 			//These EMData pointers will most probably be allocated in setup() and released in finish()
 			/// Inheriting class allocates this, probably in setup().
 			EMData* image;
@@ -460,6 +488,15 @@ namespace EMAN
 		*/
 		virtual void clear();
 
+		/** Merge a partial reconstruction into this one, see Reconstructor::add_partial()
+		*/
+		virtual void add_partial(const Reconstructor* partial);
+		virtual void add_partial(const EMData* partial,const EMData* weight);
+
+		/** Copy of the unnormalized volume or weights, see Reconstructor::get_partial()
+		*/
+		virtual EMData* get_partial(bool weights=false) const;
+
 		/** Get the unique name of the reconstructor
 		*/
 		virtual string get_name() const
@@ -759,6 +796,15 @@ namespace EMAN
 		*/
 		virtual void clear();
 
+		/** Merge a partial reconstruction into this one, see Reconstructor::add_partial()
+		*/
+		virtual void add_partial(const Reconstructor* partial);
+		virtual void add_partial(const EMData* partial,const EMData* weight);
+
+		/** Copy of the unnormalized volume or weights, see Reconstructor::get_partial()
+		*/
+		virtual EMData* get_partial(bool weights=false) const;
+
 		/** Get the unique name of the reconstructor
 		*/
 		virtual string get_name() const
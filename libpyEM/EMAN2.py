@@ -1205,7 +1205,8 @@ def remove_file( file_name, img_couples_too=True ):
 				os.remove(name+'img')
 			else: os.remove(name+file_tag)
 		else:
-			if os.path.isfile(file_name): os.remove(file_name)
+			if file_name[-5:]==".json" : js_remove_dict(file_name)		# also removes the journal and index sidecars
+			elif os.path.isfile(file_name): os.remove(file_name)
 			elif os.path.isdir(file_name):
 				import shutil
 				shutil.rmtree(file_name)
@@ -2053,6 +2054,40 @@ comment : optional comment string"""
 
 		self.ptr.write(outln)
 
+	def write_many(self,n,nextfiles,extfiles,comments=None):
+		"""Writes a block of consecutive records starting at record n with a single write. Much faster than
+repeated calls to write() for large numbers of records.
+n : record number of the first record to write, -1 appends, as does n>= current file len
+nextfiles : sequence (or numpy array) of image numbers in the referenced image files
+extfiles : a single path used for all records, or a sequence of paths, one per record
+comments : None, a single comment string for all records, or a sequence of comments (None permitted)"""
+
+		nrec=len(nextfiles)
+		if nrec==0 : return
+		if isinstance(extfiles,str) : extfiles=[extfiles]*nrec
+		if comments is None or isinstance(comments,str) : comments=[comments]*nrec
+
+		outlns=["{}\t{}".format(i,f) if c is None else "{}\t{}\t{}".format(i,f,c) for i,f,c in zip(nextfiles,extfiles,comments)]
+		maxlen=max([len(l) for l in outlns])
+		if maxlen+1>self.linelen : self.rewrite(maxlen)
+
+		fmtstr="{{:<{}}}\n".format(self.linelen-1)	# string for formatting
+
+		if n<0 or n>=self.n :
+			self.ptr.seek(0,os.SEEK_END)		# append
+			self.n+=nrec
+		else :
+			self.ptr.seek(self.seekbase+self.linelen*n)		# otherwise find the correct location, we may extend the file
+			self.n=max(self.n,n+nrec)
+
+		self.ptr.write("".join([fmtstr.format(l) for l in outlns]))
+
+	def extend(self,records):
+		"""Appends a list of (nextfile,extfile) or (nextfile,extfile,comment) tuples to the end of the file with a single write"""
+
+		records=list(records)
+		self.write_many(-1,[r[0] for r in records],[r[1] for r in records],[r[2] if len(r)>2 else None for r in records])
+
 	def read(self,n):
 		"""Reads the nth record in the file. Note that this does not read the referenced image, which can be
 performed with read_image either here or in the EMData class. Returns a tuple (n extfile,extfile,comment)"""
@@ -2075,20 +2110,87 @@ but this method prevents multiple open/close operations on the #LSX file."""
 
 		return ret
 
+	def read_many(self,start=0,stop=None):
+		"""Reads records start to stop-1 at once from a memory map of the file, without any per-record Python processing.
+Returns (imgnums,fileidx,filenames,comments):
+imgnums : numpy int64 array of image numbers in the referenced files
+fileidx : numpy int array indexing filenames for each record
+filenames : list of the unique referenced filenames (sorted)
+comments : numpy array of comment strings (bytes), empty for records without a comment"""
+		import numpy as np
+		import mmap
+
+		if stop==None or stop>self.n : stop=self.n
+		if start<0 : start=0
+		nrec=max(stop-start,0)
+		if nrec==0 : return (np.zeros(0,dtype=np.int64),np.zeros(0,dtype=np.int64),[],np.zeros(0,dtype="S1"))
+
+		self.ptr.flush()
+		mm=mmap.mmap(self.ptr.fileno(),0,access=mmap.ACCESS_READ)
+		recs=np.frombuffer(mm,dtype=np.uint8,count=nrec*self.linelen,offset=self.seekbase+self.linelen*start).reshape((nrec,self.linelen))
+		cols=np.arange(self.linelen)
+		rows=np.arange(nrec)[:,None]
+
+		# field boundaries. tab1 always exists, tab2 only if there is a comment. end is one past the last non-blank character
+		istab=recs==9
+		tab1=istab.argmax(1)
+		istab[cols[None,:]<=tab1[:,None]]=False
+		hascmt=istab.any(1)
+		tab2=np.where(hascmt,istab.argmax(1),0)
+		end=self.linelen-(((recs!=32)&(recs!=10))[:,::-1]).argmax(1)
+		fend=np.where(hascmt,tab2,end)
+
+		# image numbers, assembled from the digits before the first tab
+		w=tab1.max()
+		digits=recs[:,:w].astype(np.int64)-48
+		pwr=tab1[:,None]-1-cols[None,:w]
+		imgnums=np.where(pwr>=0,digits*10**np.maximum(pwr,0),0).sum(1)
+
+		# filenames, shifted to the start of a fixed-width array and interned with unique()
+		w=max((fend-tab1-1).max(),1)
+		idx=tab1[:,None]+1+np.arange(w)[None,:]
+		names=np.where(idx<fend[:,None],recs[rows,np.minimum(idx,self.linelen-1)],0).astype(np.uint8)
+		names=np.ascontiguousarray(names).view("S{}".format(w)).reshape(nrec)
+		filenames,fileidx=np.unique(names,return_inverse=True)
+		filenames=[str(f.decode("utf-8")) if not isinstance(f,str) else f for f in filenames]
+
+		# comments
+		w=max(((end-tab2-1)*hascmt).max(),1)
+		idx=tab2[:,None]+1+np.arange(w)[None,:]
+		comments=np.where((idx<end[:,None])&hascmt[:,None],recs[rows,np.minimum(idx,self.linelen-1)],0).astype(np.uint8)
+		comments=np.ascontiguousarray(comments).view("S{}".format(w)).reshape(nrec)
+
+		del recs,istab
+		mm.close()
+
+		return (imgnums,fileidx,filenames,comments)
+
 	def __len__(self): return self.n
 
 	def normalize(self):
 		"""This will read the entire file and insure that the line-length parameter is valid. If it is not,
-it will rewrite the file with a valid line-length. """
+it will rewrite the file with a valid line-length. If the file size is an exact multiple of the line length
+with a trailing newline, the file is assumed valid and is not scanned."""
+
+		self.ptr.seek(0,os.SEEK_END)
+		size=self.ptr.tell()-self.seekbase
+		if size%self.linelen==0 :
+			if size>0 :
+				self.ptr.seek(-1,os.SEEK_END)
+				if self.ptr.read(1)!=b"\n" : size=-1
+			if size>=0 :
+				self.n=size//self.linelen
+				return
 
 		self.ptr.seek(self.seekbase)
 		self.n=0
 		while 1:
 			ln=self.ptr.readline()
 			if len(ln)==0 :break
-			if len(ln)!=self.linelen :
+			if len(ln)!=self.linelen or ln[-1:]!=b"\n" :
 				self.rewrite()
-				break
+				self.normalize()		# every line now has the new length, so this just counts the records
+				return
 			self.n+=1
 
 	def rewrite(self,minlen=0):
@@ -2180,14 +2282,14 @@ corresponding to each 1/2 of the data."""
 		except: pass
 
 		oute=LSXFile(eset)
-		for i in range(0,n,2): oute.write(-1,i,filename)
+		oute.write_many(-1,list(range(0,n,2)),filename)
 		oute=None
 
 		try : os.unlink(oset)
 		except: pass
 
 		oute=LSXFile(oset)
-		for i in range(1,n,2): oute.write(-1,i,filename)
+		oute.write_many(-1,list(range(1,n,2)),filename)
 		oute=None
 
 	return (eset,oset)
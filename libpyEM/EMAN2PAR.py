@@ -53,6 +53,7 @@ import subprocess
 import _thread,threading
 import getpass
 import select
+import queue
 
 from EMAN2 import test_image,EMData,abs_path,local_datetime,EMUtil,Util,get_platform
 from EMAN2db import e2filemodtime
@@ -81,8 +82,10 @@ from e2classifytree import TreeClassifyTask
 
 from e2initialmodel import InitMdlTask
 import socketserver
-from pickle import dumps,loads,dump,load
+from pickle import dumps,loads,dump,load,Pickler,Unpickler
 from struct import pack,unpack
+from io import BytesIO
+import numpy as np
 
 # If we can't import it then we probably won't be trying to use MPI
 try :
@@ -94,11 +97,15 @@ except : pass
 try: from zlib import compress,decompress
 except:
 	print("Warning: no compression available, please install zlib")
-	def compress(s) : return(s)
+	def compress(s,level=0) : return(s)
 	def decompress(s) : return(s)
 
+# lz4 is optional, and only used by the "fast" codec if present on all nodes
+try: import lz4.block as lz4block
+except: lz4block=None
+
 # used to make sure servers and clients are running the same version
-EMAN2PARVER=14
+EMAN2PARVER=15
 
 # This is the maximum number of active server threads before telling clients to wait
 DCMAXTHREADS=7
@@ -115,7 +122,7 @@ class EMTaskCustomer(object):
 	def __init__(self,target):
 		"""Specify the type and target host of the parallelism server to use.
 	dc[:hostname[:port]] - default hostname localhost, default port 9990
-	thread:nthreads[:scratch_dir]
+	thread:nthreads[:scratch_dir[:spawn]] - persistent worker processes, or with 'spawn' a new process for each task
 	mpi:ncpu[:scratch_dir_on_nodes]
 	"""
 		origtarget=target
@@ -132,9 +139,14 @@ class EMTaskCustomer(object):
 		elif self.servtype=="thread":
 			self.groupn=0
 			self.maxthreads=int(target.split(":")[1])
-			try: self.scratchdir=target.split(":")[2]
+			try: self.scratchdir=origtarget.split(":")[2]
 			except: self.scratchdir="/tmp"
-			self.handler=EMLocalTaskHandler(self.maxthreads,self.scratchdir)
+			if len(self.scratchdir)==0 : self.scratchdir="/tmp"
+			# Persistent workers rely on fork(), so on Windows we always launch a new process for each task
+			try: spawn=target.split(":")[3]=="spawn"
+			except: spawn=False
+			if spawn or get_platform()=="Windows" : self.handler=EMLocalTaskHandler(self.maxthreads,self.scratchdir)
+			else : self.handler=EMLocalPoolTaskHandler(self.maxthreads)
 		elif self.servtype=="mpi":
 			self.maxthreads=int(target.split(":")[1])
 			try: self.scratchdir=origtarget.split(":")[2]
@@ -600,6 +612,145 @@ class EMLocalTaskHandler(object):
 				EMLocalTaskHandler.lock.release()
 
 
+def localpool_worker(wid,taskq,resultq):
+	"""Main loop of a persistent worker process used by EMLocalPoolTaskHandler. (taskid,task) pairs arrive on taskq, and
+	("STRT"|"PROG"|"DONE"|"ERR ",wid,data) messages are returned on resultq. A None task causes the worker to exit."""
+
+	signal.signal(signal.SIGINT,signal.SIG_IGN)		# the parent handles ^C and shuts us down
+	lastprog=[0]
+
+	while 1:
+		msg=taskq.get()
+		if msg==None : break
+		taskid,task=msg
+
+		def progcb(val):
+			# rate limited, since some tasks report progress very frequently
+			if time.time()-lastprog[0]>1.0 :
+				resultq.put(("PROG",wid,(taskid,val)))
+				lastprog[0]=time.time()
+			return True
+
+		resultq.put(("STRT",wid,taskid))
+		try:
+			ret=task.execute(progcb)
+			resultq.put(("DONE",wid,(taskid,ret)))
+		except:
+			resultq.put(("ERR ",wid,(taskid,traceback.format_exc())))
+
+class EMLocalPoolTaskHandler(object):
+	"""Local parallelism using a pool of persistent worker processes. This is used for thread:N unless 'spawn' is specified.
+	Unlike EMLocalTaskHandler, which launches a new e2parallel.py process (paying the full EMAN2 import cost) for each task and
+	checks on them once per second, workers here are forked once, take tasks from a shared queue as soon as they are free, and
+	report back on a second queue which is monitored by a single thread. Tasks and results are never written to scratch files."""
+	def __init__(self,nthreads=2):
+		import multiprocessing
+
+		self.maxthreads=nthreads
+		self.lock=threading.Lock()
+		self.maxid=0
+		self.tasks={}			# pickled copies of submitted tasks, keyed by taskid
+		self.status={}			# -1 (queued), 0-99 (running), 100 (complete) keyed by taskid
+		self.results={}			# results of completed tasks, keyed by taskid
+		self.running={}			# taskid of the task each worker is running, keyed by worker number
+		self.doexit=0
+
+		self.taskq=multiprocessing.Queue()
+		self.resultq=multiprocessing.Queue()
+		self.workers=[multiprocessing.Process(target=localpool_worker,args=(i,self.taskq,self.resultq)) for i in range(nthreads)]
+		for w in self.workers:
+			w.daemon=True
+			w.start()
+
+		self.thr=threading.Thread(target=self.run)
+		self.thr.daemon=True
+		self.thr.start()
+
+	def stop(self):
+		"""Called externally (by the Customer) to nicely shut down the task handler"""
+		if self.doexit : return
+		self.doexit=1
+		for w in self.workers: self.taskq.put(None)
+		for w in self.workers:
+			w.join(10)
+			if w.is_alive() : w.terminate()
+		self.resultq.put(("EXIT",-1,None))
+		self.thr.join()
+
+	def add_task(self,task):
+		if not isinstance(task,JSTask) : raise Exception("Non-task object passed to EMLocalPoolTaskHandler for execution")
+		self.lock.acquire()
+		ret=self.maxid
+		self.maxid+=1
+		self.tasks[ret]=dumps(task,-1)		# the customer gets back the task as it was when submitted, as with the other handlers
+		self.status[ret]=-1
+		self.lock.release()
+		self.taskq.put((ret,task))
+		return ret
+
+	def check_task(self,id_list):
+		"""Checks a list of tasks for completion. Returns -1 (queued), 0-99 (running) or 100 (complete) for each"""
+		ret=[]
+		for i in id_list:
+			if i>=self.maxid : ret.append(-1)
+			else : ret.append(self.status.get(i,100))
+		return ret
+
+	def get_results(self,taskid):
+		"""This returns a (task,dictionary) tuple for a task"""
+		if self.status.get(taskid,-1)!=100 : raise Exception("Task %d not complete !!!"%taskid)
+
+		self.lock.acquire()
+		task=loads(self.tasks.pop(taskid))
+		results=self.results.pop(taskid)
+		del self.status[taskid]
+		self.lock.release()
+
+		return (task,results)
+
+	def check_workers(self):
+		"""A worker which dies without reporting (segfault, killed, ...) is fatal. It may have taken a task from the queue
+		without reporting STRT, so we can't always tell which task was lost, and a process killed while waiting on the task
+		queue can leave it locked for the others, so a replacement worker couldn't be trusted either."""
+		for wid,w in enumerate(self.workers):
+			if w.exitcode==None or self.doexit : continue
+			# messages still buffered in the worker are lost with it, so this is only the last task we heard about
+			print("Error: worker {} exited with status {}, last task reported: {}".format(wid,w.exitcode,self.running.get(wid,"none")))
+			_thread.interrupt_main()
+			sys.stderr.flush()
+			sys.stdout.flush()
+			os._exit(1)
+
+	def run(self):
+		"""Collects messages from the workers. Blocks on the result queue, so completion is seen immediately. The workers
+		are checked on every pass, and at least twice a second."""
+		while(1):
+			self.check_workers()
+			try: com,wid,data=self.resultq.get(True,0.5)
+			except queue.Empty: continue
+
+			if com=="EXIT" : break
+			elif com=="STRT" :
+				self.running[wid]=data
+				self.status[data]=0
+			elif com=="PROG" :
+				if data[0] in self.status and self.status[data[0]]!=100 : self.status[data[0]]=min(max(int(data[1]),0),99)
+			elif com=="DONE" :
+				self.lock.acquire()
+				self.results[data[0]]=data[1]
+				self.status[data[0]]=100
+				self.lock.release()
+				try: del self.running[wid]
+				except: pass
+			elif com=="ERR " :
+				# This means that the task failed to execute properly
+				print("Error running task : ",data[0])
+				print(data[1])
+				_thread.interrupt_main()
+				sys.stderr.flush()
+				sys.stdout.flush()
+				os._exit(1)
+
 #######################
 #  Here we define the classes for MPI parallelism
 
@@ -1045,19 +1196,27 @@ class EMMpiTaskHandler(object):
 #######################
 #  Here we define the classes for publish and subscribe parallelism
 
+def netalarm(t):
+	"""signal.alarm() is used for network timeouts, but only works in the main thread. Threads prefetching data for
+	the next task rely on socket timeouts instead (see openEMDCsock), so this does nothing there. Returns the time left
+	on any previous alarm."""
+	if threading.current_thread().name=="MainThread" : return signal.alarm(t)
+	return 0
+
 def openEMDCsock(addr,clientid=0, retry=3):
-	alrm=signal.alarm(0)
+	alrm=netalarm(0)
 	addr=tuple(addr)
 	for i in range(retry):
 		try :
 			xch="WAIT"
 			while xch=="WAIT" :
-				if alrm>0 : signal.alarm(alrm+1)
+				if alrm>0 : netalarm(alrm+1)
 				sock=socket.socket()
+				if threading.current_thread().name!="MainThread" : sock.settimeout(300)
 				sock.connect(addr)
 				sockf=sock.makefile()
 				xch=sockf.read(4)
-				signal.alarm(0)
+				netalarm(0)
 				if xch=="WAIT" :
 					time.sleep(random.randint(8,30))
 					continue
@@ -1080,7 +1239,7 @@ def openEMDCsock(addr,clientid=0, retry=3):
 		print("ERROR: Server version mismatch ",socket.gethostname())
 		sys.exit(1)
 
-	if alrm>0 : signal.alarm(alrm+1)
+	if alrm>0 : netalarm(alrm+1)
 
 	return(sock,sockf)
 
@@ -1150,25 +1309,130 @@ def recvstr(sock):
 	return sock.read(datlen)
 
 
-def sendobj(sock,obj):
-	"""Sends an object as a (binary) size then a binary pickled object to a socket file object"""
-	if obj==None :
-		sock.write(pack("<I",0))
-		return
-	strobj=dumps(obj,-1)
-	sock.write(pack("<I",len(strobj)))
-	sock.write(strobj)
-
-def recvobj(sock):
-	"""receives a packed length followed by a binary (pickled) object from a socket file object and returns"""
-	l=sock.read(4)
+# EMDC messages are sent as frames. A frame is a kind byte (0 None, 1 object) and a part count, followed by the parts, each
+# with its own codec byte and length. Part 0 is a pickle of the object, in which each EMData is replaced by a reference
+# to a later part containing its raw float data, so image data is never pickled, and can be sent uncompressed on fast networks.
+DCCODECS=("none","fast","zlib")
+DCCODEC="none"			# codec for frames sent by this process, see set_dc_codec()
+DCBATCHBYTES=1<<25		# target size of batched image transfers in bytes
+DCSTATS=("minimum","maximum","mean","sigma","square_sum","mean_nonzero","sigma_nonzero")	# recomputed, not transmitted
+
+def set_dc_codec(codec):
+	"""Selects the codec used for frames sent by this process. Frames are tagged, so peers may use different codecs.
+	none - no compression, best on fast networks
+	fast - lz4 if available, otherwise zlib level 1. lz4 must then be installed on all nodes
+	zlib - better compression, but much slower"""
+	global DCCODEC
+	codec=codec.lower()
+	if codec not in DCCODECS : raise Exception("Unknown codec '%s', must be one of %s"%(codec,",".join(DCCODECS)))
+	DCCODEC=codec
+
+def dc_compress(s,codec):
+	"""Returns (codec id,data). Data which doesn't compress is sent uncompressed"""
+	if codec=="none" or len(s)<256 : return (0,s)
+	if codec=="fast" :
+		if lz4block!=None : c=(2,lz4block.compress(s))
+		else : c=(1,compress(s,1))
+	else : c=(1,compress(s,3))
+	if len(c[1])>=len(s) : return (0,s)
+	return c
+
+def dc_decompress(cid,s):
+	if cid==0 : return s
+	if cid==1 : return decompress(s)
+	if cid==2 :
+		if lz4block==None : raise Exception("Received lz4 compressed data, but lz4 is not installed. Install it or use another codec")
+		return lz4block.decompress(s)
+	raise Exception("Unknown codec (%d) in received frame"%cid)
+
+def encodeframe(obj,codec=None):
+	"""Encodes an object for transmission with sendframe(). Returns (kind,[(codec id,data),...])"""
+	if obj==None : return (0,[])
+	if codec==None : codec=DCCODEC
+	bufs=[]
+	def persistent_id(o):
+		if not isinstance(o,EMData) : return None
+		hdr=o.get_attr_dict()
+		for k in ("nx","ny","nz")+DCSTATS : hdr.pop(k,None)
+		try:
+			bufs.append(dc_compress(o.numpy().tobytes(),codec))
+			n=len(bufs)
+		except: n=0		# empty or header-only image
+		return ("EMData",n,o["nx"],o["ny"],o["nz"],hdr)
+
+	f=BytesIO()
+	p=Pickler(f,-1)
+	p.persistent_id=persistent_id
+	p.dump(obj)
+	return (1,[dc_compress(f.getvalue(),codec)]+bufs)
+
+def decodeframe(frame):
+	"""Inverse of encodeframe()"""
+	kind,parts=frame
+	if kind==0 : return None
+	def persistent_load(pid):
+		n,nx,ny,nz,hdr=pid[1:]
+		if n==0 : img=EMData()
+		else :
+			img=EMData(nx,ny,nz)
+			img.numpy().reshape(-1)[:]=np.frombuffer(dc_decompress(*parts[n]),dtype=np.float32)
+		img.set_attr_dict(hdr)
+		img.update()
+		return img
+
+	u=Unpickler(BytesIO(dc_decompress(*parts[0])))
+	u.persistent_load=persistent_load
+	return u.load()
+
+def sendframe(sock,frame):
+	"""Writes an encoded frame to a socket file object. Frames can be forwarded without decoding"""
+	sock.write(pack("<BI",frame[0],len(frame[1])))
+	for cid,data in frame[1]:
+		sock.write(pack("<BQ",cid,len(data)))
+		sock.write(data)
+
+def recvframe(sock):
+	"""Reads a frame written by sendframe() from a socket file object, but does not decode it"""
+	l=sock.read(5)
 	try :
-		datlen=unpack("<I",l)[0]
+		kind,nparts=unpack("<BI",l)
 	except:
 		print("Format error in unpacking (%d) '%s'"%(len(l),l))
 		raise Exception("Network error receiving object")
-	if datlen<=0 :return None
-	return loads(sock.read(datlen))
+	parts=[]
+	for i in range(nparts):
+		cid,datlen=unpack("<BQ",sock.read(9))
+		data=sock.read(datlen)
+		if len(data)!=datlen : raise Exception("Network error, short read (%d/%d)"%(len(data),datlen))
+		parts.append((cid,data))
+	return (kind,parts)
+
+def sendobj(sock,obj,codec=None):
+	"""Sends an object as a frame on a socket file object. EMData objects anywhere within obj are sent as raw data"""
+	sendframe(sock,encodeframe(obj,codec))
+
+def recvobj(sock):
+	"""receives a frame from a socket file object and returns the decoded object"""
+	return decodeframe(recvframe(sock))
+
+def read_batches(fsp,imnums):
+	"""Generator reading the listed images from fsp in order, and yielding (position in imnums,[images]) batches of about
+	DCBATCHBYTES, for transmission as a single frame. Images which can't be read are None"""
+	first=0
+	batch=[]
+	nbytes=0
+	for i,n in enumerate(imnums):
+		try:
+			img=EMData(fsp,n)
+			nbytes+=img["nx"]*img["ny"]*img["nz"]*4
+		except: img=None
+		batch.append(img)
+		if nbytes>=DCBATCHBYTES :
+			yield (first,batch)
+			first=i+1
+			batch=[]
+			nbytes=0
+	if len(batch)>0 : yield (first,batch)
 
 def EMDCsendonecom(addr,cmd,data,clientid=0):
 	"""Connects to an EMAN EMDCServer sends one command, receives a returned object and returns it.
@@ -1383,7 +1647,7 @@ class EMDCTaskHandler(EMTaskHandler,socketserver.BaseRequestHandler):
 					EMDCTaskHandler.rtcount+=1
 					print(" %s  (%d)   \r"%(EMDCTaskHandler.rotate[EMDCTaskHandler.rtcount%4],len(EMDCTaskHandler.clients.bdb)-1), end=' ')
 					sys.stdout.flush()
-				elif cmd=="DATA" :
+				elif cmd in ("DATA","DATN") :
 					EMDCTaskHandler.datacount+=1
 					if EMDCTaskHandler.datacount%100==0 :
 						print("*** %d data   \r"%EMDCTaskHandler.datacount, end=' ')
@@ -1457,25 +1721,22 @@ class EMDCTaskHandler(EMTaskHandler,socketserver.BaseRequestHandler):
 							sendobj(self.sockf,allclients)
 							self.sockf.flush()
 
-							# now send data for each needed file
+							# now send data for each needed file, in batches of (did[0],did[1],first image #,[images])
 							for i in needed:
 #								if self.verbose : print "Cache ",i
 								name=self.queue.didtoname[i]			# get the filename back from the did
 								n=nimg = EMUtil.get_image_count(name)	# how many images to cache in this file
-								a=EMData()
-								for j in range(n):				# loop over images
-									a.read_image(name,j)
-									xmit=compress(dumps((i[0],i[1],j,a),-1),3)		# compressed pickled string for efficient transfer
-									sendstr(self.sockf,xmit)
+								for j,imgs in read_batches(name,list(range(n))):
+									sendobj(self.sockf,(i[0],i[1],j,imgs))
 									self.sockf.flush()
 									rsp=self.sockf.read(4)
 									if rsp!="ACK " : print("Odd, non-ACK during caching")
-									if self.verbose and j%100==0 :
-										print("\r Caching %s: %d / %d        "%(name,j+1,n), end=' ')
+									if self.verbose :
+										print("\r Caching %s: %d / %d        "%(name,j+len(imgs),n), end=' ')
 										sys.stdout.flush()
 
 						if self.verbose : print("\nDone caching\n")
-						sendstr(self.sockf,"DONE")
+						sendobj(self.sockf,None)
 						self.sockf.flush()
 						self.queue.caching=False
 						ack=recvobj(self.sockf)
@@ -1576,6 +1837,22 @@ class EMDCTaskHandler(EMTaskHandler,socketserver.BaseRequestHandler):
 				self.sockf.flush()
 				EMDCTaskHandler.clients[client_id]=(client_addr,time.time(),cmd)
 
+			# Request a batch of images from the server
+			# the request should be of the form ["cache",did,[image#,...]]
+			# Returns a sequence of (first index,[images]) objects covering the request in order, followed by None.
+			# An image which can't be read is returned as None
+			elif cmd=="DATN" :
+				try:
+					fsp=self.queue.didtoname[data[1]]
+					for j,imgs in read_batches(fsp,data[2]):
+						sendobj(self.sockf,(j,imgs))
+					if self.verbose>2 : print("Data sent %s(%d images)"%(fsp,len(data[2])))
+				except:
+					if self.verbose : print("Error sending %s(%s)"%(str(data[1]),str(data[2])))
+				sendobj(self.sockf,None)
+				self.sockf.flush()
+				EMDCTaskHandler.clients[client_id]=(client_addr,time.time(),cmd)
+
 			# Notify that a task has been aborted
 			# request should be taskid
 			# no return
@@ -1775,12 +2052,15 @@ class EMDCTaskClient(EMTaskClient):
 	"""Distributed Computing Task Client. This client will connect to an EMDCTaskServer, request jobs to run
  and run them ..."""
 
-	def __init__(self,server,port,verbose=0,myid=None):
+	def __init__(self,server,port,verbose=0,myid=None,prefetch=False):
+		"""If prefetch is set, the next task and its data are requested while the current task is running"""
 		EMTaskClient.__init__(self)
 		self.addr=(server,port)
 		self.verbose=verbose
 		self.lastupdate=0
 		self.task=None
+		self.nexttask=None
+		self.prefetchtask=prefetch
 		if myid!=None : self.myid=myid
 		signal.signal(signal.SIGALRM,DCclient_alarm)	# this is used for network timeouts
 
@@ -1798,6 +2078,9 @@ class EMDCTaskClient(EMTaskClient):
 			try:
 				ret=EMDCsendonecom(self.addr,"PROG",(self.task.taskid,progress),clientid=self.myid)
 				self.lastupdate=time.time()
+				# a prefetched task waiting to run must also report, or the server will assume it is stalled
+				nt=self.nexttask
+				if nt!=None and nt!="EXIT" : EMDCsendonecom(self.addr,"PROG",(nt.taskid,0),clientid=self.myid)
 			except: pass
 
 		signal.alarm(0)
@@ -1848,7 +2131,8 @@ class EMDCTaskClient(EMTaskClient):
 				sockout,sockoutf=None,None
 				break
 			sockout=socket.socket()
-			signal.alarm(5)
+			if threading.current_thread().name!="MainThread" : sockout.settimeout(60)
+			netalarm(5)
 			try :
 				sockout.connect((nexthost,9989))
 				sockoutf=sockout.makefile()
@@ -1860,7 +2144,7 @@ class EMDCTaskClient(EMTaskClient):
 				print("connect %s to %s failed"%(socket.gethostname(),nexthost))
 
 #		if sockout!=None : print "connect %s to %s"%(socket.gethostname(),nexthost)
-		signal.alarm(0)
+		netalarm(0)
 		return (sockout,sockoutf)
 
 	def listencache(self):
@@ -1916,9 +2200,9 @@ class EMDCTaskClient(EMTaskClient):
 
 				ret=None
 				try:
-					ret=recvstr(sockf)		# this should contain time,rint,img#,image in a compressed pickled string
+					ret=recvframe(sockf)		# this should contain (time,rint,first img#,[images])
 
-					if ret=="DONE" or len(ret)==0: break
+					if ret[0]==0: break
 					sockf.write("ACK ")			# We do the ACK immediately along the chain for performance
 					sockf.flush()
 #					print "Got object (%d)"%len(ret)
@@ -1931,15 +2215,15 @@ class EMDCTaskClient(EMTaskClient):
 				# Send the image down the chain
 				if sockout!=None :
 					try:
-						sendstr(sockoutf,ret)
+						sendframe(sockoutf,ret)
 						sockoutf.flush()
 					except:
 						traceback.print_exc()
 						print("Chain broken ! (%s)"%socket.gethostname())
 						sockout=None
 
-				# The data item should be a pickled tuple (time,rand,img#,image)
-				try : img=loads(decompress(ret))
+				# The data item should be a tuple (time,rand,first img#,[images])
+				try : img=decodeframe(ret)
 				except :
 					print("ERROR (%s): Bad data on chain"%socket.gethostname())
 					continue			# bad pickle :^(
@@ -1952,8 +2236,8 @@ class EMDCTaskClient(EMTaskClient):
 					if self.verbose : print("Receiving cache data ",cname)
 					f=db_open_dict(cname)
 					lname=cname
-				f[img[2]]=img[3]
-				nrecv+=1
+				for k,im in enumerate(img[3]): f[img[2]+k]=im
+				nrecv+=len(img[3])
 
 				if sockout!=None :
 					try:
@@ -1974,7 +2258,7 @@ class EMDCTaskClient(EMTaskClient):
 		# Tell the chain we're done
 		if sockout!=None :
 			try:
-				sendstr(sockoutf,"DONE")
+				sendobj(sockoutf,None)
 				sockoutf.flush()
 #				sockoutf.close()
 #				sockout.close()
@@ -2019,20 +2303,20 @@ class EMDCTaskClient(EMTaskClient):
 #		t0,t1,t2,t3=0,0,0,0
 		# This loop receives the data from the server, then forwards it to the next host in the chain
 		while 1:
-			signal.alarm(60)
-			xmit=recvstr(sockf)		# this should contain time,rint,img#,image
+			netalarm(60)
+			xmit=recvframe(sockf)		# this should contain (time,rint,first img#,[images])
 
-			if xmit=="DONE" : break
-			try : img=loads(decompress(xmit))
-			except : print("ERROR : Bad cache data from server")
+			if xmit[0]==0 : break
 
 			# immediate ACK so the server can prepare the next packet
 			sockf.write("ACK ")
 			sockf.flush()
 
-			try : cname="bdb:cache_%d.%d"%(img[0],img[1])
+			try :
+				img=decodeframe(xmit)
+				cname="bdb:cache_%d.%d"%(img[0],img[1])
 			except :
-				print("Invalid cache data '",img,"'")
+				print("ERROR : Bad cache data from server")
 				break
 			if cname!=lname :
 				if self.verbose : print("Receiving cache data ",cname)
@@ -2043,29 +2327,94 @@ class EMDCTaskClient(EMTaskClient):
 			if sockout!=None :
 				try:
 #					print "Sending down chain"
-					sendstr(sockoutf,xmit)
+					sendframe(sockoutf,xmit)
 					sockoutf.flush()
 					if sockoutf.read(4)!="ACK " : raise Exception
 				except:
 					print("Chain broken ! (%s)"%socket.gethostname())
 					sockout=None
 
-			f[img[2]]=img[3]		# Save the image in the local cache
+			for k,im in enumerate(img[3]): f[img[2]+k]=im		# Save the images in the local cache
 
-			n+=1
+			n+=len(img[3])
 
 		# Tell the chain we're done
 		if sockout!=None :
 			try:
-				sendstr(sockoutf,"DONE")
+				sendobj(sockoutf,None)
 				sockoutf.flush()
 #				sockout.close()
 			except: pass
 
-		signal.alarm(0)
+		netalarm(0)
 #		print "Done precaching"
 
 
+	def request_task(self):
+		"""Connects to the server and requests a task. Any data the task needs which isn't already cached locally is
+		retrieved and the task data is translated to refer to the local cache. Returns the task, None if no task is
+		available or "EXIT" if the client should exit."""
+		netalarm(60)
+		sock,sockf=openEMDCsock(self.addr,clientid=self.myid,retry=3)
+		try:
+			sockf.write("RDYT")
+			sendobj(sockf,None)
+			sockf.flush()
+
+			# Get a task from the server
+			task=recvobj(sockf)
+			if self.verbose>1 : print("Task: ",task)
+
+			# This means the server wants to use us to precache files on all of the clients, we won't
+			# get a task until we finish this
+			if isinstance(task,list) and task[0]=="CACHE" :
+				self.docache(sock,sockf,task)
+				sendobj(sockf,"ACK ")
+				sockf.flush()
+				task=recvobj(sockf)
+
+			# acknowledge the task even before we know what we got
+			sendobj(sockf,("ACK ",socket.gethostname()))
+			sockf.flush()
+			netalarm(0)
+
+			if task!=None and task!="EXIT" : self.get_task_data(sockf,task)
+		finally:
+			sockf.close()
+			sock.close()
+
+		return task
+
+	def prefetch(self):
+		"""Run in a thread while a task is executing, to have the next task and its data ready when it finishes"""
+		try: self.nexttask=self.request_task()
+		except:
+			if self.verbose : print("Failed to prefetch next task")
+			self.nexttask=None
+
+	def get_task_data(self,sockf,task):
+		"""Translates 'cache' data references in a task to local cache names, retrieving any uncached images"""
+		for k,i in list(task.data.items()):
+			if self.verbose>1 : print("Data translate ",k,i)
+			if isinstance(i,list) and len(i)>0 and i[0]=="cache" :
+				cname="bdb:cache_%d.%d"%(i[1][0],i[1][1])
+				cache=db_open_dict(cname)
+				if self.verbose>2 : print("Open cache : ",cname)
+
+				needed=[]
+				for j in image_range(*i[2:]):
+					try:
+						z=cache.get_header(j)
+						if z==None : raise Exception
+					except: needed.append(j)
+
+				for j in range(0,len(needed),1000):
+					self.get_data_batch(sockf,i[1],needed[j:j+1000],cache)
+
+				for j in needed: z=cache[j]		# this is here to raise an exception if something went funny in the data retrieval
+
+				i[1]=cname
+
 	def run(self,dieifidle=86400,dieifnoserver=86400,onejob=False):
 		"""This is the actual client execution block. dieifidle is an integer number of seconds after
 		which to terminate the client if we aren't given something to do. dieifnoserver is the same if we can't find a server to
@@ -2074,33 +2423,22 @@ class EMDCTaskClient(EMTaskClient):
 		lastjob=time.time()
 		lastserv=time.time()
 		retcode=2
+		prefetch=None		# thread getting the next task ready while the current one runs
 		while (1):
 			count +=1
-			# connect to the server
-			if self.verbose>1 : print("Connect to (%s,%d)"%self.addr)
 			try :
-				signal.alarm(60)
-				sock,sockf=openEMDCsock(self.addr,clientid=self.myid,retry=3)
-				sockf.write("RDYT")
-				sendobj(sockf,None)
-				sockf.flush()
-
-				# Get a task from the server
-				task=recvobj(sockf)
-				if self.verbose>1 : print("Task: ",task)
-
-				# This means the server wants to use us to precache files on all of the clients, we won't
-				# get a task until we finish this
-				if isinstance(task,list) and task[0]=="CACHE" :
-					self.docache(sock,sockf,task)
-					sendobj(sockf,"ACK ")
-					sockf.flush()
-					task=recvobj(sockf)
+				task=None
+				if prefetch!=None :
+					prefetch.join()
+					prefetch=None
+					task=self.nexttask
+					self.nexttask=None
+
+				# connect to the server
+				if task==None :
+					if self.verbose>1 : print("Connect to (%s,%d)"%self.addr)
+					task=self.request_task()
 
-				# acknowledge the task even before we know what we got
-				sendobj(sockf,("ACK ",socket.gethostname()))
-				sockf.flush()
-				signal.alarm(0)
 				if task=="EXIT" :
 					retcode=1
 					break
@@ -2121,40 +2459,18 @@ class EMDCTaskClient(EMTaskClient):
 					if count%1==0 : print(" | \r", end=' ')
 					else : print(" - \r", end=' ')
 					sys.stdout.flush()
-				sockf.close()
-				sock.close()
 				if time.time()-lastjob>dieifidle :
 					print("Idle too long. Terminating")
 					retcode=4
 					break
 				self.listencache()		# We will listen for precached data for 15 seconds (or sleep if another thread is listening)
 				continue
-			sockf.flush()
-
-			# Translate and retrieve (if necessary) data for task
-			for k,i in list(task.data.items()):
-				if self.verbose>1 : print("Data translate ",k,i)
-#				try:
-				if isinstance(i,list) and len(i)>0 and i[0]=="cache" :
-					cname="bdb:cache_%d.%d"%(i[1][0],i[1][1])
-					cache=db_open_dict(cname)
-					if self.verbose>2 : print("Open cache : ",cname)
-
-					for j in image_range(*i[2:]):
-#						if not cache.has_key(j):
-						try:
-							z=cache.get_header(j)
-							if z==None : raise Exception
-						except:
-							cache[j]=self.get_data(sockf,i[1],j)
-#							print j,cache[j]
-
-						z=cache[j]		# this is here to raise an exception if something went funny in the data retrieval
 
-					i[1]=cname
-#				except: pass
-			sockf.close()
-			sock.close()
+			if self.prefetchtask and not onejob :
+				self.nexttask=None
+				prefetch=threading.Thread(target=self.prefetch)
+				prefetch.daemon=True
+				prefetch.start()
 
 			# Execute translated task
 #			try:
@@ -2247,9 +2563,33 @@ class EMDCTaskClient(EMTaskClient):
 		if retcode : print("Client on %s exiting. Bye !"%socket.gethostname())
 		return retcode
 
+	def get_data_batch(self,sockf,did,imnums,cache):
+		"""request a list of images from the server on an open connection and store them in cache. The server streams
+		the images back in batches as it reads them, so there is only a single round trip for the whole list."""
+		netalarm(240)
+		if self.verbose>2 : print("Retrieve %s : %d images"%(str(did),len(imnums)))
+		sockf.write("DATN")
+		sendobj(sockf,["cache",did,imnums])
+		sockf.flush()
+
+		got=set()
+		while 1:
+			netalarm(240)
+			r=recvobj(sockf)
+			if r==None : break
+			for k,img in enumerate(r[1]):
+				if img==None : continue
+				cache[imnums[r[0]+k]]=img
+				got.add(r[0]+k)
+		netalarm(0)
+
+		# anything the server failed to send is retried individually
+		for k,j in enumerate(imnums):
+			if k not in got : cache[j]=self.get_data(sockf,did,j)
+
 	def get_data(self,sockf,did,imnum):
 		"""request data from the server on an open connection"""
-		signal.alarm(240)
+		netalarm(240)
 		if self.verbose>2 : print("Retrieve %s : %d"%(str(did),imnum))
 		sockf.write("DATA")
 		sendobj(sockf,["cache",did,imnum])
@@ -2262,7 +2602,7 @@ class EMDCTaskClient(EMTaskClient):
 			sendobj(sockf,["cache",did,imnum])
 			sockf.flush()
 			ret=recvobj(sockf)
-		signal.alarm(0)
+		netalarm(0)
 
 		return ret
 
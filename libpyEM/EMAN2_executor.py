@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+from __future__ import print_function
+from __future__ import division
+#
+# Copyright (c) 2000-2006 Baylor College of Medicine
+#
+# This software is issued under a joint BSD/GNU license. You may use the
+# source code in this file under either license. However, note that the
+# complete EMAN2 and SPARX software packages have some GPL dependencies,
+# so you are responsible for compliance with the licenses of these packages
+# if you opt to use BSD licensing. The warranty disclaimer below holds
+# in either instance.
+#
+# This complete copyright notice must be included in any revised version of the
+# source code. Additional authorship citations may be added, but existing
+# author citations must be preserved.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston MA 02111-1307 USA
+#
+#
+
+# This file contains a small bounded thread pool used by programs which run many independent jobs in threads
+# on a single computer. It replaces the pattern of creating one Thread per job and polling threading.active_count()
+
+from future import standard_library
+standard_library.install_aliases()
+from builtins import range
+from builtins import object
+import sys
+import threading
+import queue
+from future.utils import raise_
+
+class EMExecutor(object):
+	"""A fixed pool of worker threads fed through a bounded queue. Jobs are (function,args) pairs. map() streams results
+back to the caller either in submission order or as they complete, so results can be written out while later jobs are
+still running. Only a bounded number of jobs (and results) exist at any one time, regardless of the total number of
+jobs. An exception in any job is re-raised in the calling thread, with its original traceback.
+
+Image I/O through the EMData methods (read_image, write_image, ...) is serialized in the bindings, so jobs may read
+and write images freely. File access made from within libEM, such as a processor reading a mask from a file, is not.
+
+Usage:
+	with EMExecutor(options.threads) as ex:
+		for r in ex.map(fn,[(a,b) for ...],logid=logid) : ...
+"""
+
+	def __init__(self,nthreads,maxqueue=None):
+		"""nthreads : number of worker threads
+maxqueue : maximum number of jobs submitted but not yet returned by map(). Default 4*nthreads"""
+		self.nthreads=max(1,int(nthreads))
+		if maxqueue==None : maxqueue=self.nthreads*4
+		self.maxqueue=max(self.nthreads,maxqueue)
+		self.jobs=queue.Queue(self.nthreads*2)
+		self.threads=[threading.Thread(target=self._worker) for i in range(self.nthreads)]
+		for t in self.threads:
+			t.daemon=True
+			t.start()
+
+	def __enter__(self): return self
+
+	def __exit__(self,typ,value,tb):
+		self.shutdown()
+		return False
+
+	def _worker(self):
+		while 1:
+			job=self.jobs.get()
+			if job==None : break
+			n,fn,args,results=job
+			try: results.put((n,True,fn(*args)))
+			except: results.put((n,False,sys.exc_info()))
+
+	def shutdown(self):
+		"""Stops the worker threads once queued jobs are complete. The executor cannot be used after this."""
+		if self.threads==None : return
+		for t in self.threads: self.jobs.put(None)
+		for t in self.threads: t.join()
+		self.threads=None
+
+	def map(self,fn,jobs,ordered=True,logid=None,progress=(0.0,1.0),verbose=0):
+		"""This is a generator which runs fn(*args) for each args in jobs and yields the return values.
+fn : function to run
+jobs : iterable of argument tuples, non-tuple items are passed as a single argument. May be a generator
+ordered : if set, results are yielded in the order of jobs, otherwise as soon as they are complete
+logid : if provided (from E2init), E2progress is updated as jobs complete, requires len(jobs)
+progress : (start,end) fraction of E2progress covered by these jobs
+verbose : if >0, prints a running count of completed jobs"""
+
+		try: ntot=len(jobs)
+		except: ntot=None
+		if logid!=None and ntot!=None : from EMAN2 import E2progress
+		else : logid=None
+
+		jobs=iter(jobs)
+		results=queue.Queue()
+		pending={}
+		nsub=0			# number of jobs submitted
+		nret=0			# number of results yielded
+		ndone=0			# number of completed jobs
+		exhausted=False
+		while 1:
+			# keep the pool busy, but never let more than maxqueue jobs/results accumulate
+			while not exhausted and nsub-nret<self.maxqueue :
+				try: args=next(jobs)
+				except StopIteration:
+					exhausted=True
+					break
+				if not isinstance(args,tuple) : args=(args,)
+				self.jobs.put((nsub,fn,args,results))
+				nsub+=1
+
+			if exhausted and nret==nsub : break
+
+			n,ok,ret=results.get()
+			ndone+=1
+			if not ok : raise_(ret[0],ret[1],ret[2])
+
+			if logid!=None : E2progress(logid,progress[0]+(progress[1]-progress[0])*ndone/ntot)
+			if verbose :
+				if ntot!=None : sys.stdout.write("\r  {}/{}   ".format(ndone,ntot))
+				else : sys.stdout.write("\r  {}   ".format(ndone))
+				sys.stdout.flush()
+
+			if ordered :
+				pending[n]=ret
+				while nret in pending :
+					nret+=1
+					yield pending.pop(nret-1)
+			else :
+				nret+=1
+				yield ret
+
+		if verbose : print("")
+
+	def run(self,fn,jobs,logid=None,progress=(0.0,1.0),verbose=0):
+		"""Runs fn(*args) for each args in jobs, discarding the return values. Returns when all jobs are complete."""
+		for r in self.map(fn,jobs,False,logid,progress,verbose): pass
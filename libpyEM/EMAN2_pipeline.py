@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+from __future__ import print_function
+from __future__ import division
+#
+# Copyright (c) 2000-2006 Baylor College of Medicine
+#
+# This software is issued under a joint BSD/GNU license. You may use the
+# source code in this file under either license. However, note that the
+# complete EMAN2 and SPARX software packages have some GPL dependencies,
+# so you are responsible for compliance with the licenses of these packages
+# if you opt to use BSD licensing. The warranty disclaimer below holds
+# in either instance.
+#
+# This complete copyright notice must be included in any revised version of the
+# source code. Additional authorship citations may be added, but existing
+# author citations must be preserved.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston MA 02111-1307 USA
+#
+#
+
+# This file contains a small dependency graph scheduler used by the refinement drivers (e2refine_easy) to run
+# the steps of an iteration which don't depend on each other (even/odd halves) concurrently on one computer
+
+from builtins import object
+import os
+import sys
+import time
+import shlex
+import subprocess
+import traceback
+
+class EMPipelineNode(object):
+	"""One step in an EMPipeline. Not normally created directly, see EMPipeline.add()"""
+
+	def __init__(self,name,command,deps,cores,fatal,inprocess):
+		self.name=name
+		self.command=command		# e2 program command line (str) or a Python callable
+		self.deps=list(deps)
+		self.cores=cores
+		self.fatal=fatal
+		self.inprocess=inprocess
+		self.mode=None				# "fork", "spawn" or "python" once started
+		self.start=None
+		self.end=None
+		self.status=None			# exit status once finished, 0 on success
+		self.proc=None				# pid (fork) or Popen (spawn) while running
+
+	def elapsed(self):
+		if self.start==None : return 0.0
+		if self.end==None : return time.time()-self.start
+		return self.end-self.start
+
+class EMPipeline(object):
+	"""Runs a set of steps as a dependency graph. Each step is either an EMAN2 program command line or a Python callable,
+and declares the steps it depends on and how many cores it will use. Steps are started in the order they were added as
+soon as their dependencies are complete and enough of the core budget is free. A step which would need more than the
+whole budget is run when nothing else is running.
+
+On POSIX systems, command lines for EMAN2 programs found next to the running program are executed in a fork of the
+current interpreter rather than a new shell, so they don't pay the Python/EMAN2 startup cost. Anything else (shell syntax,
+unknown programs, Windows) is run with a shell, as launch_childprocess() would. Python callables run in the calling
+process, and should be short.
+
+Usage:
+	pl=EMPipeline(options.threads)
+	pl.add("proj_even","e2project3d.py ...",cores=2)
+	pl.add("proj_odd","e2project3d.py ...",cores=2)
+	pl.add("simmask",makemask,deps=("proj_even","proj_odd"))
+	if not pl.run() : sys.exit(1)
+	for n in pl.nodes : print(n.name,n.elapsed())
+"""
+
+	def __init__(self,ncores=1,inprocess=True,onstart=None,onfinish=None,progdir=None):
+		"""ncores : total number of cores the running steps may use at once
+inprocess : if set, run EMAN2 programs in a fork of this process where possible
+onstart, onfinish : optional functions called with each node as it starts/finishes (in the calling thread)
+progdir : where to look for EMAN2 programs. Default is the directory of the running program"""
+		self.ncores=max(1,int(ncores))
+		self.inprocess=inprocess and hasattr(os,"fork")
+		self.onstart=onstart
+		self.onfinish=onfinish
+		if progdir==None : progdir=os.path.dirname(os.path.abspath(sys.argv[0]))
+		self.progdir=progdir
+		self.nodes=[]
+		self.byname={}
+
+	def add(self,name,command,deps=(),cores=1,fatal=True,inprocess=True):
+		"""Adds a step. name must be unique. deps is a list of names of previously added steps which must finish before this
+one starts. If fatal is not set, a failure of this step is reported but doesn't stop the pipeline, and steps depending
+on it still run. inprocess=False forces a command to run in a separate shell. Returns name"""
+		if name in self.byname : raise ValueError("Duplicate pipeline step: {}".format(name))
+		for d in deps:
+			if d not in self.byname : raise ValueError("Pipeline step {} depends on unknown step {}".format(name,d))
+		node=EMPipelineNode(name,command,deps,min(max(1,int(cores)),self.ncores),fatal,inprocess)
+		self.nodes.append(node)
+		self.byname[name]=node
+		return name
+
+	def __getitem__(self,name): return self.byname[name]
+
+	def _program(self,command):
+		"""returns the argv for running command in-process, or None if it must go through a shell"""
+		if any(c in command for c in "|&;<>()$`\n") : return None
+		try: argv=shlex.split(command)
+		except ValueError: return None
+		if len(argv)==0 or not argv[0].endswith(".py") : return None
+		path=argv[0] if os.path.dirname(argv[0]) else os.path.join(self.progdir,argv[0])
+		if not os.path.isfile(path) : return None
+		return [path]+argv[1:]
+
+	def _fork(self,argv):
+		"""Runs an EMAN2 program as __main__ in a child copy of this interpreter. Returns the child pid."""
+		sys.stdout.flush()
+		sys.stderr.flush()
+		pid=os.fork()
+		if pid : return pid
+
+		# child. Never returns to the caller
+		ret=0
+		try:
+			import runpy
+			sys.argv=argv+["--ppid={}".format(os.getppid())]
+			runpy.run_path(argv[0],run_name="__main__")
+		except SystemExit as e:
+			if e.code==None : ret=0
+			elif isinstance(e.code,int) : ret=e.code
+			else:
+				print(e.code,file=sys.stderr)
+				ret=1
+		except:
+			traceback.print_exc()
+			ret=1
+		try:
+			sys.stdout.flush()
+			sys.stderr.flush()
+		except: pass
+		os._exit(ret)
+
+	def _start(self,node):
+		argv=None
+		if callable(node.command) : node.mode="python"
+		else:
+			if self.inprocess and node.inprocess : argv=self._program(node.command)
+			node.mode="spawn" if argv==None else "fork"
+		node.start=time.time()
+		if self.onstart!=None : self.onstart(node)
+
+		if node.mode=="python":
+			try:
+				node.command()
+				node.status=0
+			except:
+				traceback.print_exc()
+				node.status=1
+			node.end=time.time()
+			return False
+
+		if node.mode=="fork" : node.proc=self._fork(argv)
+		else: node.proc=subprocess.Popen(str(node.command)+" --ppid=%d"%os.getpid(), shell=True)
+		return True
+
+	def _poll(self,node):
+		"""returns True if node has finished, filling in its status"""
+		if node.mode=="fork":
+			pid,status=os.waitpid(node.proc,os.WNOHANG)
+			if pid==0 : return False
+			if os.WIFEXITED(status) : node.status=os.WEXITSTATUS(status)
+			else : node.status=-os.WTERMSIG(status) if os.WIFSIGNALED(status) else 1
+		else:
+			status=node.proc.poll()
+			if status==None : return False
+			node.status=status
+		node.end=time.time()
+		node.proc=None
+		return True
+
+	def run(self,polltime=0.2):
+		"""Runs all of the steps which haven't run yet. Returns True if no fatal step failed. After a fatal failure no new
+steps are started, but those already running are allowed to finish."""
+		pending=[n for n in self.nodes if n.status==None]
+		running=[]
+		failed=False
+		try:
+			while running or (pending and not failed):
+				# start everything we can, in the order steps were added
+				used=sum(n.cores for n in running)
+				for node in list(pending):
+					if failed : break
+					if any(self.byname[d].status==None for d in node.deps) : continue
+					if running and used+node.cores>self.ncores : continue
+					pending.remove(node)
+					if self._start(node):
+						running.append(node)
+						used+=node.cores
+					else: failed=self._finish(node) or failed
+
+				if not running :
+					if pending and not failed : raise RuntimeError("EMPipeline: unable to schedule {}".format(",".join(n.name for n in pending)))
+					continue
+
+				time.sleep(polltime)
+				for node in list(running):
+					if self._poll(node):
+						running.remove(node)
+						failed=self._finish(node) or failed
+		except:
+			# make sure we don't leave orphans behind on ^C or an error in a callback
+			for node in running:
+				try:
+					if node.mode=="fork" : os.kill(node.proc,15)
+					else : node.proc.terminate()
+				except: pass
+			raise
+
+		return not failed
+
+	def _finish(self,node):
+		"""returns True if this is a fatal failure"""
+		if self.onfinish!=None : self.onfinish(node)
+		return node.status!=0 and node.fatal
+
+	def failed(self):
+		"""list of nodes which have failed"""
+		return [n for n in self.nodes if n.status not in (None,0)]
+
+	def timing_html(self,title=None):
+		"""An HTML table with timing information for each step which has been run"""
+		ret=[]
+		if title!=None : ret.append("<h4>{}</h4>".format(title))
+		ret.append("<table border=1 cellpadding=2><tr><th>Step</th><th>Mode</th><th>Cores</th><th>Start</th><th>Elapsed (s)</th><th>Status</th></tr>")
+		for n in self.nodes:
+			if n.start==None : continue
+			ret.append("<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{:1.1f}</td><td>{}</td></tr>".format(n.name,n.mode,n.cores,
+				time.strftime("%H:%M:%S",time.localtime(n.start)),n.elapsed(),"ok" if n.status==0 else "running" if n.status==None else "failed ({})".format(n.status)))
+		if len(ret)>1 :
+			t0=min(n.start for n in self.nodes if n.start!=None)
+			t1=max(n.end for n in self.nodes if n.end!=None) if any(n.end!=None for n in self.nodes) else t0
+			ret.append("<tr><td colspan=4>Total (wall clock)</td><td>{:1.1f}</td><td></td></tr>".format(t1-t0))
+		ret.append("</table>")
+		return "\n".join(ret)
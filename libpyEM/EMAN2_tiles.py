@@ -0,0 +1,365 @@
+#!/usr/bin/env python
+from __future__ import print_function
+from __future__ import division
+#
+# Copyright (c) 2000-2006 Baylor College of Medicine
+#
+# This software is issued under a joint BSD/GNU license. You may use the
+# source code in this file under either license. However, note that the
+# complete EMAN2 and SPARX software packages have some GPL dependencies,
+# so you are responsible for compliance with the licenses of these packages
+# if you opt to use BSD licensing. The warranty disclaimer below holds
+# in either instance.
+#
+# This complete copyright notice must be included in any revised version of the
+# source code. Additional authorship citations may be added, but existing
+# author citations must be preserved.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston MA 02111-1307 USA
+#
+#
+
+# This file contains a multiresolution tile store for browsing very large images (montaged micrographs, tomogram slices).
+# Level 0 is the full resolution image, and each following level is 2x2 mean shrunk, down to a level which fits in a
+# single tile. Tiles are stored uncompressed as uint8 or float16, so any tile can be located directly, and the file is
+# accessed through a read-only memory map.
+#
+# File layout (little endian):
+#	0		header, TILE_HEADER
+#	64		level table, TILE_MAXLEVELS x TILE_LEVEL
+#	4096	tile index for each level, (nty,ntx) TILE_INDEX records. offset 0 marks a tile which hasn't been written
+#	...		tile data for each level, (nty,ntx,tilesize,tilesize), starting on a TILE_ALIGN boundary
+#	...		optional power spectrum, TILE_PSPEC x TILE_PSPEC float32 followed by TILE_PSPEC/2 float32 radial profile
+#
+# Values are stored normalized by the mean and sigma of the source image. uint8 tiles map the rmin-rmax range of their
+# level (mean+-3 sigma of the level) to 0-255.
+
+from builtins import range
+from builtins import object
+import struct
+import os
+import numpy as np
+from collections import OrderedDict
+from EMAN2 import EMData,Region,to_numpy
+from EMAN2_executor import EMExecutor
+
+TILE_MAGIC=b"EMTILE01"
+TILE_VERSION=1
+TILE_HEADER="<8sIIIIIIffQI"			# magic,version,dtype,tilesize,nx,ny,nlevels,mean,sigma,pspec offset,pspec size
+TILE_LEVEL="<IIIIQQff"				# nx,ny,ntx,nty,index offset,data offset,rmin,rmax
+TILE_LEVEL_START=64
+TILE_MAXLEVELS=32
+TILE_ALIGN=4096
+TILE_INDEX=np.dtype([("offset","<u8"),("min","<f4"),("max","<f4")])
+TILE_DTYPES={"uint8":(1,np.uint8),"float16":(2,np.float16)}
+TILE_PSPEC=512
+
+def tile_levels(nx,ny,tilesize):
+	"""Returns a list of (nx,ny) for each level of a pyramid, ending with the first level which fits in a single tile"""
+	lv=[(nx,ny)]
+	while max(lv[-1])>tilesize : lv.append((max(1,lv[-1][0]//2),max(1,lv[-1][1]//2)))
+	return lv
+
+def _align(n): return (n+TILE_ALIGN-1)//TILE_ALIGN*TILE_ALIGN
+
+def _shrink(a):
+	"""2x2 mean shrink of a 2D array. Odd trailing rows/columns are dropped, but a dimension of 1 is kept"""
+	if a.shape[1]>1 : a=a[:,:a.shape[1]//2*2].reshape(a.shape[0],-1,2).mean(axis=2)
+	if a.shape[0]>1 : a=a[:a.shape[0]//2*2].reshape(-1,2,a.shape[1]).mean(axis=1)
+	return a.astype(np.float32)
+
+class EMTileFile(object):
+	"""Read access to a tile pyramid written by build_tiles(). The file is memory mapped, and get_tile() returns a view or a
+small decoded copy, so panning and zooming only touch the tiles actually displayed.
+
+Usage:
+	tf=EMTileFile("image.tiles")
+	for l in range(tf.nlevels) : print(tf.level_size(l),tf.level_tiles(l))
+	a=tf.get_tile(2,0,1)		# numpy array tilesize x tilesize, a[y,x]
+"""
+
+	def __init__(self,fsp):
+		self.fsp=fsp
+		self.mm=np.memmap(fsp,dtype=np.uint8,mode="r")
+		hdr=struct.unpack(TILE_HEADER,self.mm[:struct.calcsize(TILE_HEADER)].tobytes())
+		if hdr[0]!=TILE_MAGIC : raise Exception("{} is not a tile file".format(fsp))
+		(self.version,dtc,self.tilesize,self.nx,self.ny,self.nlevels,self.mean,self.sigma,self.pspec_offset,self.pspec_size)=hdr[1:]
+		self.dtype=[k for k,v in list(TILE_DTYPES.items()) if v[0]==dtc][0]
+		npdt=TILE_DTYPES[self.dtype][1]
+		ts=self.tilesize
+		lsz=struct.calcsize(TILE_LEVEL)
+
+		self.levels=[]
+		self.index=[]
+		self.data=[]
+		for l in range(self.nlevels):
+			lv=struct.unpack(TILE_LEVEL,self.mm[TILE_LEVEL_START+l*lsz:TILE_LEVEL_START+(l+1)*lsz].tobytes())
+			self.levels.append(lv)
+			nx,ny,ntx,nty,ioff,doff=lv[:6]
+			self.index.append(self.mm[ioff:ioff+ntx*nty*TILE_INDEX.itemsize].view(TILE_INDEX).reshape(nty,ntx))
+			nb=ntx*nty*ts*ts*np.dtype(npdt).itemsize
+			self.data.append(self.mm[doff:doff+nb].view(npdt).reshape(nty,ntx,ts,ts))
+
+	def close(self):
+		self.index=self.data=None
+		self.mm=None
+
+	def level_size(self,level):
+		"""(nx,ny) of the image at a level"""
+		return self.levels[level][0],self.levels[level][1]
+
+	def level_tiles(self,level):
+		"""(ntx,nty) number of tiles at a level"""
+		return self.levels[level][2],self.levels[level][3]
+
+	def level_range(self,level):
+		"""(rmin,rmax) suggested display range for a level, in the normalized units returned by get_tile()"""
+		return self.levels[level][6],self.levels[level][7]
+
+	def has_tile(self,level,x,y):
+		if level<0 or level>=self.nlevels : return False
+		ntx,nty=self.level_tiles(level)
+		return 0<=x<ntx and 0<=y<nty and self.index[level][y,x]["offset"]!=0
+
+	def tile_stats(self,level,x,y):
+		"""(min,max) of the valid region of a tile"""
+		r=self.index[level][y,x]
+		return float(r["min"]),float(r["max"])
+
+	def get_tile(self,level,x,y,raw=False):
+		"""Returns tile x,y of a level as a tilesize x tilesize array indexed [y,x], normalized by the mean and sigma of the
+source image. Tiles on the right and bottom edges are padded with 0. If raw is set, the stored uint8/float16 data is
+returned without copying (eg - to build a QImage directly). Raises KeyError if the tile doesn't exist."""
+		if not self.has_tile(level,x,y) : raise KeyError((level,x,y))
+		t=self.data[level][y,x]
+		if raw : return t
+		if self.dtype=="uint8" :
+			rmin,rmax=self.level_range(level)
+			return t.astype(np.float32)*((rmax-rmin)/255.0)+rmin
+		return t.astype(np.float32)
+
+	def get_region(self,level,x0,y0,nx,ny):
+		"""Returns an nx x ny region of a level with its corner at x0,y0 (in pixels at that level), assembled from tiles.
+Areas outside the image are 0."""
+		ts=self.tilesize
+		ret=np.zeros((ny,nx),np.float32)
+		for ty in range(max(0,y0//ts),(y0+ny-1)//ts+1):
+			for tx in range(max(0,x0//ts),(x0+nx-1)//ts+1):
+				if not self.has_tile(level,tx,ty) : continue
+				t=self.get_tile(level,tx,ty)
+				# overlap of the tile with the requested region, in level coordinates
+				xa,xb=max(x0,tx*ts),min(x0+nx,(tx+1)*ts)
+				ya,yb=max(y0,ty*ts),min(y0+ny,(ty+1)*ts)
+				ret[ya-y0:yb-y0,xa-x0:xb-x0]=t[ya-ty*ts:yb-ty*ts,xa-tx*ts:xb-tx*ts]
+		return ret
+
+	def get_pspec(self):
+		"""Returns (2D power spectrum, 1D radial power spectrum), both log scaled, or None if not built"""
+		if self.pspec_size==0 : return None
+		n=self.pspec_size
+		a=self.mm[self.pspec_offset:self.pspec_offset+(n*n+n//2)*4].view(np.float32)
+		return a[:n*n].reshape(n,n),a[n*n:]
+
+_open_tiles=OrderedDict()		# (mtime,size,EMTileFile) keyed by path, least recently used first
+TILE_MAXOPEN=16
+
+def get_tile(tilefile,level,x,y):
+	"""get_tile(tilefile,level,x,y)
+	retrieve a tile from a tile file as a numpy array. The file is only opened once for repeated calls. At most TILE_MAXOPEN
+	files are kept open, and a file is reopened if it has been rewritten"""
+	path=os.path.abspath(tilefile)
+	st=os.stat(path)
+	try:
+		mt,sz,tf=_open_tiles.pop(path)
+		if (mt,sz)!=(st.st_mtime,st.st_size) :
+			tf.close()
+			raise KeyError(path)
+	except KeyError:
+		mt,sz,tf=st.st_mtime,st.st_size,EMTileFile(path)
+		while len(_open_tiles)>=TILE_MAXOPEN : _open_tiles.popitem(last=False)[1][2].close()
+	_open_tiles[path]=(mt,sz,tf)
+	return tf.get_tile(level,x,y)
+
+def _source_info(src,zslice):
+	"""(nx,ny,z) for a source image, which may be an EMData or a filename. z is the slice of a 3D file to use"""
+	if isinstance(src,EMData) : return src["nx"],src["ny"],0
+	hdr=EMData(src,0,True)
+	if hdr["nz"]>1 and zslice==None : zslice=hdr["nz"]//2
+	return hdr["nx"],hdr["ny"],zslice
+
+def _read_rows(src,y,ny,nx,z):
+	"""Reads rows y to y+ny of the source image as a float32 array [y,x]"""
+	if isinstance(src,EMData) : return np.array(to_numpy(src)[y:y+ny],dtype=np.float32)
+	if z==None : r=EMData(src,0,False,Region(0,y,nx,ny))
+	else : r=EMData(src,0,False,Region(0,y,z,nx,ny,1))
+	return np.array(to_numpy(r),dtype=np.float32).reshape(ny,nx)
+
+def _sample_stats(src,nx,ny,z,levels,nsample=16):
+	"""Estimates the mean and sigma of the source, and the sigma of each level relative to the source, from a sample of
+horizontal strips, so the image doesn't need to be read an extra time"""
+	h=min(ny,max(256,2**(len(levels)-1)))
+	ys=sorted(set([int(i*(ny-h)/max(1,nsample-1)) for i in range(nsample)]))
+	strips=[_read_rows(src,y,h,nx,z) for y in ys]
+	mean=np.mean([s.mean() for s in strips])
+	sigma=np.sqrt(np.mean([((s-mean)**2).mean() for s in strips]))
+	if sigma==0 : sigma=1.0
+	lsig=[]
+	for l in range(len(levels)):
+		lsig.append(np.sqrt(np.mean([((s-mean)**2).mean() for s in strips]))/sigma)
+		strips=[_shrink(s) for s in strips]
+	return float(mean),float(sigma),lsig
+
+class _PyramidWriter(object):
+	"""Creates a tile file and fills it from horizontal strips of the normalized level 0 image. Strips are fed through
+rows(), which shrinks them into every level as they arrive and yields complete rows of tiles to be written, so memory
+use is a few rows of tiles per level regardless of image size"""
+
+	def __init__(self,fsp,nx,ny,tilesize,dtype,mean,sigma,lsig,pspec):
+		self.ts=ts=tilesize
+		self.dtype=dtype
+		dtc,self.npdt=TILE_DTYPES[dtype]
+		self.levels=tile_levels(nx,ny,ts)
+		nl=len(self.levels)
+		if nl>TILE_MAXLEVELS : raise Exception("Image too large for tile size {}".format(ts))
+
+		# layout
+		tb=ts*ts*np.dtype(self.npdt).itemsize
+		ntiles=[(-(-lx//ts),-(-ly//ts)) for lx,ly in self.levels]
+		ioffs=[]
+		pos=TILE_ALIGN
+		for ntx,nty in ntiles:
+			ioffs.append(pos)
+			pos+=ntx*nty*TILE_INDEX.itemsize
+		doffs=[]
+		pos=_align(pos)
+		for ntx,nty in ntiles:
+			doffs.append(pos)
+			pos+=ntx*nty*tb
+		if pspec : self.pspec_offset,pos=pos,pos+(TILE_PSPEC*TILE_PSPEC+TILE_PSPEC//2)*4
+		else : self.pspec_offset=0
+
+		self.ranges=[(-3.0*s,3.0*s) for s in lsig]
+		out=open(fsp,"wb")
+		out.write(struct.pack(TILE_HEADER,TILE_MAGIC,TILE_VERSION,dtc,ts,nx,ny,nl,mean,sigma,self.pspec_offset,TILE_PSPEC if pspec else 0))
+		out.seek(TILE_LEVEL_START)
+		for l in range(nl):
+			out.write(struct.pack(TILE_LEVEL,self.levels[l][0],self.levels[l][1],ntiles[l][0],ntiles[l][1],ioffs[l],doffs[l],self.ranges[l][0],self.ranges[l][1]))
+		out.truncate(pos)
+		out.close()
+
+		self.mm=np.memmap(fsp,dtype=np.uint8,mode="r+")
+		self.index=[self.mm[ioffs[l]:ioffs[l]+nt[0]*nt[1]*TILE_INDEX.itemsize].view(TILE_INDEX).reshape(nt[1],nt[0]) for l,nt in enumerate(ntiles)]
+		self.data=[self.mm[doffs[l]:doffs[l]+nt[0]*nt[1]*tb].view(self.npdt).reshape(nt[1],nt[0],ts,ts) for l,nt in enumerate(ntiles)]
+		self.doffs=doffs
+
+		self.pend_t=[np.zeros((0,lx),np.float32) for lx,ly in self.levels]		# rows not yet making up a full row of tiles
+		self.pend_s=[np.zeros((0,lx),np.float32) for lx,ly in self.levels]		# rows waiting for a partner to be shrunk
+		self.nin=[0]*nl			# rows received by each level
+		self.ty=[0]*nl			# next row of tiles
+
+	def rows(self,strips):
+		"""Generator yielding (level,ty,block) for each complete row of tiles, where block is up to tilesize rows of the
+level. strips is an iterable of normalized level 0 strips."""
+		for s in strips:
+			for r in self._push(0,s): yield r
+		for l in range(len(self.levels)):
+			# a level 1 pixel high would shrink to nothing, so the last row is carried up instead
+			if l+1<len(self.levels) and self.nin[l+1]==0 and len(self.pend_s[l])>0 :
+				for r in self._push(l+1,_shrink(self.pend_s[l][:1])): yield r
+			if len(self.pend_t[l])>0 :
+				yield (l,self.ty[l],self.pend_t[l])
+				self.ty[l]+=1
+				self.pend_t[l]=self.pend_t[l][:0]
+
+	def _push(self,l,rows):
+		self.nin[l]+=len(rows)
+		self.pend_t[l]=np.concatenate((self.pend_t[l],rows))
+		while len(self.pend_t[l])>=self.ts :
+			yield (l,self.ty[l],self.pend_t[l][:self.ts])
+			self.ty[l]+=1
+			self.pend_t[l]=self.pend_t[l][self.ts:]
+		if l+1<len(self.levels) :
+			p=np.concatenate((self.pend_s[l],rows))
+			n2=len(p)//2*2
+			self.pend_s[l]=p[n2:]
+			if n2>0 :
+				for r in self._push(l+1,_shrink(p[:n2])): yield r
+
+	def write_row(self,l,ty,block):
+		"""Encodes and stores one row of tiles. Different rows may be written concurrently"""
+		ts=self.ts
+		ny,nx=block.shape
+		ntx=self.data[l].shape[1]
+		rmin,rmax=self.ranges[l]
+		for tx in range(ntx):
+			v=block[:,tx*ts:(tx+1)*ts]
+			t=np.zeros((ts,ts),np.float32)
+			t[:v.shape[0],:v.shape[1]]=v
+			if self.dtype=="uint8" : t=np.clip(np.rint((t-rmin)*(255.0/(rmax-rmin))),0,255)
+			self.data[l][ty,tx]=t.astype(self.npdt)
+			# the offset is set last, so a tile is only marked present once it is complete
+			self.index[l][ty,tx]=(self.doffs[l]+(ty*ntx+tx)*ts*ts*np.dtype(self.npdt).itemsize,v.min(),v.max())
+
+	def write_pspec(self,pspec,radial):
+		n=TILE_PSPEC
+		a=self.mm[self.pspec_offset:self.pspec_offset+(n*n+n//2)*4].view(np.float32)
+		a[:n*n]=pspec.ravel()
+		a[n*n:]=radial
+
+	def close(self):
+		self.mm.flush()
+		self.index=self.data=None
+		self.mm=None
+
+def _pspec(src,nx,ny,z,mean,sigma):
+	"""Log scaled 2D power spectrum averaged over TILE_PSPEC boxes from the interior of the image, and its radial profile"""
+	n=TILE_PSPEC
+	a=np.zeros((n,n))
+	for y in range(1,ny//n-1):
+		rows=(_read_rows(src,y*n,n,nx,z)-mean)/sigma
+		for x in range(1,nx//n-1):
+			c=rows[:,x*n:(x+1)*n]
+			c=c-c.mean()
+			a+=np.abs(np.fft.fftshift(np.fft.fft2(c)))**2
+	a[n//2,n//2]=0
+	a=np.log10(a+a[a>0].min()*0.01 if (a>0).any() else a+1.0)
+	r=np.hypot(*np.mgrid[-n//2:n//2,-n//2:n//2]).astype(int).ravel()
+	radial=(np.bincount(r,a.ravel())/np.maximum(np.bincount(r),1))[:n//2]
+	return a.astype(np.float32),radial.astype(np.float32)
+
+def build_tiles(src,tilefile,tilesize=256,dtype="uint8",threads=4,pspec=False,zslice=None,verbose=0):
+	"""Builds a tile file from a 2D image. src may be an EMData or a filename. Files are read in strips, so images much
+larger than memory may be used, and a single z slice of a 3D file (default the middle) may be tiled. Rows of tiles are
+encoded and written by threads worker threads. If pspec is set, an averaged power spectrum is also stored (requires an
+image at least 3 x TILE_PSPEC in each dimension)."""
+	if dtype not in TILE_DTYPES : raise Exception("Unknown tile data type {}".format(dtype))
+	nx,ny,z=_source_info(src,zslice)
+	levels=tile_levels(nx,ny,tilesize)
+	mean,sigma,lsig=_sample_stats(src,nx,ny,z,levels)
+	if verbose : print("{} x {}, {} levels, mean {:g} sigma {:g}".format(nx,ny,len(levels),mean,sigma))
+
+	pspec=pspec and nx>=3*TILE_PSPEC and ny>=3*TILE_PSPEC
+	wr=_PyramidWriter(tilefile,nx,ny,tilesize,dtype,mean,sigma,lsig,pspec)
+
+	def strips():
+		for y in range(0,ny,tilesize):
+			if verbose>1 : print("  rows {}/{}".format(y,ny))
+			yield (_read_rows(src,y,min(tilesize,ny-y),nx,z)-mean)/sigma
+
+	with EMExecutor(threads) as ex:
+		ex.run(wr.write_row,wr.rows(strips()))
+
+	if pspec : wr.write_pspec(*_pspec(src,nx,ny,z,mean,sigma))
+	wr.close()
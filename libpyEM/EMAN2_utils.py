@@ -434,6 +434,227 @@ def textwriter(data,options,name,invert=0,xvals=None,onlydata=False):
 	return
 
 
+# Sparse (top-k) similarity matrices. Rather than the full clen x rlen matrix, only the best k references for each
+# particle are kept. The file is a stack of k x rlen images laid out like a classification matrix:
+# 0 - reference (column) number, 1 - similarity score, and with alignments 2-6 - dx, dy, dalpha, mirror, scale
+# Each row is sorted best (lowest) score first. Unused slots have a reference number of -1.
+# In memory, the same information is kept as a list of (rlen,k) numpy arrays in the same order.
+SIMMX_TOPK_ATTR = "simmx_topk"
+
+def simmx_topk_init(k,nrows,saveali):
+	"""Returns an empty in-memory top-k similarity matrix for nrows particles"""
+	topk=[np.full((nrows,k),-1.0,dtype=np.float32),np.full((nrows,k),np.inf,dtype=np.float32)]
+	if saveali : topk.extend([np.zeros((nrows,k),dtype=np.float32) for i in range(5)])
+	return topk
+
+def simmx_topk_merge(topk,r0,c0,block):
+	"""Merges a dense block of a similarity matrix into topk. block is a list of 2-D numpy arrays, (score,dx,dy,dalpha,mirror,scale)
+	or just (score,), covering rows r0:r0+ny and columns c0:c0+nx. Cells with scores <= -1e37 were not computed, and are ignored."""
+	nr,nc=block[0].shape
+	k=topk[0].shape[1]
+	rows=slice(r0,r0+nr)
+
+	score=np.where(block[0]>-1.0e37,block[0],np.inf)
+	score=np.concatenate((topk[1][rows],score),axis=1)
+	cols=np.concatenate((topk[0][rows],np.broadcast_to(np.arange(c0,c0+nc,dtype=np.float32),(nr,nc))),axis=1)
+	best=np.argpartition(score,k-1,axis=1)[:,:k]
+	best=np.take_along_axis(best,np.argsort(np.take_along_axis(score,best,axis=1),axis=1,kind="stable")[:,:k],axis=1)
+
+	newscore=np.take_along_axis(score,best,axis=1)
+	topk[0][rows]=np.where(np.isinf(newscore),-1.0,np.take_along_axis(cols,best,axis=1))
+	topk[1][rows]=newscore
+	for i in range(2,len(topk)):
+		topk[i][rows]=np.take_along_axis(np.concatenate((topk[i][rows],block[i-1]),axis=1),best,axis=1)
+
+def simmx_topk_write(fsp,topk,nref,projfile=None,partfile=None):
+	"""Writes an in-memory top-k similarity matrix to a file. nref is the number of columns in the full matrix"""
+	for i,a in enumerate(topk):
+		if i==1 : a=np.where(np.isinf(a),1.0e30,a)		# keep the file finite
+		img=from_numpy(np.ascontiguousarray(a,dtype=np.float32))
+		if i==0:
+			img[SIMMX_TOPK_ATTR]=a.shape[1]
+			img["simmx_nref"]=nref
+			if projfile!=None : img["projection_file"]=projfile
+			if partfile!=None : img["particle_file"]=partfile
+		img.write_image(fsp,i)
+
+def is_simmx_topk(fsp):
+	"""Returns True if fsp is a sparse (top-k) similarity matrix rather than a full one"""
+	try: return EMData(fsp,0,True).has_attr(SIMMX_TOPK_ATTR)
+	except: return False
+
+def simmx_topk_read(fsp):
+	"""Reads a top-k similarity matrix written by simmx_topk_write. Returns (topk,nref)"""
+	imgs=EMData.read_images(fsp)
+	topk=[i.numpy().copy() for i in imgs]
+	topk[1][topk[0]<0]=np.inf
+	return topk,imgs[0]["simmx_nref"]
+
+def simmx_read_rows(fsp,r0,ny,nimg=None):
+	"""Reads rows r0:r0+ny of a full similarity matrix file as a list of 2-D numpy arrays, (score,dx,dy,dalpha,mirror,scale)
+	or just (score,) if the file has no alignments. Older files with no scale get a scale of 1."""
+	hdr=EMData(fsp,0,True)
+	if nimg==None : nimg=min(EMUtil.get_image_count(fsp),6)
+	if nimg<5 : nimg=1
+	block=[]
+	for i in range(nimg):
+		img=EMData()
+		img.read_image(fsp,i,False,Region(0,r0,hdr["nx"],ny))
+		block.append(img.numpy().copy())
+	if len(block)==5 : block.append(np.ones_like(block[0]))
+	return block
+
+def simmx_dense_to_topk(fsp,k,outfsp,chunk=4096):
+	"""Converts a full similarity matrix file into a top-k similarity matrix file, reading chunk rows at a time"""
+	hdr=EMData(fsp,0,True)
+	nref,nptcl=hdr["nx"],hdr["ny"]
+	nimg=min(EMUtil.get_image_count(fsp),6)
+	topk=simmx_topk_init(k,nptcl,nimg>=5)
+	for r0 in range(0,nptcl,chunk):
+		block=simmx_read_rows(fsp,r0,min(chunk,nptcl-r0),nimg)
+		simmx_topk_merge(topk,r0,0,block)
+	simmx_topk_write(outfsp,topk,nref,hdr.get_attr_default("projection_file",None),hdr.get_attr_default("particle_file",None))
+
+def simmx_topk_to_classmx(topk,sep=1):
+	"""Produces the classification matrix e2classify.py would produce (a list of sep x nptcl EMData) from a top-k similarity
+	matrix, either a filename or an in-memory list of arrays."""
+	if isinstance(topk,str) : topk=simmx_topk_read(topk)[0]
+	if sep>topk[0].shape[1] : raise ValueError("Cannot classify into {} classes with only {} stored per particle".format(sep,topk[0].shape[1]))
+
+	ret=[from_numpy(np.ascontiguousarray(topk[0][:,:sep]))]
+	ret.append(from_numpy(np.where(topk[0][:,:sep]<0,0.0,1.0).astype(np.float32)))		# weight
+	for a in topk[2:]: ret.append(from_numpy(np.ascontiguousarray(a[:,:sep])))
+	return ret
+
+def simmx_dense_to_classmx(fsp,sep=1,threads=1,chunk=4096,scorefn=None):
+	"""Produces the classification matrix e2classify.py would produce (a list of sep x nptcl EMData) from a full similarity
+	matrix file. The file is read chunk rows at a time, and the sep best classes for each particle are found with a partial
+	sort. Every particle is classified, on the raw scores if none of its cells were computed. Blocks are processed by threads
+	threads. If provided, scorefn(score,r0) returns a replacement for the score array of the block starting at row r0."""
+	from EMAN2_executor import EMExecutor
+
+	hdr=EMData(fsp,0,True)
+	nref,nptcl=hdr["nx"],hdr["ny"]
+	nimg=min(EMUtil.get_image_count(fsp),6)
+	topk=simmx_topk_init(sep,nptcl,nimg>=5)
+
+	def doblock(r0):
+		block=simmx_read_rows(fsp,r0,min(chunk,nptcl-r0),nimg)
+		if scorefn!=None : block[0]=scorefn(block[0],r0)
+		simmx_topk_merge(topk,r0,0,block)		# each block covers its own rows of topk, so they can be merged concurrently
+
+		# a particle with no computed cells at all is still classified on the raw scores, as e2classify always has
+		empty=np.flatnonzero(topk[0][r0:r0+len(block[0]),0]<0)
+		if len(empty)==0 : return
+		sub=[b[empty] for b in block]
+		best=np.argsort(sub[0],axis=1,kind="stable")[:,:sep]
+		rows=(r0+empty)[:,np.newaxis]
+		k=best.shape[1]
+		topk[0][rows,np.arange(k)]=best
+		topk[1][rows,np.arange(k)]=np.take_along_axis(sub[0],best,axis=1)
+		for i in range(2,len(topk)): topk[i][rows,np.arange(k)]=np.take_along_axis(sub[i-1],best,axis=1)
+
+	with EMExecutor(threads) as ex: ex.run(doblock,range(0,nptcl,chunk))
+
+	ret=simmx_topk_to_classmx(topk,sep)
+	if nimg>=5 : ret=ret[:nimg+1]		# no scale image if the simmx didn't have one
+	return ret
+
+class ClassMxIndex(object):
+	"""An inverted index of a classification matrix (classmx), from each class to the particles assigned to it. This replaces
+	scanning the whole classmx once per class. The index is stored as CSR arrays: the entries for class n are
+	indptr[n]:indptr[n+1], in increasing particle order. ptcl holds the particle number of each entry, col the classmx column
+	it came from (always 0 unless classified with --sep>1), and ali, if the classmx contains alignments, a
+	(weight,dx,dy,dalpha,mirror[,scale]) x entries array. The index is built in a single pass over the classmx, and when
+	constructed from a filename is cached next to it as <classmx>.idx.npz, which is rebuilt if the classmx changes.
+
+	idx=ClassMxIndex("r2d_01/classmx_04.hdf")
+	for n in range(idx.ncls):
+		ptcls=idx.members(n)
+		xfs=idx.xforms(n)
+	"""
+
+	version=1
+
+	def __init__(self,classmx,cache=True):
+		"""classmx may be a filename or a list of EMData, as from EMData.read_images() or simmx_topk_to_classmx()"""
+		if isinstance(classmx,str) :
+			if cache and self._read_cache(classmx) : return
+			self._build(EMData.read_images(classmx))
+			if cache : self._write_cache(classmx)
+		else : self._build(classmx)
+
+	def _build(self,classmx):
+		self.sep,self.nptcl=classmx[0]["nx"],classmx[0]["ny"]
+		cls=classmx[0].numpy().reshape(-1).astype(np.int64)
+		valid=np.nonzero(cls>=0)[0]
+		order=valid[np.argsort(cls[valid],kind="stable")]		# stable, so particles stay in order within each class
+
+		if len(valid)>0 : self.ncls=int(cls[valid].max())+1
+		else : self.ncls=0
+		self.indptr=np.zeros(self.ncls+1,dtype=np.int64)
+		self.indptr[1:]=np.cumsum(np.bincount(cls[valid],minlength=self.ncls))
+		self.ptcl=(order//self.sep).astype(np.int32)
+		self.col=(order%self.sep).astype(np.int32)
+		if len(classmx)>=6 : self.ali=np.array([i.numpy().reshape(-1)[order] for i in classmx[1:]],dtype=np.float32)
+		else : self.ali=None
+
+	def _read_cache(self,fsp):
+		try:
+			st=os.stat(fsp)
+			c=np.load(fsp+".idx.npz")
+			if int(c["version"])!=self.version or int(c["srcsize"])!=st.st_size or float(c["srcmtime"])!=st.st_mtime : return False
+			self.indptr,self.ptcl,self.col=c["indptr"],c["ptcl"],c["col"]
+			self.ali=c["ali"] if c["ali"].size>0 else None
+			self.sep,self.nptcl,self.ncls=int(c["sep"]),int(c["nptcl"]),len(self.indptr)-1
+		except: return False
+		return True
+
+	def _write_cache(self,fsp):
+		# written to a temporary file and renamed, so readers never see a partial index. Failure (eg - read-only directory) isn't an error
+		try:
+			st=os.stat(fsp)
+			tmp="{}.idx.{}.tmp".format(fsp,os.getpid())
+			with open(tmp,"wb") as out:
+				np.savez(out,version=self.version,srcsize=st.st_size,srcmtime=st.st_mtime,sep=self.sep,nptcl=self.nptcl,
+					indptr=self.indptr,ptcl=self.ptcl,col=self.col,ali=self.ali if self.ali is not None else np.zeros(0,dtype=np.float32))
+			os.rename(tmp,fsp+".idx.npz")
+		except:
+			try: os.unlink(tmp)
+			except: pass
+
+	def _slice(self,n,col=None):
+		if n<0 or n>=self.ncls : return slice(0,0),None
+		s=slice(self.indptr[n],self.indptr[n+1])
+		if col==None : return s,None
+		return s,self.col[s]==col
+
+	def members(self,n,col=None):
+		"""Returns the particle numbers in class n, as a list, optionally only those from a single classmx column"""
+		s,m=self._slice(n,col)
+		if m is None : return self.ptcl[s].tolist()
+		return self.ptcl[s][m].tolist()
+
+	def alignments(self,n,col=None):
+		"""Returns the (weight,dx,dy,dalpha,mirror[,scale]) x members array for class n, in the same order as members()"""
+		if self.ali is None : raise ValueError("The classification matrix has no alignment information")
+		s,m=self._slice(n,col)
+		if m is None : return self.ali[:,s]
+		return self.ali[:,s][:,m]
+
+	def xforms(self,n,col=None):
+		"""Returns a 2-D Transform for each of the members of class n, in the same order as members()"""
+		a=self.alignments(n,col)
+		return [Transform({"type":"2d","tx":float(a[1,i]),"ty":float(a[2,i]),"alpha":float(a[3,i]),"mirror":int(a[4,i])}) for i in range(a.shape[1])]
+
+	def column(self,n,ptcl):
+		"""Returns the classmx column in which particle ptcl was assigned to class n, or -1 if it isn't in the class"""
+		s,m=self._slice(n)
+		p=self.ptcl[s]
+		i=np.searchsorted(p,ptcl)
+		if i>=len(p) or p[i]!=ptcl : return -1
+		return int(self.col[s][i])
+
 def cmponetomany(reflist,target,align=None,alicmp=("dot",{}),cmp=("dot",{}), ralign=None, alircmp=("dot",{}),shrink=None,mask=None,subset=None,prefilt=False,verbose=0):
 	"""Compares one image (target) to a list of many images (reflist). Returns """
 
@@ -374,9 +374,9 @@ def db_emd_init(self,*parms):
 		return
 	else :
 #		print "toC:", parms
-		if len(parms)>2 and isinstance(parms[0],str) :
+		if len(parms)>0 and isinstance(parms[0],str) :
 			self.__initc()
-			self.read_image_c(*parms)
+			self.read_image_c(*parms)			# unlike the C++ constructor, this releases the GIL while reading
 			#try: self.read_image_c(*parms)			# this handles Region reading, which isn't supported in the C++ constructor
 			#except:
 				#traceback.print_exc()
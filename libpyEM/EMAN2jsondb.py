@@ -39,7 +39,7 @@ from builtins import object
 import weakref
 import json
 import pickle
-from zlib import compress,decompress
+from zlib import compress,decompress,crc32
 import os
 import os.path
 import signal
@@ -60,22 +60,27 @@ from libpyUtils2 import EMUtil
 DBDEBUG=0
 
 def js_one_key(url,key):
-	"""Opens a JSON file and returns a single key before closing the file. Not really faster, but conserves memory by not leaving the file open"""
+	"""Opens a JSON file and returns a single key before closing the file. Uses the sidecar index written with the file
+	if available, so only the requested value is parsed. Conserves memory by not leaving the file open"""
 
 	return JSDict.one_key(url,key)
 
-def js_open_dict(url):
+def js_open_dict(url,journal=False):
 	"""Opens a JSON file as a dict-like database object. The interface is almost identical to the BDB db_* functions.
 If opened. Writes to JDB dictionaries may be somewhat inefficient due to the lack of a good model (as BDB has) for
 multithreaded access. Default behavior is to write the entire dictionary to disk when any element is changed. File
 locking is attempted to avoid conflicts, but may not work in all situations. read-only access is a meaningless concept
 because file pointers are not held open beyond discrete transations. While it is possible to store images in JSON files
-it is not recommended due to inefficiency, and making files which are difficult to read."""
+it is not recommended due to inefficiency, and making files which are difficult to read.
+
+If journal is set, changes are instead appended as small records to a <name>_journal.jsonl file next to the JSON file,
+which is periodically folded back into the JSON file. This is much faster for large dictionaries which are updated one key
+at a time (eg - particle_parms_xx.json during refinement)."""
 
 	if url[-5:]!=".json" :
 		raise Exception("JSON databases must have .json extension")
 
-	return JSDict.open_db(url)
+	return JSDict.open_db(url,journal)
 
 def js_close_dict(url):
 	"""This will free some resources associated with the database. Not associated with closing a file pointer at present."""
@@ -97,6 +102,10 @@ def js_remove_dict(url):
 	js_close_dict(url)
 	try : os.unlink(url)
 	except OSError: pass
+	try : os.unlink(url[:-5]+"_journal.jsonl")
+	except OSError: pass
+	try : os.unlink(url+".idx")
+	except OSError: pass
 
 	return
 
@@ -537,6 +546,8 @@ def denl(s):
 	"This will replace \n with nothing in a search match"
 	return s.group(0).replace("\n","")
 
+jsitemsep=json.dumps([0,0],indent=0)[3:-3]		# separator between items with indent=0, ", \n" on Python 2 and ",\n" on Python 3
+
 class JSDict(object):
 	"""This class provides dict-like access to a JSON file on disk. It goes to some lengths to insure thread/process-safety, even if
 performance must be sacrificed. The only case where it may not work is when a remote filesystem which doesn't obey file-locking is used.
@@ -546,10 +557,12 @@ JSDicts are open at one time."""
 
 	opendicts={}
 	lock=threading.Lock()		# to make this section threadsafe
+	journal_minsize=1<<20		# journals smaller than this (in bytes) are never compacted
 
 	@classmethod
-	def open_db(cls,path=None):
-		"""This should be used to create a JSDict instance. It caches already open dictionaries to avoid redundancy and conflicts."""
+	def open_db(cls,path=None,journal=False):
+		"""This should be used to create a JSDict instance. It caches already open dictionaries to avoid redundancy and conflicts.
+		If journal is set, the (possibly cached) dictionary will write changes to a journal file rather than rewriting the full file."""
 
 		cls.lock.acquire()
 
@@ -566,10 +579,12 @@ JSDicts are open at one time."""
 			raise Exception("Cannot find path for {}".format(path))
 
 		if normpath in cls.opendicts :
+			ret=cls.opendicts[normpath]
+			if journal : ret.journal=True
 			cls.lock.release()
-			return cls.opendicts[normpath]
+			return ret
 
-		try : ret=JSDict(path)
+		try : ret=JSDict(path,journal)
 		except:
 			cls.lock.release()
 			traceback.print_exc()
@@ -604,26 +619,50 @@ JSDicts are open at one time."""
 
 	@classmethod
 	def one_key(cls,path,key):
-		"""Opens a JSDict for path, reads a single key (if present) then closes the JSDict, to reduce memory issues
-		when a large set of Dicts is iterated over in a large project"""
+		"""Reads a single key (if present) from a JSON file without opening it as a JSDict, to reduce memory issues
+		when a large set of Dicts is iterated over in a large project. If the file has a valid sidecar index (.json.idx)
+		only the text for the requested key is read and parsed. Otherwise the file is parsed without object conversion,
+		and only the requested value is converted to EMData/Transform/... objects. If the dictionary is already open,
+		or has a pending journal, we fall back on a normal JSDict access."""
 
+		key=str(key)
 		try:
-			db=JSDict.open_db(path)
-			ret=db[key]
-			db.close()
+			normpath=os.path.abspath(path)
+			try: jsize=os.stat(normpath[:-5]+"_journal.jsonl").st_size
+			except: jsize=0
+			if normpath in cls.opendicts or jsize>0 or not os.path.isfile(normpath) :
+				db=JSDict.open_db(path)
+				ret=db[key]
+				db.close()
+				return ret
+
+			jfile=open(normpath,"r")
+			file_lock(jfile,readonly=True)
+			try:
+				jss=js_index_read(jfile,normpath,key)
+				if jss==None :
+					jfile.seek(0)
+					return json_decode_tree(json.load(jfile)[key])
+				return json.loads(jss,object_hook=json_to_obj)
+			finally:
+				file_unlock(jfile)
+				jfile=None
 		except:
 #			traceback.print_exc()
 			return None
 
-		return ret
-
-	def __init__(self,path=None):
+	def __init__(self,path=None,journal=False):
 		"""This is a dict-like representation of a JSON file on disk. Warning, the entire file contents are parsed and held
 in memory for efficient access. File change monitoring and file locking is used to insure self-consistency across processes.
 Due to JSON module, there may be some data types which aren't permitted as values. While this module may be used like a traditional
 dictionary for the most part, for efficiency, you may consider using the setval() and get() methods which permit deferring
 synchronization with the disk file.
 
+If journal is set, each sync() with pending changes appends a single delta record to <name>_journal.jsonl instead of rewriting
+the whole file. The journal is replayed on open, and is folded back into the JSON file (in a background thread) once it grows
+larger than the JSON file itself. Once a journal file exists, all writers (journaled or not) will append to it, so the JSON file
+alone is only complete after compaction.
+
 There is no name/path separation as existed with BDB objects. 'path' is a full path to the .json file. A normalized version
 of the path is stored as self.normpath"""
 
@@ -632,6 +671,7 @@ of the path is stored as self.normpath"""
 		self.path=path
 		try: self.normpath=os.path.abspath(path)
 		except: self.normpath=path
+		self.jpath=self.normpath[:-5]+"_journal.jsonl"
 		self.filesize=0					# stores the size of the text file on disk for approximate memory management
 
 		self.data={}					# a cached copy of the actual data
@@ -639,6 +679,10 @@ of the path is stored as self.normpath"""
 		self.delkeys=set()				# a set of keys to delete on next update
 		self.lasttime=0					# last time the database was accessed
 
+		self.journal=journal			# if set, changes are appended to the journal file rather than rewriting the JSON file
+		self.jpos=0						# byte offset in the journal file up to which records have been applied to self.data
+		self.compacting=False			# set while a background compaction thread is running
+
 		self.busy=False					# used for some degree of threadsafety to supplement file locking
 		self.sync()
 		JSDict.opendicts[self.normpath]=self	# add ourselves to the cache
@@ -654,6 +698,7 @@ of the path is stored as self.normpath"""
 		be automatically reopened."""
 		if len(self.changes)>0 or len(self.delkeys): self.sync()
 		self.lasttime=0
+		self.jpos=0
 		self.data={}
 #		del JSDict.opendicts[self.normpath]
 
@@ -663,6 +708,30 @@ of the path is stored as self.normpath"""
 		while self.busy: time.sleep(.1)		# this is for some degree of threadsafety beyond file locking
 		self.busy=True
 
+		if self.journal or os.path.exists(self.jpath) :
+			try: self._sync_journal()
+			finally: self.busy=False
+			return
+
+		mt=self._check_file()
+
+		### Read entire dict from file
+		# If we have unprocessed changes, or if the file has changed since last access
+		if len(self.changes)>0 or mt>self.lasttime : self._read_file()
+
+		### Write entire dict to file
+		# If we have unprocessed changes, we need to apply them and write back to disk
+		if len(self.changes)>0 or len(self.delkeys)>0:
+			### We do the updates and prepare the string in-ram. If someone else tries a write while we're doing this, it should raise an exception
+			self._apply_changes()
+			self._write_file()
+
+		self.lasttime=os.stat(self.normpath).st_mtime	# make sure we include our recent change, if made
+		self.busy=False
+
+	def _check_file(self):
+		"""Returns the modification time of the JSON file, recovering an orphaned _tmp file or creating an empty JSON file if necessary"""
+
 		# We check for the _tmp file first
 		try:
 			mt2=os.stat(self.normpath[:-5]+"_tmp.json").st_mtime
@@ -697,56 +766,164 @@ of the path is stored as self.normpath"""
 					jfile=None
 					mt=time.time()
 
+		return mt
 
-		### Read entire dict from file
-		# If we have unprocessed changes, or if the file has changed since last access
-		if len(self.changes)>0 or mt>self.lasttime :
-			jfile=open(self.normpath,"r")		# open the file
-			file_lock(jfile,readonly=True)		# lock it for reading
+	def _read_file(self):
+		"""Parses the entire JSON file into self.data"""
 
-			try:
-				self.data=json.load(jfile,object_hook=json_to_obj)			# parse the whole JSON file, which should be a single dictionary
-			except:
-				jfile.seek(0)
-				a=jfile.read()
-				if len(a.strip())==0 : self.data={}		# json.load doesn't like completely empty files
-				else :
-					file_unlock(jfile)					# unlock the file
-					print("Error in file: ",self.path)
-					traceback.print_exc()
-					raise Exception("Error reading JSON file : {}".format(self.path))
-			self.filesize=jfile.tell()			# our location after reading the data from the file
-			file_unlock(jfile)					# unlock the file
-			jfile=None							# implicit close
+		jfile=open(self.normpath,"r")		# open the file
+		file_lock(jfile,readonly=True)		# lock it for reading
 
-		### Write entire dict to file
-		# If we have unprocessed changes, we need to apply them and write back to disk
-		if len(self.changes)>0 or len(self.delkeys)>0:
-			try:
-				os.rename(self.normpath,self.normpath[:-5]+"_tmp.json")		# we back up the original file, just in case
-			except:
-				raise Exception("WARNING: file '{}' cannot be created, conflict in writing JSON files. You may consider reporting this if you don't know why this happened.".format(self.normpath[:-3]+"_tmp.json"))
+		try:
+			self.data=json.load(jfile,object_hook=json_to_obj)			# parse the whole JSON file, which should be a single dictionary
+		except:
+			jfile.seek(0)
+			a=jfile.read()
+			if len(a.strip())==0 : self.data={}		# json.load doesn't like completely empty files
+			else :
+				file_unlock(jfile)					# unlock the file
+				print("Error in file: ",self.path)
+				traceback.print_exc()
+				raise Exception("Error reading JSON file : {}".format(self.path))
+		self.filesize=jfile.tell()			# our location after reading the data from the file
+		file_unlock(jfile)					# unlock the file
+		jfile=None							# implicit close
+
+	def _apply_changes(self):
+		"""Merges pending changes and deletions into self.data"""
+
+		self.data.update(self.changes)		# update the internal copy of the data
+		self.changes={}
+		for k in self.delkeys:
+			try: del self.data[k]
+			except: pass
+		self.delkeys=set()
 
-			### We do the updates and prepare the string in-ram. If someone else tries a write while we're doing this, it should raise the above exception
-			self.data.update(self.changes)		# update the internal copy of the data
-			self.changes={}
-			for k in self.delkeys:
+	def _write_file(self):
+		"""Writes the entire contents of self.data to the JSON file"""
+
+		try:
+			os.rename(self.normpath,self.normpath[:-5]+"_tmp.json")		# we back up the original file, just in case
+		except:
+			raise Exception("WARNING: file '{}' cannot be created, conflict in writing JSON files. You may consider reporting this if you don't know why this happened.".format(self.normpath[:-3]+"_tmp.json"))
+
+		# We serialize one key at a time so we know where each value lands in the file. With indent=0 and the same item
+		# separator json uses, the layout matches serializing the whole dictionary at once
+		parts=[]
+		index={}
+		pos=2
+		for k in sorted(self.data.keys()):
+			ks=json.dumps(k)+": "
+			vs=json.dumps(self.data[k],indent=0,sort_keys=True,default=obj_to_json,encoding="ascii")
+			vs=re.sub(listrex,denl,vs)
+			index[k]=(pos+len(ks),len(vs),js_crc(vs))
+			parts.append(ks+vs)
+			pos+=len(ks)+len(vs)+len(jsitemsep)
+		if len(parts)==0 : jss="{}"
+		else: jss="{\n"+jsitemsep.join(parts)+"\n}"
+
+		### We do the actual write as a rapid sequence to avoid conflicts
+		jfile=open(self.normpath,"w")
+		file_lock(jfile,readonly=False)
+		jfile.write(jss)
+		jfile.flush()
+		js_index_write(self.normpath,index,len(jss))
+		file_unlock(jfile)
+		jfile=None
+		os.unlink(self.normpath[:-5]+"_tmp.json")
+		self.filesize=len(jss)
+
+	def _replay_journal(self,jfile):
+		"""Applies any complete records in the (open and locked) journal file beyond self.jpos to self.data"""
+
+		jfile.seek(self.jpos)
+		buf=jfile.read()
+		end=buf.rfind(b"\n")+1			# a partial record at the end can only come from an interrupted writer, and is ignored
+		for line in buf[:end].splitlines():
+			if len(line.strip())==0 : continue
+			try: rec=json.loads(line.decode("ascii"),object_hook=json_to_obj)
+			except:
+				print("Error in journal: ",self.jpath)
+				traceback.print_exc()
+				continue
+			self.data.update(rec["set"])
+			for k in rec["del"]:
 				try: del self.data[k]
 				except: pass
-			self.delkeys=set()
-			jss=json.dumps(self.data,indent=0,sort_keys=True,default=obj_to_json,encoding="ascii")			# write the whole dictionary back to disk
-			jss=re.sub(listrex,denl,jss)
+		self.jpos+=end
+
+	def _sync_journal(self):
+		"""sync() for journaled dictionaries. Rather than rewriting the whole file, pending changes are appended as a single
+		record to the journal, under an exclusive lock on the journal file."""
+
+		changed=len(self.changes)>0 or len(self.delkeys)>0
+		mt=self._check_file()
 
-			### We do the actual write as a rapid sequence to avoid conflicts
-			jfile=open(self.normpath,"w")
+		try: jfile=open(self.jpath,"a+b" if changed or self.journal else "rb")
+		except:
+			# the journal was removed from under us, so there is nothing to replay
+			if mt>self.lasttime :
+				self._read_file()
+				self.jpos=0
+			self.lasttime=mt
+			return
+
+		file_lock(jfile,readonly=not changed)
+		jfile.seek(0,2)
+		jsize=jfile.tell()
+
+		# The JSON file is rewritten (and the journal truncated) on compaction, so we need to start over
+		mt=os.stat(self.normpath).st_mtime
+		if mt>self.lasttime or jsize<self.jpos :
+			self._read_file()
+			self.jpos=0
+
+		if jsize>self.jpos : self._replay_journal(jfile)
+
+		if changed:
+			rec={"set":self.changes,"del":sorted(self.delkeys)}
+			jss=json.dumps(rec,sort_keys=True,default=obj_to_json)+"\n"
+			jfile.seek(0,2)
+			jfile.write(jss.encode("ascii"))
+			jfile.flush()
+			self._apply_changes()
+			self.jpos=jfile.tell()
+
+		file_unlock(jfile)
+		jfile=None
+		self.lasttime=mt
+
+		# Fold the journal back into the main file once it is larger than the file itself. This keeps the amortized cost of a
+		# single change independent of the size of the dictionary
+		if changed and self.jpos>max(JSDict.journal_minsize,self.filesize) and not self.compacting :
+			self.compacting=True
+			thr=threading.Thread(target=self.compact)		# not a daemon thread, so the interpreter won't exit mid-write
+			thr.start()
+
+	def compact(self):
+		"""Folds the journal into the JSON file, leaving an empty journal behind. After this the JSON file is readable on its own.
+		Normally called automatically in a background thread."""
+
+		while self.busy: time.sleep(.1)
+		self.busy=True
+
+		try:
+			jfile=open(self.jpath,"a+b")
 			file_lock(jfile,readonly=False)
-			jfile.write(jss)
+			self._check_file()
+			self._read_file()					# we reread everything, since we may have been closed
+			self.jpos=0
+			self._replay_journal(jfile)
+			self._write_file()
+			jfile.seek(0)
+			jfile.truncate()					# the journal file is never removed, since other processes may be waiting on its lock
 			file_unlock(jfile)
 			jfile=None
-			os.unlink(self.normpath[:-5]+"_tmp.json")
-
-		self.lasttime=os.stat(self.normpath).st_mtime	# make sure we include our recent change, if made
-		self.busy=False
+			self.jpos=0
+			self.lasttime=os.stat(self.normpath).st_mtime
+		finally:
+			self.compacting=False
+			self.busy=False
 
 	def __len__(self):
 		"""Ignores any pending updates for speed"""
@@ -887,6 +1064,7 @@ performance than many individual changes."""
 		if not deferupdate : self.sync()
 
 	def delete(self,key,deferupdate=False):
+		key=str(key)
 		self.delkeys.add(key)
 		if key in self.changes : del self.changes[key]
 		if not deferupdate : self.sync()
@@ -925,6 +1103,67 @@ def json_to_obj(jsdata):
 	elif "__class__" in jsdata : return jsonclasses[jsdata["__class__"]](jsdata)
 	else: return jsdata
 
+def json_decode_tree(jsdata):
+	"""Converts a JSON value parsed without an object_hook into python objects, exactly as json_to_obj would have during parsing.
+	This permits parsing a whole file cheaply, then converting only the values which are actually needed."""
+
+	if isinstance(jsdata,dict) : return json_to_obj({k:json_decode_tree(v) for k,v in list(jsdata.items())})
+	if isinstance(jsdata,list) : return [json_decode_tree(v) for v in jsdata]
+	return jsdata
+
+def js_crc(jss):
+	"""CRC32 of a JSON string, as stored in the sidecar index"""
+	if not isinstance(jss,bytes) : jss=jss.encode("ascii")
+	return crc32(jss)&0xffffffff
+
+def js_index_write(normpath,index,size):
+	"""Writes the sidecar index for a JSON file. index is a dict of key:(offset,length,crc) for each top-level value in the
+	file. The size and modification time of the JSON file are recorded so stale indices can usually be rejected without
+	reading anything else. Failure to write the index is not an error, the index is purely an optimization."""
+
+	try:
+		jss=json.dumps({"size":size,"mtime":os.stat(normpath).st_mtime,"keys":index},separators=(",",":"))
+		ifile=open(normpath+".idx","w")
+		ifile.write(jss)
+		ifile=None
+	except:
+		try: os.unlink(normpath+".idx")
+		except: pass
+
+def js_index_value(jfile,key,entry):
+	"""Returns the JSON text of key from an open JSON file given its (offset,length,crc) index entry, or None if the file
+	doesn't have the key at that offset with that content"""
+
+	off,ln,crc=entry
+	ks=json.dumps(key)+": "
+	if off<len(ks) : return None
+	jfile.seek(off-len(ks))
+	jss=jfile.read(len(ks)+ln)
+	if jss[:len(ks)]!=ks or js_crc(jss[len(ks):])!=crc : return None
+	return jss[len(ks):]
+
+def js_index_read(jfile,normpath,key):
+	"""Returns the JSON text of a single top-level key using the sidecar index of an open JSON file. Returns None if there is
+	no valid index for the file in its current state, and raises KeyError if the index is valid but the key isn't present.
+	Size and mtime alone can't detect a rewrite of the same size within the mtime resolution, so the key name and the CRC
+	of the value are checked at the recorded offset as well. For a missing key, the first and last keys are checked."""
+
+	try:
+		idx=json.load(open(normpath+".idx","r"))
+		st=os.fstat(jfile.fileno())
+		if idx["size"]!=st.st_size or idx["mtime"]!=st.st_mtime : return None
+
+		keys=idx["keys"]
+		if key in keys : return js_index_value(jfile,key,keys[key])
+
+		if len(keys)>0 :
+			for k in (min(keys),max(keys)):
+				if js_index_value(jfile,k,keys[k])==None : return None
+	except:
+		return None
+
+	raise KeyError(key)
+
 def obj_to_json(obj):
 	"""converts a python object to a supportable json type"""
 	if isinstance(obj,tmpimg) :
@@ -0,0 +1,74 @@
+/*
+ * Copyright (c) 2000-2006 Baylor College of Medicine
+ *
+ * This software is issued under a joint BSD/GNU license. You may use the
+ * source code in this file under either license. However, note that the
+ * complete EMAN2 and SPARX software packages have some GPL dependencies,
+ * so you are responsible for compliance with the licenses of these packages
+ * if you opt to use BSD licensing. The warranty disclaimer below holds
+ * in either instance.
+ *
+ * This complete copyright notice must be included in any revised version of the
+ * source code. Additional authorship citations may be added, but existing
+ * author citations must be preserved.
+ *
+ * This program is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; either version 2 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program; if not, write to the Free Software
+ * Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+ *
+ * */
+#ifndef GILRELEASE_H_
+#define GILRELEASE_H_
+
+#include <boost/python.hpp>
+
+// drawn from https://wiki.python.org/moin/boost.python/HowTo#Multithreading_Support_for_my_function
+// Instantiating GILRelease in a binding function releases the GIL for the rest of the scope, so
+// other Python threads keep running while the C++ code does the real work. It is restored by the
+// destructor, so it is also restored properly when the C++ code throws.
+//
+// Rules for use:
+//  - all Python objects must already have been converted to C++ arguments before the release
+//  - nothing inside the scope may touch Python, unless it first takes the GIL back with GILAcquire
+class GILRelease
+{
+public:
+    inline GILRelease() { m_thread_state = PyEval_SaveThread(); }
+    inline ~GILRelease() { PyEval_RestoreThread(m_thread_state); m_thread_state = NULL; }
+private:
+    GILRelease(const GILRelease &);
+    PyThreadState * m_thread_state;
+};
+
+// The reverse of GILRelease. Used in the wrapper classes of objects which may be subclassed in
+// Python, since their virtual methods may be called from C++ code running inside a GILRelease.
+// Safe to use whether or not the current thread already holds the GIL.
+class GILAcquire
+{
+public:
+    inline GILAcquire() { m_state = PyGILState_Ensure(); }
+    inline ~GILAcquire() { PyGILState_Release(m_state); }
+private:
+    GILAcquire(const GILAcquire &);
+    PyGILState_STATE m_state;
+};
+
+// Bindings which replace pure_virtual() with a GIL releasing wrapper call this when they are reached
+// by a Python subclass which doesn't override the method, raising the same error pure_virtual() would.
+inline void pure_virtual_called()
+{
+    PyErr_SetString(PyExc_RuntimeError, "Pure virtual function called");
+    boost::python::throw_error_already_set();
+}
+
+#endif	//GILRELEASE_H_
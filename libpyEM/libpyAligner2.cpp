@@ -40,6 +40,7 @@
 #include <ctf.h>
 #include <emdata.h>
 #include <emobject.h>
+#include <gilrelease.h>
 #include <xydata.h>
 
 #include "emdata_pickle.h"
@@ -59,22 +60,27 @@ struct EMAN_Aligner_Wrapper: EMAN::Aligner
         EMAN::Aligner(), py_self(py_self_) {}
 
     EMAN::EMData* align(EMAN::EMData* p0, EMAN::EMData* p1) const {
+        GILAcquire gil;
         return call_method< EMAN::EMData* >(py_self, "align", p0, p1);
     }
 
     EMAN::EMData* align(EMAN::EMData* p0, EMAN::EMData* p1, const std::string& p2, const EMAN::Dict& p3) const {
+        GILAcquire gil;
         return call_method< EMAN::EMData* >(py_self, "align", p0, p1, p2, p3);
     }
 
     std::string get_name() const {
+        GILAcquire gil;
         return call_method< std::string >(py_self, "get_name");
     }
 
     std::string get_desc() const {
+        GILAcquire gil;
         return call_method< std::string >(py_self, "get_desc");
     }
 
     EMAN::Dict get_params() const {
+        GILAcquire gil;
         return call_method< EMAN::Dict >(py_self, "get_params");
     }
 
@@ -83,6 +89,7 @@ struct EMAN_Aligner_Wrapper: EMAN::Aligner
     }
 
     void set_params(const EMAN::Dict& p0) {
+        GILAcquire gil;
         call_method< void >(py_self, "set_params", p0);
     }
 
@@ -91,12 +98,27 @@ struct EMAN_Aligner_Wrapper: EMAN::Aligner
     }
 
     EMAN::TypeDict get_param_types() const {
+        GILAcquire gil;
         return call_method< EMAN::TypeDict >(py_self, "get_param_types");
     }
 
     PyObject* py_self;
 };
 
+// The aligners do their work with the GIL released. A Python subclass's own align() is reached through
+// the wrapper above, which takes the GIL back.
+EMAN::EMData* aligner_align2(EMAN::Aligner &self, EMAN::EMData* this_img, EMAN::EMData* to_img) {
+	if (dynamic_cast<EMAN_Aligner_Wrapper*>(&self)) pure_virtual_called();
+	GILRelease rel;
+	return self.align(this_img,to_img);
+}
+
+EMAN::EMData* aligner_align4(EMAN::Aligner &self, EMAN::EMData* this_img, EMAN::EMData* to_img, const std::string& cmp_name, const EMAN::Dict& cmp_params) {
+	if (dynamic_cast<EMAN_Aligner_Wrapper*>(&self)) pure_virtual_called();
+	GILRelease rel;
+	return self.align(this_img,to_img,cmp_name,cmp_params);
+}
+
 
 struct EMAN_Ctf_Wrapper: EMAN::Ctf
 {
@@ -107,62 +129,77 @@ struct EMAN_Ctf_Wrapper: EMAN::Ctf
         EMAN::Ctf(), py_self(py_self_) {}
 
 	float get_phase() const {
+        GILAcquire gil;
         return call_method< float >(py_self, "get_phase");
 	}
 
 	void set_phase(float phase) {
+        GILAcquire gil;
         return call_method< void >(py_self, "set_phase", phase);
 	}
 
     int from_string(const std::string& p0) {
+        GILAcquire gil;
         return call_method< int >(py_self, "from_string", p0);
     }
 
     std::string to_string() const {
+        GILAcquire gil;
         return call_method< std::string >(py_self, "to_string");
     }
 
     void from_dict(const EMAN::Dict& p0) {
+        GILAcquire gil;
         call_method< void >(py_self, "from_dict", p0);
     }
 
     EMAN::Dict to_dict() const {
+        GILAcquire gil;
         return call_method< EMAN::Dict >(py_self, "to_dict");
     }
 
     void from_vector(const std::vector<float,std::allocator<float> >& p0) {
+        GILAcquire gil;
         call_method< void >(py_self, "from_vector", p0);
     }
 
     std::vector<float,std::allocator<float> > to_vector() const {
+        GILAcquire gil;
         return call_method< std::vector<float,std::allocator<float> > >(py_self, "to_vector");
     }
 
     std::vector<float,std::allocator<float> > compute_1d(int p0,float p1, EMAN::Ctf::CtfType p2, EMAN::XYData* p3) {
+        GILAcquire gil;
         return call_method< std::vector<float,std::allocator<float> > >(py_self, "compute_1d", p0, p1, p2, p3);
     }
 
     std::vector<float,std::allocator<float> > compute_1d_fromimage(int p0, float p1, EMAN::EMData *p2) {
+        GILAcquire gil;
         return call_method< std::vector<float,std::allocator<float> > >(py_self, "compute_1d_fromimage", p0, p1, p2);
     }
 
     void compute_2d_real(EMAN::EMData* p0, EMAN::Ctf::CtfType p1, EMAN::XYData* p2) {
+        GILAcquire gil;
         call_method< void >(py_self, "compute_2d_real", p0, p1, p2);
     }
 
     void compute_2d_complex(EMAN::EMData* p0, EMAN::Ctf::CtfType p1, EMAN::XYData* p2) {
+        GILAcquire gil;
         call_method< void >(py_self, "compute_2d_complex", p0, p1, p2);
     }
 
     void copy_from(const EMAN::Ctf* p0) {
+        GILAcquire gil;
         call_method< void >(py_self, "copy_from", p0);
     }
 
     bool equal(const EMAN::Ctf* p0) const {
+        GILAcquire gil;
         return call_method< bool >(py_self, "equal", p0);
     }
 
     float zero(int n) const {
+        GILAcquire gil;
         return call_method< float >(py_self, "zero", n);
     }
 
@@ -179,6 +216,7 @@ struct EMAN_EMAN1Ctf_Wrapper: EMAN::EMAN1Ctf
         EMAN::EMAN1Ctf(), py_self(py_self_) {}
 
     std::vector<float,std::allocator<float> > compute_1d(int p0, float p1,EMAN::Ctf::CtfType p2, EMAN::XYData* p3) {
+        GILAcquire gil;
         return call_method< std::vector<float,std::allocator<float> > >(py_self, "compute_1d", p0, p1, p2, p3);
     }
 
@@ -191,6 +229,7 @@ struct EMAN_EMAN1Ctf_Wrapper: EMAN::EMAN1Ctf
     }
 
     std::vector<float,std::allocator<float> > compute_1d_fromimage(int p0, float p1, EMAN::EMData* p2) {
+        GILAcquire gil;
         return call_method< std::vector<float,std::allocator<float> > >(py_self, "compute_1d_fromimage", p0, p1, p2);
     }
 
@@ -199,6 +238,7 @@ struct EMAN_EMAN1Ctf_Wrapper: EMAN::EMAN1Ctf
     }
 
 	float get_phase() const {
+        GILAcquire gil;
         return call_method< float >(py_self, "get_phase");
 	}
 
@@ -207,6 +247,7 @@ struct EMAN_EMAN1Ctf_Wrapper: EMAN::EMAN1Ctf
 	}
 
 	void set_phase(float phase) {
+        GILAcquire gil;
         return call_method< void >(py_self, "set_phase", phase);
 	}
 
@@ -215,6 +256,7 @@ struct EMAN_EMAN1Ctf_Wrapper: EMAN::EMAN1Ctf
 	}
 		
     void compute_2d_real(EMAN::EMData* p0, EMAN::Ctf::CtfType p1, EMAN::XYData* p2) {
+        GILAcquire gil;
         call_method< void >(py_self, "compute_2d_real", p0, p1, p2);
     }
 
@@ -227,6 +269,7 @@ struct EMAN_EMAN1Ctf_Wrapper: EMAN::EMAN1Ctf
     }
 
     void compute_2d_complex(EMAN::EMData* p0, EMAN::Ctf::CtfType p1, EMAN::XYData* p2) {
+        GILAcquire gil;
         call_method< void >(py_self, "compute_2d_complex", p0, p1, p2);
     }
 
@@ -239,6 +282,7 @@ struct EMAN_EMAN1Ctf_Wrapper: EMAN::EMAN1Ctf
     }
 
     int from_string(const std::string& p0) {
+        GILAcquire gil;
         return call_method< int >(py_self, "from_string", p0);
     }
 
@@ -247,6 +291,7 @@ struct EMAN_EMAN1Ctf_Wrapper: EMAN::EMAN1Ctf
     }
 
     std::string to_string() const {
+        GILAcquire gil;
         return call_method< std::string >(py_self, "to_string");
     }
 
@@ -255,6 +300,7 @@ struct EMAN_EMAN1Ctf_Wrapper: EMAN::EMAN1Ctf
     }
 
     void from_dict(const EMAN::Dict& p0) {
+        GILAcquire gil;
         call_method< void >(py_self, "from_dict", p0);
     }
 
@@ -263,6 +309,7 @@ struct EMAN_EMAN1Ctf_Wrapper: EMAN::EMAN1Ctf
     }
 
     EMAN::Dict to_dict() const {
+        GILAcquire gil;
         return call_method< EMAN::Dict >(py_self, "to_dict");
     }
 
@@ -271,6 +318,7 @@ struct EMAN_EMAN1Ctf_Wrapper: EMAN::EMAN1Ctf
     }
 
     void from_vector(const std::vector<float,std::allocator<float> >& p0) {
+        GILAcquire gil;
         call_method< void >(py_self, "from_vector", p0);
     }
 
@@ -279,6 +327,7 @@ struct EMAN_EMAN1Ctf_Wrapper: EMAN::EMAN1Ctf
     }
 
     std::vector<float,std::allocator<float> > to_vector() const {
+        GILAcquire gil;
         return call_method< std::vector<float,std::allocator<float> > >(py_self, "to_vector");
     }
 
@@ -287,6 +336,7 @@ struct EMAN_EMAN1Ctf_Wrapper: EMAN::EMAN1Ctf
     }
 
     void copy_from(const EMAN::Ctf* p0) {
+        GILAcquire gil;
         call_method< void >(py_self, "copy_from", p0);
     }
 
@@ -295,6 +345,7 @@ struct EMAN_EMAN1Ctf_Wrapper: EMAN::EMAN1Ctf
     }
 
     bool equal(const EMAN::Ctf* p0) const {
+        GILAcquire gil;
         return call_method< bool >(py_self, "equal", p0);
     }
     
@@ -303,6 +354,7 @@ struct EMAN_EMAN1Ctf_Wrapper: EMAN::EMAN1Ctf
     }
     
     float zero(int p0) const {
+        GILAcquire gil;
         return call_method< float >(py_self, "zero", p0);
     }
 
@@ -322,6 +374,7 @@ struct EMAN_EMAN2Ctf_Wrapper: EMAN::EMAN2Ctf
         EMAN::EMAN2Ctf(), py_self(py_self_) {}
 
     std::vector<float,std::allocator<float> > compute_1d(int p0, float p1, EMAN::Ctf::CtfType p2, EMAN::XYData* p3) {
+        GILAcquire gil;
         return call_method< std::vector<float,std::allocator<float> > >(py_self, "compute_1d", p0, p1, p2, p3);
     }
 
@@ -334,6 +387,7 @@ struct EMAN_EMAN2Ctf_Wrapper: EMAN::EMAN2Ctf
     }
     
     float get_phase() const {
+        GILAcquire gil;
         return call_method< float >(py_self, "get_phase");
 	}
 
@@ -342,6 +396,7 @@ struct EMAN_EMAN2Ctf_Wrapper: EMAN::EMAN2Ctf
 	}
 
 	void set_phase(float phase) {
+        GILAcquire gil;
         return call_method< void >(py_self, "set_phase", phase);
 	}
 
@@ -351,6 +406,7 @@ struct EMAN_EMAN2Ctf_Wrapper: EMAN::EMAN2Ctf
 
 	
     std::vector<float,std::allocator<float> > compute_1d_fromimage(int p0, float p1, EMAN::Ctf::CtfType p2, EMAN::XYData* p3) {
+        GILAcquire gil;
         return call_method< std::vector<float,std::allocator<float> > >(py_self, "compute_1d_fromimage", p0, p1, p2, p3);
     }
 
@@ -359,6 +415,7 @@ struct EMAN_EMAN2Ctf_Wrapper: EMAN::EMAN2Ctf
     }
 
     void compute_2d_real(EMAN::EMData* p0, EMAN::Ctf::CtfType p1, EMAN::XYData* p2) {
+        GILAcquire gil;
         call_method< void >(py_self, "compute_2d_real", p0, p1, p2);
     }
 
@@ -371,6 +428,7 @@ struct EMAN_EMAN2Ctf_Wrapper: EMAN::EMAN2Ctf
     }
 
     void compute_2d_complex(EMAN::EMData* p0, EMAN::Ctf::CtfType p1, EMAN::XYData* p2) {
+        GILAcquire gil;
         call_method< void >(py_self, "compute_2d_complex", p0, p1, p2);
     }
 
@@ -383,6 +441,7 @@ struct EMAN_EMAN2Ctf_Wrapper: EMAN::EMAN2Ctf
     }
 
     int from_string(const std::string& p0) {
+        GILAcquire gil;
         return call_method< int >(py_self, "from_string", p0);
     }
 
@@ -391,6 +450,7 @@ struct EMAN_EMAN2Ctf_Wrapper: EMAN::EMAN2Ctf
     }
 
     std::string to_string() const {
+        GILAcquire gil;
         return call_method< std::string >(py_self, "to_string");
     }
 
@@ -399,6 +459,7 @@ struct EMAN_EMAN2Ctf_Wrapper: EMAN::EMAN2Ctf
     }
 
     void from_dict(const EMAN::Dict& p0) {
+        GILAcquire gil;
         call_method< void >(py_self, "from_dict", p0);
     }
 
@@ -407,6 +468,7 @@ struct EMAN_EMAN2Ctf_Wrapper: EMAN::EMAN2Ctf
     }
 
     EMAN::Dict to_dict() const {
+        GILAcquire gil;
         return call_method< EMAN::Dict >(py_self, "to_dict");
     }
 
@@ -415,6 +477,7 @@ struct EMAN_EMAN2Ctf_Wrapper: EMAN::EMAN2Ctf
     }
 
     void from_vector(const std::vector<float,std::allocator<float> >& p0) {
+        GILAcquire gil;
         call_method< void >(py_self, "from_vector", p0);
     }
 
@@ -423,6 +486,7 @@ struct EMAN_EMAN2Ctf_Wrapper: EMAN::EMAN2Ctf
     }
 
     std::vector<float,std::allocator<float> > to_vector() const {
+        GILAcquire gil;
         return call_method< std::vector<float,std::allocator<float> > >(py_self, "to_vector");
     }
 
@@ -431,6 +495,7 @@ struct EMAN_EMAN2Ctf_Wrapper: EMAN::EMAN2Ctf
     }
 
     void copy_from(const EMAN::Ctf* p0) {
+        GILAcquire gil;
         call_method< void >(py_self, "copy_from", p0);
     }
 
@@ -439,6 +504,7 @@ struct EMAN_EMAN2Ctf_Wrapper: EMAN::EMAN2Ctf
     }
 
     bool equal(const EMAN::Ctf* p0) const {
+        GILAcquire gil;
         return call_method< bool >(py_self, "equal", p0);
     }
 
@@ -447,6 +513,7 @@ struct EMAN_EMAN2Ctf_Wrapper: EMAN::EMAN2Ctf
     }
 
     float zero(int p0) const {
+        GILAcquire gil;
         return call_method< float >(py_self, "zero", p0);
     }
     
@@ -467,8 +534,8 @@ BOOST_PYTHON_MODULE(libpyAligner2)
     def("dump_aligners", &EMAN::dump_aligners);
     def("dump_aligners_list", &EMAN::dump_aligners_list);
     class_< EMAN::Aligner, boost::noncopyable, EMAN_Aligner_Wrapper >("__Aligner", init<  >())
-        .def("align", pure_virtual((EMAN::EMData* (EMAN::Aligner::*)(EMAN::EMData*, EMAN::EMData*) const)&EMAN::Aligner::align), return_value_policy< manage_new_object >())
-        .def("align", pure_virtual((EMAN::EMData* (EMAN::Aligner::*)(EMAN::EMData*, EMAN::EMData*, const std::string&, const EMAN::Dict&) const)&EMAN::Aligner::align), return_value_policy< manage_new_object >())
+        .def("align", &aligner_align2, return_value_policy< manage_new_object >())
+        .def("align", &aligner_align4, return_value_policy< manage_new_object >())
 		.def("xform_align_nbest", &EMAN::Aligner::xform_align_nbest)
         .def("get_name", pure_virtual(&EMAN::Aligner::get_name))
         .def("get_desc", pure_virtual(&EMAN::Aligner::get_desc))
@@ -39,6 +39,7 @@
 #include <averager.h>
 #include <emdata.h>
 #include <emobject.h>
+#include <gilrelease.h>
 
 // Using =======================================================================
 using namespace boost::python;
@@ -46,15 +47,6 @@ using namespace boost::python;
 // Declarations ================================================================
 namespace  {
 
-class GILRelease
-{
-public:
-    inline GILRelease() { m_thread_state = PyEval_SaveThread(); }
-    inline ~GILRelease() { PyEval_RestoreThread(m_thread_state); m_thread_state = NULL; }
-private:
-    PyThreadState * m_thread_state;
-};
-
 // This is a really wierd construct. I think someone probably didn't know what they were doing with
 // Boost when writing it, but since it works, I'm leaving it alone
 struct EMAN_Averager_Wrapper: EMAN::Averager
@@ -66,6 +58,7 @@ struct EMAN_Averager_Wrapper: EMAN::Averager
         EMAN::Averager(), py_self(py_self_) {}
 
     void add_image(EMAN::EMData* p0) {
+      GILAcquire gil;
       call_method< void >(py_self, "add_image", p0);
     }
     
@@ -74,6 +67,7 @@ struct EMAN_Averager_Wrapper: EMAN::Averager
     }
 
     void add_image_list(const std::vector<EMAN::EMData*,std::allocator<EMAN::EMData*> >& p0) {
+        GILAcquire gil;
         call_method< void >(py_self, "add_image_list", p0);
     }
 
@@ -82,18 +76,22 @@ struct EMAN_Averager_Wrapper: EMAN::Averager
     }
 
     EMAN::EMData* finish() {
+        GILAcquire gil;
         return call_method< EMAN::EMData* >(py_self, "finish");
     }
 
     std::string get_name() const {
+        GILAcquire gil;
         return call_method< std::string >(py_self, "get_name");
     }
 
     std::string get_desc() const {
+        GILAcquire gil;
         return call_method< std::string >(py_self, "get_desc");
     }
 
     void set_params(const EMAN::Dict& p0) {
+        GILAcquire gil;
         call_method< void >(py_self, "set_params", p0);
     }
 
@@ -102,6 +100,7 @@ struct EMAN_Averager_Wrapper: EMAN::Averager
     }
 
     EMAN::TypeDict get_param_types() const {
+        GILAcquire gil;
         return call_method< EMAN::TypeDict >(py_self, "get_param_types");
     }
 
@@ -39,6 +39,7 @@
 #include <cmp.h>
 #include <emdata.h>
 #include <emobject.h>
+#include <gilrelease.h>
 #include <log.h>
 #include <transform.h>
 #include <xydata.h>
@@ -58,18 +59,22 @@ struct EMAN_Cmp_Wrapper: EMAN::Cmp
         EMAN::Cmp(), py_self(py_self_) {}
 
     float cmp(EMAN::EMData* p0, EMAN::EMData* p1) const {
+        GILAcquire gil;
         return call_method< float >(py_self, "cmp", p0, p1);
     }
 
     std::string get_name() const {
+        GILAcquire gil;
         return call_method< std::string >(py_self, "get_name");
     }
 
     std::string get_desc() const {
+        GILAcquire gil;
         return call_method< std::string >(py_self, "get_desc");
     }
 
     EMAN::Dict get_params() const {
+        GILAcquire gil;
         return call_method< EMAN::Dict >(py_self, "get_params");
     }
 
@@ -78,6 +83,7 @@ struct EMAN_Cmp_Wrapper: EMAN::Cmp
     }
 
     void set_params(const EMAN::Dict& p0) {
+        GILAcquire gil;
         call_method< void >(py_self, "set_params", p0);
     }
 
@@ -86,12 +92,21 @@ struct EMAN_Cmp_Wrapper: EMAN::Cmp
     }
 
     EMAN::TypeDict get_param_types() const {
+        GILAcquire gil;
         return call_method< EMAN::TypeDict >(py_self, "get_param_types");
     }
 
     PyObject* py_self;
 };
 
+// The comparators do their work with the GIL released. A Python subclass's own cmp() is reached through
+// the wrapper above, which takes the GIL back.
+float cmp_cmp(EMAN::Cmp &self, EMAN::EMData* image, EMAN::EMData* with) {
+	if (dynamic_cast<EMAN_Cmp_Wrapper*>(&self)) pure_virtual_called();
+	GILRelease rel;
+	return self.cmp(image,with);
+}
+
 BOOST_PYTHON_MEMBER_FUNCTION_OVERLOADS(EMAN_Log_end_overloads_1_3, end, 1, 3)
 BOOST_PYTHON_MEMBER_FUNCTION_OVERLOADS(EMAN_XYData_get_yatx_overloads_1_2, get_yatx, 1, 2)
 
@@ -112,7 +127,7 @@ BOOST_PYTHON_MODULE(libpyCmp2)
     ;
 
     class_< EMAN::Cmp, boost::noncopyable, EMAN_Cmp_Wrapper >("__Cmp", init<  >())
-        .def("cmp", pure_virtual(&EMAN::Cmp::cmp))
+        .def("cmp", &cmp_cmp)
         .def("get_name", pure_virtual(&EMAN::Cmp::get_name))
         .def("get_desc", pure_virtual(&EMAN::Cmp::get_desc))
         .def("get_params", &EMAN::Cmp::get_params, &EMAN_Cmp_Wrapper::default_get_params)
@@ -43,6 +43,7 @@
 #include <emdata_pickle.h>
 #include <emdata_wrapitems.h>
 #include <emfft.h>
+#include <gilrelease.h>
 #include <processor.h>
 #include <transform.h>
 #include <xydata.h>/** return the FFT amplitude which is greater than thres %
@@ -57,21 +58,15 @@ using namespace boost::python;
 
 // Declarations ================================================================
 namespace  {
-BOOST_PYTHON_MEMBER_FUNCTION_OVERLOADS(EMAN_EMData_read_image_overloads_1_5, read_image, 1, 5)
 
-BOOST_PYTHON_MEMBER_FUNCTION_OVERLOADS(EMAN_EMData_read_binedimage_overloads_1_5, read_binedimage, 1, 5)
 
-BOOST_PYTHON_MEMBER_FUNCTION_OVERLOADS(EMAN_EMData_write_image_overloads_1_7, write_image, 1, 7)
 
-BOOST_PYTHON_MEMBER_FUNCTION_OVERLOADS(EMAN_EMData_append_image_overloads_1_3, append_image, 1, 3)
 
-BOOST_PYTHON_MEMBER_FUNCTION_OVERLOADS(EMAN_EMData_write_lst_overloads_1_4, write_lst, 1, 4)
 
 //BOOST_PYTHON_MEMBER_FUNCTION_OVERLOADS(EMAN_EMData_print_image_overloads_0_2, EMAN::EMData::print_image, 0, 2)
 
-BOOST_PYTHON_FUNCTION_OVERLOADS(EMAN_EMData_read_images_overloads_1_3, EMAN::EMData::read_images, 1, 3)
 
-BOOST_PYTHON_FUNCTION_OVERLOADS(EMAN_EMData_read_images_ext_overloads_3_5, EMAN::EMData::read_images_ext, 3, 5)
+
 
 BOOST_PYTHON_MEMBER_FUNCTION_OVERLOADS(EMAN_EMData_set_size_overloads_1_4, EMAN::EMData::set_size, 1, 4)
 
@@ -93,7 +88,6 @@ BOOST_PYTHON_MEMBER_FUNCTION_OVERLOADS(EMAN_EMData_clip_inplace_overloads_1_2, E
 
 //BOOST_PYTHON_MEMBER_FUNCTION_OVERLOADS(EMAN_EMData_project_overloads_1_2, EMAN::EMData::project, 1, 2)
 
-BOOST_PYTHON_MEMBER_FUNCTION_OVERLOADS(EMAN_EMData_backproject_overloads_1_2, EMAN::EMData::backproject, 1, 2)
 
 BOOST_PYTHON_MEMBER_FUNCTION_OVERLOADS(EMAN_EMData_insert_scaled_sum_overloads_2_4, EMAN::EMData::insert_scaled_sum, 2, 4)
 
@@ -147,9 +141,7 @@ BOOST_PYTHON_MEMBER_FUNCTION_OVERLOADS(EMAN_EMData_little_big_dot_overloads_1_2,
 
 BOOST_PYTHON_MEMBER_FUNCTION_OVERLOADS(EMAN_EMData_calc_ccf_overloads_0_3, EMAN::EMData::calc_ccf, 0, 3)
 
-BOOST_PYTHON_MEMBER_FUNCTION_OVERLOADS(EMAN_EMData_calc_ccfx_overloads_1_6, EMAN::EMData::calc_ccfx, 1, 6)
 
-BOOST_PYTHON_MEMBER_FUNCTION_OVERLOADS(EMAN_EMData_make_rotational_footprint_overloads_0_1, EMAN::EMData::make_rotational_footprint, 0, 1)
 
 BOOST_PYTHON_MEMBER_FUNCTION_OVERLOADS(EMAN_EMData_make_rotational_footprint_e1_overloads_0_1, EMAN::EMData::make_rotational_footprint_e1, 0, 1)
 
@@ -217,17 +209,126 @@ BOOST_PYTHON_MEMBER_FUNCTION_OVERLOADS(EMAN_EMData_compute_missingwedge_overload
 using namespace EMAN;
 //// These give us threadsafety. Couldn't find a more elegant way to do it with overloading :^/
 
-// drawn from https://wiki.python.org/moin/boost.python/HowTo#Multithreading_Support_for_my_function
-// Instantiating this class in the function gives us GIL release
-class GILRelease
+// GILRelease is in gilrelease.h. Every binding below which does substantial work in C++ releases the GIL.
+
+// None of the ImageIO classes (HDF5 in particular) are safe to use from several threads at once, so
+// file access is serialized by this lock. It is always taken after the GIL is released and freed before
+// the GIL is restored, so a thread waiting for it never blocks other Python threads.
+// Only the EMData file I/O bindings below take it. Files read or written inside libEM (processors such as
+// mask.fromfile, aligners or reconstructors given a filename, ...) are not covered, so a job which uses those
+// must not run in a thread while other threads do image I/O on the same kind of file.
+#ifdef _WIN32
+static MUTEX imageio_mutex=CreateMutex(0, FALSE, 0);
+#else
+static pthread_mutex_t imageio_mutex=PTHREAD_MUTEX_INITIALIZER;
+#endif
+
+class ImageIOLock
 {
 public:
-    inline GILRelease() { m_thread_state = PyEval_SaveThread(); }
-    inline ~GILRelease() { PyEval_RestoreThread(m_thread_state); m_thread_state = NULL; }
-private:
-    PyThreadState * m_thread_state;
+    inline ImageIOLock() { Util::MUTEX_LOCK(&imageio_mutex); }
+    inline ~ImageIOLock() { Util::MUTEX_UNLOCK(&imageio_mutex); }
 };
 
+void EMData_read_image_wrapper(EMData &ths, const string & filename, int img_index=0, bool header_only=false, const Region * region=0, bool is_3d=false) {
+	GILRelease rel;
+	ImageIOLock lock;
+	
+	ths.read_image(filename,img_index,header_only,region,is_3d);
+}
+
+void EMData_read_binedimage_wrapper(EMData &ths, const string & filename, int img_index=0, int binfactor=0, bool fast=false, bool is_3d=false) {
+	GILRelease rel;
+	ImageIOLock lock;
+	
+	ths.read_binedimage(filename,img_index,binfactor,fast,is_3d);
+}
+
+void EMData_write_image_wrapper(EMData &ths, const string & filename, int img_index=0, EMUtil::ImageType imgtype=EMUtil::IMAGE_UNKNOWN, bool header_only=false, const Region * region=0, EMUtil::EMDataType filestoragetype=EMUtil::EM_FLOAT, bool use_host_endian=true) {
+	GILRelease rel;
+	ImageIOLock lock;
+	
+	ths.write_image(filename,img_index,imgtype,header_only,region,filestoragetype,use_host_endian);
+}
+
+void EMData_append_image_wrapper(EMData &ths, const string & filename, EMUtil::ImageType imgtype=EMUtil::IMAGE_UNKNOWN, bool header_only=false) {
+	GILRelease rel;
+	ImageIOLock lock;
+	
+	ths.append_image(filename,imgtype,header_only);
+}
+
+void EMData_write_lst_wrapper(EMData &ths, const string & filename, const string & reffile="", int refn=-1, const string & comment="") {
+	GILRelease rel;
+	ImageIOLock lock;
+	
+	ths.write_lst(filename,reffile,refn,comment);
+}
+
+vector < boost::shared_ptr<EMData> > EMData_read_images_wrapper(const string & filename, vector < int >img_indices=vector < int >(), bool header_only=false) {
+	GILRelease rel;
+	ImageIOLock lock;
+	
+	return EMData::read_images(filename,img_indices,header_only);
+}
+
+vector < boost::shared_ptr<EMData> > EMData_read_images_ext_wrapper(const string & filename, int img_index_start, int img_index_end, bool header_only=false, const string & ext="") {
+	GILRelease rel;
+	ImageIOLock lock;
+	
+	return EMData::read_images_ext(filename,img_index_start,img_index_end,header_only,ext);
+}
+
+int EMData_write_images_wrapper(const string & filename, vector < EMData * >imgs, EMUtil::ImageType imgtype=EMUtil::IMAGE_UNKNOWN, bool header_only=false, EMUtil::EMDataType filestoragetype=EMUtil::EM_FLOAT, bool use_host_endian=true) {
+	GILRelease rel;
+	ImageIOLock lock;
+	
+	return EMData::write_images(filename,imgs,imgtype,header_only,filestoragetype,use_host_endian);
+}
+
+BOOST_PYTHON_FUNCTION_OVERLOADS(EMData_read_image_wrapper_overloads_2_6, EMData_read_image_wrapper, 2, 6)
+BOOST_PYTHON_FUNCTION_OVERLOADS(EMData_read_binedimage_wrapper_overloads_2_6, EMData_read_binedimage_wrapper, 2, 6)
+BOOST_PYTHON_FUNCTION_OVERLOADS(EMData_write_image_wrapper_overloads_2_8, EMData_write_image_wrapper, 2, 8)
+BOOST_PYTHON_FUNCTION_OVERLOADS(EMData_append_image_wrapper_overloads_2_4, EMData_append_image_wrapper, 2, 4)
+BOOST_PYTHON_FUNCTION_OVERLOADS(EMData_write_lst_wrapper_overloads_2_5, EMData_write_lst_wrapper, 2, 5)
+BOOST_PYTHON_FUNCTION_OVERLOADS(EMData_read_images_wrapper_overloads_1_3, EMData_read_images_wrapper, 1, 3)
+BOOST_PYTHON_FUNCTION_OVERLOADS(EMData_read_images_ext_wrapper_overloads_3_5, EMData_read_images_ext_wrapper, 3, 5)
+BOOST_PYTHON_FUNCTION_OVERLOADS(EMData_write_images_wrapper_overloads_2_6, EMData_write_images_wrapper, 2, 6)
+
+EMData *EMData_do_ift_wrapper(EMData &ths) {
+	GILRelease rel;
+	
+	return ths.do_ift();
+}
+
+void EMData_transform_wrapper(EMData &ths, const Transform & t) {
+	GILRelease rel;
+	
+	ths.transform(t);
+}
+
+EMData *EMData_calc_ccfx_wrapper(EMData &ths, EMData * const with, int y0=0, int y1=-1, bool nosum=false, bool flip=false, bool usez=false) {
+	GILRelease rel;
+	
+	return ths.calc_ccfx(with,y0,y1,nosum,flip,usez);
+}
+
+EMData *EMData_make_rotational_footprint_wrapper(EMData &ths, bool unwrap=true) {
+	GILRelease rel;
+	
+	return ths.make_rotational_footprint(unwrap);
+}
+
+EMData *EMData_backproject_wrapper(EMData &ths, const string & projector_name, const Dict & params=Dict()) {
+	GILRelease rel;
+	
+	return ths.backproject(projector_name,params);
+}
+
+BOOST_PYTHON_FUNCTION_OVERLOADS(EMData_calc_ccfx_wrapper_overloads_2_7, EMData_calc_ccfx_wrapper, 2, 7)
+BOOST_PYTHON_FUNCTION_OVERLOADS(EMData_make_rotational_footprint_wrapper_overloads_1_2, EMData_make_rotational_footprint_wrapper, 1, 2)
+BOOST_PYTHON_FUNCTION_OVERLOADS(EMData_backproject_wrapper_overloads_2_3, EMData_backproject_wrapper, 2, 3)
+
 EMData *EMData_get_clip_1(EMData &ths, Region rgn) {
 	GILRelease rel;
 	
@@ -290,236 +391,88 @@ vector<float> EMData_calc_fourier_shell_correlation_wrapper2(EMData &ths, EMData
 
 
 vector<Dict> EMData_align_nbest_wrapper6(EMData &ths, const string & aligner_name, EMData * to_img, const Dict & params, int nsoln, const string & cmp_name, const Dict& cmp_params) {
-	vector<Dict> ret;
-	PyThreadState *_save = PyEval_SaveThread();
-
-	try {
-		ret = ths.xform_align_nbest(aligner_name,to_img,params,nsoln,cmp_name,cmp_params);
-	}
-	catch (std::exception &e) {
-		PyEval_RestoreThread(_save);
-		cerr << e.what() << endl;
-		throw e;
-	}
-	PyEval_RestoreThread(_save);
-	return ret;
+	GILRelease rel;
+	
+	return ths.xform_align_nbest(aligner_name,to_img,params,nsoln,cmp_name,cmp_params);
 }
 
 vector<Dict> EMData_align_nbest_wrapper5(EMData &ths, const string & aligner_name, EMData * to_img, const Dict & params, int nsoln, const string & cmp_name) {
-	vector<Dict> ret;
-	PyThreadState *_save = PyEval_SaveThread();
-
-	try {
-		ret = ths.xform_align_nbest(aligner_name,to_img,params,nsoln,cmp_name);
-	}
-	catch (std::exception &e) {
-		PyEval_RestoreThread(_save);
-		cerr << e.what() << endl;
-		throw e;
-	}
-	PyEval_RestoreThread(_save);
-	return ret;
+	GILRelease rel;
+	
+	return ths.xform_align_nbest(aligner_name,to_img,params,nsoln,cmp_name);
 }
 
 vector<Dict> EMData_align_nbest_wrapper4(EMData &ths, const string & aligner_name, EMData * to_img, const Dict & params, int nsoln) {
-	vector<Dict> ret;
-	PyThreadState *_save = PyEval_SaveThread();
-
-	try {
-		ret = ths.xform_align_nbest(aligner_name,to_img,params,nsoln);
-	}
-	catch (std::exception &e) {
-		PyEval_RestoreThread(_save);
-		cerr << e.what() << endl;
-		throw e;
-	}
-	PyEval_RestoreThread(_save);
-	return ret;
+	GILRelease rel;
+	
+	return ths.xform_align_nbest(aligner_name,to_img,params,nsoln);
 }
 
 EMData *EMData_align_wrapper2(EMData &ths, const string & aligner_name, EMData * to_img) {
-	EMData *ret;
-	PyThreadState *_save = PyEval_SaveThread();
-
-	try {
-		ret = ths.align(aligner_name,to_img);
-	}
-	catch (std::exception &e) {
-		PyEval_RestoreThread(_save);
-		cerr << e.what() << endl;
-		throw e;
-	}
-	PyEval_RestoreThread(_save);
-	return ret;
+	GILRelease rel;
+	
+	return ths.align(aligner_name,to_img);
 }
 EMData *EMData_align_wrapper3(EMData &ths, const string & aligner_name, EMData * to_img,const Dict & params) {
-	EMData *ret;
-	PyThreadState *_save = PyEval_SaveThread();
-
-	try {
-		ret=ths.align(aligner_name,to_img,params);
-	}
-	catch (std::exception &e) {
-		PyEval_RestoreThread(_save);
-		cerr << e.what() << endl;
-		throw e;
-	}
-	PyEval_RestoreThread(_save);
-	return ret;
+	GILRelease rel;
+	
+	return ths.align(aligner_name,to_img,params);
 }
 EMData *EMData_align_wrapper4(EMData &ths, const string & aligner_name, EMData * to_img,const Dict & params, const string & cmp_name) {
-	EMData *ret;
-	PyThreadState *_save = PyEval_SaveThread();
-
-	try {
-		ret=ths.align(aligner_name,to_img,params,cmp_name);
-	}
-	catch (std::exception &e) {
-		PyEval_RestoreThread(_save);
-		cerr << e.what() << endl;
-		throw e;
-	}
-	PyEval_RestoreThread(_save);
-	return ret;
+	GILRelease rel;
+	
+	return ths.align(aligner_name,to_img,params,cmp_name);
 }
 EMData *EMData_align_wrapper5(EMData &ths, const string & aligner_name, EMData * to_img,const Dict & params, const string & cmp_name, const Dict& cmp_params) {
-	EMData *ret;
-	PyThreadState *_save = PyEval_SaveThread();
-
-	try {
-		ret=ths.align(aligner_name,to_img,params,cmp_name,cmp_params);
-	}
-	catch (std::exception &e) {
-		PyEval_RestoreThread(_save);
-		cerr << e.what() << endl;
-		throw e;
-	}
-	PyEval_RestoreThread(_save);
-	return ret;
+	GILRelease rel;
+	
+	return ths.align(aligner_name,to_img,params,cmp_name,cmp_params);
 }
 
 EMData *EMData_project_wrapperD(EMData &ths,const std::string& name, const Dict & params) {
-	PyThreadState *_save = PyEval_SaveThread();
-	EMData *ret;
-
-	try {
-		ret=ths.project(name,params);
-	}
-	catch (std::exception &e) {
-		PyEval_RestoreThread(_save);
-		cerr << e.what() << endl;
-		throw e;
-	}
-	PyEval_RestoreThread(_save);
+	GILRelease rel;
 	
-	return ret;
+	return ths.project(name,params);
 }
 
 EMData *EMData_project_wrapper(EMData &ths,const std::string& name, const EMAN::Transform& xf) {
-	PyThreadState *_save = PyEval_SaveThread();
-	EMData *ret;
-
-	try {
-		ret=ths.project(name,xf);
-	}
-	catch (std::exception &e) {
-		PyEval_RestoreThread(_save);
-		cerr << e.what() << endl;
-		throw e;
-	}
-	PyEval_RestoreThread(_save);
+	GILRelease rel;
 	
-	return ret;
+	return ths.project(name,xf);
 }
 
 void EMData_process_inplace_wrapper1(EMData &ths,const string & processorname) {
-	PyThreadState *_save = PyEval_SaveThread();
+	GILRelease rel;
 	
-	try {
-		ths.process_inplace(processorname);
-	}
-	catch (std::exception &e) {
-		PyEval_RestoreThread(_save);
-		cerr << e.what() << endl;
-		throw e;
-	}
-	PyEval_RestoreThread(_save);
+	ths.process_inplace(processorname);
 }
 
 void EMData_process_inplace_wrapper2(EMData &ths,const string & processorname, const Dict & params) {
-	PyThreadState *_save = PyEval_SaveThread();
-
-	try {
-		ths.process_inplace(processorname,params);
-	}
-	catch (std::exception &e) {
-		PyEval_RestoreThread(_save);
-		cerr << e.what() << endl;
-		throw e;
-	}
-	PyEval_RestoreThread(_save);
+	GILRelease rel;
+	
+	ths.process_inplace(processorname,params);
 }
 
 EMData *EMData_process_wrapper1(EMData &ths,const string & processorname) {
-	EMData *ret;
-	PyThreadState *_save = PyEval_SaveThread();
-
-	try {
-		ret=ths.process(processorname);
-	}
-	catch (std::exception &e) {
-		PyEval_RestoreThread(_save);
-		cerr << e.what() << endl;
-		throw e;
-	}
-	PyEval_RestoreThread(_save);
-	return ret;
+	GILRelease rel;
+	
+	return ths.process(processorname);
 }
 EMData *EMData_process_wrapper2(EMData &ths,const string & processorname, const Dict & params) {
-	EMData *ret;
-	PyThreadState *_save = PyEval_SaveThread();
-
-	try {
-		ret=ths.process(processorname,params);
-	}
-	catch (std::exception &e) {
-		PyEval_RestoreThread(_save);
-		cerr << e.what() << endl;
-		throw e;
-	}
-	PyEval_RestoreThread(_save);
-	return ret;
+	GILRelease rel;
+	
+	return ths.process(processorname,params);
 }
 
 float EMData_cmp_wrapper2(EMData &ths,const string & cmpname, EMData * with) {
-	float ret;
-	PyThreadState *_save = PyEval_SaveThread();
-
-	try {
-		ret=ths.cmp(cmpname,with);
-	}
-	catch (std::exception &e) {
-		PyEval_RestoreThread(_save);
-		cerr << e.what() << endl;
-		throw e;
-	}
-	PyEval_RestoreThread(_save);
-	return ret;
+	GILRelease rel;
+	
+	return ths.cmp(cmpname,with);
 }
 float EMData_cmp_wrapper3(EMData &ths,const string & cmpname, EMData * with, const Dict & params) {
-	float ret;
-	PyThreadState *_save = PyEval_SaveThread();
-
-	try {
-		ret=ths.cmp(cmpname,with,params);
-	}
-	catch (std::exception &e) {
-		PyEval_RestoreThread(_save);
-		cerr << e.what() << endl;
-		throw e;
-	}
-	PyEval_RestoreThread(_save);
-	return ret;
+	GILRelease rel;
+	
+	return ths.cmp(cmpname,with,params);
 }
 
 
@@ -538,14 +491,15 @@ BOOST_PYTHON_MODULE(libpyEMData2)
 	.def(init< const std::string&, optional< int > >(args("filename", "image_index"), "Construct from an image file.\n \nfilename - the image file name\nimage_index the image index for stack image file(default = 0)"))
 	.def(init< int, int, optional< int, bool > >(args("nx", "ny", "nz", "is_real"), "makes an image of the specified size, either real or complex.\nFor complex image, the user would specify the real-space dimensions.\n \nnx - size for x dimension\nny - size for y dimension\nnz size for z dimension(default=1)\nis_real - boolean to specify real(true) or complex(false) image(default=True)"))
 	.add_static_property("totalalloc", make_getter(EMAN::EMData::totalalloc), make_setter(EMAN::EMData::totalalloc))
-	.def("read_image", &EMAN::EMData::read_image, EMAN_EMData_read_image_overloads_1_5(args("filename", "img_index", "header_only", "region", "is_3d"), "read an image file and stores its information to this EMData object.\n\nIf a region is given, then only read a\nregion of the image file. The region will be this\nEMData object. The given region must be inside the given\nimage file. Otherwise, an error will be created.\n\nfilename The image file name.\nimg_index The nth image you want to read.\nheader_only To read only the header or both header and data.\nregion To read only a region of the image.\nis_3d  Whether to treat the image as a single 3D or a set of 2Ds. This is a hint for certain image formats which has no difference between 3D image and set of 2Ds.\nexception ImageFormatException\nexception ImageReadException"))
-	.def("read_binedimage", &EMAN::EMData::read_binedimage, EMAN_EMData_read_binedimage_overloads_1_5(args("filename", "img_index", "binfactor", "fast", "is_3d"), "read an image file and stores its information to this EMData object.\nfilename The image file name.\nimg_index The nth image you want to read.\nbinfactor The amount by which to bin by. Must be an integer\nfast bin very binfactor xy slice otherwise meanshrink z slice\nis_3d  Whether to treat the image as a single 3D or a set of 2Ds. This is a hint for certain image formats which has no difference between 3D image and set of 2Ds.\nexception ImageFormatException\nexception ImageReadException"))
-	.def("write_image", &EMAN::EMData::write_image, EMAN_EMData_write_image_overloads_1_7(args("filename", "img_index", "imgtype", "header_only", "region", "filestoragetype", "use_host_endian"), "write the header and data out to an image.\n\nIf the img_index = -1, append the image to the given image file.\n\nIf the given image file already exists, this image\nformat only stores 1 image, and no region is given, then\ntruncate the image file  to  zero length before writing\ndata out. For header writing only, no truncation happens.\n\nIf a region is given, then write a region only.\n\nfilename - The image file name.\nimg_index - The nth image to write as.\nimgtype - Write to the given image format type. if not specified, use the 'filename' extension to decide.\nheader_only - To write only the header or both header and data.\nregion - Define the region to write to.\nfilestoragetype - The image data type used in the output file.\nuse_host_endian - To write in the host computer byte order.\n\nexception - ImageFormatException\nexception ImageWriteException"))
-	.def("append_image", &EMAN::EMData::append_image, EMAN_EMData_append_image_overloads_1_3(args("filename", "imgtype", "header_only"), "append to an image file; If the file doesn't exist, create one.\nfilename - The image file name.\nimgtype - Write to the given image format type. if not specified, use the 'filename' extension to decide.\nheader_only - To write only the header or both header and data."))
-	.def("write_lst", &EMAN::EMData::write_lst, EMAN_EMData_write_lst_overloads_1_4(args("filename", "reffile", "refn", "comment"), "Append data to a LST image file.\nfilename - The LST image file name.\nreffile - Reference file name.\nrefn The reference file number.\ncomment - The comment to the added reference file."))
+	.def("read_image", &EMData_read_image_wrapper, EMData_read_image_wrapper_overloads_2_6(args("filename", "img_index", "header_only", "region", "is_3d"), "read an image file and stores its information to this EMData object.\n\nIf a region is given, then only read a\nregion of the image file. The region will be this\nEMData object. The given region must be inside the given\nimage file. Otherwise, an error will be created.\n\nfilename The image file name.\nimg_index The nth image you want to read.\nheader_only To read only the header or both header and data.\nregion To read only a region of the image.\nis_3d  Whether to treat the image as a single 3D or a set of 2Ds. This is a hint for certain image formats which has no difference between 3D image and set of 2Ds.\nexception ImageFormatException\nexception ImageReadException"))
+	.def("read_binedimage", &EMData_read_binedimage_wrapper, EMData_read_binedimage_wrapper_overloads_2_6(args("filename", "img_index", "binfactor", "fast", "is_3d"), "read an image file and stores its information to this EMData object.\nfilename The image file name.\nimg_index The nth image you want to read.\nbinfactor The amount by which to bin by. Must be an integer\nfast bin very binfactor xy slice otherwise meanshrink z slice\nis_3d  Whether to treat the image as a single 3D or a set of 2Ds. This is a hint for certain image formats which has no difference between 3D image and set of 2Ds.\nexception ImageFormatException\nexception ImageReadException"))
+	.def("write_image", &EMData_write_image_wrapper, EMData_write_image_wrapper_overloads_2_8(args("filename", "img_index", "imgtype", "header_only", "region", "filestoragetype", "use_host_endian"), "write the header and data out to an image.\n\nIf the img_index = -1, append the image to the given image file.\n\nIf the given image file already exists, this image\nformat only stores 1 image, and no region is given, then\ntruncate the image file  to  zero length before writing\ndata out. For header writing only, no truncation happens.\n\nIf a region is given, then write a region only.\n\nfilename - The image file name.\nimg_index - The nth image to write as.\nimgtype - Write to the given image format type. if not specified, use the 'filename' extension to decide.\nheader_only - To write only the header or both header and data.\nregion - Define the region to write to.\nfilestoragetype - The image data type used in the output file.\nuse_host_endian - To write in the host computer byte order.\n\nexception - ImageFormatException\nexception ImageWriteException"))
+	.def("write_images", &EMData_write_images_wrapper, EMData_write_images_wrapper_overloads_2_6(args("filename", "imgs", "imgtype", "header_only", "filestoragetype", "use_host_endian"), "Write a list of images to one file, appending after any images already present.\nThe file is opened and flushed only once for the whole list.\n\nfilename - The image file name.\nimgs - The images to write, in order.\nimgtype - Write to the given image format type. if not specified, use the 'filename' extension to decide.\nheader_only - To write only the header or both header and data.\nfilestoragetype - The image data type used in the output file.\nuse_host_endian - To write in the host computer byte order.\n\nreturn - The index of the first image written."))
+	.def("append_image", &EMData_append_image_wrapper, EMData_append_image_wrapper_overloads_2_4(args("filename", "imgtype", "header_only"), "append to an image file; If the file doesn't exist, create one.\nfilename - The image file name.\nimgtype - Write to the given image format type. if not specified, use the 'filename' extension to decide.\nheader_only - To write only the header or both header and data."))
+	.def("write_lst", &EMData_write_lst_wrapper, EMData_write_lst_wrapper_overloads_2_5(args("filename", "reffile", "refn", "comment"), "Append data to a LST image file.\nfilename - The LST image file name.\nreffile - Reference file name.\nrefn The reference file number.\ncomment - The comment to the added reference file."))
 //	.def("print_image", &EMAN::EMData::print_image, EMAN_EMData_print_image_overloads_0_2(args("filename", "output_stream"), "Print the image data to a file stream (standard out by default).\nfilename - image file to be printed.\noutput_stream - Output stream; cout by default."))
-	.def("read_images", &EMAN::EMData::read_images, EMAN_EMData_read_images_overloads_1_3(args("filename", "img_indices", "header_only"),"Read a set of images from file specified by 'filename'.\nWhich images are read is set by 'img_indices'.\nfilename The image file name.\nimg_indices Which images are read. If it is empty, all images are read. If it is not empty, only those in this array are read.\nheader_only If true, only read image header. If false, read both data and header.\nreturn The set of images read from filename."))
-	.def("read_images_ext", &EMAN::EMData::read_images_ext, EMAN_EMData_read_images_ext_overloads_3_5(args("filename", "img_index_start", "img_index_end", "header_only", "ext"), "Read a set of images from file specified by 'filename'. If\nthe given 'ext' is not empty, replace 'filename's extension it.\nImages with index from img_index_start to img_index_end are read.\n \nfilename - The image file name.\nimg_index_start Starting image index.\nimg_index_end - Ending image index.\nheader_only - If true, only read image header. If false, read both data and header.\next - The new image filename extension.\n \nreturn The set of images read from filename."))
+	.def("read_images", &EMData_read_images_wrapper, EMData_read_images_wrapper_overloads_1_3(args("filename", "img_indices", "header_only"),"Read a set of images from file specified by 'filename'.\nWhich images are read is set by 'img_indices'.\nfilename The image file name.\nimg_indices Which images are read. If it is empty, all images are read. If it is not empty, only those in this array are read.\nheader_only If true, only read image header. If false, read both data and header.\nreturn The set of images read from filename."))
+	.def("read_images_ext", &EMData_read_images_ext_wrapper, EMData_read_images_ext_wrapper_overloads_3_5(args("filename", "img_index_start", "img_index_end", "header_only", "ext"), "Read a set of images from file specified by 'filename'. If\nthe given 'ext' is not empty, replace 'filename's extension it.\nImages with index from img_index_start to img_index_end are read.\n \nfilename - The image file name.\nimg_index_start Starting image index.\nimg_index_end - Ending image index.\nheader_only - If true, only read image header. If false, read both data and header.\next - The new image filename extension.\n \nreturn The set of images read from filename."))
 	.def("get_fft_amplitude", &EMAN::EMData::get_fft_amplitude, return_value_policy< manage_new_object >(), "return the amplitudes of the FFT including the left half\n \nreturn The current FFT image's amplitude image.\nexception - ImageFormatException If the image is not a complex image.")
 	.def("get_fft_amplitude2D", &EMAN::EMData::get_fft_amplitude2D, return_value_policy< manage_new_object >(), "return the amplitudes of the 2D FFT including the left half, PRB\n \nreturn The current FFT image's amplitude image.\nexception - ImageFormatException If the image is not a complex image.")
 	.def("get_fft_phase", &EMAN::EMData::get_fft_phase, return_value_policy< manage_new_object >(), "return the phases of the FFT including the left half\n \nreturn The current FFT image's phase image.\nexception - ImageFormatException If the image is not a complex image.")
@@ -648,10 +602,10 @@ BOOST_PYTHON_MODULE(libpyEMData2)
 	.def("project", &EMData_project_wrapperD, args("projector_name", "params"), "Calculate the projection of this image and return the result.\n \nprojector_name - Projection algorithm name.\nparams - projection options.\n \nreturn The result image.\nexception - NotExistingObjectError If the projection algorithm doesn't exist.", return_value_policy< manage_new_object >() )
 	.def("project", &EMData_project_wrapper, args("projector_name", "t3d"), "Calculate the projection of this image and return the result.\n \nprojector_name - Projection algorithm name.\nt3d - Transform object used to do projection.\n \nreturn The result image.\nexception - NotExistingObjectError If the projection algorithm doesn't exist.", return_value_policy< manage_new_object >() )
 //	.def("project", (EMAN::EMData* (EMAN::EMData::*)(const std::string&, const EMAN::Transform&) )&EMAN::EMData::project, args("projector_name", "t3d"), "Calculate the projection of this image and return the result.\n \nprojector_name - Projection algorithm name.\nt3d - Transform object used to do projection.\n \nreturn The result image.\nexception - NotExistingObjectError If the projection algorithm doesn't exist.", return_value_policy< manage_new_object >() )
-	.def("backproject", &EMAN::EMData::backproject, EMAN_EMData_backproject_overloads_1_2(args("peojector_name", "params"), "Calculate the backprojection of this image (stack) and return the result.\n \nprojector_name - Projection algorithm name. Only \"pawel\" and \"chao\" have been implemented now.\nparams - Projection Algorithm parameters, default to Null.\n \nreturn The result image.\nexception - NotExistingObjectError If the projection algorithm doesn't exist.")[ return_value_policy< manage_new_object >() ])
+	.def("backproject", &EMData_backproject_wrapper, EMData_backproject_wrapper_overloads_2_3(args("peojector_name", "params"), "Calculate the backprojection of this image (stack) and return the result.\n \nprojector_name - Projection algorithm name. Only \"pawel\" and \"chao\" have been implemented now.\nparams - Projection Algorithm parameters, default to Null.\n \nreturn The result image.\nexception - NotExistingObjectError If the projection algorithm doesn't exist.")[ return_value_policy< manage_new_object >() ])
 	.def("do_fft", &EMData_do_fft_wrapper, return_value_policy< manage_new_object >(), "return the fast fourier transform (FFT) image of the current\nimage. the current image is not changed. The result is in\nreal/imaginary format.\n \nreturn The FFT of the current image in real/imaginary format.")
 	.def("do_fft_inplace", &EMAN::EMData::do_fft_inplace, return_value_policy< reference_existing_object >(), "Do FFT inplace. And return the FFT image.\n \nreturn The FFT of the current image in real/imaginary format.")
-	.def("do_ift", &EMAN::EMData::do_ift, return_value_policy< manage_new_object >(), "return the inverse fourier transform (IFT) image of the current\nimage. the current image may be changed if it is in amplitude/phase\nformat as opposed to real/imaginary format - if this change is\nperformed it is not undone.\n \nreturn The current image's inverse fourier transform image.\nexception - ImageFormatException If the image is not a complex image.")
+	.def("do_ift", &EMData_do_ift_wrapper, return_value_policy< manage_new_object >(), "return the inverse fourier transform (IFT) image of the current\nimage. the current image may be changed if it is in amplitude/phase\nformat as opposed to real/imaginary format - if this change is\nperformed it is not undone.\n \nreturn The current image's inverse fourier transform image.\nexception - ImageFormatException If the image is not a complex image.")
 	.def("do_ift_inplace", &EMAN::EMData::do_ift_inplace, return_value_policy< reference_existing_object >(), "Do IFT inplace. And return the IFT image.\n \nreturn The IFT image.")
 	.def("bispecRotTransInvN", &EMAN::EMData::bispecRotTransInvN, return_value_policy< reference_existing_object >(), args("N", "NK"), "This computes the rotational and translational bispectral\ninvariants of an image. The invariants are labelled by the Fourier\nHarmonic label given by N.\nNK is the number of Fourier components one wishes to use in calculating this bispectrum.\nthe output is a single 2D image whose x,y labels are lengths, corresponding to the two lengths of sides of a triangle.")
 	.def("bispecRotTransInvDirect", &EMAN::EMData::bispecRotTransInvDirect, return_value_policy< reference_existing_object >(), args("type"), "This computes the rotational and translational bispectral\ninvariants of an image.\nthe output is a single 3d Volume whose x,y labels are lengths,\ncorresponding to the two lengths of sides of a triangle.\nthe z label is for the angle.")
@@ -835,7 +789,7 @@ BOOST_PYTHON_MODULE(libpyEMData2)
 //	.def("rotate", (void (EMAN::EMData::*)(const EMAN::Transform3D&) )&EMAN::EMData::rotate, args("t"), "Rotate this image.\nDEPRECATED USE EMData::Transform\n \nt - Transformation rotation.")
 	.def("rotate", (void (EMAN::EMData::*)(float, float, float) )&EMAN::EMData::rotate, args("az", "alt", "phi"), "Rotate this image.\nDEPRECATED USE EMData::Transform\n \naz - Rotation euler angle az  in EMAN convention.\nalt - Rotation euler angle alt in EMAN convention.\nphi - Rotation euler angle phi in EMAN convention.")
 //	.def("rotate_translate", (void (EMAN::EMData::*)(const EMAN::Transform3D&) )&EMAN::EMData::rotate_translate, args("t"), "Rotate then translate the image.\nDEPRECATED USE EMData::Transform\n \nt - The rotation and translation transformation to be done.")
-	.def("transform", &EMAN::EMData::transform, args("t"), "Transform the image\n \nt - the transform object that describes the transformation to be applied to the image.")
+	.def("transform", &EMData_transform_wrapper, args("t"), "Transform the image\n \nt - the transform object that describes the transformation to be applied to the image.")
 	.def("rotate_translate", (void (EMAN::EMData::*)(const EMAN::Transform&) )&EMAN::EMData::rotate_translate, args("t"), "Apply a transformation to the image.\nDEPRECATED USE EMData::Transform\n \nt - transform object that describes the transformation to be applied to the image.")
 	.def("rotate_translate", (void (EMAN::EMData::*)(float, float, float, float, float, float) )&EMAN::EMData::rotate_translate, args("az", "alt", "phi", "dx", "dy", "dz"), "Rotate then translate the image.\nDEPRECATED USE EMData::Transform\n \naz - Rotation euler angle az  in EMAN convention.\nalt - Rotation euler angle alt in EMAN convention.\nphi - Rotation euler angle phi in EMAN convention.\ndx - Translation distance in x direction.\ndy - Translation distance in y direction.\ndz - Translation distance in z direction.")
 	.def("rotate_translate", (void (EMAN::EMData::*)(float, float, float, float, float, float, float, float, float) )&EMAN::EMData::rotate_translate, args("az", "alt", "phi", "dx", "dy", "dz", "pdx", "pdy", "pdz"), "Rotate then translate the image.\nDEPRECATED USE EMData::Transform\n \naz - Rotation euler angle az  in EMAN convention.\nalt - Rotation euler angle alt in EMAN convention.\nphi - Rotation euler angle phi in EMAN convention.\ndx - Translation distance in x direction.\ndy - Translation distance in y direction.\ndz - Translation distance in z direction.\npdx - Pretranslation distance in x direction.\npdy - Pretranslation distance in y direction.\npdz - Pretranslation distance in z direction.")
@@ -848,9 +802,9 @@ BOOST_PYTHON_MODULE(libpyEMData2)
 	.def("calc_ccf", &EMData_calc_ccf_wrapper1, args("with"), return_value_policy< manage_new_object >())
 	.def("calc_ccf", &EMData_calc_ccf_wrapper2, args("with", "fpflag"),return_value_policy< manage_new_object >())
 	.def("calc_ccf", &EMData_calc_ccf_wrapper3, args("with", "fpflag", "center"), return_value_policy< manage_new_object >())
-	.def("calc_ccfx", &EMAN::EMData::calc_ccfx, EMAN_EMData_calc_ccfx_overloads_1_6(args("with", "y0", "y1", "nosum","flip","usez"), "Calculate Cross-Correlation Function (CCF) in the x-direction and adds them up,\nresult in 1D.\nWARNING: this routine will modify the 'this' and 'with' to contain\n1D fft's without setting some flags. This is an optimization\nfor rotational alignment.\nsee calc_ccf()\n \nwith - The image used to calculate CCF.\ny0 - Starting position in x-direction(default=0).\ny1 - Ending position in x-direction. '-1' means the end of the row.(default=-1)\nnosum - If true, returns an image y1-y0+1 pixels high.(default=False)\n \nreturn The result image containing the CCF.\nexception - NullPointerException If input image 'with' is NULL.\nexception - ImageFormatException If 'with' and 'this' are not same size.\nexception - ImageDimensionException If 'this' image is 3D.")[ return_value_policy< manage_new_object >() ])
+	.def("calc_ccfx", &EMData_calc_ccfx_wrapper, EMData_calc_ccfx_wrapper_overloads_2_7(args("with", "y0", "y1", "nosum","flip","usez"), "Calculate Cross-Correlation Function (CCF) in the x-direction and adds them up,\nresult in 1D.\nWARNING: this routine will modify the 'this' and 'with' to contain\n1D fft's without setting some flags. This is an optimization\nfor rotational alignment.\nsee calc_ccf()\n \nwith - The image used to calculate CCF.\ny0 - Starting position in x-direction(default=0).\ny1 - Ending position in x-direction. '-1' means the end of the row.(default=-1)\nnosum - If true, returns an image y1-y0+1 pixels high.(default=False)\n \nreturn The result image containing the CCF.\nexception - NullPointerException If input image 'with' is NULL.\nexception - ImageFormatException If 'with' and 'this' are not same size.\nexception - ImageDimensionException If 'this' image is 3D.")[ return_value_policy< manage_new_object >() ])
 	.def("calc_fast_sigma_image",&EMAN::EMData::calc_fast_sigma_image, return_value_policy< manage_new_object >(), args("mask"), "Calculates the local standard deviation (sigma) image using the given\nmask image. The mask image is typically much smaller than this image,\nand consists of ones, or is a small circle consisting of ones. The extent\nof the non zero neighborhood explicitly defines the range over which\nthe local standard deviation is determined.\nFourier convolution is used to do the math, ala Roseman (2003, Ultramicroscopy)\nHowever, Roseman was just working on methods Van Heel had presented earlier.\nThe normalize flag causes the mask image to be processed so that it has a unit sum.\nWorks in 1,2 and 3D\n \nmask - the image that will be used to define the neighborhood for determine the local standard deviation\n \nreturn the sigma image, the phase origin is at the corner (not the center)\nexception - ImageDimensionException if the dimensions of with do not match those of this\nexception - ImageDimensionException if any of the dimensions sizes of with exceed of this image's.")
-	.def("make_rotational_footprint", &EMAN::EMData::make_rotational_footprint, EMAN_EMData_make_rotational_footprint_overloads_0_1(args("unwrap"), "Makes a 'rotational footprint', which is an 'unwound'\nautocorrelation function. generally the image should be\nedge-normalized and masked before using this.\n \nunwrap - RFP undergoes polar->cartesian x-form,(default=True)\n \nreturn The rotaional footprint image.\nexception - ImageFormatException If image size is not even.")[ return_value_policy< manage_new_object >() ])
+	.def("make_rotational_footprint", &EMData_make_rotational_footprint_wrapper, EMData_make_rotational_footprint_wrapper_overloads_1_2(args("unwrap"), "Makes a 'rotational footprint', which is an 'unwound'\nautocorrelation function. generally the image should be\nedge-normalized and masked before using this.\n \nunwrap - RFP undergoes polar->cartesian x-form,(default=True)\n \nreturn The rotaional footprint image.\nexception - ImageFormatException If image size is not even.")[ return_value_policy< manage_new_object >() ])
 	.def("make_rotational_footprint_e1", &EMAN::EMData::make_rotational_footprint_e1, EMAN_EMData_make_rotational_footprint_e1_overloads_0_1(args("unwrap"), "unwrap - RFP undergoes polar->cartesian x-form,(default=True)")[ return_value_policy< manage_new_object >() ])
 	.def("make_rotational_footprint_cmc", &EMAN::EMData::make_rotational_footprint_cmc, EMAN_EMData_make_rotational_footprint_cmc_overloads_0_1(args("unwrap"), "unwrap - RFP undergoes polar->cartesian x-form,(default=True)")[ return_value_policy< manage_new_object >() ])
 	.def("make_footprint", &EMAN::EMData::make_footprint, EMAN_EMData_make_footprint_overloads_0_1(args("type"), "Makes a 'footprint' for the current image. This is image containing\na rotational & translational invariant of the parent image. The size of the\nresulting image depends on the selected type.\ntype 0- The original, default footprint derived from the rotational footprint\ntypes 1-6 - bispectrum-based\ntypes 1,3,5 - returns Fouier-like images\ntypes 2,4,6 - returns real-space-like images\ntype 1,2 - simple r1,r2, 2-D footprints\ntype 3,4 - r1,r2,anle 3D footprints\ntype 5,6 - same as 1,2 but with the cube root of the final products used\n \ntype - Select one of several possible algorithms for producing the invariants\n \nreturn The footprint image.\nexception - ImageFormatException If image size is not even.")[return_value_policy< manage_new_object >()])
@@ -880,6 +834,7 @@ BOOST_PYTHON_MODULE(libpyEMData2)
 	.def("__setitem__", &emdata_setitem)
 	.staticmethod("read_images_ext")
 	.staticmethod("read_images")
+	.staticmethod("write_images")
 	.def("__add__", (EMAN::EMData* (*)(const EMAN::EMData&, const EMAN::EMData&) )&EMAN::operator+, return_value_policy< manage_new_object >() )
 	.def("__sub__", (EMAN::EMData* (*)(const EMAN::EMData&, const EMAN::EMData&) )&EMAN::operator-, return_value_policy< manage_new_object >() )
 	.def("__mul__", (EMAN::EMData* (*)(const EMAN::EMData&, const EMAN::EMData&) )&EMAN::operator*, return_value_policy< manage_new_object >() )
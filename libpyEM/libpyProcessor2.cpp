@@ -38,6 +38,7 @@
 // Includes ====================================================================
 #include <emdata.h>
 #include <emobject.h>
+#include <gilrelease.h>
 #include <processor.h>
 
 // Using =======================================================================
@@ -55,10 +56,12 @@ struct EMAN_Processor_Wrapper: EMAN::Processor
         EMAN::Processor(), py_self(py_self_) {}
 
     void process_inplace(EMAN::EMData* p0) {
+        GILAcquire gil;
         call_method< void >(py_self, "process_inplace", p0);
     }
 
     EMAN::EMData* process(const EMAN::EMData* const p0) {
+        GILAcquire gil;
         return call_method< EMAN::EMData* >(py_self, "process", p0);
     }
 
@@ -67,6 +70,7 @@ struct EMAN_Processor_Wrapper: EMAN::Processor
     }
 
     void process_list_inplace(std::vector<EMAN::EMData*,std::allocator<EMAN::EMData*> >& p0) {
+        GILAcquire gil;
         call_method< void >(py_self, "process_list_inplace", p0);
     }
 
@@ -75,10 +79,12 @@ struct EMAN_Processor_Wrapper: EMAN::Processor
     }
 
     std::string get_name() const {
+        GILAcquire gil;
         return call_method< std::string >(py_self, "get_name");
     }
 
     EMAN::Dict get_params() const {
+        GILAcquire gil;
         return call_method< EMAN::Dict >(py_self, "get_params");
     }
 
@@ -87,6 +93,7 @@ struct EMAN_Processor_Wrapper: EMAN::Processor
     }
 
     void set_params(const EMAN::Dict& p0) {
+        GILAcquire gil;
         call_method< void >(py_self, "set_params", p0);
     }
 
@@ -95,6 +102,7 @@ struct EMAN_Processor_Wrapper: EMAN::Processor
     }
 
     EMAN::TypeDict get_param_types() const {
+        GILAcquire gil;
         return call_method< EMAN::TypeDict >(py_self, "get_param_types");
     }
 
@@ -103,12 +111,26 @@ struct EMAN_Processor_Wrapper: EMAN::Processor
     }
 
     std::string get_desc() const {
+        GILAcquire gil;
         return call_method< std::string >(py_self, "get_desc");
     }
 
     PyObject* py_self;
 };
 
+// The processors do their work with the GIL released. A Python subclass's own methods are reached through
+// the wrapper above, which takes the GIL back.
+void processor_process_inplace(EMAN::Processor &self, EMAN::EMData* image) {
+	if (dynamic_cast<EMAN_Processor_Wrapper*>(&self)) pure_virtual_called();
+	GILRelease rel;
+	self.process_inplace(image);
+}
+
+EMAN::EMData* processor_process(EMAN::Processor &self, const EMAN::EMData* const image) {
+	if (dynamic_cast<EMAN_Processor_Wrapper*>(&self)) return self.EMAN::Processor::process(image);
+	GILRelease rel;
+	return self.process(image);
+}
 
 }// namespace
 
@@ -118,8 +140,8 @@ BOOST_PYTHON_MODULE(libpyProcessor2)
 {
     scope* EMAN_Processor_scope = new scope(
     class_< EMAN::Processor, boost::noncopyable, EMAN_Processor_Wrapper >("Processor", init<  >())
-        .def("process_inplace", pure_virtual(&EMAN::Processor::process_inplace))
-        .def("process", &EMAN::Processor::process, &EMAN_Processor_Wrapper::default_process, return_value_policy< manage_new_object >())
+        .def("process_inplace", &processor_process_inplace)
+        .def("process", &processor_process, return_value_policy< manage_new_object >())
         .def("process_list_inplace", &EMAN::Processor::process_list_inplace, &EMAN_Processor_Wrapper::default_process_list_inplace)
         .def("get_name", pure_virtual(&EMAN::Processor::get_name))
         .def("get_params", &EMAN::Processor::get_params, &EMAN_Processor_Wrapper::default_get_params)
@@ -38,6 +38,7 @@
 // Includes ====================================================================
 #include <emdata.h>
 #include <emobject.h>
+#include <gilrelease.h>
 #include <projector.h>
 
 // Using =======================================================================
@@ -55,22 +56,27 @@ struct EMAN_Projector_Wrapper: EMAN::Projector
         EMAN::Projector(), py_self(py_self_) {}
 
     EMAN::EMData* project3d(EMAN::EMData* p0) const {
+        GILAcquire gil;
         return call_method< EMAN::EMData* >(py_self, "project3d", p0);
     }
 
     EMAN::EMData* backproject3d(EMAN::EMData* p0) const {
+        GILAcquire gil;
         return call_method< EMAN::EMData* >(py_self, "backproject3d", p0);
     }
 
     std::string get_name() const {
+        GILAcquire gil;
         return call_method< std::string >(py_self, "get_name");
     }
 
     std::string get_desc() const {
+        GILAcquire gil;
         return call_method< std::string >(py_self, "get_desc");
     }
 
     EMAN::Dict get_params() const {
+        GILAcquire gil;
         return call_method< EMAN::Dict >(py_self, "get_params");
     }
 
@@ -79,6 +85,7 @@ struct EMAN_Projector_Wrapper: EMAN::Projector
     }
 
     EMAN::TypeDict get_param_types() const {
+        GILAcquire gil;
         return call_method< EMAN::TypeDict >(py_self, "get_param_types");
     }
 
@@ -89,6 +96,19 @@ struct EMAN_Projector_Wrapper: EMAN::Projector
     PyObject* py_self;
 };
 
+// The projectors do their work with the GIL released. A Python subclass's own methods are reached through
+// the wrapper above, which takes the GIL back.
+EMAN::EMData* projector_project3d(EMAN::Projector &self, EMAN::EMData* image) {
+	if (dynamic_cast<EMAN_Projector_Wrapper*>(&self)) pure_virtual_called();
+	GILRelease rel;
+	return self.project3d(image);
+}
+
+EMAN::EMData* projector_backproject3d(EMAN::Projector &self, EMAN::EMData* image) {
+	if (dynamic_cast<EMAN_Projector_Wrapper*>(&self)) pure_virtual_called();
+	GILRelease rel;
+	return self.backproject3d(image);
+}
 
 }// namespace
 
@@ -99,8 +119,8 @@ BOOST_PYTHON_MODULE(libpyProjector2)
     def("dump_projectors", &EMAN::dump_projectors);
     def("dump_projectors_list", &EMAN::dump_projectors_list);
     class_< EMAN::Projector, boost::noncopyable, EMAN_Projector_Wrapper >("__Projector", init<  >())
-        .def("project3d", pure_virtual(&EMAN::Projector::project3d), return_value_policy< manage_new_object >())
-        .def("backproject3d", pure_virtual(&EMAN::Projector::backproject3d), return_value_policy< manage_new_object >())
+        .def("project3d", &projector_project3d, return_value_policy< manage_new_object >())
+        .def("backproject3d", &projector_backproject3d, return_value_policy< manage_new_object >())
         .def("get_name", pure_virtual(&EMAN::Projector::get_name))
         .def("get_desc", pure_virtual(&EMAN::Projector::get_desc))
         .def("get_params", &EMAN::Projector::get_params, &EMAN_Projector_Wrapper::default_get_params)
@@ -39,6 +39,7 @@
 #include <emdata.h>
 #include <emobject.h>
 #include <reconstructor.h>
+#include <gilrelease.h>
 
 // Using =======================================================================
 using namespace boost::python;
@@ -51,40 +52,50 @@ using std::endl;
 // Declarations ================================================================
 using namespace EMAN;
 
+	// GILRelease rather than Py_BEGIN_ALLOW_THREADS, so the GIL is restored if the reconstructor throws
 	int reconstructor_insert_slice2(Reconstructor &self, const EMData* slice, const Transform& euler) {
-		int ret;
-		Py_BEGIN_ALLOW_THREADS
-//		printf("wrapper1\n");
-		ret=self.insert_slice(slice,euler);
-//		ret=call_method< int >(py_self, "insert_slice", slice,euler,1.0f);
-		Py_END_ALLOW_THREADS
-		return ret;
+		GILRelease rel;
+		return self.insert_slice(slice,euler);
 	}
 
  	int reconstructor_insert_slice3(Reconstructor &self, const EMData* slice, const Transform& euler,float weight) {
-		int ret;
-		Py_BEGIN_ALLOW_THREADS
-//		printf("wrapper2 %p %p %f\n",&self,slice,weight);
-		ret=self.insert_slice(slice,euler,weight);
-// 		ret=call_method< int >(py_self, "insert_slice", slice,euler,weight);
-		Py_END_ALLOW_THREADS
-		return ret;
+		GILRelease rel;
+		return self.insert_slice(slice,euler,weight);
  	}
 
  	EMAN::EMData* reconstructor_finish(Reconstructor &self, bool doift) {
-		EMAN::EMData* ret;
-		Py_BEGIN_ALLOW_THREADS
-// 		printf("reconfinish2???\n");
-		ret=self.finish(doift);
-		Py_END_ALLOW_THREADS
-		return ret;
+		GILRelease rel;
+		return self.finish(doift);
  	}
 	int reconstructor_determine_slice_agreement(Reconstructor &self, EMData* slice, const Transform &euler, const float weight=1.0, bool sub=true) {
-		int ret;
-		Py_BEGIN_ALLOW_THREADS
-		ret=self.determine_slice_agreement(slice,euler,weight,sub);
-		Py_END_ALLOW_THREADS
-		return ret;
+		GILRelease rel;
+		return self.determine_slice_agreement(slice,euler,weight,sub);
+	}
+
+	EMAN::EMData* reconstructor_preprocess_slice(Reconstructor &self, const EMData* slice, const Transform& t) {
+		GILRelease rel;
+		return self.preprocess_slice(slice,t);
+	}
+
+	// used by e2make3dpar.py to sum per-thread partial volumes
+	void reconstructor_add_partial(Reconstructor &self, const Reconstructor* partial) {
+		GILRelease rel;
+		self.add_partial(partial);
+	}
+
+	void reconstructor_add_partial2(Reconstructor &self, const EMData* partial, const EMData* weight) {
+		GILRelease rel;
+		self.add_partial(partial,weight);
+	}
+
+	EMAN::EMData* reconstructor_get_partial(Reconstructor &self, bool weights) {
+		GILRelease rel;
+		return self.get_partial(weights);
+	}
+
+	EMAN::EMData* reconstructor_get_partial1(Reconstructor &self) {
+		GILRelease rel;
+		return self.get_partial(false);
 	}
 	
 struct EMAN_Reconstructor_Wrapper: EMAN::Reconstructor
@@ -96,35 +107,34 @@ struct EMAN_Reconstructor_Wrapper: EMAN::Reconstructor
         EMAN::Reconstructor(), py_self(py_self_) {}
 
     void setup() {
+        GILAcquire gil;
         call_method< void >(py_self, "setup");
     }
 
     void setup_seed(const EMAN::EMData* seed,float seed_weight) {
+       GILAcquire gil;
        call_method< void >(py_self, "setup_seed",seed,seed_weight);
     }
 
 	void setup_seedandweights(const EMAN::EMData* seed,const EMAN::EMData* weight) {
+        GILAcquire gil;
         call_method< void >(py_self, "setup_seedandweights",seed,weight);
     }
 
     void clear() {
+        GILAcquire gil;
         call_method< void >(py_self, "clear");
     }
     
+	// these are called with the GIL released by the insert_slice bindings, and must take it back to call Python
  	int insert_slice(const EMAN::EMData* const slice, const EMAN::Transform& euler) {
-		int ret;
-		Py_BEGIN_ALLOW_THREADS
-		ret=call_method< int >(py_self, "insert_slice", slice,euler,1.0);
-		Py_END_ALLOW_THREADS
-		return ret;
+		GILAcquire gil;
+		return call_method< int >(py_self, "insert_slice", slice,euler,1.0);
 	}
 
  	int insert_slice(const EMAN::EMData* const slice, const EMAN::Transform& euler,float weight) {
-		int ret;
-		Py_BEGIN_ALLOW_THREADS
- 		ret=call_method< int >(py_self, "insert_slice", slice,euler,weight);
-		Py_END_ALLOW_THREADS
-		return ret;
+		GILAcquire gil;
+ 		return call_method< int >(py_self, "insert_slice", slice,euler,weight);
  	}
  	
 // 	int insert_slice2( const EMData* slice, const Transform& euler) {
@@ -148,23 +158,28 @@ struct EMAN_Reconstructor_Wrapper: EMAN::Reconstructor
 //  	}
 
     EMAN::EMData* finish(bool doift) {
+        GILAcquire gil;
         return call_method< EMAN::EMData* >(py_self, "finish", doift);
     }
 
     std::string get_name() const {
+        GILAcquire gil;
         return call_method< std::string >(py_self, "get_name");
     }
 
     std::string get_desc() const {
+        GILAcquire gil;
         return call_method< std::string >(py_self, "get_desc");
     }
 
     EMAN::Dict get_params() const {
+        GILAcquire gil;
 		printf("call goes here!\n");
         return call_method< EMAN::Dict >(py_self, "get_params");
     }
 /*
 	void print_params() const {
+        GILAcquire gil;
         call_method< void >(py_self, "print_params");
 	}*/
 
@@ -173,6 +188,7 @@ struct EMAN_Reconstructor_Wrapper: EMAN::Reconstructor
     }
 
     void set_params(const EMAN::Dict& p0) {
+        GILAcquire gil;
         call_method< void >(py_self, "set_params", p0);
     }
 
@@ -181,6 +197,7 @@ struct EMAN_Reconstructor_Wrapper: EMAN::Reconstructor
     }
 
     EMAN::TypeDict get_param_types() const {
+        GILAcquire gil;
         return call_method< EMAN::TypeDict >(py_self, "get_param_types");
     }
 
@@ -206,9 +223,13 @@ BOOST_PYTHON_MODULE(libpyReconstructor2)
 		.def("insert_slice", &reconstructor_insert_slice2)
 		.def("determine_slice_agreement", &reconstructor_determine_slice_agreement)
 //		.def("determine_slice_agreement", (int (EMAN::Reconstructor::*)(EMAN::EMData* , const EMAN::Transform&, const float, bool))&EMAN::Reconstructor::determine_slice_agreement)
-        .def("preprocess_slice", (EMAN::EMData* (EMAN::Reconstructor::*)(const EMAN::EMData* const, const EMAN::Transform&))&EMAN::Reconstructor::preprocess_slice, return_value_policy< manage_new_object >())
+        .def("preprocess_slice", &reconstructor_preprocess_slice, return_value_policy< manage_new_object >())
 //         .def("finish", (EMAN::EMData* (EMAN::Reconstructor::*)(bool))&EMAN::Reconstructor::finish, return_value_policy< manage_new_object >())
         .def("finish", &reconstructor_finish, return_value_policy< manage_new_object >())
+		.def("add_partial", &reconstructor_add_partial)
+		.def("add_partial", &reconstructor_add_partial2)
+		.def("get_partial", &reconstructor_get_partial, return_value_policy< manage_new_object >())
+		.def("get_partial", &reconstructor_get_partial1, return_value_policy< manage_new_object >())
         .def("get_name", pure_virtual(&EMAN::Reconstructor::get_name))
         .def("get_desc", pure_virtual(&EMAN::Reconstructor::get_desc))
 // 		.def("get_emdata", (&EMAN::Reconstructor::get_emdata),  return_internal_reference< 1 >())
@@ -10,13 +10,11 @@ from builtins import range
 from EMAN2 import *
 import time
 import os
-import threading
-import queue
+from EMAN2_executor import EMExecutor
 from sys import argv,exit
 
-def ali2dfn(jsd,fsp,il,a,options):
+def ali2dfn(fsp,il,a,options):
 #	t=time.time()
-	global frac
 	rslt=[]
 	for n,i in enumerate(il):
 		b=EMData(fsp,i)
@@ -30,12 +28,9 @@ def ali2dfn(jsd,fsp,il,a,options):
 		else: 
 			sim=c.cmp(options.cmp[0],a,options.cmp[1])
 			rslt.append((i,{"xform.align2d":c["xform.align2d"],"score":sim}))
-		if il[0]==0 : frac=old_div(n,float(len(il)))		# we monitor progress in the first thread
 
-	jsd.put((fsp,rslt))
 #	if options.verbose>1 : print "{}\t{}\t{}\t{}".format(fsp,i,time.time()-t,c[0]["score"])
-
-frac=0
+	return (fsp,rslt)
 
 def main():
 	progname = os.path.basename(sys.argv[0])
@@ -70,6 +65,7 @@ def main():
 	options.ralign=parsemodopt(options.ralign)
 	options.raligncmp=parsemodopt(options.raligncmp)
 	options.cmp=parsemodopt(options.cmp)
+	if options.threads<1 : options.threads=1
 
 
 	if options.path == None:
@@ -98,8 +94,6 @@ def main():
 	ref=EMData(reffile,nref)
 	ref.write_image("{}/refimg_{:02d}.hdf".format(options.path,options.iter))
 	
-	NTHREADS=max(options.threads,2)		# we have one thread just writing results
-
 	logid=E2init(sys.argv, options.ppid)
 	
 	parms=js_open_dict("{}/0_a2d_parms.json".format(options.path))
@@ -107,31 +101,15 @@ def main():
 					  "ralign":unparsemodopt(options.ralign),"raligncmp":unparsemodopt(options.raligncmp),"cmp":unparsemodopt(options.cmp)}
 
 	angs={}
-	jsd=queue.Queue(0)
 
-	n=-1
 	N=EMUtil.get_image_count(args[0])
-	thrds=[threading.Thread(target=ali2dfn,args=(jsd,args[0],list(range(i,N,NTHREADS-1)),ref,options)) for i in range(NTHREADS-1)]
-
-	# here we run the threads and save the results, no actual alignment done here
-	if options.verbose: print(len(thrds)," threads")
-	thrtolaunch=0
-	while thrtolaunch<len(thrds) or threading.active_count()>1:
-		# If we haven't launched all threads yet, then we wait for an empty slot, and launch another
-		# note that it's ok that we wait here forever, since there can't be new results if an existing
-		# thread hasn't finished.
-		if thrtolaunch<len(thrds) :
-			while (threading.active_count()==NTHREADS ) : time.sleep(.1)
-			if options.verbose>1 : print("Starting thread {}/{}".format(thrtolaunch,len(thrds)))
-			thrds[thrtolaunch].start()
-			thrtolaunch+=1
-		else: time.sleep(1)
-		if options.verbose>1 and thrtolaunch>0:
-			frac=thrtolaunch/float(len(thrds))
-			print("{}% complete".format(100.0*frac))
-	
-		while not jsd.empty():
-			fsp,nds=jsd.get()
+	blk=max(1,N//(options.threads*20))		# particles are aligned in small blocks, so the pool stays balanced
+	jobs=[(args[0],list(range(i,min(i+blk,N))),ref,options) for i in range(0,N,blk)]
+
+	# here we run the jobs and save the results, no actual alignment done here
+	if options.verbose: print(len(jobs)," jobs")
+	with EMExecutor(options.threads) as ex:
+		for fsp,nds in ex.map(ali2dfn,jobs,ordered=False,logid=logid,verbose=options.verbose>1):
 			for n,d in nds:
 				angs[(fsp,n)]=d
 				if options.saveali:
@@ -139,10 +117,6 @@ def main():
 					v.transform(d["xform.align2d"])
 					v.write_image("{}/aliptcls_{:02d}.hdf".format(options.path,options.iter),n)
 
-
-	for t in thrds:
-		t.join()
-
 	if options.verbose : print("Writing results")
 
 	angsd=js_open_dict("{}/particle_parms_{:02d}.json".format(options.path,options.iter))
@@ -40,6 +40,7 @@ from builtins import range
 from builtins import object
 from EMAN2 import *
 from EMAN2jsondb import *
+from EMAN2_executor import EMExecutor
 import numpy as np
 import threading
 import queue
@@ -111,6 +112,8 @@ def main():
 	parser.add_argument("--ptclsize","-P",type=int,help="Longest axis of particle in pixels (diameter, not radius)",default=-1, guitype='intbox', row=2, col=1, rowspan=1, colspan=1, mode="boxing,extraction")
 	parser.add_argument("--write_dbbox",action="store_true",default=False,help="Export EMAN1 .box files",guitype='boolbox', row=3, col=0, rowspan=1, colspan=1, mode="extraction")
 	parser.add_argument("--write_ptcls",action="store_true",default=False,help="Extract selected particles from micrographs and write to disk", guitype='boolbox', row=3, col=1, rowspan=1, colspan=1, mode="extraction[True]")
+	parser.add_argument("--ptclshrink",type=float,help="Downsample particles by this factor as they are extracted with --write_ptcls. Box size is in original micrograph pixels.",default=1.0)
+	parser.add_argument("--ptclnorm",type=str,help="Normalization processor applied to particles as they are extracted with --write_ptcls, eg - normalize.edgemean",default=None)
 	parser.add_argument("--invert",action="store_true",help="If specified, inverts input contrast. Particles MUST be white on a darker background.",default=False, guitype='boolbox', row=4, col=0, rowspan=1, colspan=1, mode="extraction")
 	parser.add_argument("--no_ctf",action="store_true",default=False,help="Disable CTF determination", guitype='boolbox', row=4, col=1, rowspan=1, colspan=1, mode="extraction, boxing")
 	parser.add_argument("--suffix",type=str,help="Suffix of the micrographs used for particle picking (i.e. suffix=goodali will use micrographs end with __goodali.hdf). It is only useful when [allmicrographs] is True.",default="", guitype='strbox', row=16, col=0, rowspan=1, colspan=1, mode="boxing,extraction")
@@ -321,7 +324,7 @@ def main():
 		print(".box files written to boxfiles/")
 
 	if options.write_ptcls:
-		write_particles(args,boxsize,options.verbose)
+		write_particles(args,boxsize,options.verbose,options.threads,options.ptclshrink,options.ptclnorm)
 		print("Particles written to particles/*_ptcls.hdf")
 
 	E2end(logid)
@@ -345,39 +348,63 @@ def write_boxfiles(files,boxsize):
 		for b in boxes:
 			out.write("{:0.0f}\t{:0.0f}\t{:0.0f}\t{:0.0f}\n".format(int(b[0]-boxsize2),int(b[1]-boxsize2),int(boxsize),int(boxsize)))
 
-def write_particles(files,boxsize,verbose):
+def extract_particles(micrograph,boxes,boxsize,srcname,shrink=1,normproc=None):
+	"""Crops all of the boxes from a single in-memory micrograph in one pass, optionally downsampling by shrink
+	and normalizing with normproc (a (name,dict) tuple from parsemodopt). Returns the list of particles."""
+	boxsize2=old_div(boxsize,2)
+	ptcls=[]
+	for b in boxes:
+		boxim=micrograph.get_clip(Region(b[0]-boxsize2,b[1]-boxsize2,boxsize,boxsize))
+		if shrink>1 : boxim.process_inplace("math.fft.resample",{"n":shrink})
+		if normproc!=None : boxim.process_inplace(normproc[0],normproc[1])
+		boxim["ptcl_source_coord"]=(b[0],b[1])
+		boxim["ptcl_source_image"]=srcname
+		ptcls.append(boxim)
+	return ptcls
+
+def write_particles_mg(m,boxes,boxsize,shrink,normproc):
+	"""Extracts and writes the particles from one micrograph. The whole stack is written with a single bulk write
+	to a temporary file, which replaces any existing particle file only once it is complete."""
+	ptcl="particles/{}.hdf".format(base_name(m))
+	micrograph=load_micrograph(m)		# read micrograph
+	ptcls=extract_particles(micrograph,boxes,boxsize,m,shrink,normproc)
+	micrograph=None
+
+	tmp=ptcl+".tmp"
+	try: os.unlink(tmp)
+	except: pass
+	EMData.write_images(tmp,ptcls,IMAGE_HDF)
+	os.rename(tmp,ptcl)
+	return m,ptcl,len(ptcls)
+
+def write_particles(files,boxsize,verbose,threads=1,shrink=1,normproc=None):
 	"""This function will write a particles/*_ptcls.hdf file for each provided micrograph, based on
 	box locations in the corresponding info/*json file. To use this with .box files, they must be imported
-	to a JSON file first."""
+	to a JSON file first. Micrographs are processed in parallel on threads, and particles may optionally be
+	downsampled by shrink and normalized with normproc as they are extracted."""
 	
 	try: os.mkdir("particles")
 	except: pass
-	boxsize2=old_div(boxsize,2)
+
+	if isinstance(normproc,str) : normproc=parsemodopt(normproc)
 	
+	jobs=[]
 	for nm in files:
 		n,m=nm.split()
-		base=base_name(m)
-		ptcl="particles/{}.hdf".format(base)
 		
 		# get the list of box locations
 		db=js_open_dict(info_name(m))
 		boxes=db.setdefault("boxes",[])
+		db.close()
 		if len(boxes)==0 :
 			if verbose :
 				print("No particles in ",m)
 			continue
-	
-		# remove any existing file
-		try: os.unlink(ptcl)
-		except: pass
-	
-		if verbose : print("{} : {} particles written to {}".format(m,len(boxes),ptcl))
-		micrograph=load_micrograph(m)		# read micrograph
-		for i,b in enumerate(boxes):
-			boxim=micrograph.get_clip(Region(b[0]-boxsize2,b[1]-boxsize2,boxsize,boxsize))
-			boxim["ptcl_source_coord"]=(b[0],b[1])
-			boxim["ptcl_source_image"]=m
-			boxim.write_image(ptcl,i)
+		jobs.append((m,boxes,boxsize,shrink,normproc))
+
+	with EMExecutor(max(1,threads)) as ex:
+		for m,ptcl,n in ex.map(write_particles_mg,jobs,ordered=False):
+			if verbose : print("{} : {} particles written to {}".format(m,n,ptcl))
 	
 ##########
 # to add a new autoboxer module, create a class here, then add it to the GUIBoxer.aboxmodes list below
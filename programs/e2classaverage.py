@@ -44,6 +44,7 @@ import sys
 import random
 from random import choice
 import traceback
+from EMAN2_utils import is_simmx_topk,simmx_topk_to_classmx,ClassMxIndex
 
 READ_HEADER_ONLY = True
 
@@ -66,7 +67,7 @@ def main():
 	parser.add_argument("--input", type=str, help="The name of the input particle stack", default=None)
 	parser.add_argument("--output", type=str, help="The name of the output class-average stack", default=None)
 	parser.add_argument("--oneclass", type=int, help="Create only a single class-average. Specify the number.",default=None)
-	parser.add_argument("--classmx", type=str, help="The name of the classification matrix specifying how particles in 'input' should be grouped. If omitted, all particles will be averaged.", default=None)
+	parser.add_argument("--classmx", type=str, help="The name of the classification matrix specifying how particles in 'input' should be grouped. May also be a sparse similarity matrix from e2simmx.py --topk. If omitted, all particles will be averaged.", default=None)
 	parser.add_argument("--focused",type=str,help="Name of a reference projection file to read 1st iteration refine alignment references from.", default=None)
 	parser.add_argument("--ref", type=str, help="Reference image(s). Used as an initial alignment reference and for final orientation adjustment if present. Also used to assign euler angles to the generated classes. This is typically the projections that were used for classification.", default=None)
 	parser.add_argument("--storebad", action="store_true", help="Even if a class-average fails, write to the output. Forces 1->1 numbering in output",default=False)
@@ -134,8 +135,16 @@ def main():
 	print("Class averaging beginning")
 
 	try:
-		classmx=EMData.read_images(options.classmx)		# we keep the entire classification matrix in memory, since we need to update it in most cases
-		ncls=int(classmx[0]["maximum"])+1
+		# class membership comes from an index built in one pass (and cached) rather than a scan of the classmx per class
+		# we keep the entire classification matrix in memory only when we need to update it
+		# a sparse similarity matrix from e2simmx.py --topk is used directly, taking the best reference for each particle
+		if is_simmx_topk(options.classmx) :
+			classmx=simmx_topk_to_classmx(options.classmx,1)
+			cmxidx=ClassMxIndex(classmx)
+		else :
+			cmxidx=ClassMxIndex(options.classmx)
+			if options.resultmx!=None : classmx=EMData.read_images(options.classmx)
+		ncls=cmxidx.ncls
 	except:
 		ncls=1
 		if options.resultmx!=None :
@@ -172,7 +181,7 @@ def main():
 		else : clslst=[options.oneclass]
 
 		for cl in clslst:
-			ptcls=classmx_ptcls(classmx[0],cl)
+			ptcls=cmxidx.members(cl)
 			if options.resample : ptcls=[random.choice(ptcls) for i in ptcls]	# this implements bootstrap resampling of the class-average
 			if options.odd : ptcls=[i for i in ptcls if i%2==1]
 			if options.even: ptcls=[i for i in ptcls if i%2==0]
@@ -222,11 +231,9 @@ def main():
 								y=pnums[n]		# actual particle number
 
 								# find the matching class in the existing classification matrix
-								for x in range(classmx[0]["nx"]):
-									if classmx[0][x,y]==rslt[1]["n"] :		# if the class number in the classmx matches the current class-average number
-										break
-								else :
-									print("Resultmx error: no match found ! (%d %d %d)"%(x,y,rslt[1]["n"]))
+								x=cmxidx.column(rslt[1]["n"],y)
+								if x<0 :
+									print("Resultmx error: no match found ! (%d %d)"%(y,rslt[1]["n"]))
 									continue
 								xform=info[1].get_params("2d")
 								classmx[1][x,y]=info[2]					# used
@@ -291,11 +298,9 @@ def main():
 						y=pnums[n]		# actual particle number
 
 						# find the matching class in the existing classification matrix
-						for x in range(classmx[0]["nx"]):
-							if classmx[0][x,y]==rslt["n"] :		# if the class number in the classmx matches the current class-average number
-								break
-						else :
-							print("Resultmx error: no match found ! (%d %d %d)"%(x,y,rslt[1]["n"]))
+						x=cmxidx.column(rslt["n"],y)
+						if x<0 :
+							print("Resultmx error: no match found ! (%d %d)"%(y,rslt["n"]))
 							continue
 						xform=info[1].get_params("2d")
 						classmx[1][x,y]=info[2]					# used
@@ -694,10 +699,10 @@ def class_average(images,ref=None,focused=None,niter=1,normproc=("normalize.edge
 	return [ref,ptcl_info]
 
 def classmx_ptcls(classmx,n):
-	"""Scans a classmx file to determine which images are in a specific class. classmx may be a filename or an EMData object.
-	returns a list of integers"""
+	"""Determines which images are in a specific class. classmx may be a filename, in which case the cached ClassMxIndex is
+	used, or an EMData object, which is scanned. returns a list of integers"""
 
-	if isinstance(classmx,str) : classmx=EMData(classmx,0)
+	if isinstance(classmx,str) : return ClassMxIndex(classmx).members(n)
 
 	plist=[i.y for i in classmx.find_pixels_with_value(float(n))]
 
@@ -35,6 +35,7 @@ from __future__ import division
 from builtins import range
 import os, re
 from EMAN2 import *
+from EMAN2_utils import ClassMxIndex
 import traceback
 
 def main():
@@ -89,30 +90,17 @@ e2classextract.py --orientcls refine_03/cls_result_04 --orientedparticles sets/a
 	logid=E2init(sys.argv)
 
 	if options.orientedparticles!=None:
-		# each of these classmx variables becomes a 2 element list with even and odd particles respectively
+		# classmx becomes a 2 element list of class membership indices with even and odd particles respectively
 		if options.orientcls==None : 
 			print("--orientedparticles also requires --orientcls")
 			sys.exit(1)
 			
 		try:
 			if options.evenoddmerge:
-				pathmx="{}_even.hdf".format(options.orientcls)
-			else: pathmx=options.orientcls
-			classmx=[EMData(pathmx,0)]
-			nptcl=[classmx[0]["ny"]]
-			cmxtx=[EMData(pathmx,2)]
-			cmxty=[EMData(pathmx,3)]
-			cmxalpha=[EMData(pathmx,4)]
-			cmxmirror=[EMData(pathmx,5)]
-
-			if options.evenoddmerge:
-				pathmx="{}_odd.hdf".format(options.orientcls)
-				classmx.append(EMData(pathmx,0))
-				nptcl.append(classmx[1]["ny"])
-				cmxtx.append(EMData(pathmx,2))
-				cmxty.append(EMData(pathmx,3))
-				cmxalpha.append(EMData(pathmx,4))
-				cmxmirror.append(EMData(pathmx,5))
+				pathmx=["{}_even.hdf".format(options.orientcls),"{}_odd.hdf".format(options.orientcls)]
+			else: pathmx=[options.orientcls]
+			classmx=[ClassMxIndex(f) for f in pathmx]
+			if any(i.ali is None for i in classmx) : raise Exception("no alignments in classmx")
 		except:
 			traceback.print_exc()
 			print("====\nError reading classification matrix. Must be full classification matrix with alignments")
@@ -124,7 +112,7 @@ e2classextract.py --orientcls refine_03/cls_result_04 --orientedparticles sets/a
 		else:
 			cptcl=[options.orientedparticles]
 
-		nref=int(classmx[0]["maximum"])+1
+		nref=classmx[0].ncls
 
 		if options.orientclassn==None : rng=list(range(nref))
 		else : rng=[int(i) for i in options.orientclassn.split(",")]
@@ -137,8 +125,8 @@ e2classextract.py --orientcls refine_03/cls_result_04 --orientedparticles sets/a
 				outname="classptcl_{:04d}.hdf".format(i)
 #				else : outname="classptcl_{:04d}_{}.hdf".format(i,("even","odd")[eo])
 				
-				for j in range(nptcl[eo]):
-					if classmx[eo][0,j]!=i : continue		# only proceed if the particle is in this class
+				# only the particles in this class (the first classmx column)
+				for j,ptclxf in zip(classmx[eo].members(i,0),classmx[eo].xforms(i,0)):
 					if options.verbose: print("{}\t{}\t{}".format(i,("even","odd")[eo],j))
 
 					try: ptcl=EMData(cptcl[eo],j)
@@ -146,8 +134,7 @@ e2classextract.py --orientcls refine_03/cls_result_04 --orientedparticles sets/a
 						print("Error reading: ",cptcl[eo],j)
 						sys.exit(1)
 
-					# Find the transform for this particle (2d) and apply it
-					ptclxf=Transform({"type":"2d","alpha":cmxalpha[eo][0,j],"mirror":int(cmxmirror[eo][0,j]),"tx":cmxtx[eo][0,j],"ty":cmxty[eo][0,j]})
+					# Apply the transform for this particle (2d)
 					ptclx=ptcl.process("xform",{"transform":ptclxf})
 
 					ptclx.write_image(outname,-1)
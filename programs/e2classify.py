@@ -39,6 +39,8 @@ import os
 import sys
 from EMAN2db import db_check_dict
 from EMAN2 import *
+from EMAN2_utils import is_simmx_topk,simmx_topk_to_classmx,simmx_dense_to_classmx,simmx_read_rows
+import numpy as np
 
 def main():
 	
@@ -55,6 +57,7 @@ def main():
 
 	The similarity matrix is a stack of 1 or 5 images: similarity, dx,dy,dalpha,mirror.
 	The output is 6 images: class, weight, dx, dy, dalpha, mirror).
+	A sparse similarity matrix produced with e2simmx.py --topk may also be used, so long as --sep is not larger than k.
 	See the wiki for more complete documentation of the files.
 	"""
 	
@@ -66,6 +69,7 @@ def main():
 	parser.add_argument("--nofilecheck",action="store_true",help="Turns file checking off in the check functionality - used by e2refine.py.",default=False)
 	parser.add_argument("--check","-c",action="store_true",help="Performs a command line argument check only.",default=False)
 	parser.add_argument("--noalign",action="store_true",help="Ignore the alignments",default=False)
+	parser.add_argument("--threads", default=1,type=int,help="Number of threads used to classify blocks of the similarity matrix in parallel")
 	parser.add_argument("--ppid", type=int, help="Set the PID of the parent process, used for cross platform PPID",default=-1)
 
 	(options, args) = parser.parse_args()
@@ -100,6 +104,17 @@ def main():
 		if (options.force):
 			remove_file(args[1])
 
+	# sparse matrices already contain the best classes for each particle in order
+	if is_simmx_topk(args[0]):
+		if options.simvec :
+			print("Error: --simvec requires a full similarity matrix")
+			sys.exit(1)
+		clsmx=simmx_topk_to_classmx(args[0],options.sep)
+		print("Classification complete, writing classmx")
+		EMData.write_images(args[1],clsmx)
+		E2end(E2n)
+		return
+
 	num_sim =  EMUtil.get_image_count(args[0])
 	if (num_sim < 5):
 		print("Warning, similarity matrix did not contain alignments, neither will the classification matrix")
@@ -107,26 +122,23 @@ def main():
 	tmp=EMData(args[0],0,True)
 	nptcl=tmp["ny"]
 	nref=tmp["nx"]
-	if num_sim==5:
-		clsmx=(EMData(options.sep,nptcl),EMData(options.sep,nptcl),EMData(options.sep,nptcl),EMData(options.sep,nptcl),EMData(options.sep,nptcl),EMData(options.sep,nptcl))
-	elif num_sim==6:
-		clsmx=(EMData(options.sep,nptcl),EMData(options.sep,nptcl),EMData(options.sep,nptcl),EMData(options.sep,nptcl),EMData(options.sep,nptcl),EMData(options.sep,nptcl),EMData(options.sep,nptcl))		
-	else :
-		clsmx=(EMData(options.sep,nptcl),EMData(options.sep,nptcl))
+	chunk=4096		# rows of the simmx read at once
 
 	# preparation for the simvec option. This finds all particles with a peak value corresponding to a particular orientation
 	# and then computes an average similarity vector (across all references).
+	scorefn=None
 	if options.simvec:
 		print("Computing average unit vectors")
 		
 		bvecs={}
 		# compile vector sums for each class
-		for y in range(nptcl):
-			im=EMData(args[0],0,False,Region(0,y,nref,1))
-			N=im.calc_min_index()
-			im.process_inplace("normalize")
-			try: bvecs[N].add(im)
-			except: bvecs[N]=im
+		for r0 in range(0,nptcl,chunk):
+			for row in simmx_read_rows(args[0],r0,min(chunk,nptcl-r0),1)[0]:
+				im=from_numpy(row.copy())
+				N=int(np.argmin(row))
+				im.process_inplace("normalize")
+				try: bvecs[N].add(im)
+				except: bvecs[N]=im
 
 		# normalize all vector sums
 		for im in list(bvecs.values()): 
@@ -140,57 +152,24 @@ def main():
 			#except: pass
 			
 		#mx.write_image("simvec.hdf",0)
-		
-		
-		
-	simmx=(EMData(),EMData(),EMData(),EMData(),EMData(),EMData())
-	for iptcl in range(nptcl):
-		simmx[0].read_image(args[0],0,False,Region(0,iptcl,nref,1))
-		if num_sim>=5 :
-			simmx[1].read_image(args[0],1,False,Region(0,iptcl,nref,1))		#tx
-			simmx[2].read_image(args[0],2,False,Region(0,iptcl,nref,1))		#ty
-			simmx[3].read_image(args[0],3,False,Region(0,iptcl,nref,1))		#dalpha
-			simmx[4].read_image(args[0],4,False,Region(0,iptcl,nref,1))		#mirror
-			try:
-				simmx[5].read_image(args[0],5,False,Region(0,iptcl,nref,1))		#scale
-			except: pass
-		
-		# We replace simmx[0] with a new version computed via average vectors
-		if options.simvec:
-			newmx=simmx[0].copy()
-			for i in range(newmx["nx"]):
-				try: 
-#					simmx[0][i]=newmx.cmp("ccc",bvecs[i])
-					simmx[0][i]=newmx.cmp("sqeuclidean",bvecs[i],{"normto":1})
-				except: simmx[0][i]=100000.0		# bad value if we have no reference
-		
-		#hmmm, this code is pretty silly, but harmless, I suppose...
-		maximum=simmx[0]["maximum"]
-		for ic in range(options.sep):
-			cls=simmx[0].calc_min_index()
-			clsmx[0][ic,iptcl]=cls
-			clsmx[1][ic,iptcl]=1.0		# weight
-			if num_sim>=5:
-				clsmx[2][ic,iptcl]=simmx[1][cls]
-				clsmx[3][ic,iptcl]=simmx[2][cls]
-				clsmx[4][ic,iptcl]=simmx[3][cls]
-				clsmx[5][ic,iptcl]=simmx[4][cls]
-				if num_sim>5 : clsmx[6][ic,iptcl]=simmx[5][cls]
-			simmx[0][cls]=maximum		# this is so the next minimum search gets the next highest value
-			
-		E2end(E2n)
+
+		# We replace the similarity values with new ones computed via average vectors
+		def scorefn(score,r0):
+			ret=np.empty_like(score)
+			for y in range(len(score)):
+				newmx=from_numpy(score[y].copy())
+				for i in range(nref):
+					try: ret[y,i]=newmx.cmp("sqeuclidean",bvecs[i],{"normto":1})
+					except: ret[y,i]=100000.0		# bad value if we have no reference
+			return ret
+
+	# the sep best classes for each particle, found a block of rows at a time
+	clsmx=simmx_dense_to_classmx(args[0],options.sep,options.threads,chunk,scorefn)
 
 	print("Classification complete, writing classmx")
-	clsmx[0].write_image(args[1],0)
-	clsmx[1].write_image(args[1],1)
-	if num_sim>=5 :
-		clsmx[2].write_image(args[1],2)
-		clsmx[3].write_image(args[1],3)
-		clsmx[4].write_image(args[1],4)
-		clsmx[5].write_image(args[1],5)
-		if num_sim>5 : clsmx[6].write_image(args[1],6)
-		
-	
+	EMData.write_images(args[1],clsmx)
+
+	E2end(E2n)
 
 def check(options,verbose):
 	error = False
@@ -215,6 +194,7 @@ def check(options,verbose):
 			error = True
 		else:
 			num_sim =  EMUtil.get_image_count(options.simmxfile)
+			if is_simmx_topk(options.simmxfile) : num_sim-=1		# sparse matrices have an extra image for the reference number
 			if (num_sim<5):
 				if verbose>0:
 					print("Error, the similarity matrix did not contain 5 images - be sure to use the --saveali argument when running e2simmx.py")
@@ -45,6 +45,7 @@ from os import system
 from os import unlink
 from sys import argv
 from EMAN2 import *
+from EMAN2_utils import ClassMxIndex
 from EMAN2db import db_open_dict
 
 def main():
@@ -94,12 +95,9 @@ e2classifyligand.py sets/myset_even.lst refine_01/classmx_04_even.hdf refine_01/
 
 
 	try:
-		classmx=EMData(args[1],0)
-		nptcl=classmx["ny"]
-		cmxtx=EMData(args[1],2)
-		cmxty=EMData(args[1],3)
-		cmxalpha=EMData(args[1],4)
-		cmxmirror=EMData(args[1],5)
+		classmx=ClassMxIndex(args[1])
+		nptcl=classmx.nptcl
+		if classmx.ali is None : raise Exception("no alignments in classmx")
 	except:
 		print("Error reading classification matrix. Must be full classification matrix with alignments")
 		sys.exit(1)
@@ -176,9 +174,7 @@ e2classifyligand.py sets/myset_even.lst refine_01/classmx_04_even.hdf refine_01/
 		statr2=[]
 		statm=[]
 		nalis=0
-		for j in range(nptcl):
-			if classmx[0,j]!=i : continue		# only proceed if the particle is in this class
-
+		for j,ptclxf in zip(classmx.members(i,0),classmx.xforms(i,0)):		# only the particles in this class
 			try: ptcl=EMData(args[0],j)
 			except: 
 				print("Cannot read particle {} from {}. This should not happen. Using correct input file?".format(j,args[0]))
@@ -186,7 +182,6 @@ e2classifyligand.py sets/myset_even.lst refine_01/classmx_04_even.hdf refine_01/
 			if options.process!=None :
 				popt=parsemodopt(options.process)
 				ptcl.process_inplace(popt[0],popt[1])
-			ptclxf=Transform({"type":"2d","alpha":cmxalpha[0,j],"mirror":int(cmxmirror[0,j]),"tx":cmxtx[0,j],"ty":cmxty[0,j]})
 
 			statn.append(j)
 
@@ -46,6 +46,9 @@ from sys import argv
 from time import sleep,time,ctime
 import threading
 import queue
+import traceback
+from future.utils import raise_
+from EMAN2_executor import EMExecutor
 import numpy as np
 from sklearn import linear_model
 from scipy import optimize
@@ -128,6 +131,16 @@ def main():
 
 	parser.add_argument("--threads", default=4,type=int,help="Number of threads to run in parallel. The default is 4, and our alignment routine requires 2+ threads. Using more threads will result in faster processing times.", guitype='intbox', row=28, col=0, rowspan=1, colspan=1, mode="align,tomo")
 
+	parser.add_argument("--streaming", default=False, action="store_true", help="Process movies through a streaming pipeline. Frames are read and corrected in a background thread, only the tile FFTs of the last --ccfwindow frames are kept, and frames are read a second time to produce aligned averages. Memory use is then independent of the number of frames.")
+	parser.add_argument("--ccfwindow", type=int, default=0, help="Only compute CCFs between frames at most this far apart in the sequence. Default (0) computes all n(n-1)/2 pairs.")
+	parser.add_argument("--prefetch", type=int, default=2, help="With --streaming, number of corrected frames read ahead of processing. Default=2")
+	parser.add_argument("--moviethreads", type=int, default=1, help="With --streaming, number of movies to process concurrently. All movies share the --threads worker threads. Default=1")
+	parser.add_argument("--maxmem", type=float, default=0, help="With --streaming, total memory in GB available to concurrently processed movies. A movie only starts once its estimated memory is available. Default (0) is unlimited.")
+
+	parser.add_argument("--batch", default=False, action="store_true", help="Process movies through a pipeline of reader, alignment and writer stages running concurrently on different movies, so disk I/O overlaps with alignment. Reports the throughput of each stage when done.")
+	parser.add_argument("--batchqueue", type=int, default=1, help="With --batch, maximum number of movies (held in memory) waiting between stages. Default=1")
+	parser.add_argument("--skipexisting", default=False, action="store_true", help="With --batch, skip movies whose outputs all exist, so an interrupted run can be resumed.")
+
 	parser.add_argument("--verbose", "-v", dest="verbose", action="store", metavar="n", type=int, default=4, help="verbose level [0-9], higner number means higher level of verboseness",guitype="intbox",row=28,col=1,rowspan=1,colspan=1,mode="align,tomo")
 	parser.add_argument("--debug", default=False, action="store_true", help="run with debugging output")
 	parser.add_argument("--ppid", type=int, help="Set the PID of the parent process, used for cross platform PPID",default=-2)
@@ -179,6 +192,10 @@ def main():
 			print("Error: --bad_rows contains nonnumeric input.")
 			sys.exit(1)
 
+	if options.batch and options.streaming:
+		print("Error: --batch and --streaming are alternative ways of processing multiple movies. Please choose one.")
+		sys.exit(1)
+
 	if options.align_frames and options.realign:
 		print("Error: Running --align_frames and --realign would remove any existing alignment.")
 		print("If you wish to do so, simply run with --align_frames only. Otherwise, use --realign.")
@@ -428,6 +445,7 @@ def main():
 		db.close()
 
 	# the user may provide multiple movies to process at once
+	stream=[]
 	for idx,fsp in enumerate(sorted(args)):
 		print("Processing {}".format(base_name(fsp,nodir=True)))
 
@@ -479,28 +497,18 @@ def main():
 
 		if flast > n : flast = n
 
-		process_movie(options, fsp, dark, gain, first, flast, step, idx)
+		if options.streaming or options.batch : stream.append((fsp,flast,idx))
+		else : process_movie(options, fsp, dark, gain, first, flast, step, idx)
+
+	if options.batch : process_movies_batch(options, stream, dark, gain, first, step)
+	elif stream : process_movies_stream(options, stream, dark, gain, first, step)
 
 	print("Done")
 	E2end(pid)
 
 
 def process_movie(options,fsp,dark,gain,first,flast,step,idx):
-	cwd = os.getcwd()
-
-	# format outname
-	if options.frames: outname="{}/{}_{}".format(cwd,base_name(fsp,nodir=True),options.suffix) #Output contents vary with options
-	else: outname="{}/{}".format(cwd,base_name(fsp,nodir=True))
-
-	if options.groupby > 1: outname = "{}_group{}".format(outname,options.groupby)
-
-	if options.ext == "mrc": outname = "{}.mrcs".format(outname)
-	else: outname = "{}.{}".format(outname,options.ext)
-
-	# prepare to read file
-	if fsp[-4:].lower() in (".mrc"):
-		hdr=EMData(fsp,0,True)			# read header
-		nx,ny=hdr["nx"],hdr["ny"]
+	outname=frames_outname(options,fsp)
 
 	# bgsub and gain correct the stack
 	outim=[]
@@ -511,25 +519,7 @@ def process_movie(options,fsp,dark,gain,first,flast,step,idx):
 			sys.stdout.write(" {}/{}   \r".format(ii-first+1,flast-first+1))
 			sys.stdout.flush()
 
-		if fsp[-4:].lower() in (".mrc") :
-		#if fsp[-4:].lower() in (".mrc") :
-			im=EMData(fsp,0,False,Region(0,0,ii,nx,ny,1))
-		else: im=EMData(fsp,ii)
-
-		if dark!=None : im.sub(dark)
-		if gain!=None : im.mult(gain)
-		#im.process_inplace("threshold.clampminmax",{"minval":0,"maxval":im["mean"]+im["sigma"]*3.5,"tozero":1})
-		if options.de64: im.process_inplace( "threshold.clampminmax", { "minval" : im[ 'minimum' ], "maxval" : im[ 'mean' ] + 8.0 * im[ 'sigma' ], "tomean" : True } )
-		#if options.fixbadpixels : im.process_inplace("threshold.outlier.localmean",{"sigma":3.5,"fix_zero":1}) # fixes clear outliers as well as values which were exactly zero
-
-		#im.process_inplace("threshold.clampminmax.nsigma",{"nsigma":3.0})
-#			im.mult(-1.0)
-		#if options.normalize: im.process_inplace("normalize.edgemean")
-
-		if options.bad_rows != [] or options.bad_columns != []:
-			im = im.process("math.xybadlines",{"rows":options.bad_rows,"cols":options.bad_columns})
-
-		outim.append(im)
+		outim.append(correct_frame(options,read_frame(fsp,ii),dark,gain))
 
 	nfs_read = len(outim)
 
@@ -587,72 +577,30 @@ def process_movie(options,fsp,dark,gain,first,flast,step,idx):
 
 		print("{} frames read ({} x {}). Grouped by {}.".format(nfs_read,nx,ny,options.groupby,n))
 
-		ccfs=queue.Queue(0)
+		with EMExecutor(options.threads) as ex:
+			# prepare image data (outim) by clipping and FFT'ing all tiles (this is threaded as well)
+			sys.stdout.write("\rPrecompute  /{} FFTs".format(n))
+			t0=time()
 
-		# prepare image data (outim) by clipping and FFT'ing all tiles (this is threaded as well)
-		immx=[0]*n
-		thds = []
-		for i in range(n):
-			thd = threading.Thread(target=split_fft,args=(options,outim[i],i,options.optbox,options.optstep,ccfs))
-			thds.append(thd)
-		sys.stdout.write("\rPrecompute  /{} FFTs".format(len(thds)))
-		t0=time()
-
-		thrtolaunch=0
-		while thrtolaunch<len(thds) or threading.active_count()>1:
-			if thrtolaunch<len(thds) :
-				while (threading.active_count()==options.threads ) : sleep(.01)
-				#if options.verbose :
-				#	sys.stdout.write("\rPrecompute {}/{} FFTs {}".format(thrtolaunch+1,len(thds),threading.active_count()))
-				#	sys.stdout.flush()
-				thds[thrtolaunch].start()
-				thrtolaunch+=1
-			else: sleep(0.5)
-
-			while not ccfs.empty():
-				i,d=ccfs.get()
-				immx[i]=d
-
-		for th in thds: th.join()
-		print()
+			immx=list(ex.map(split_fft,[(options,outim[i],i,options.optbox,options.optstep) for i in range(n)]))
+			print()
 
-		# create threads
-		thds=[]
-		peak_locs=queue.Queue(0)
-		i=-1
-		for ima in range(n-1):
-			for imb in range(ima+1,n):
+			# create jobs
+			jobs=[]
+			i=-1
+			for ima,imb in ccf_pairs(n,ccf_window(options,n)):
 				if options.verbose>3: i+=1		# if i>0 then it will write pre-processed CCF images to disk for debugging
-				thds.append(threading.Thread(target=calc_ccf_wrapper,args=(options,(ima,imb),options.optbox,options.optstep,immx[ima],immx[imb],ccfs,peak_locs,i,fsp)))
-
-		print("{:1.1f} s\nCompute {} ccfs".format(time()-t0,len(thds)))
-		t0=time()
+				jobs.append((options,(ima,imb),options.optbox,options.optstep,immx[ima],immx[imb],i,fsp))
 
-		# here we run the threads and save the results, no actual alignment done here
-		csum2={}
-
-		thrtolaunch=0
-		while thrtolaunch<len(thds) or threading.active_count()>1:
-			# If we haven't launched all threads yet, then we wait for an empty slot, and launch another
-			# note that it's ok that we wait here forever, since there can't be new results if an existing
-			# thread hasn't finished.
-			if thrtolaunch<len(thds) :
-				while (threading.active_count()==options.threads ) : sleep(.01)
-				#if options.verbose : print "Starting thread {}/{}".format(thrtolaunch,len(thds))
-				thds[thrtolaunch].start()
-				thrtolaunch+=1
-			else:
-				sleep(0.5)
-
-			while not ccfs.empty():
-				i,d=ccfs.get()
-				csum2[i]=d
-
-			if options.verbose:
-				sys.stdout.write("\r  {}/{} ({})".format(thrtolaunch,len(thds),threading.active_count()))
-				sys.stdout.flush()
+			print("{:1.1f} s\nCompute {} ccfs".format(time()-t0,len(jobs)))
+			t0=time()
 
-		for th in thds: th.join()
+			# here we run the jobs and save the results, no actual alignment done here
+			csum2={}
+			peak_locs={}
+			for N,csum,loc in ex.map(calc_ccf_wrapper,jobs,ordered=False,verbose=options.verbose):
+				csum2[N]=csum
+				peak_locs[N]=loc
 		print()
 
 		avgr=Averagers.get("minmax",{"max":0})
@@ -669,8 +617,6 @@ def process_movie(options,fsp,dark,gain,first,flast,step,idx):
 		print("{:1.1f} s\nAlign {} frames".format(time()-t0,n))
 		t0=time()
 
-		peak_locs = {p[0]:p[1] for p in peak_locs.queue}
-
 		if options.debug and options.verbose == 9:
 			print("PEAK LOCATIONS:")
 			for l in list(peak_locs.keys()):
@@ -688,48 +634,7 @@ def process_movie(options,fsp,dark,gain,first,flast,step,idx):
 		# 	ccmean = np.mean(vals)
 		# 	ccstd = np.std(vals)
 
-		m = old_div(n*(n-1),2)
-		bx = np.ones(m)
-		by = np.ones(m)
-		A = np.zeros([m,n]) # coefficient matrix
-		for ima,(i,j) in enumerate(sorted(peak_locs.keys())):
-			for imb in range(i,j):
-				try:
-					bx[ima] = peak_locs[(i,j)][0]
-					by[ima] = peak_locs[(i,j)][1]
-					A[ima,imb] = 1
-					#A[ima,imb] = float(n-np.fabs(i-j))/n
-					#A[ima,imb] = np.exp(1-peak_locs[(i,j)][3])
-					#A[ima,imb] = sqrt(float(n-fabs(i-j))/n)
-				except:
-					pass # CCF peak was not found
-		b = np.c_[bx,by]
-		A = np.asmatrix(A)
-		b = np.asmatrix(b)
-
-		# remove all zero rows from A and corresponding entries in b
-		z = np.argwhere(np.all(A==0,axis=1))
-		A = np.delete(A,z,axis=0)
-		b = np.delete(b,z,axis=0)
-
-		regr = linear_model.Ridge(alpha=options.optalpha,normalize=True,fit_intercept=True)
-		regr.fit(A,b)
-
-		traj = regr.predict(np.tri(n))
-		#shifts = regr.predict(np.eye(n))-options.optbox/2
-
-		traj -= traj[0]
-
-		if options.round == "int": traj = np.round(traj,0)#.astype(np.int8)
-
-		locs = traj.ravel()
-		quals=[0]*n # quality of each frame based on its correlation peak summed over all images
-		cen=old_div(options.optbox,2) #csum2[(0,1)]["nx"]/2
-		for i in range(n-1):
-			for j in range(i+1,n):
-				val=csum2[(i,j)].sget_value_at_interp(int(cen+locs[j*2]-locs[i*2]),int(cen+locs[j*2+1]-locs[i*2+1]))*sqrt(old_div(float(n-fabs(i-j)),n))
-				quals[i]+=val
-				quals[j]+=val
+		traj,locs,quals=solve_alignment(options,csum2,peak_locs,n)
 
 		print("{:1.1f} s".format(time()-t0,n))
 
@@ -777,25 +682,7 @@ def process_movie(options,fsp,dark,gain,first,flast,step,idx):
 		#out.close
 
 		# store alignment parameters
-		if options.tomo:
-			db=js_open_dict(info_name(options.tomo_name,nodir=True))
-			db[idx]["ddd_alignment_trans"]=[i for i in locs]
-			db[idx]["ddd_alignment_qual"]=[q for q in quals]
-			db[idx]["ddd_alignment_time"]=runtime
-			db[idx]["ddd_alignment_precision"]=options.round
-			db[idx]["ddd_alignment_optbox"]=options.optbox
-			db[idx]["ddd_alignment_optstep"]=options.optstep
-			db[idx]["ddd_alignment_optalpha"]=options.optalpha
-		else:
-			db=js_open_dict(info_name(fsp,nodir=True))
-			db["ddd_alignment_trans"]=[i for i in locs]
-			db["ddd_alignment_qual"]=[q for q in quals]
-			db["ddd_alignment_time"]=runtime
-			db["ddd_alignment_precision"]=options.round
-			db["ddd_alignment_optbox"]=options.optbox
-			db["ddd_alignment_optstep"]=options.optstep
-			db["ddd_alignment_optalpha"]=options.optalpha
-		db.close()
+		store_alignment(options,fsp,idx,locs,quals,runtime)
 
 		# if options.plot:
 		# 	import matplotlib.pyplot as plt
@@ -899,8 +786,490 @@ def process_movie(options,fsp,dark,gain,first,flast,step,idx):
 		except:
 			print("Error: Could not find prior alignment for {}. Exiting".format(fsp,nodir=True))
 
+def frames_outname(options,fsp):
+	"""Filename for the --frames output of a movie"""
+	cwd = os.getcwd()
+	if options.frames: outname="{}/{}_{}".format(cwd,base_name(fsp,nodir=True),options.suffix) #Output contents vary with options
+	else: outname="{}/{}".format(cwd,base_name(fsp,nodir=True))
+
+	if options.groupby > 1: outname = "{}_group{}".format(outname,options.groupby)
+
+	if options.ext == "mrc": outname = "{}.mrcs".format(outname)
+	else: outname = "{}.{}".format(outname,options.ext)
+	return outname
+
+def read_frame(fsp,ii):
+	"""Reads frame ii of a movie. .mrc files are treated as a 3D stack of frames"""
+	if fsp[-4:].lower() in (".mrc") :
+		hdr=EMData(fsp,0,True)
+		return EMData(fsp,0,False,Region(0,0,ii,hdr["nx"],hdr["ny"],1))
+	return EMData(fsp,ii)
+
+def correct_frame(options,im,dark,gain):
+	"""Applies dark, gain and bad line correction to a single frame. Returns the corrected frame, which may or may not be im"""
+	if dark!=None : im.sub(dark)
+	if gain!=None : im.mult(gain)
+	#im.process_inplace("threshold.clampminmax",{"minval":0,"maxval":im["mean"]+im["sigma"]*3.5,"tozero":1})
+	if options.de64: im.process_inplace( "threshold.clampminmax", { "minval" : im[ 'minimum' ], "maxval" : im[ 'mean' ] + 8.0 * im[ 'sigma' ], "tomean" : True } )
+	#if options.fixbadpixels : im.process_inplace("threshold.outlier.localmean",{"sigma":3.5,"fix_zero":1}) # fixes clear outliers as well as values which were exactly zero
+
+	if options.bad_rows != [] or options.bad_columns != []:
+		im = im.process("math.xybadlines",{"rows":options.bad_rows,"cols":options.bad_columns})
+	return im
+
+class FrameReader(object):
+	"""Iterating over a FrameReader yields the corrected frames first,flast,step of a movie. Frames are read and corrected in
+a background thread, which stays at most prefetch frames ahead of the consumer. Each iteration reads the movie again."""
+
+	def __init__(self,options,fsp,dark,gain,first,flast,step,prefetch=2):
+		self.options=options
+		self.fsp=fsp
+		self.dark=dark
+		self.gain=gain
+		self.frames=list(range(first,flast,step))
+		self.prefetch=max(1,prefetch)
+
+	def __len__(self): return len(self.frames)
+
+	def __iter__(self):
+		q=queue.Queue(self.prefetch)
+		thr=threading.Thread(target=self._read,args=(q,))
+		thr.daemon=True
+		thr.start()
+		while 1:
+			ok,im=q.get()
+			if not ok : raise_(im[0],im[1],im[2])
+			if im is None : break
+			yield im
+		thr.join()
+
+	def _read(self,q):
+		try:
+			for ii in self.frames: q.put((True,correct_frame(self.options,read_frame(self.fsp,ii),self.dark,self.gain)))
+			q.put((True,None))
+		except: q.put((False,sys.exc_info()))
+
+def group_frames(frames,groupby):
+	"""Moving window average of groupby frames from an iterable of frames. Like process_movie, there is one output per input
+frame, and the last groupby-1 outputs average fewer frames"""
+	if groupby<=1 :
+		for im in frames: yield im
+		return
+	win=[]
+	for im in frames:
+		win.append(im)
+		if len(win)==groupby:
+			yield qsum(win)
+			win.pop(0)
+	while len(win)>0 :
+		yield qsum(win)
+		win.pop(0)
+
+def ccf_window(options,n):
+	"""Maximum separation of frames in a CCF pair"""
+	if options.ccfwindow<=0 : return n-1
+	return min(options.ccfwindow,n-1)
+
+def ccf_pairs(n,w):
+	"""(i,j) frame pairs with i<j<=i+w in the same order as the full all-vs-all loop"""
+	for i in range(n-1):
+		for j in range(i+1,min(n,i+w+1)): yield (i,j)
+
+def solve_alignment(options,csum2,peak_locs,n):
+	"""Finds the trajectory of n frames from pairwise CCF peak locations by regularized regression. peak_locs and csum2
+are keyed by (i,j) and may contain any subset of pairs. Returns (traj,locs,quals)"""
+	m = len(peak_locs)
+	bx = np.ones(m)
+	by = np.ones(m)
+	A = np.zeros([m,n]) # coefficient matrix
+	for ima,(i,j) in enumerate(sorted(peak_locs.keys())):
+		for imb in range(i,j):
+			try:
+				bx[ima] = peak_locs[(i,j)][0]
+				by[ima] = peak_locs[(i,j)][1]
+				A[ima,imb] = 1
+				#A[ima,imb] = float(n-np.fabs(i-j))/n
+				#A[ima,imb] = np.exp(1-peak_locs[(i,j)][3])
+				#A[ima,imb] = sqrt(float(n-fabs(i-j))/n)
+			except:
+				pass # CCF peak was not found
+	b = np.c_[bx,by]
+	A = np.asmatrix(A)
+	b = np.asmatrix(b)
+
+	# remove all zero rows from A and corresponding entries in b
+	z = np.argwhere(np.all(A==0,axis=1))
+	A = np.delete(A,z,axis=0)
+	b = np.delete(b,z,axis=0)
+
+	regr = linear_model.Ridge(alpha=options.optalpha,normalize=True,fit_intercept=True)
+	regr.fit(A,b)
+
+	traj = regr.predict(np.tri(n))
+	#shifts = regr.predict(np.eye(n))-options.optbox/2
+
+	traj -= traj[0]
+
+	if options.round == "int": traj = np.round(traj,0)#.astype(np.int8)
+
+	locs = traj.ravel()
+	quals=[0]*n # quality of each frame based on its correlation peak summed over all images
+	cen=old_div(options.optbox,2) #csum2[(0,1)]["nx"]/2
+	for i,j in sorted(csum2.keys()):
+		val=csum2[(i,j)].sget_value_at_interp(int(cen+locs[j*2]-locs[i*2]),int(cen+locs[j*2+1]-locs[i*2+1]))*sqrt(old_div(float(n-fabs(i-j)),n))
+		quals[i]+=val
+		quals[j]+=val
+
+	return traj,locs,quals
+
+def store_alignment(options,fsp,idx,locs,quals,runtime):
+	"""Stores alignment parameters in the info file of the movie (or tilt series)"""
+	if options.tomo:
+		db=js_open_dict(info_name(options.tomo_name,nodir=True))
+		db[idx]["ddd_alignment_trans"]=[i for i in locs]
+		db[idx]["ddd_alignment_qual"]=[q for q in quals]
+		db[idx]["ddd_alignment_time"]=runtime
+		db[idx]["ddd_alignment_precision"]=options.round
+		db[idx]["ddd_alignment_optbox"]=options.optbox
+		db[idx]["ddd_alignment_optstep"]=options.optstep
+		db[idx]["ddd_alignment_optalpha"]=options.optalpha
+	else:
+		db=js_open_dict(info_name(fsp,nodir=True))
+		db["ddd_alignment_trans"]=[i for i in locs]
+		db["ddd_alignment_qual"]=[q for q in quals]
+		db["ddd_alignment_time"]=runtime
+		db["ddd_alignment_precision"]=options.round
+		db["ddd_alignment_optbox"]=options.optbox
+		db["ddd_alignment_optstep"]=options.optstep
+		db["ddd_alignment_optalpha"]=options.optalpha
+	db.close()
+
+def write_average(options,fsp,idx,tag,img):
+	"""Writes one of the averaged outputs of a movie, tag is eg - noali, allali"""
+	if options.tomo:
+		alioutname = os.path.join(".","tiltseries","{}__{}.hdf".format(base_name(options.tomo_name,nodir=True),tag))
+		img.write_image(alioutname,idx)
+	else:
+		# written under a temporary name first, so an interrupted run never leaves a partial output for --skipexisting to find
+		alioutname = os.path.join(".","micrographs","{}__{}.hdf".format(base_name(fsp,nodir=True),tag))
+		tmpname = os.path.join(".","micrographs","{}__{}_tmp.hdf".format(base_name(fsp,nodir=True),tag))
+		img.write_image(tmpname,0)
+		os.rename(tmpname,alioutname)
+
+class MemoryBudget(object):
+	"""Shared by concurrently processed movies. acquire() blocks until the requested number of bytes is available. A request
+larger than the total waits until nothing else is running. A total <=0 is unlimited."""
+
+	def __init__(self,total):
+		self.total=total
+		self.used=0
+		self.cond=threading.Condition()
+
+	def acquire(self,nbytes):
+		"""Returns the amount actually reserved, which must be passed to release()"""
+		if self.total<=0 : return 0
+		nbytes=min(nbytes,self.total)
+		with self.cond:
+			while self.used+nbytes>self.total : self.cond.wait()
+			self.used+=nbytes
+		return nbytes
+
+	def release(self,nbytes):
+		with self.cond:
+			self.used-=nbytes
+			self.cond.notify_all()
+
+def movie_memory(options,nx,ny,n):
+	"""Estimated peak memory use in bytes of process_movie_stream for a movie of n nx x ny frames"""
+	box=options.optbox
+	ntiles=len(range(box//2,nx-box,options.optstep))*len(range(box//2,ny-box,options.optstep))
+	fftsize=ntiles*(box+2)*box*4
+	w=ccf_window(options,n)
+	# frames: prefetched, in the groupby window, and being FFT'd
+	nfr=options.prefetch+options.groupby+options.threads+1
+	return nfr*nx*ny*4+(w+1+options.threads)*fftsize+n*w*box*box*4
+
+def process_movies_stream(options,movies,dark,gain,first,step):
+	"""Runs process_movie_stream on a list of (fsp,flast,idx). Up to --moviethreads movies are processed at once under a
+--maxmem memory budget, all sharing one pool of --threads worker threads. Tilt series are always processed in order."""
+	budget=MemoryBudget(options.maxmem*2**30)
+	with EMExecutor(options.threads,options.threads) as ex:		# small queue, each FFT job holds a full frame
+		def run_one(fsp,flast,idx):
+			hdr=EMData(fsp,0,True)
+			need=budget.acquire(movie_memory(options,hdr["nx"],hdr["ny"],len(range(first,flast,step))))
+			try: process_movie_stream(options,fsp,dark,gain,first,flast,step,idx,ex)
+			finally: budget.release(need)
+
+		nmovie=1 if options.tomo else max(1,options.moviethreads)
+		with EMExecutor(nmovie,nmovie) as mex:
+			mex.run(run_one,movies)
+
+def process_movie_stream(options,fsp,dark,gain,first,flast,step,idx,ex):
+	"""Streaming equivalent of process_movie. Frames come from a FrameReader, only the tile FFTs of the last --ccfwindow frames
+are kept while CCFs are computed, and the movie is read a second time to produce the aligned averages. ex is the EMExecutor
+used for FFTs and CCFs, and may be shared with other movies."""
+	start=time()
+	name=base_name(fsp,nodir=True)
+	outname=frames_outname(options,fsp)
+	reader=FrameReader(options,fsp,dark,gain,first,flast,step,options.prefetch)
+	n=len(reader)
+	align=options.align_frames and not options.realign
+	noali=Averagers.get("mean") if options.noali else None
+
+	def unaligned():
+		for im in reader:
+			if noali!=None : noali.add_image(im)
+			yield im
+
+	def frames():
+		# first pass over the movie, averaging unaligned frames and writing grouped frames on the way
+		for i,im in enumerate(group_frames(unaligned(),options.groupby)):
+			if options.frames and options.groupby>1 : im.write_image(outname,i)
+			yield im
+
+	if align:
+		locs,quals=align_movie(options,ex,fsp,idx,frames(),n)
+		print("{}: aligned in {:.1f} s".format(name,time()-start))
+	else:
+		for im in frames(): pass
+
+	if noali!=None : write_average(options,fsp,idx,"noali",noali.finish())
+	if options.frames and options.ext == "mrc":
+		os.rename(outname,outname.replace(".mrcs",".mrc"))
+
+	if not (options.align_frames or options.realign) : return
+
+	if not align:
+		try: locs,quals=load_alignment(options,fsp,idx)
+		except:
+			print("Error: Could not find prior alignment for {}".format(fsp))
+			return
+
+	outs=aligned_averagers(options,fsp,n,quals)
+	if len(outs)==0 : return
+
+	for i,im in enumerate(group_frames(reader,options.groupby)):
+		shift_frame(options,im,locs,i)
+		for tag,avgr,keep in outs:
+			if i in keep : avgr.add_image(im)
+
+	for tag,avgr,keep in outs:
+		write_average(options,fsp,idx,tag,avgr.finish())
+	print("{}: done in {:.1f} s".format(name,time()-start))
+
+def align_movie(options,ex,fsp,idx,frames,n):
+	"""Aligns n frames from the iterable frames, which may be a generator. FFTs and CCFs run on the EMExecutor ex, and only
+the tile FFTs of the last --ccfwindow frames are kept. The alignment is stored in the info file. Returns (locs,quals)"""
+	start=time()
+	hdr=EMData(fsp,0,True)
+	if min(hdr["nx"],hdr["ny"]) <= 2048:
+		print("This program does not facilitate alignment of movies with frames smaller than 2048x2048 pixels.")
+		sys.exit(1)
+
+	w=ccf_window(options,n)
+	if options.verbose : print("{}: aligning {} frames ({} x {}), {} CCFs".format(base_name(fsp,nodir=True),n,hdr["nx"],hdr["ny"],len(list(ccf_pairs(n,w)))))
+
+	ffts={}
+	csum2={}
+	peak_locs={}
+	ii=-1
+	ffts_in=((options,im,i,options.optbox,options.optstep) for i,im in enumerate(frames))
+	for i,fft in enumerate(ex.map(split_fft,ffts_in)):
+		ffts[i]=fft
+		jobs=[]
+		for j in range(max(0,i-w),i):
+			if options.verbose>3: ii+=1		# if ii>0 then it will write pre-processed CCF images to disk for debugging
+			jobs.append((options,(j,i),options.optbox,options.optstep,ffts[j],fft,ii,fsp))
+		for N,csum,loc in ex.map(calc_ccf_wrapper,jobs,ordered=False):
+			csum2[N]=csum
+			peak_locs[N]=loc
+		ffts.pop(i-w,None)		# no longer needed for any CCF
+	ffts=None
+
+	traj,locs,quals=solve_alignment(options,csum2,peak_locs,n)
+	store_alignment(options,fsp,idx,locs,quals,time()-start)
+	return locs,quals
+
+def load_alignment(options,fsp,idx):
+	"""Returns (locs,quals) from a previous alignment stored in the info file. quals is None if not stored. Raises an
+exception if there is no alignment"""
+	if options.tomo:
+		db=js_open_dict(info_name(options.tomo_name,nodir=True))
+		ali=db[idx]
+	else:
+		db=js_open_dict(info_name(fsp,nodir=True))
+		ali=db
+	locs=ali["ddd_alignment_trans"]
+	quals=ali.get("ddd_alignment_qual",None)
+	db.close()
+	return locs,quals
+
+def range_tag(options):
+	"""Output tag for --rangeali"""
+	rng=[int(i) for i in options.rangeali.split("-")]
+	return "{}-{}".format(rng[0],rng[1])
+
+def aligned_averagers(options,fsp,n,quals):
+	"""Returns a list of [tag,averager,set of frames to include] for each requested aligned average of n frames"""
+	outs=[]
+	if options.allali : outs.append(["allali",Averagers.get("mean"),set(range(n))])
+	for tag,frac in (("goodali",0.4),("bestali",0.6)):
+		if not getattr(options,tag) : continue
+		if quals==None :
+			print("Error: no frame quality for {}, cannot produce {}".format(fsp,tag))
+			continue
+		thr=(max(quals[1:])-min(quals))*frac+min(quals)	# max correlation cutoff for inclusion
+		keep=set([i for i in range(n) if quals[i]>thr])
+		if options.verbose : print("{}: keeping {}/{} frames for {}".format(base_name(fsp,nodir=True),len(keep),n,tag))
+		outs.append([tag,Averagers.get("mean"),keep])
+	if len(options.rangeali)>0:
+		rng=[int(i) for i in options.rangeali.split("-")]
+		outs.append([range_tag(options),Averagers.get("mean"),set(range(rng[0],rng[1]+1))])
+	return outs
+
+def shift_frame(options,im,locs,i):
+	"""Translates frame i in place by its alignment"""
+	if options.round == "int": im.translate(int(round(locs[i*2],0)),int(round(locs[i*2+1],0)),0)
+	else: im.translate(float(locs[i*2]),float(locs[i*2+1]),0)
+
+def movie_outputs(options,fsp):
+	"""List of the files produced for a single movie (not used for tilt series, which share files)"""
+	tags=[]
+	if options.noali : tags.append("noali")
+	if options.align_frames or options.realign :
+		tags.extend([t for t in ("allali","goodali","bestali") if getattr(options,t)])
+		if len(options.rangeali)>0 : tags.append(range_tag(options))
+	outs=[os.path.join(".","micrographs","{}__{}.hdf".format(base_name(fsp,nodir=True),t)) for t in tags]
+	if options.frames and options.groupby>1 :
+		outname=frames_outname(options,fsp)
+		if options.ext=="mrc" : outname=outname.replace(".mrcs",".mrc")
+		outs.append(outname)
+	return outs
+
+class MovieJob(object):
+	"""A single movie passing through the batch pipeline"""
+	def __init__(self,fsp,flast,idx):
+		self.fsp=fsp
+		self.flast=flast
+		self.idx=idx
+		self.frames=None		# corrected (and grouped) frames
+		self.noali=None			# unaligned average
+		self.locs=None
+		self.quals=None
+		self.nbytes=0			# size of the frames read
+
+class PipelineStage(object):
+	"""One stage of the batch pipeline. A thread takes jobs from inq, calls fn(job) and puts the job on outq. None marks the
+end of the input. An exception only drops the current movie, so one bad movie doesn't stop a large batch. Busy time and
+the amount of data handled are recorded for reporting throughput."""
+
+	def __init__(self,name,fn,inq,outq=None):
+		self.name=name
+		self.fn=fn
+		self.inq=inq
+		self.outq=outq
+		self.njobs=0
+		self.nbytes=0
+		self.busy=0.0
+		self.failed=[]
+		self.thread=threading.Thread(target=self._run)
+		self.thread.daemon=True
+		self.thread.start()
+
+	def _run(self):
+		while 1:
+			job=self.inq.get()
+			if job is None : break
+			t0=time()
+			try:
+				self.fn(job)
+			except:
+				# SystemExit is also caught here, as some checks call sys.exit()
+				print("Error in {} stage for {}: {}".format(self.name,job.fsp,sys.exc_info()[1]))
+				traceback.print_exc()
+				self.failed.append(job.fsp)
+				job=None
+			self.busy+=time()-t0
+			if job!=None :
+				self.njobs+=1
+				self.nbytes+=job.nbytes
+				if self.outq!=None : self.outq.put(job)
+		if self.outq!=None : self.outq.put(None)
+
+	def report(self,wall):
+		"""Returns a line of throughput statistics given the wall time of the whole run"""
+		rate=self.njobs*3600.0/self.busy if self.busy>0 else 0
+		return "{:6s} {:6d} movies  busy {:8.1f} s ({:3.0f}%)  {:7.1f} movies/hr busy  {:8.1f} MB/s".format(self.name,self.njobs,
+			self.busy,100.0*self.busy/max(wall,1e-6),rate,self.nbytes/max(self.busy,1e-6)/1.0e6)
+
+def process_movies_batch(options,movies,dark,gain,first,step):
+	"""Processes a list of (fsp,flast,idx) through a pipeline with a reader stage (read, dark/gain correct, group), an
+alignment stage (FFTs and CCFs on --threads threads) and a writer stage (shift, average and write outputs). Stages run
+concurrently on different movies, with at most --batchqueue movies waiting between stages. With --skipexisting, movies
+whose outputs all exist are skipped, so an interrupted run can be resumed."""
+	jobs=[]
+	for fsp,flast,idx in movies:
+		if options.skipexisting and not options.tomo :
+			outs=movie_outputs(options,fsp)
+			if len(outs)>0 and len([f for f in outs if not os.path.exists(f)])==0 : continue
+		jobs.append(MovieJob(fsp,flast,idx))
+	if len(jobs)<len(movies) : print("Skipping {} movies with existing outputs".format(len(movies)-len(jobs)))
+
+	with EMExecutor(options.threads) as ex:
+		def read(job):
+			reader=FrameReader(options,job.fsp,dark,gain,first,job.flast,step,options.prefetch)
+			raw=[]
+			if options.noali : noali=Averagers.get("mean")
+			for im in reader:
+				if options.noali : noali.add_image(im)
+				job.nbytes+=im["nx"]*im["ny"]*4
+				raw.append(im)
+			if options.noali : job.noali=noali.finish()
+			job.frames=list(group_frames(raw,options.groupby))
+
+		def align(job):
+			if options.align_frames and not options.realign :
+				job.locs,job.quals=align_movie(options,ex,job.fsp,job.idx,job.frames,len(job.frames))
+			elif options.realign :
+				job.locs,job.quals=load_alignment(options,job.fsp,job.idx)
+
+		def write(job):
+			if job.noali!=None : write_average(options,job.fsp,job.idx,"noali",job.noali)
+			if options.frames and options.groupby>1 :
+				outname=frames_outname(options,job.fsp)
+				if options.ext == "mrc" : final=outname.replace(".mrcs",".mrc")
+				else : final=outname
+				tmp="{}_tmp{}".format(*os.path.splitext(outname))
+				for i,im in enumerate(job.frames): im.write_image(tmp,i)
+				os.rename(tmp,final)
+			if job.locs!=None :
+				outs=aligned_averagers(options,job.fsp,len(job.frames),job.quals)
+				for i,im in enumerate(job.frames):
+					shift_frame(options,im,job.locs,i)
+					for tag,avgr,keep in outs:
+						if i in keep : avgr.add_image(im)
+				for tag,avgr,keep in outs:
+					write_average(options,job.fsp,job.idx,tag,avgr.finish())
+			job.frames=None
+			if options.verbose : print("{} done".format(base_name(job.fsp,nodir=True)))
+
+		start=time()
+		q0=queue.Queue()
+		q1=queue.Queue(max(1,options.batchqueue))
+		q2=queue.Queue(max(1,options.batchqueue))
+		stages=[PipelineStage("read",read,q0,q1),PipelineStage("align",align,q1,q2),PipelineStage("write",write,q2)]
+		for job in jobs: q0.put(job)
+		q0.put(None)
+		for s in stages: s.thread.join()
+
+	wall=time()-start
+	print("Processed {} movies in {:.1f} s".format(stages[-1].njobs,wall))
+	for s in stages: print(s.report(wall))
+	failed=[f for s in stages for f in s.failed]
+	if failed : print("Failed: {}".format(" ".join(failed)))
+
 # CCF calculation
-def calc_ccf_wrapper(options,N,box,step,dataa,datab,out,locs,ii,fsp):
+def calc_ccf_wrapper(options,N,box,step,dataa,datab,ii,fsp):
 
 	for i in range(len(dataa)):
 		c=dataa[i].calc_ccf(datab[i],fp_flag.CIRCULANT,True)
@@ -925,20 +1294,18 @@ def calc_ccf_wrapper(options,N,box,step,dataa,datab,out,locs,ii,fsp):
 	popt,ccpeakval = bimodal_peak_model(options,csum)
 	if popt == None:
 		csum = from_numpy(np.zeros((box,box))).process("normalize.edgemean")
-		locs.put((N,[]))
-		out.put((N,csum))
+		loc=[]
 	else:
 		#if ii>=0: csum.process("normalize.edgemean").write_image("ccf_models.hdf",ii)
 		if options.phaseplate:
 			ncc = csum.numpy().copy()
 			pcsum = neighbormean_origin(ncc)
 			csum = from_numpy(pcsum)
-			locs.put((N,[popt[0],popt[1],ccpeakval,csum["maximum"]]))
+			loc=[popt[0],popt[1],ccpeakval,csum["maximum"]]
 		else:
 			cc_model = correlation_peak_model((xx,yy),popt[0],popt[1],popt[2],popt[3]).reshape(box,box)
 			csum = from_numpy(cc_model)
-			locs.put((N,[popt[0],popt[1],popt[2],popt[3],popt[4],popt[5],ccpeakval,csum["maximum"]]))
-		out.put((N,csum))
+			loc=[popt[0],popt[1],popt[2],popt[3],popt[4],popt[5],ccpeakval,csum["maximum"]]
 	if ii>=0 and options.debug:
 		if fsp[-5:] == ".mrcs":
 			fff = "{}-ccf_models.hdf".format(fsp.replace(".mrcs",""))
@@ -950,8 +1317,10 @@ def calc_ccf_wrapper(options,N,box,step,dataa,datab,out,locs,ii,fsp):
 			fff = "{}-ccf_models.hdf".format(fsp.replace(".tif",""))
 		csum.process("normalize.edgemean").write_image(fff,ii)
 
+	return (N,csum,loc)
+
 # preprocess regions by normalizing and doing FFT
-def split_fft(options,img,i,box,step,out):
+def split_fft(options,img,i,box,step):
 	lst=[]
 	# if min(img["nx"],img["ny"]) > 6000:
 	# 	img.process_inplace("math.fft.resample",{"n":1.5})
@@ -998,7 +1367,7 @@ def split_fft(options,img,i,box,step,out):
 			#patchid += 1
 			clp.do_fft_inplace()
 			lst.append(clp)
-	out.put((i,lst))
+	return lst
 
 def correlation_peak_model(x_y, xo, yo, sigma, amp):
 	x, y = x_y
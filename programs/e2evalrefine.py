@@ -39,6 +39,7 @@ from future import standard_library
 standard_library.install_aliases()
 from builtins import range
 from EMAN2 import *
+from EMAN2_utils import ClassMxIndex
 from math import *
 import os
 import sys
@@ -68,7 +69,7 @@ def safediv(a,b):
 def pqual(n,ptclincls,jsd,includeproj,verbose):
 	"""This computes particle quality for all particles in one class average over both iterations"""
 	# The first projection is unmasked, used for scaling
-	global classmx,nptcl,cmxtx,cmxty,cmxalpha,cmxmirror,eulers,threed,ptclmask,rings,pf,cptcl
+	global classmx,nptcl,eulers,threed,ptclmask,rings,pf,cptcl
 	proj=[t.project("standard",eulers[n]) for t in threed]
 	projmask=ptclmask.project("standard",eulers[n])		# projection of the 3-D mask for the reference volume to apply to particles
 
@@ -76,7 +77,7 @@ def pqual(n,ptclincls,jsd,includeproj,verbose):
 	az=eulers[n].get_rotation("eman")["az"]
 
 	result={}
-	for it,eo,j in ptclincls:
+	for it,eo,j,ptclxf in ptclincls:
 	#for it in xrange(2):			# note that this is 0,1 not actual iteration
 		#for eo in range(2):
 			#for j in xrange(nptcl[eo]):
@@ -97,9 +98,7 @@ def pqual(n,ptclincls,jsd,includeproj,verbose):
 
 				sums=[0,0]
 			
-				# Find the transform for this particle (2d) and apply it to the unmasked/masked projections
-				ptclxf=Transform({"type":"2d","alpha":cmxalpha[eo+2*it][0,j],"mirror":int(cmxmirror[eo+2*it][0,j]),"tx":cmxtx[eo+2*it][0,j],"ty":cmxty[eo+2*it][0,j]}).inverse()
-
+				# Apply the (inverse) transform for this particle (2d) to the unmasked/masked projections
 				projc=proj[it].process("xform",{"transform":ptclxf})	# we transform the projection, not the particle (as in the original classification)
 
 				# This is for visualization with e2display later on
@@ -120,7 +119,7 @@ def pqual(n,ptclincls,jsd,includeproj,verbose):
 	jsd.put(result)
 
 def main():
-	global classmx,nptcl,cmxtx,cmxty,cmxalpha,cmxmirror,eulers,threed,ptclmask,rings,pf,cptcl
+	global classmx,nptcl,eulers,threed,ptclmask,rings,pf,cptcl
 	progname = os.path.basename(sys.argv[0])
 	usage = """prog [options] [refine_xx]
 	This program performs various assessments of e2refine_easy (or similar) runs, and operates in one of several possible modes.
@@ -234,21 +233,10 @@ def main():
 		print("Anisotropy evaluation mode")
 
 		try:
-			pathmx="{}/classmx_{:02d}_even.hdf".format(args[0],options.iter)
-			classmx=[EMData(pathmx,0)]
-			nptcl=[classmx[0]["ny"]]
-			cmxtx=[EMData(pathmx,2)]
-			cmxty=[EMData(pathmx,3)]
-			cmxalpha=[EMData(pathmx,4)]
-			cmxmirror=[EMData(pathmx,5)]
-
-			pathmx="{}/classmx_{:02d}_odd.hdf".format(args[0],options.iter)
-			classmx.append(EMData(pathmx,0))
-			nptcl.append(classmx[1]["ny"])
-			cmxtx.append(EMData(pathmx,2))
-			cmxty.append(EMData(pathmx,3))
-			cmxalpha.append(EMData(pathmx,4))
-			cmxmirror.append(EMData(pathmx,5))
+			pathmx=["{}/classmx_{:02d}_even.hdf".format(args[0],options.iter),"{}/classmx_{:02d}_odd.hdf".format(args[0],options.iter)]
+			classmx=[ClassMxIndex(f) for f in pathmx]
+			nptcl=[i.nptcl for i in classmx]
+			if any(i.ali is None for i in classmx) : raise Exception("no alignments in classmx")
 		except:
 			traceback.print_exc()
 			print("====\nError reading classification matrix. Must be full classification matrix with alignments")
@@ -294,16 +282,16 @@ def main():
 			az=eulers[i].get_rotation("eman")["az"]
 			best=(0,0,1.02)
 
+			# the even and odd particles in this class (first classmx column) with the inverse of their 2-D transforms
+			members=[list(zip(classmx[eo].members(i,0),[xf.inverse() for xf in classmx[eo].xforms(i,0)])) for eo in range(2)]
+
 			for angle in range(0,180,5):
 				rt=Transform({"type":"2d","alpha":angle})
 				xf=rt*Transform([1.02,0,0,0,0,old_div(1,1.02),0,0,0,0,1,0])*rt.inverse()
 				esum=0
 
 				for eo in range(2):
-					for j in range(nptcl[eo]):
-						if classmx[eo][0,j]!=i :
-	#						if options.debug: print "XXX {}\t{}\t{}\t{}".format(i,("even","odd")[eo],j,classmx[eo][0,j])
-							continue		# only proceed if the particle is in this class
+					for j,ptclxf in members[eo]:
 						if options.verbose: print("{}\t{}\t{}".format(i,("even","odd")[eo],j))
 
 						# the particle itself
@@ -316,7 +304,6 @@ def main():
 
 						# Find the transform for this particle (2d) and apply it to the unmasked/masked projections
 						ptcl.transform(xf)		# anisotropy directly on the particle
-						ptclxf=Transform({"type":"2d","alpha":cmxalpha[eo][0,j],"mirror":int(cmxmirror[eo][0,j]),"tx":cmxtx[eo][0,j],"ty":cmxty[eo][0,j]}).inverse()
 						projc=proj.process("xform",{"transform":ptclxf})	# we transform the projection, not the particle (as in the original classification)
 
 						projmaskc=projmask.process("xform",{"transform":ptclxf})
@@ -352,10 +339,7 @@ def main():
 				esum=0
 
 				for eo in range(2):
-					for j in range(nptcl[eo]):
-						if classmx[eo][0,j]!=i :
-	#						if options.debug: print "XXX {}\t{}\t{}\t{}".format(i,("even","odd")[eo],j,classmx[eo][0,j])
-							continue		# only proceed if the particle is in this class
+					for j,ptclxf in members[eo]:
 						if options.verbose: print("{}\t{}\t{}".format(i,("even","odd")[eo],j))
 
 						# the particle itself
@@ -368,7 +352,6 @@ def main():
 
 						# Find the transform for this particle (2d) and apply it to the unmasked/masked projections
 						ptcl.transform(xf)		# anisotropy directly on the particle
-						ptclxf=Transform({"type":"2d","alpha":cmxalpha[eo][0,j],"mirror":int(cmxmirror[eo][0,j]),"tx":cmxtx[eo][0,j],"ty":cmxty[eo][0,j]}).inverse()
 						projc=proj.process("xform",{"transform":ptclxf})	# we transform the projection, not the particle (as in the original classification)
 
 						projmaskc=projmask.process("xform",{"transform":ptclxf})
@@ -406,12 +389,9 @@ def main():
 
 		try:
 			pathmx=["{}/classmx_{:02d}_even.hdf".format(args[0],options.iter-1),"{}/classmx_{:02d}_odd.hdf".format(args[0],options.iter-1),"{}/classmx_{:02d}_even.hdf".format(args[0],options.iter),"{}/classmx_{:02d}_odd.hdf".format(args[0],options.iter)]
-			classmx=[EMData(f,0) for f in pathmx]
-			nptcl=[classmx[i]["ny"] for i in range(len(pathmx))]
-			cmxtx=[EMData(f,2) for f in pathmx]
-			cmxty=[EMData(f,3) for f in pathmx]
-			cmxalpha=[EMData(f,4) for f in pathmx]
-			cmxmirror=[EMData(f,5) for f in pathmx]
+			classmx=[ClassMxIndex(f) for f in pathmx]
+			nptcl=[i.nptcl for i in classmx]
+			if any(i.ali is None for i in classmx) : raise Exception("no alignments in classmx")
 
 		except:
 			traceback.print_exc()
@@ -469,14 +449,15 @@ def main():
 		#tfs = []
 
 		tlast=time()
-		# Put particles in class lists
+		# Put particles in class lists, with the inverse of their 2-D transform
 		classptcls={}
 		for it in range(2):			# note that this is 0,1 not actual iteration
 			for eo in range(2):
-				for j in range(nptcl[eo]):
-					cls=int(classmx[eo+2*it][0,j])
-					try: classptcls[cls].append((it,eo,j))
-					except: classptcls[cls]=[(it,eo,j)]
+				cmx=classmx[eo+2*it]
+				for cls in range(cmx.ncls):
+					for j,xf in zip(cmx.members(cls,0),cmx.xforms(cls,0)):
+						try: classptcls[cls].append((it,eo,j,xf.inverse()))
+						except: classptcls[cls]=[(it,eo,j,xf.inverse())]
 
 		# Create Thread objects
 		jsd=queue.Queue(0)
@@ -47,9 +47,10 @@ from os import unlink
 from sys import argv
 import traceback
 from EMAN2 import *
+from EMAN2_utils import ClassMxIndex
 from numpy import arange
 
-def monoextract(jsd,cls,threed,nptcl,mask,subunitmask,outermask,symxfs,eulers,cptcl,classmx,cmxtx,cmxty,cmxalpha,cmxmirror,domask,newbox,verbose):
+def monoextract(jsd,cls,threed,nptcl,mask,subunitmask,outermask,symxfs,eulers,cptcl,classmx,domask,newbox,verbose):
 	# for a single class-average, subtract away a projection of the reference with the exclusion mask in
 	# each symmetry-related orientation, after careful scaling. Note that we don't have a list of which particle is in each class,
 	# but rather a list of which class each particle is in, so we do this a bit inefficiently for now
@@ -88,12 +89,10 @@ def monoextract(jsd,cls,threed,nptcl,mask,subunitmask,outermask,symxfs,eulers,cp
 	if verbose : print("--- Class %d masks prepared"%cls)
 	
 	for eo in range(2):
-		for j in range(nptcl[eo]):
+		# only the particles in this class (first classmx column)
+		for j,ptclxf in zip(classmx[eo].members(cls,0),classmx[eo].xforms(cls,0)):
 			if DEBUG and len(ret)>100 : break 
 			
-			if classmx[eo][0,j]!=cls : 
-				#if options.debug: print("XXX {}\t{}\t{}\t{}".format(cls,("even","odd")[eo],j,classmx[eo][0,j]))
-				continue		# only proceed if the particle is in this class
 			if verbose>1: print("{}\t{}\t{}".format(cls,("even","odd")[eo],j))
 
 			ptcl=EMData(cptcl[eo],j)
@@ -102,7 +101,7 @@ def monoextract(jsd,cls,threed,nptcl,mask,subunitmask,outermask,symxfs,eulers,cp
 			#highth=ptcl["mean"]+ptcl["sigma"]*3.0
 
 			# Find the transform for this particle (2d) and apply it to the unmasked/masked projections
-			ptclxf=Transform({"type":"2d","alpha":cmxalpha[eo][0,j],"mirror":int(cmxmirror[eo][0,j]),"tx":cmxtx[eo][0,j],"ty":cmxty[eo][0,j]}).inverse()
+			ptclxf=ptclxf.inverse()
 			projc=[im.process("xform",{"transform":ptclxf}) for im in projs]		# we transform the projections, not the particle (as in the original classification)
 			if domask: projm=[im.process("xform",{"transform":ptclxf}) for im in projmask]
 #			maskctr=[j.calc_center_of_mass(0.5) for j in projm]
@@ -185,21 +184,10 @@ is maintained, and a single output stack is generated by this program.
 
 	# each of these classmx variables becomes a 2 element list with even and odd particles respectively
 	try:
-		pathmx="{}/classmx_{:02d}_even.hdf".format(args[0],args[1])
-		classmx=[EMData(pathmx,0)]
-		nptcl=[classmx[0]["ny"]]
-		cmxtx=[EMData(pathmx,2)]
-		cmxty=[EMData(pathmx,3)]
-		cmxalpha=[EMData(pathmx,4)]
-		cmxmirror=[EMData(pathmx,5)]
-
-		pathmx="{}/classmx_{:02d}_odd.hdf".format(args[0],args[1])
-		classmx.append(EMData(pathmx,0))
-		nptcl.append(classmx[1]["ny"])
-		cmxtx.append(EMData(pathmx,2))
-		cmxty.append(EMData(pathmx,3))
-		cmxalpha.append(EMData(pathmx,4))
-		cmxmirror.append(EMData(pathmx,5))
+		pathmx=["{}/classmx_{:02d}_even.hdf".format(args[0],args[1]),"{}/classmx_{:02d}_odd.hdf".format(args[0],args[1])]
+		classmx=[ClassMxIndex(f) for f in pathmx]
+		nptcl=[i.nptcl for i in classmx]
+		if any(i.ali is None for i in classmx) : raise Exception("no alignments in classmx")
 	except:
 		traceback.print_exc()
 		print("====\nError reading classification matrix. Must be full classification matrix with alignments")
@@ -259,7 +247,7 @@ is maintained, and a single output stack is generated by this program.
 	jsd=queue.Queue(0)
 
 	# we start out with just a list of parameters to avoid initializing so many Thread objects at once
-	thrds=[(jsd,cls,threed,nptcl,mask,subunitmask,outermask,symxfs,eulers,cptcl,classmx,cmxtx,cmxty,cmxalpha,cmxmirror,options.masked,options.newbox,options.verbose-1) for cls in range(0,nref,1 if not DEBUG else 16)]
+	thrds=[(jsd,cls,threed,nptcl,mask,subunitmask,outermask,symxfs,eulers,cptcl,classmx,options.masked,options.newbox,options.verbose-1) for cls in range(0,nref,1 if not DEBUG else 16)]
 
 	# here we run the threads and save the results, no actual alignment done here
 	if options.verbose: print(len(thrds)," threads")
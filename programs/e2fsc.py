@@ -45,9 +45,10 @@ import os
 import sys
 import time
 from numpy import *
-import queue
+from EMAN2_executor import EMExecutor
 
-def procthread(jsd,vals,lnx,thresh1,thresh2,apix,v1,v2,cenmask,avgmask,options,ttl):
+def procthread(vals,lnx,thresh1,thresh2,apix,v1,v2,cenmask,avgmask,options):
+	ret=[]
 	for ox,x,oy,y,oz,z in vals:
 		if options.verbose>2 : print("%d, %d, %d :"%(x,y,z), end=' ')
 		elif options.verbose>3:
@@ -72,7 +73,7 @@ def procthread(jsd,vals,lnx,thresh1,thresh2,apix,v1,v2,cenmask,avgmask,options,t
 		if options.verbose>3 : print(v1m["sigma_nonzero"], v2m["sigma_nonzero"], end=' ')
 		if v1m["maximum"]<thresh1 or v2m["maximum"]<thresh2 :
 			if options.verbose>3 : print(" ")
-			jsd.put((0,0,[],ox,x,oy,y,oz,z,0,None,None))
+			ret.append((0,0,[],ox,x,oy,y,oz,z,0,None,None))
 			continue
 		
 		if options.verbose>3 : print(" ***")
@@ -120,8 +121,9 @@ def procthread(jsd,vals,lnx,thresh1,thresh2,apix,v1,v2,cenmask,avgmask,options,t
 
 	#				if res143>.2 : print x,y,z,si,lnx,fx[si],res143
 
-		jsd.put((res,res143,fy,ox,x,oy,y,oz,z,si,v1m,v2m))
-	jsd.put(ttl)		# joins the thread
+		ret.append((res,res143,fy,ox,x,oy,y,oz,z,si,v1m,v2m))
+
+	return ret
 
 def main():
 	progname = os.path.basename(sys.argv[0])
@@ -259,42 +261,18 @@ and this program should be regarded as experimental.
 	fys=[]
 	funny=[]		# list of funny curves
 	t=time.time()
-	jsd=queue.Queue(0)
-	thrds=[]
+	jobs=[]
 	for oz,z in enumerate(zr):
 		for oy,y in enumerate(yr):
-			thrd=[]
-			for ox,x in enumerate(xr):
-				thrd.append((ox,x,oy,y,oz,z))		# this is different from the normal parallelism pattern. We make the actual Threads on demand
-			thrds.append(thrd)						# one row of x values per thread
+			vals=[(ox,x,oy,y,oz,z) for ox,x in enumerate(xr)]
+			jobs.append((vals,lnx,thresh1,thresh2,apix,v1,v2,cenmask,avgmask,options))		# one row of x values per job
 	
 
-	if options.verbose: print(len(thrds)," threads")
-	
-	thrtolaunch=0
-	while thrtolaunch<len(thrds) or threading.active_count()>1:
-		# If we haven't launched all threads yet, then we wait for an empty slot, and launch another
-		# note that it's ok that we wait here forever, since there can't be new results if an existing
-		# thread hasn't finished.
-		if thrtolaunch<len(thrds) :
-			while (threading.active_count()==options.threads ) : time.sleep(.1)
-			if options.verbose>1 : 
-				print("\rStarting thread {}/{}                                                  ".format(thrtolaunch,len(thrds)), end=' ')
-				sys.stdout.flush()
-			vals=thrds[thrtolaunch]
-			thr=threading.Thread(target=procthread,args=(jsd,vals,lnx,thresh1,thresh2,apix,v1,v2,cenmask,avgmask,options,thrtolaunch))
-			thrds[thrtolaunch]=thr		# replace the values with the actual thread
-			thr.start()
-			thrtolaunch+=1
-		else: time.sleep(1)
-#		if options.verbose>1: print "{}% complete".format(100.0*frac),
+	if options.verbose: print(len(jobs)," jobs")
 	
-		while not jsd.empty():
-			vals=jsd.get()
-			if isinstance(vals,int) : 
-				thrds[vals].join()
-				thrds[vals]=None
-			else :
+	with EMExecutor(options.threads) as ex:
+		for row in ex.map(procthread,jobs,ordered=False,verbose=options.verbose>1):
+			for vals in row:
 				res,res143,fy,ox,x,oy,y,oz,z,si,v1m,v2m=vals
 
 				resvol[ox,oy,oz]=res
@@ -10,8 +10,7 @@ import numpy as np
 from EMAN2 import *
 from EMAN2_utils import cmponetomany
 import time
-import threading
-import queue
+from EMAN2_executor import EMExecutor
 
 
 def make3d(aptcls, sym="c1"):
@@ -113,7 +112,7 @@ def random_sample(n,k):
 	np.random.shuffle(a)
 	return a[:int(k)]
 
-def make_model(jsd,myid, options):
+def make_model(myid, options):
 	ptclname=options.ptcls
 	num=EMUtil.get_image_count(ptclname)
 	sym=options.sym
@@ -223,10 +222,7 @@ def make_model(jsd,myid, options):
 		compares.append(p)
 		compares.append(pjs[p["match_n"]])
 	scr=np.array(scr)
-	jsd.put((map0, ddmap["mean"], np.mean(scr[-num:]), compares))
-	pjs=None
-	return 
-	#launch_childprocess("e2proclst.py {}/model_*.hdf --create {}/models.lst".format(path, path));
+	return (map0, ddmap["mean"], np.mean(scr[-num:]), compares)
 
 def main():
 	
@@ -275,35 +271,18 @@ def main():
 		
 	
 	
-	jsd=queue.Queue(0)	
-	NTHREADS=max(options.threads+1,2)
-	thrds=[threading.Thread(target=make_model,args=(jsd, i, options)) for i in range(options.ntry)]	
-	thrtolaunch=0
 	models=[]
 	scrs=[]
 	grads=[]
 	cmps=[]
 	
-	while thrtolaunch<len(thrds) or threading.active_count()>1:
-		# If we haven't launched all threads yet, then we wait for an empty slot, and launch another
-		# note that it's ok that we wait here forever, since there can't be new results if an existing
-		# thread hasn't finished.
-		if thrtolaunch<len(thrds) :
-			while (threading.active_count()==NTHREADS ) : time.sleep(.1)
-			thrds[thrtolaunch].start()
-			thrtolaunch+=1
-		else: time.sleep(1)
-	
-		while not jsd.empty():
-			m, grad, scr,c=jsd.get()
+	with EMExecutor(options.threads) as ex:
+		for m, grad, scr,c in ex.map(make_model,[(i, options) for i in range(options.ntry)]):
 			models.append(m)
 			scrs.append(scr)
 			grads.append(grad)
 			cmps.append(c)
 
-	for t in thrds:
-		t.join()
-
 	
 	sid=np.argsort(scrs)
 	for i,si in enumerate(sid):
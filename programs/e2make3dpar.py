@@ -46,6 +46,7 @@ import os
 import sys
 import math
 import random
+import time
 import traceback
 import numpy as np
 
@@ -114,6 +115,7 @@ def main():
 	parser.add_argument("--verbose", "-v", dest="verbose", action="store", metavar="n", type=int, default=0, help="verbose level [0-9], higner number means higher level of verboseness")
 
 	parser.add_argument("--threads", default=4,type=int,help="Number of threads to run in parallel on a single computer. This is the only parallelism supported by e2make3dpar", guitype='intbox', row=24, col=2, rowspan=1, colspan=1, mode="refinement")
+	parser.add_argument("--accumulate", type=str, default="shared", choices=["shared","thread","process"], help="How the --threads workers accumulate the reconstruction. 'shared' inserts into a single Fourier volume, 'thread' gives each thread a private Fourier volume and weights which are summed at the end, and 'process' does the same using separate processes, summed through shared memory. Each private volume costs more memory, see the estimate printed at startup. default=shared")
 	parser.add_argument("--preprocess", metavar="processor_name(param1=value1:param2=value2)", type=str, action="append", help="preprocessor to be applied to the projections prior to 3D insertion. There can be more than one preprocessor and they are applied in the order in which they are specifed. Applied before padding occurs. See e2help.py processors for a complete list of available processors.")
 	parser.add_argument("--setsf",type=str,help="Force the structure factor to match a 'known' curve prior to postprocessing (<filename>, auto or none). default=none",default="none")
 	parser.add_argument("--postprocess", metavar="processor_name(param1=value1:param2=value2)", type=str, action="append", help="postprocessor to be applied to the 3D volume once the reconstruction is completed. There can be more than one postprocessor, and they are applied in the order in which they are specified. See e2help.py processors for a complete list of available processors.")
@@ -238,20 +240,27 @@ def main():
 	if options.iterative :
 		a = {"size":padvol,"sym":options.sym,"verbose":options.verbose-1}
 		if options.savenorm!=None : a["savenorm"]=options.savenorm
-		recon=Reconstructors.get("fourier_iter", a)
+		rname="fourier_iter"
 		niter=4
 	else :
 		a = {"size":padvol,"sym":options.sym,"mode":options.mode,"usessnr":options.usessnr,"verbose":options.verbose-1}
 		if options.savenorm!=None : a["savenorm"]=options.savenorm
-		recon=Reconstructors.get("fourier", a)
+		rname="fourier"
 		niter=1
+	recon=Reconstructors.get(rname, a)
+	if options.threads>1 or options.verbose>0 : report_memory(rname,padvol,options.threads,options.accumulate)
+
+	# parameters for the partial reconstructors, which don't write a normalization volume themselves
+	pa=dict(a)
+	if "savenorm" in pa : del pa["savenorm"]
+	pa["verbose"]=0
+	rargs=(options.preprocess,options.pad,options.fillangle,options.altedgemask,max(options.verbose-1,0),options.input.endswith(".lst"))
+
 	#########################################################
 	# The actual reconstruction
 
 	for it in range(niter):
-		threads=[threading.Thread(target=reconstruct,args=(data[i::options.threads],recon,options.preprocess,options.pad,
-				options.fillangle,options.altedgemask,max(options.verbose-1,0),options.input.endswith(".lst"))) for i in range(options.threads)]
-
+		ref=None
 		if it==0:
 			if options.seedmap!=None :
 				seed=EMData(options.seedmap)
@@ -262,15 +271,30 @@ def main():
 				else:
 					seedweightmap=EMData(seedweightmap,0)
 					recon.setup_seedandweights(seed,seedweightmap)
+				ref=seed
 			else : recon.setup()
 		else:
 			recon.setup_seed(output,1.0)
+			ref=output
+
+		if options.accumulate=="process" :
+			reconstruct_procs(data,recon,rname,pa,ref,padvol,options.threads,rargs)
+		else:
+			# with "thread" the main reconstructor serves as the first thread's accumulator, the others get their own
+			if options.accumulate=="thread" : recons=[recon]+[partial_reconstructor(rname,pa,ref) for i in range(1,options.threads)]
+			else : recons=[recon]*options.threads
+			threads=[threading.Thread(target=reconstruct,args=(data[i::options.threads],recons[i])+rargs) for i in range(options.threads)]
 
-		for i,t in enumerate(threads):
-			if options.verbose>1: print("started thread ",i)
-			t.start()
+			for i,t in enumerate(threads):
+				if options.verbose>1: print("started thread ",i)
+				t.start()
 
-		for t in threads: t.join()
+			for t in threads: t.join()
+
+			# summed in thread order, so the result doesn't depend on thread timing
+			for r in recons[1:]:
+				if r is not recon : recon.add_partial(r)
+			recons=None
 
 #		output = recon.finish(it==niter-1)		# only return real-space on the final pass
 		output = recon.finish(True)
@@ -523,6 +547,81 @@ def get_processed_image(filename,nim,nsl,preprocess,pad,nx=0,ny=0):
 
 	return ret
 
+def report_memory(rname,padvol,nthreads,accumulate):
+	"""Prints the approximate memory required for the Fourier accumulators with the requested --accumulate mode"""
+	fnx=padvol[0]+2-padvol[0]%2
+	vol=fnx*padvol[1]*padvol[2]*4.0/1.0e9		# complex padded volume in GB, weights are half this
+	if rname=="fourier_iter" : each=vol*2.5		# fourier_iter also holds a reference volume after the first iteration
+	else : each=vol*1.5
+
+	if accumulate=="thread" : total=each*nthreads
+	elif accumulate=="process" : total=each*(nthreads+1)+vol*1.5		# plus the shared sum
+	else : total=each
+	print("Fourier accumulator {:1.3g} GB, {} mode with {} workers requires ~{:1.3g} GB ({:1.3g} GB with a single shared accumulator)".format(each,accumulate,nthreads,total,each))
+
+def partial_reconstructor(rname,parms,ref=None):
+	"""Returns a new reconstructor to accumulate a subset of the slices, to be merged into the main reconstructor
+	with add_partial(). For fourier_iter, ref is the current reference volume, which shapes the interpolation
+	but isn't itself accumulated. Seeds are otherwise only set in the main reconstructor, so they are counted once."""
+	r=Reconstructors.get(rname,parms)
+	if ref!=None and rname=="fourier_iter" : r.setup_seed(ref,1.0)
+	else : r.setup()
+	return r
+
+def reconstruct_proc(data,rname,parms,ref,shared,prev,done,failed,rargs):
+	"""Runs in a child process. Reconstructs data into a private volume, then adds it to the shared sum
+	after the previous worker has done so, so the summation order is fixed"""
+	try:
+		r=partial_reconstructor(rname,parms,ref)
+		reconstruct(data,r,*rargs)
+		# to_numpy() doesn't copy, so the EMData must stay referenced until the copy is made
+		parts=[]
+		for wt in (False,True):
+			p=r.get_partial(wt)
+			parts.append(to_numpy(p).copy())
+			p=None
+		r=None
+		if prev!=None : prev.wait()
+		if failed.value : return		# an earlier worker failed, the sum is useless anyway
+		for buf,p in zip(shared,parts):
+			b=np.frombuffer(buf,dtype=np.float32)
+			b+=p.reshape(-1)
+	except:
+		traceback.print_exc()
+		failed.value=1
+	finally:
+		done.set()
+
+def reconstruct_procs(data,recon,rname,parms,ref,padvol,nproc,rargs):
+	"""Reconstructs data using nproc processes on the local machine, each with its own Fourier volume.
+	These are summed through shared memory and added to recon, which must already be set up."""
+	import multiprocessing
+
+	fnx=padvol[0]+2-padvol[0]%2
+	shape=((padvol[2],padvol[1],fnx),(padvol[2],padvol[1],fnx//2))
+	shared=[multiprocessing.RawArray("f",int(np.prod(s))) for s in shape]
+	failed=multiprocessing.RawValue("i",0)
+	done=[multiprocessing.Event() for i in range(nproc)]
+	procs=[multiprocessing.Process(target=reconstruct_proc,args=(data[i::nproc],rname,parms,ref,shared,done[i-1] if i>0 else None,done[i],failed,rargs)) for i in range(nproc)]
+
+	for p in procs: p.start()
+
+	# a worker which dies outright (eg - killed by a signal) never sets its event, so we release its successor here
+	while any(p.is_alive() for p in procs):
+		for p,d in zip(procs,done):
+			if not p.is_alive() and p.exitcode!=0 and not d.is_set():
+				failed.value=1
+				d.set()
+		time.sleep(0.5)
+	for p in procs: p.join()
+
+	if failed.value or any(p.exitcode!=0 for p in procs):
+		print("Error: a reconstruction process failed")
+		sys.exit(1)
+
+	vol,wt=[from_numpy(np.frombuffer(buf,dtype=np.float32).reshape(s)) for buf,s in zip(shared,shape)]
+	recon.add_partial(vol,wt)
+
 def reconstruct(data,recon,preprocess,pad,fillangle,altmask,verbose=0, lstinput=False):
 	"""Do an actual reconstruction using an already allocated reconstructor, and a data list as produced
 	by initialize_data(). preprocess is a list of processor strings to be applied to the image data in the
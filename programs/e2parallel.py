@@ -82,6 +82,8 @@ run e2parallel.py dcclient on as many other machines as possible, pointing at th
 	parser.add_argument("--port",type=int,help="Specifies server port, default is automatic assignment",default=-1)
 	parser.add_argument("--clientpath",type=str,help="Scratch directory for DC clients. Default is current directory.",default=None)
 	parser.add_argument("--clientid",type=int,help="Internal use only",default=-1)
+	parser.add_argument("--codec",type=str,help="Compression for data sent by a DC server or client, one of none, fast, zlib. Default none, which is best on fast networks",default="none")
+	parser.add_argument("--prefetch",action="store_true",help="DC clients run many tasks in one process, retrieving the next task and its data while the current task runs",default=False)
 	parser.add_argument("--verbose", "-v", dest="verbose", action="store", metavar="n", type=int, default=0, help="verbose level [0-9], higner number means higher level of verboseness")
 	parser.add_argument("--taskin", type=str,help="Internal use only. Used when executing local threaded tasks.")
 	parser.add_argument("--taskout", type=str,help="Internal use only. Used when executing local threaded tasks.")
@@ -96,6 +98,7 @@ run e2parallel.py dcclient on as many other machines as possible, pointing at th
 	initializeCUDAdevice()
 	
 	if len(args)<1 or args[0] not in commandlist: parser.error("command required: "+str(commandlist))
+	set_dc_codec(options.codec)
 
 	if args[0]=="dcserver" :
 		print("Sorry : e2parallel DC mode is not supported in EMAN2.1. We may revisit this if users complain, though. Please email sludtke@bcm.edu.")
@@ -109,10 +112,10 @@ run e2parallel.py dcclient on as many other machines as possible, pointing at th
 			try: os.makedirs(options.clientpath)
 			except: pass
 			os.chdir(options.clientpath)
-		rundcclients(options.server,options.port,options.verbose-1)
+		rundcclients(options.server,options.port,options.verbose-1,options.codec,options.prefetch)
 		
 	elif args[0]=="realdcclient" :
-		rundcclient(options.server,options.port,options.verbose-1,options.clientid)
+		rundcclient(options.server,options.port,options.verbose-1,options.clientid,options.prefetch)
 		
 	elif args[0]=="dckill" :
 		killdcserver(options.server,options.port,options.verbose-1)
@@ -186,20 +189,22 @@ def killdcclients(server,port,verbose):
 	import EMAN2db
 	server=runEMDCServer(port,verbose,True)			# never returns
 
-def rundcclients(host,port,verbose):
+def rundcclients(host,port,verbose,codec="none",prefetch=False):
 	clientid=random.randint(1,2000000000)
+	cmd=["e2parallel.py","realdcclient","--server="+str(host),"--port="+str(port),"--verbose="+str(verbose),"--clientid="+str(clientid),"--codec="+codec]
+	if prefetch : cmd.append("--prefetch")
 	while 1:
-		rc=subprocess.call(["e2parallel.py","realdcclient","--server="+str(host),"--port="+str(port),"--verbose="+str(verbose),"--clientid="+str(clientid)])
+		rc=subprocess.call(cmd)
 		if rc : 
 			if rc==1 : print("Client exited at server request")
 			else : print("Client exited with status code %s"%str(rc))
 			break
 
-def rundcclient(host,port,verbose,clientid):
+def rundcclient(host,port,verbose,clientid,prefetch=False):
 	"""Starts a DC client running, runs forever"""
 #	while (1):
-	client=EMDCTaskClient(host,port,verbose,myid=clientid)
-	r=client.run(onejob=True)
+	client=EMDCTaskClient(host,port,verbose,myid=clientid,prefetch=prefetch)
+	r=client.run(onejob=not prefetch)
 	sys.exit(r)
 #	print "New client (%d alloced)"%EMData.totalalloc
 
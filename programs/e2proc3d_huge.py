@@ -37,31 +37,60 @@ from __future__ import division
 
 
 from EMAN2 import *
+from EMAN2_executor import EMExecutor
 from optparse import OptionParser
 import sys
 from math import *
 import os.path
+import shutil
+import numpy as np
 import pyemtbx.options
 from pyemtbx.options import intvararg_callback
 from pyemtbx.options import floatvararg_callback
 
+# processors which only look at one voxel at a time, so any region of the volume may be processed independently
+POINTWISE_PROCS=set(["math.absvalue","math.floor","math.reciprocal","math.pow","math.squared","math.sqrt","math.linear","math.exp",
+	"math.log","math.finite","threshold.notzero","threshold.belowtozero","threshold.abovetozero","threshold.clampminmax",
+	"threshold.belowtominval","threshold.belowtozero_cut","threshold.binary","threshold.binaryrange","threshold.compress"])
+
+def proc_halo(name,parms):
+	"""Returns the number of voxels of context a processor needs on each side of a region to produce the same result there as
+it would when applied to the whole volume. None if the processor isn't local, in which case it can't be used on fragments."""
+	if name=="threshold.clampminmax" and parms.get("tomean",False) : return None		# clamps to the mean of the whole volume
+	if name in POINTWISE_PROCS : return 0
+	if name in ("eman1.filter.median","math.localsigma","math.localmax") : return int(parms.get("radius",1))
+	if name in ("morph.dilate.binary","morph.erode.binary") : return int(parms.get("radius",1))*int(parms.get("iters",1))
+	# libEM passes the same parameters (iters included) to each of the iters dilate/erode pairs, so the reach is 2*radius*iters^2
+	if name in ("morph.open.binary","morph.close.binary") : return 2*int(parms.get("radius",1))*int(parms.get("iters",1))**2
+	if name=="filter.bilateral" : return int(parms.get("half_width",0))*int(parms.get("niter",1))
+	if name=="math.laplacian" : return 1
+	return None
+
 def main():
 	progname = os.path.basename(sys.argv[0])
-	usage = progname + """ [options] <inputfile>
+	usage = progname + """ [options] <inputfile> [outputfile]
 	This is a specialized version of e2proc3d.py targeted at performing a limited set of operations on
-very large volumes in-place (such as tomograms) which may not readily fit into system memory. Operations are 
-performed by reading portions of the image, processing, then writing the portion back to disk. Unlike e2proc3d.py
-you may pass only a single operation to the program for each invocation, or behavior will be undefined. It will 
-process a single volume in a single file in-place.
+very large volumes (such as tomograms) which may not readily fit into system memory. Operations are 
+performed by reading z-slabs of the volume, processing them, then writing the slab back to disk, so only a few slabs
+are ever in memory. Each slab is further divided into bricks in X-Y which are processed in parallel threads.
+
+If no output file is specified, the volume is processed in-place. If an output file is specified, it must be the same
+format as the input. It is created as a copy of the input, then processed in-place.
 
+Unlike e2proc3d.py, operations are always performed in the following order, regardless of the order on the command-line:
+--trans, --streaksubtract, --process (in the order given), --multfile, --mult, --add
+
+Only processors with finite local support can be applied to fragments of a volume. Bricks are extended by a halo large
+enough that results are identical to processing the whole volume. Processors which need the whole volume (Fourier filters,
+normalization, masks, transformations, ...) are refused.
 """
 	parser = OptionParser(usage)
 	
 
-	parser.add_option("--streaksubtract",type="string",help="This will subtract the histogram peak value along a single axis in the volume.",default=None)
+	parser.add_option("--streaksubtract",type="string",help="This will subtract the histogram peak value along a single axis (x or y) in the volume.",default=None)
 
 	parser.add_option("--process", metavar="processor_name:param1=value1:param2=value2", type="string",
-								action="append", help="apply a processor named 'processorname' with all its parameters/values. WARNING: this works by operating on fragments of the overall image at a time, and some processors won't work properly this way.")
+								action="append", help="apply a processor named 'processorname' with all its parameters/values. Only processors with local support (pointwise, threshold, local median/sigma/max, binary morphology, bilateral) are accepted.")
 
 	parser.add_option("--mult", metavar="f", type="float", 
 								help="Scales the densities by a fixed number in the output")
@@ -72,28 +101,168 @@ process a single volume in a single file in-place.
 	parser.add_option("--add", metavar="f", type="float", 
 								help="Adds a constant 'f' to the densities")
 
-	parser.add_option("--trans", metavar="dx,dy,dz", type="string", default=0, help="Translate map by dx,dy,dz ")
+	parser.add_option("--trans", metavar="dx,dy,dz", type="string", default=None, help="Translate map by dx,dy,dz. Only integer translations are supported. Voxels shifted in from outside the volume are zero.")
+	parser.add_option("--chunkmem", type="float", default=2048.0, help="Approximate amount of memory in MB to use for volume data. Determines the slab thickness. Default=2048")
+	parser.add_option("--bricksize", type="int", default=512, help="X-Y size of the bricks each slab is divided into for parallel processing. Default=512")
+	parser.add_option("--threads", type="int", default=4, help="Number of threads to use for processing bricks. Default=4")
 	parser.add_option("--ppid", type=int, help="Set the PID of the parent process, used for cross platform PPID",default=-1)
 	parser.add_option("--verbose", "-v", dest="verbose", action="store", metavar="n", type="int", default=0, help="verbose level [0-9], higner number means higher level of verboseness")
 		
 	(options, args) = parser.parse_args()
 
-	print("Sorry, this program still under development. Not functional yet.")
-	sys.exit(1)
+	if len(args)<1 or len(args)>2 :
+		parser.error("Please specify an input file and optionally an output file")
+	infile=args[0]
+	if len(args)>1 : outfile=args[1]
+	else : outfile=infile
 
 	try:
-		hdr=EMData(args[1],0,1)
+		hdr=EMData(infile,0,True)
 	except:
 		print("ERROR: Can't read input file header")
 		sys.exit(1)
+	nx,ny,nz=hdr["nx"],hdr["ny"],hdr["nz"]
 
+	# check everything up front, so we never leave a half processed volume behind because of a bad option
+	procs=[]
+	halo=0
+	for p in options.process or [] :
+		(name,parms)=parsemodopt(p)
+		if not parms : parms={}
+		h=proc_halo(name,parms)
+		if h==None :
+			print("ERROR: {} needs the whole volume and cannot be applied to a volume in pieces. Please use e2proc3d.py".format(name))
+			sys.exit(1)
+		procs.append((name,parms))
+		halo+=h
 
-	if options.mediansubtract!=None :
-		pass  # Added this to make python happy
-		
+	dx,dy,dz=0,0,0
+	if options.trans!=None :
+		try:
+			t=[float(i) for i in options.trans.split(",")]
+			dx,dy,dz=[int(i) for i in t]
+			if [dx,dy,dz]!=t : raise Exception
+		except:
+			print("ERROR: --trans requires 3 integer values dx,dy,dz")
+			sys.exit(1)
+
+	for mf in options.multfile or [] :
+		try: mh=EMData(mf,0,True)
+		except:
+			print("ERROR: Can't read header of ",mf)
+			sys.exit(1)
+		if (mh["nx"],mh["ny"],mh["nz"])!=(nx,ny,nz) :
+			print("ERROR: {} is not the same size as {}".format(mf,infile))
+			sys.exit(1)
+
+	if options.streaksubtract!=None and options.streaksubtract.lower() not in ("x","y") :
+		print("ERROR: --streaksubtract must be x or y, as only complete lines in X or Y are available in each slab")
+		sys.exit(1)
+
+	if not (procs or options.multfile or options.mult!=None or options.add!=None or (dx,dy,dz)!=(0,0,0) or options.streaksubtract!=None) :
+		print("No operations specified, nothing to do")
+		sys.exit(0)
+
+	if outfile!=infile :
+		if os.path.splitext(outfile)[1].lower()!=os.path.splitext(infile)[1].lower() :
+			print("ERROR: The output file must be the same format as the input file")
+			sys.exit(1)
+		if options.verbose : print("Copying {} to {}".format(infile,outfile))
+		shutil.copyfile(infile,outfile)
+
+	logid=E2init(sys.argv,options.ppid)
+
+	# hz is the number of slices of the original volume needed on each side of a slab. Voxel data is ~nx*ny*4 bytes per slice
+	# for the raw slab, the translated slab (if any) and the output slab
+	hz=halo+abs(dz)
+	nslab=3 if (dx,dy,dz)!=(0,0,0) else 2
+	thick=int(options.chunkmem*2**20/(nslab*nx*ny*4.0))-2*hz
+	if thick<1 :
+		print("Warning: --chunkmem is too small for this volume, processing 1 slice at a time")
+		thick=1
+	thick=min(thick,nz)
+	if options.verbose : print("{}x{}x{} volume, {} slices per slab, halo {}".format(nx,ny,nz,thick,halo))
+
+	bs=max(1,options.bricksize)
+	ex=EMExecutor(options.threads) if procs else None
+
+	tail=None		# unmodified slices from the end of the previous slab, which is already overwritten if processing in-place
+	for z0 in range(0,nz,thick):
+		z1=min(nz,z0+thick)
+		if options.verbose : print("Slab {}-{}".format(z0,z1))
+
+		# raw covers original slices s0-s1
+		s0=max(0,z0-hz)
+		s1=min(nz,z1+hz)
+		ntail=0 if tail==None else tail["nz"]
+		raw=EMData(outfile,0,False,Region(0,0,s0+ntail,nx,ny,s1-s0-ntail))
+		if ntail>0 :
+			raw=raw.get_clip(Region(0,0,-ntail,nx,ny,s1-s0))
+			raw.insert_clip(tail,(0,0,0))
+		if hz>0 and z1<nz : tail=raw.get_clip(Region(0,0,max(0,z1-hz)-s0,nx,ny,z1-max(0,z1-hz)))
+		else : tail=None
+
+		# src covers translated slices t0-t1. Anything shifted in from outside the volume is zero.
+		t0=max(0,z0-halo)
+		t1=min(nz,z1+halo)
+		if (dx,dy,dz)!=(0,0,0) : src=raw.get_clip(Region(-dx,-dy,t0-dz-s0,nx,ny,t1-t0))
+		else : src=raw.get_clip(Region(0,0,t0-s0,nx,ny,t1-t0)) if (t0,t1)!=(s0,s1) else raw
+		raw=None
+
+		if options.streaksubtract!=None :
+			a=to_numpy(src)
+			axis=2 if options.streaksubtract.lower()=="x" else 1
+			for z in range(a.shape[0]): a[z]-=findmode(a[z],axis-1)
+			src.update()
+
+		if procs :
+			jobs=[]
+			for y0 in range(0,ny,bs):
+				for x0 in range(0,nx,bs):
+					x1=min(nx,x0+bs)
+					y1=min(ny,y0+bs)
+					# brick with halo, never extending past the edge of the volume, so edge handling matches the full volume
+					bx0,by0=max(0,x0-halo),max(0,y0-halo)
+					bx1,by1=min(nx,x1+halo),min(ny,y1+halo)
+					reg=Region(bx0,by0,0,bx1-bx0,by1-by0,t1-t0)
+					inner=Region(x0-bx0,y0-by0,z0-t0,x1-x0,y1-y0,z1-z0)
+					jobs.append((src,reg,inner,procs,(x0,y0)))
+			out=EMData(nx,ny,z1-z0)
+			for b,loc in ex.map(process_brick,jobs,ordered=False):
+				out.insert_clip(b,(loc[0],loc[1],0))
+		else :
+			out=src.get_clip(Region(0,0,z0-t0,nx,ny,z1-z0)) if (t0,t1)!=(z0,z1) else src
+		src=None
+
+		for mf in options.multfile or [] :
+			out.mult(EMData(mf,0,False,Region(0,0,z0,nx,ny,z1-z0)))
+		if options.mult!=None : out.mult(options.mult)
+		if options.add!=None : out.add(options.add)
+
+		out.write_image(outfile,0,IMAGE_UNKNOWN,False,Region(0,0,z0,nx,ny,z1-z0))
+		E2progress(logid,z1/nz)
+
+	if ex!=None : ex.shutdown()
+
+	E2end(logid)
+
+def process_brick(src,reg,inner,procs,loc):
+	"""Extracts a brick from src, applies the processors in sequence, and returns (the inner part of the brick with the halo removed,loc)"""
+	b=src.get_clip(reg)
+	for name,parms in procs: b.process_inplace(name,parms)
+	return (b.get_clip(inner),loc)
 
-def findmode(img) :
-	"""This computes something akin to the mode"""
+def findmode(a,axis,nbins=64):
+	"""This computes something akin to the mode along one axis of a numpy array. Each line is histogrammed between its min and max,
+and the center of the most populated bin is returned. The result has length 1 along axis, so it can be directly subtracted from a."""
+	mn=a.min(axis=axis,keepdims=True)
+	scl=(a.max(axis=axis,keepdims=True)-mn)/nbins
+	scl[scl==0]=1.0
+	b=np.moveaxis(np.clip(((a-mn)/scl).astype(np.int32),0,nbins-1),axis,-1)
+	shp=b.shape
+	b=b.reshape(-1,shp[-1])+np.arange(b.size//shp[-1],dtype=np.int32)[:,None]*nbins
+	pk=np.bincount(b.ravel(),minlength=b.shape[0]*nbins).reshape(-1,nbins).argmax(axis=1)
+	return mn+(np.expand_dims(pk.reshape(shp[:-1]),axis)+0.5)*scl
 
 
 if __name__ == "__main__":
@@ -83,7 +83,7 @@ def main():
 		sys.exit(0)
 
 	if options.allinfo:
-		args=["info/{}".format(i) for i in os.listdir("info") if ".json" in i]
+		args=["info/{}".format(i) for i in os.listdir("info") if i.endswith(".json")]
 
 	if options.verbose>1: print(len(args)," json files to process")
 
@@ -45,12 +45,14 @@ except:
 
 
 from EMAN2 import *
+from EMAN2_pipeline import EMPipeline
 from math import *
 import os
 import sys
 import time
 import traceback
 import numpy as np
+from functools import partial
 
 
 # This is used to build the HTML status file. It's a global for convenience
@@ -191,6 +193,7 @@ not need to specify any of the following other than the ones already listed abov
 	parser.add_argument("--m3dpostprocess", type=str, default=None, help="Default=none. An arbitrary post-processor to run after all other automatic processing. Maps are autofiltered, so a low-pass filter should not normally be used here.", guitype='comboparambox', choicelist='re_filter_list(dump_processors_list(),"filter.lowpass|filter.highpass|mask")', row=26, col=0, rowspan=1, colspan=3, mode="refinement")
 	parser.add_argument("--parallel","-P",type=str,help="Run in parallel, specify type:<option>=<value>:<option>=<value>. See http://blake.bcm.edu/emanwiki/EMAN2/Parallel",default=None, guitype='strbox', row=30, col=0, rowspan=1, colspan=2, mode="refinement[thread:4]")
 	parser.add_argument("--threads", default=1,type=int,help="Number of threads to run in parallel on a single computer when multi-computer parallelism isn't useful", guitype='intbox', row=30, col=2, rowspan=1, colspan=1, mode="refinement[4]")
+	parser.add_argument("--spawnsteps", default=False, action="store_true",help="Run each step of an iteration as a separate program rather than in a fork of this one. Mainly for debugging.")
 	parser.add_argument("--path", default=None, type=str,help="The name of a directory where results are placed. Default = create new refine_xx")
 	parser.add_argument("--verbose", "-v", dest="verbose", action="store", metavar="n", type=int, default=0, help="verbose level [0-9], higner number means higher level of verboseness")
 #	parser.add_argument("--usefilt", dest="usefilt", type=str,default=None, help="Specify a particle data file that has been low pass or Wiener filtered. Has a one to one correspondence with your particle data. If specified will be used in projection matching routines, and elsewhere.")
@@ -650,9 +653,21 @@ are memory concerns, using a smaller pad option may be the only reasonable alter
 		print("WARNING: threads set to an invalid value. Changing to 1, but you should really provide a reasonable number.")
 		options.threads=1
 
-	if options.parallel!=None : parallel="--parallel {}".format(options.parallel)
-	elif options.threads>1: parallel="--parallel thread:{}".format(options.threads)
-	else: parallel=""
+	# --parallel thread:N is also a statement of how many cores this machine has
+	if options.parallel!=None and options.parallel[:7]=="thread:" :
+		try: options.threads=max(options.threads,int(options.parallel.split(":")[1]))
+		except ValueError: pass
+
+	# The even and odd halves of each iteration run side by side, so the local steps each get half of the threads.
+	# Steps using some other --parallel mode (mpi, dc) are given the whole core budget, so only one runs at a time.
+	halfthreads=max(1,options.threads//2)
+	if options.parallel!=None and options.parallel[:6]!="thread" :
+		parallel="--parallel {}".format(options.parallel)
+		parcores=options.threads
+	else:
+		if options.threads>1: parallel="--parallel thread:{}".format(halfthreads)
+		else: parallel=""
+		parcores=halfthreads
 
 	if options.prefilt : prefilt="--prefilt"
 	elif options.prectf : prefilt="--prectf"
@@ -791,116 +806,87 @@ power spectrum of one of the maps to the other. For example <i>e2proc3d.py map_e
 			mdl1=None
 			mdl2=None
 
+		### The rest of the iteration is run as a dependency graph, since the even and odd halves are independent of each other
+		### until postprocessing. Steps start as soon as their inputs exist, limited to options.threads cores in total
+		eos=("even","odd")
+		notes={}		# explanation for the command log, added when the step starts
+		weights={}		# contribution of each step to the overall progress
+		def stepstart(node):
+			if node.name in notes : append_html(notes[node.name],True)
+			if node.mode=="python" : return
+			print("{}: {}".format(time.ctime(node.start),node.command))
+			append_html("<p>{}: {}</p>".format(time.ctime(node.start),node.command),True)
+
+		def stepdone(node):
+			if node.status!=0 :
+				if node.fatal : print("Error running: ",node.name if node.mode=="python" else node.command)
+				else: print("{} error".format(node.name))
+			E2progress(logid,old_div(progress+sum(weights.get(n.name,0) for n in pl.nodes if n.status!=None),total_procs))
+
+		pl=EMPipeline(options.threads,inprocess=not options.spawnsteps,onstart=stepstart,onfinish=stepdone)
+
 		### 3-D Projections
 		# Note that projections are generated on a single node only as specified by --threads
-		append_html("<p>* Generating 2-D projections of even/odd 3-D maps",True)
-		fspe="{path}/threed_{itrm1:02d}_even.hdf".format(path=options.path,itrm1=it-1)
-		fspo="{path}/threed_{itrm1:02d}_odd.hdf".format(path=options.path,itrm1=it-1)
+		notes["project_even"]="<p>* Generating 2-D projections of even/odd 3-D maps"
 		projsym=options.sym
 		# For focused mode we make a separate set of masked projections (un-numbered) for use in final alignment
 		# these get overwritten in each iteration
 		if options.focused!=None:
-			fmask=EMData(options.focused)
-			omap=EMData(fspe)
-			omap.mult(fmask)
-			omap.write_image("{path}/tmp.hdf".format(path=options.path),0)
-			cmd = "e2project3d.py {path}/tmp.hdf  --outfile {path}/projections_masked_even.hdf -f --projector {projector} --orientgen {orient} --sym {sym} {prethr} --parallel thread:{threads} {verbose}".format(
-				path=options.path,itrm1=it-1,itr=it,projector=options.projector,orient=options.orientgen,sym=projsym,prethr=prethreshold,threads=options.threads,verbose=verbose)
-			run(cmd)
-			
-			omap=EMData(fspo)
-			omap.mult(fmask)
-			omap.write_image("{path}/tmp.hdf".format(path=options.path),0)
-			cmd = "e2project3d.py {path}/tmp.hdf  --outfile {path}/projections_masked_odd.hdf -f --projector {projector} --orientgen {orient} --sym {sym} {prethr} --parallel thread:{threads} {verbose}".format(
-				path=options.path,itrm1=it-1,itr=it,projector=options.projector,orient=options.orientgen,sym=projsym,prethr=prethreshold,threads=options.threads,verbose=verbose)
-			run(cmd)
-			
-			omap=None
-			fmask=None
-			try: os.unlink("{path}/tmp.hdf".format(path=options.path))
-			except: pass
-			
-		cmd = "e2project3d.py {path}/threed_{itrm1:02d}_even.hdf  --outfile {path}/projections_{itr:02d}_even.hdf -f --projector {projector} --orientgen {orient} --sym {sym} {prethr} --parallel thread:{threads} {verbose}".format(
-			path=options.path,itrm1=it-1,itr=it,projector=options.projector,orient=options.orientgen,sym=projsym,prethr=prethreshold,threads=options.threads,verbose=verbose)
-		run(cmd)
-		
-		cmd = "e2project3d.py  {path}/threed_{itrm1:02d}_odd.hdf --outfile {path}/projections_{itr:02d}_odd.hdf -f --projector {projector} --orientgen {orient} --sym {sym} {prethr} --parallel thread:{threads} {verbose}".format(
-			path=options.path,itrm1=it-1,itr=it,projector=options.projector,orient=options.orientgen,sym=projsym,prethr=prethreshold,threads=options.threads,verbose=verbose)
-		run(cmd)
-		
-		progress += 1.0
-		E2progress(logid,old_div(progress,total_procs))
+			for eo in eos:
+				tmp="{path}/tmp_{eo}.hdf".format(path=options.path,eo=eo)
+				pl.add("focusmask_"+eo,partial(mask_map,"{path}/threed_{itrm1:02d}_{eo}.hdf".format(path=options.path,itrm1=it-1,eo=eo),options.focused,tmp))
+				cmd = "e2project3d.py {tmp}  --outfile {path}/projections_masked_{eo}.hdf -f --projector {projector} --orientgen {orient} --sym {sym} {prethr} --parallel thread:{threads} {verbose}".format(
+					tmp=tmp,path=options.path,eo=eo,projector=options.projector,orient=options.orientgen,sym=projsym,prethr=prethreshold,threads=halfthreads,verbose=verbose)
+				pl.add("project_masked_"+eo,cmd,deps=["focusmask_"+eo],cores=halfthreads)
+
+		for eo in eos:
+			cmd = "e2project3d.py {path}/threed_{itrm1:02d}_{eo}.hdf  --outfile {path}/projections_{itr:02d}_{eo}.hdf -f --projector {projector} --orientgen {orient} --sym {sym} {prethr} --parallel thread:{threads} {verbose}".format(
+				path=options.path,itrm1=it-1,itr=it,eo=eo,projector=options.projector,orient=options.orientgen,sym=projsym,prethr=prethreshold,threads=halfthreads,verbose=verbose)
+			weights[pl.add("project_"+eo,cmd,cores=halfthreads)]=0.5
 
 		### We may need to make our own similarity mask file for more accurate particle classification
 		if makesimmask :
-			av=Averagers.get("minmax",{"max":1})
-			nprj=EMUtil.get_image_count("{path}/projections_{itr:02d}_odd.hdf".format(path=options.path,itr=it))
-			print("Mask from {} projections".format(nprj))
-			for i in range(nprj):
-				a=EMData("{path}/projections_{itr:02d}_even.hdf".format(path=options.path,itr=it),i)
-				av.add_image(a)
-				a=EMData("{path}/projections_{itr:02d}_odd.hdf".format(path=options.path,itr=it),i)
-				av.add_image(a)
-			msk=av.finish()
-#			msk.process_inplace("threshold.binary",{"value":msk["sigma"]/50.0})
-			msk.process_inplace("threshold.notzero")
-			msk.write_image("{path}/simmask.hdf".format(path=options.path),0)
+			pl.add("simmask",partial(make_simmask,options.path,it),deps=["project_even","project_odd"])
+			clsdeps=["simmask"]
+		else: clsdeps=[]
 
+		clsdone={}		# the step producing the classmx for each half
 		if options.treeclassify:
 			### Classify using a binary tree
-			append_html("<p>* Classify each particle using a binary tree generated from the projections</p>",True)
-			cmd = "e2classifytree.py {path}/projections_{itr:02d}_even.hdf {inputfile} --output={path}/classmx_{itr:02d}_even.hdf  --nodes {path}/nodes_{itr:02d}_even.hdf --cmp {simcmp} --align {simalign} --aligncmp {simaligncmp} {simralign} {cmpdiff} --incomplete {incomplete} {parallel}".format(path=options.path,itr=it,inputfile=options.input[0],simcmp=options.simcmp,simalign=options.simalign,simaligncmp=options.simaligncmp,simralign=simralign,cmpdiff=cmpdiff,incomplete=options.treeincomplete, parallel=parallel)
-			run(cmd)
-			progress += 1.0
-
-			cmd = "e2classifytree.py {path}/projections_{itr:02d}_odd.hdf {inputfile} --output={path}/classmx_{itr:02d}_odd.hdf  --nodes {path}/nodes_{itr:02d}_odd.hdf --cmp {simcmp} --align {simalign} --aligncmp {simaligncmp} {simralign} {cmpdiff} --incomplete {incomplete} {parallel}".format(path=options.path,itr=it,inputfile=options.input[1],simcmp=options.simcmp,simalign=options.simalign,simaligncmp=options.simaligncmp,simralign=simralign,cmpdiff=cmpdiff,incomplete=options.treeincomplete,parallel=parallel)
-			run(cmd)
-			progress += 1.0
-			E2progress(logid,old_div(progress,total_procs))
+			notes["classifytree_even"]="<p>* Classify each particle using a binary tree generated from the projections</p>"
+			for i,eo in enumerate(eos):
+				cmd = "e2classifytree.py {path}/projections_{itr:02d}_{eo}.hdf {inputfile} --output={path}/classmx_{itr:02d}_{eo}.hdf  --nodes {path}/nodes_{itr:02d}_{eo}.hdf --cmp {simcmp} --align {simalign} --aligncmp {simaligncmp} {simralign} {cmpdiff} --incomplete {incomplete} {parallel}".format(path=options.path,itr=it,eo=eo,inputfile=options.input[i],simcmp=options.simcmp,simalign=options.simalign,simaligncmp=options.simaligncmp,simralign=simralign,cmpdiff=cmpdiff,incomplete=options.treeincomplete, parallel=parallel)
+				clsdone[eo]=pl.add("classifytree_"+eo,cmd,deps=["project_"+eo]+clsdeps,cores=parcores)
+				weights[clsdone[eo]]=1.0
 		elif options.bispec:
 			### FIXME - hard-coded rotate_translate aligner here due to odd irreproducible memory related crashes with rotate_translate_tree:flip=0   8/22/17
 			### At some point this was changed back to rotate_translate_tree with flipping. May be ok since it would recover some mis-classified handedness related particles?  5/29/18
-			append_html("<p>* Computing similarity of each particle to the set of projections using bispectra. This avoids alignment, and permits classification in a single step.</p>",True)
-			cmd = "e2classesbyref.py {path}/projections_{itr:02d}_even.hdf {inputfile} --classmx {path}/classmx_{itr:02d}_even.hdf --classinfo {path}/classinfo_{itr:02d}_even.json --classes {path}/classes_{itr:02}_even.hdf --averager {averager} --cmp {simcmp} --align rotate_translate_flip:usebispec=1 --aligncmp {simaligncmp} {simralign} {verbose} --sep {sep} --threads {threads}".format(
-				path=options.path,itr=it,inputfile=options.input[0],simcmp=options.simcmp,simalign=options.simalign,simaligncmp=options.simaligncmp,simralign=simralign,sep=options.sep,averager=options.classaverager,
-				verbose=verbose,threads=options.threads)
-			run(cmd)
-			progress += 1.0
-			cmd = "e2classesbyref.py {path}/projections_{itr:02d}_odd.hdf {inputfile} --classmx {path}/classmx_{itr:02d}_odd.hdf --classinfo {path}/classinfo_{itr:02d}_odd.json --classes {path}/classes_{itr:02}_odd.hdf --averager {averager} --cmp {simcmp} --align rotate_translate_flip:usebispec=1 --aligncmp {simaligncmp} {simralign} {verbose} --sep {sep} --threads {threads}".format(
-				path=options.path,itr=it,inputfile=options.input[1],simcmp=options.simcmp,simalign=options.simalign,simaligncmp=options.simaligncmp,simralign=simralign,sep=options.sep,averager=options.classaverager,
-				verbose=verbose,threads=options.threads)
-			run(cmd)
-			progress += 1.0
-			
-			
+			notes["classesbyref_even"]="<p>* Computing similarity of each particle to the set of projections using bispectra. This avoids alignment, and permits classification in a single step.</p>"
+			for i,eo in enumerate(eos):
+				cmd = "e2classesbyref.py {path}/projections_{itr:02d}_{eo}.hdf {inputfile} --classmx {path}/classmx_{itr:02d}_{eo}.hdf --classinfo {path}/classinfo_{itr:02d}_{eo}.json --classes {path}/classes_{itr:02}_{eo}.hdf --averager {averager} --cmp {simcmp} --align rotate_translate_flip:usebispec=1 --aligncmp {simaligncmp} {simralign} {verbose} --sep {sep} --threads {threads}".format(
+					path=options.path,itr=it,eo=eo,inputfile=options.input[i],simcmp=options.simcmp,simalign=options.simalign,simaligncmp=options.simaligncmp,simralign=simralign,sep=options.sep,averager=options.classaverager,
+					verbose=verbose,threads=halfthreads)
+				clsdone[eo]=pl.add("classesbyref_"+eo,cmd,deps=["project_"+eo]+clsdeps,cores=halfthreads)
+				weights[clsdone[eo]]=1.0
 		else:
 			### Simmx
 			#FIXME - Need to combine simmx with classification !!!
 
-			append_html("<p>* Computing similarity of each particle to the set of projections using a hierarchical scheme. This will be the basis for classification.</p>",True)
-			cmd = "e2simmx2stage.py {path}/projections_{itr:02d}_even.hdf {inputfile} {path}/simmx_{itr:02d}_even.hdf {path}/proj_simmx_{itr:02d}_even.hdf {path}/proj_stg1_{itr:02d}_even.hdf {path}/simmx_stg1_{itr:02d}_even.hdf --saveali --cmp {simcmp} \
+			notes["simmx_even"]="<p>* Computing similarity of each particle to the set of projections using a hierarchical scheme. This will be the basis for classification.</p>"
+			for i,eo in enumerate(eos):
+				cmd = "e2simmx2stage.py {path}/projections_{itr:02d}_{eo}.hdf {inputfile} {path}/simmx_{itr:02d}_{eo}.hdf {path}/proj_simmx_{itr:02d}_{eo}.hdf {path}/proj_stg1_{itr:02d}_{eo}.hdf {path}/simmx_stg1_{itr:02d}_{eo}.hdf --saveali --cmp {simcmp} \
 	--align {simalign} --aligncmp {simaligncmp} {simralign} {shrinks1} {shrink} {prefilt} {simmask} {verbose} {parallel}".format(
-				path=options.path,itr=it,inputfile=options.input[0],simcmp=options.simcmp,simalign=options.simalign,simaligncmp=options.simaligncmp,simralign=simralign,
-				shrinks1=shrinks1,shrink=shrink,prefilt=prefilt,simmask=simmask,verbose=verbose,parallel=parallel)
-			run(cmd)
-			cmd = "e2simmx2stage.py {path}/projections_{itr:02d}_odd.hdf {inputfile} {path}/simmx_{itr:02d}_odd.hdf {path}/proj_simmx_{itr:02d}_odd.hdf {path}/proj_stg1_{itr:02d}_odd.hdf {path}/simmx_stg1_{itr:02d}_odd.hdf --saveali --cmp {simcmp} \
-	--align {simalign} --aligncmp {simaligncmp} {simralign} {shrinks1} {shrink} {prefilt} {simmask} {verbose} {parallel}".format(
-				path=options.path,itr=it,inputfile=options.input[1],simcmp=options.simcmp,simalign=options.simalign,simaligncmp=options.simaligncmp,simralign=simralign,
-				shrinks1=shrinks1,shrink=shrink,prefilt=prefilt,simmask=simmask,verbose=verbose,parallel=parallel)
-			run(cmd)
-			progress += 1.0
-			E2progress(logid,old_div(progress,total_procs))
+					path=options.path,itr=it,eo=eo,inputfile=options.input[i],simcmp=options.simcmp,simalign=options.simalign,simaligncmp=options.simaligncmp,simralign=simralign,
+					shrinks1=shrinks1,shrink=shrink,prefilt=prefilt,simmask=simmask,verbose=verbose,parallel=parallel)
+				weights[pl.add("simmx_"+eo,cmd,deps=["project_"+eo]+clsdeps,cores=parcores)]=0.5
 
 			### Classify
-			append_html("<p>* Based on the similarity values, put each particle in to 1 or more classes (depending on --sep)</p>",True)
-			cmd = "e2classify.py {path}/simmx_{itr:02d}_even.hdf {path}/classmx_{itr:02d}_even.hdf -f --sep {sep} {verbose}".format(
-				path=options.path,itr=it,sep=options.sep,verbose=verbose)
-			run(cmd)
-			cmd = "e2classify.py {path}/simmx_{itr:02d}_odd.hdf {path}/classmx_{itr:02d}_odd.hdf -f --sep {sep} {verbose}".format(
-				path=options.path,itr=it,sep=options.sep,verbose=verbose)
-			run(cmd)
-			progress += 1.0
-			E2progress(logid,old_div(progress,total_procs))
+			notes["classify_even"]="<p>* Based on the similarity values, put each particle in to 1 or more classes (depending on --sep)</p>"
+			for eo in eos:
+				cmd = "e2classify.py {path}/simmx_{itr:02d}_{eo}.hdf {path}/classmx_{itr:02d}_{eo}.hdf -f --sep {sep} --threads {threads} {verbose}".format(
+					path=options.path,itr=it,eo=eo,sep=options.sep,threads=halfthreads,verbose=verbose)
+				clsdone[eo]=pl.add("classify_"+eo,cmd,deps=["simmx_"+eo],cores=halfthreads)
+				weights[clsdone[eo]]=0.5
 
 		### Class-averaging
 
@@ -920,114 +906,91 @@ power spectrum of one of the maps to the other. For example <i>e2proc3d.py map_e
 			print("Warning: Not using structure factor amplitude correction, so disabling classrefsf option")
 			append_html("<p>Warning: classrefsf option requires 'strucfac' amplitude correction. Since this is not being used either by intent or due to the high resolution of the map, 'classrefsf' has been disabled.</p>")
 
-#		if not options.bispec or classiter!=0 :
-		try:
-			append_html("<p>* Iteratively align and average all of the particles within each class, discarding the worst fraction</p>",True)
-			if options.focused : focused="--focused {path}/projections_even_masked.hdf".format(path=options.path)
+		# a failed class-averaging doesn't stop the refinement (fatal=False)
+		notes["classaverage_even"]="<p>* Iteratively align and average all of the particles within each class, discarding the worst fraction</p>"
+		for i,eo in enumerate(eos):
+			if options.focused : focused="--focused {path}/projections_{eo}_masked.hdf".format(path=options.path,eo=eo)
 			else: focused =""
-			cmd="e2classaverage.py {inputfile} --classmx {path}/classmx_{itr:02d}_even.hdf --decayedge --storebad --output {path}/classes_{itr:02d}_even.hdf --ref {path}/projections_{itr:02d}_even.hdf --iter {classiter} \
-	-f --resultmx {path}/cls_result_{itr:02d}_even.hdf --normproc {normproc} --averager {averager} {classrefsf} {classautomask} --keep {classkeep} {classkeepsig} --cmp {classcmp} \
-	--align {classalign} --aligncmp {classaligncmp} {classralign} {prefilt} {focused} {verbose} {parallel}".format(
-				inputfile=cainput[0], path=options.path, itr=it, classiter=classiter, normproc=options.classnormproc, averager=options.classaverager, classrefsf=classrefsf,
-				classautomask=classautomask,classkeep=options.classkeep, classkeepsig=classkeepsig, classcmp=options.classcmp, classalign=options.classalign, classaligncmp=options.classaligncmp,
-				classralign=classralign, prefilt=prefilt,focused=focused, verbose=verbose, parallel=parallel)
-			run(cmd)
-			
-			if options.focused : focused="--focused {path}/projections_odd_masked.hdf".format(path=options.path)
-			cmd="e2classaverage.py {inputfile} --classmx {path}/classmx_{itr:02d}_odd.hdf --decayedge --storebad --output {path}/classes_{itr:02d}_odd.hdf --ref {path}/projections_{itr:02d}_odd.hdf --iter {classiter} \
-	-f --resultmx {path}/cls_result_{itr:02d}_odd.hdf --normproc {normproc} --averager {averager} {classrefsf} {classautomask} --keep {classkeep} {classkeepsig} --cmp {classcmp} \
+			cmd="e2classaverage.py {inputfile} --classmx {path}/classmx_{itr:02d}_{eo}.hdf --decayedge --storebad --output {path}/classes_{itr:02d}_{eo}.hdf --ref {path}/projections_{itr:02d}_{eo}.hdf --iter {classiter} \
+	-f --resultmx {path}/cls_result_{itr:02d}_{eo}.hdf --normproc {normproc} --averager {averager} {classrefsf} {classautomask} --keep {classkeep} {classkeepsig} --cmp {classcmp} \
 	--align {classalign} --aligncmp {classaligncmp} {classralign} {prefilt} {focused} {verbose} {parallel}".format(
-				inputfile=cainput[1], path=options.path, itr=it, classiter=classiter, normproc=options.classnormproc, averager=options.classaverager, classrefsf=classrefsf,
+				inputfile=cainput[i], path=options.path, itr=it, eo=eo, classiter=classiter, normproc=options.classnormproc, averager=options.classaverager, classrefsf=classrefsf,
 				classautomask=classautomask,classkeep=options.classkeep, classkeepsig=classkeepsig, classcmp=options.classcmp, classalign=options.classalign, classaligncmp=options.classaligncmp,
 				classralign=classralign, prefilt=prefilt,focused=focused, verbose=verbose, parallel=parallel)
-			run(cmd)
-		except:
-			print("classaverage error")
-		progress += 1.0
-		E2progress(logid,old_div(progress,total_procs))
+			deps=[clsdone[eo]]
+			if options.focused!=None : deps.append("project_masked_"+eo)
+			weights[pl.add("classaverage_"+eo,cmd,deps=deps,cores=parcores,fatal=False)]=0.5
 
 		### Refine Euler angles of class-averages
+		avgdone={eo:"classaverage_"+eo for eo in eos}
 		if options.eulerrefine and it>1 :
-			cmd="e2euler_refine.py --input {path}/classes_{itr:02d}_even.hdf --ref_volume {path}/threed_{itrm1:02d}_even.hdf --threads {threads} {verbose}".format(
-				path=options.path, itr=it, itrm1=it-1,threads=options.threads,verbose=verbose)
-			run(cmd)
-			
-			cmd="e2euler_refine.py --input {path}/classes_{itr:02d}_odd.hdf --ref_volume {path}/threed_{itrm1:02d}_odd.hdf --threads {threads} {verbose}".format(
-				path=options.path, itr=it, itrm1=it-1,threads=options.threads,verbose=verbose)
-			run(cmd)
+			for eo in eos:
+				cmd="e2euler_refine.py --input {path}/classes_{itr:02d}_{eo}.hdf --ref_volume {path}/threed_{itrm1:02d}_{eo}.hdf --threads {threads} {verbose}".format(
+					path=options.path, itr=it, itrm1=it-1, eo=eo, threads=halfthreads,verbose=verbose)
+				avgdone[eo]=pl.add("eulerrefine_"+eo,cmd,deps=[avgdone[eo]],cores=halfthreads)
 
 		### 3-D Reconstruction
 		# FIXME - --lowmem removed due to some tricky bug in e2make3d
 		if options.breaksym : m3dsym="c1"
 		else : m3dsym=options.sym
-		append_html("<p>* Using the known orientations, reconstruct the even/odd 3-D maps from the even/odd 2-D class-averages.</p>",True)
+		notes["make3d_even"]="<p>* Using the known orientations, reconstruct the even/odd 3-D maps from the even/odd 2-D class-averages.</p>"
 
-		if not options.m3dold :
-			cmd="e2make3dpar.py --input {path}/classes_{itr:02d}_even.hdf --sym {sym} --output {path}/threed_{itr:02d}_even.hdf {preprocess} \
+		recdone={}
+		for eo in eos:
+			if not options.m3dold :
+				cmd="e2make3dpar.py --input {path}/classes_{itr:02d}_{eo}.hdf --sym {sym} --output {path}/threed_{itr:02d}_{eo}.hdf {preprocess} \
  --keep {m3dkeep} {keepsig} --apix {apix} --pad {m3dpad} --iterative --threads {threads} {verbose}".format(
-			path=options.path, itr=it, sym=m3dsym, recon=options.recon, preprocess=m3dpreprocess,  m3dkeep=options.m3dkeep, keepsig=m3dkeepsig,
-			m3dpad=options.pad,fillangle=astep ,threads=options.threads, apix=apix, verbose=verbose)
-			if it>1 : cmd=cmd+" --itermask {path}/mask.hdf".format(path=options.path)
-		else:
-			cmd="e2make3d.py --input {path}/classes_{itr:02d}_even.hdf --iter 2 -f --sym {sym} --output {path}/threed_{itr:02d}_even.hdf --recon {recon} {preprocess} \
+				path=options.path, itr=it, eo=eo, sym=m3dsym, recon=options.recon, preprocess=m3dpreprocess,  m3dkeep=options.m3dkeep, keepsig=m3dkeepsig,
+				m3dpad=options.pad,fillangle=astep ,threads=halfthreads, apix=apix, verbose=verbose)
+				if it>1 : cmd=cmd+" --itermask {path}/mask.hdf".format(path=options.path)
+				cores=halfthreads
+			else:
+				cmd="e2make3d.py --input {path}/classes_{itr:02d}_{eo}.hdf --iter 2 -f --sym {sym} --output {path}/threed_{itr:02d}_{eo}.hdf --recon {recon} {preprocess} \
  --keep={m3dkeep} {keepsig} --apix={apix} --pad={m3dpad} {verbose}".format(
-			path=options.path, itr=it, sym=m3dsym, recon=options.recon, preprocess=m3dpreprocess,  m3dkeep=options.m3dkeep, keepsig=m3dkeepsig,
-			m3dpad=options.pad, apix=apix, verbose=verbose)
+				path=options.path, itr=it, eo=eo, sym=m3dsym, recon=options.recon, preprocess=m3dpreprocess,  m3dkeep=options.m3dkeep, keepsig=m3dkeepsig,
+				m3dpad=options.pad, apix=apix, verbose=verbose)
+				cores=1
 
-		#if options.classweight == "count":
-		#	pass # this is the default.
-		#elif options.classweight == "sqrt":
-		#	cmd += " --sqrtnorm"
-		#elif options.classwright == "no_wt":
-		#	cmd += " --no_wt"
+			#if options.classweight == "count":
+			#	pass # this is the default.
+			#elif options.classweight == "sqrt":
+			#	cmd += " --sqrtnorm"
+			#elif options.classwright == "no_wt":
+			#	cmd += " --no_wt"
 
-		run(cmd)
+			recdone[eo]=pl.add("make3d_"+eo,cmd,deps=[avgdone[eo]],cores=cores)
+			weights[recdone[eo]]=0.5
 
-		if not options.m3dold :
-			cmd="e2make3dpar.py --input {path}/classes_{itr:02d}_odd.hdf --sym {sym} --output {path}/threed_{itr:02d}_odd.hdf {preprocess} \
- --keep {m3dkeep} {keepsig} --apix {apix} --pad {m3dpad} --iterative --threads {threads} {verbose}".format(
-			path=options.path, itr=it, sym=m3dsym, recon=options.recon, preprocess=m3dpreprocess, m3dkeep=options.m3dkeep, keepsig=m3dkeepsig,
-			m3dpad=options.pad, apix=apix, fillangle=astep ,threads=options.threads, verbose=verbose)
-			if it>1 : cmd=cmd+" --itermask {path}/mask.hdf".format(path=options.path)
-		else:
-			cmd="e2make3d.py --input {path}/classes_{itr:02d}_odd.hdf --iter 2 -f --sym {sym} --output {path}/threed_{itr:02d}_odd.hdf --recon {recon} {preprocess} \
- --keep={m3dkeep} {keepsig} --apix={apix} --pad={m3dpad} {verbose}".format(
-			path=options.path, itr=it, sym=m3dsym, recon=options.recon, preprocess=m3dpreprocess, m3dkeep=options.m3dkeep, keepsig=m3dkeepsig,
-			m3dpad=options.pad, apix=apix, verbose=verbose)
-
-		#if options.classweight == "count":
-		#	pass # this is the default.
-		#elif options.classweight == "sqrt":
-		#	cmd += " --sqrtnorm"
-		#elif options.classwright == "no_wt":
-		#	cmd += " --no_wt"
-
-		run(cmd)
-		progress += 1.0
-		
-		### in focused mode we need to symmetrize under the mask
-		if options.focused!=None and options.sym.lower() not in ("c1","i") :
-			fmask=EMData(options.focused)
-			emap=EMData("{path}/threed_{itr:02d}_even.hdf".format(path=options.path,itr=it))
-			emap.mult(fmask)
-			emap.process_inplace("xform.applysym",{"sym":options.sym})
-			emap.write_image("{path}/threed_{itr:02d}_even.hdf".format(path=options.path,itr=it),0)
-
-			omap=EMData("{path}/threed_{itr:02d}_odd.hdf".format(path=options.path,itr=it))
-			omap.mult(fmask)
-			omap.process_inplace("xform.applysym",{"sym":options.sym})
-			omap.write_image("{path}/threed_{itr:02d}_odd.hdf".format(path=options.path,itr=it),0)
+			### in focused mode we need to symmetrize under the mask
+			if options.focused!=None and options.sym.lower() not in ("c1","i") :
+				fsp="{path}/threed_{itr:02d}_{eo}.hdf".format(path=options.path,itr=it,eo=eo)
+				recdone[eo]=pl.add("symmetrize_"+eo,partial(mask_map,fsp,options.focused,fsp,options.sym),deps=[recdone[eo]])
 
 		### postprocessing
-		append_html("""<p>* Finally, determine the resolution, filter and mask the even/odd maps, and then produce the final 3-D map for this iteration.
-Note that the next iteration is seeded with the individual even/odd maps, not the final average.</p>""",True)
+		notes["postprocess"]="""<p>* Finally, determine the resolution, filter and mask the even/odd maps, and then produce the final 3-D map for this iteration.
+Note that the next iteration is seeded with the individual even/odd maps, not the final average.</p>"""
 		evenfile="{path}/threed_{itr:02d}_even.hdf".format(path=options.path,itr=it)
 		oddfile="{path}/threed_{itr:02d}_odd.hdf".format(path=options.path,itr=it)
 		combfile="{path}/threed_{itr:02d}.hdf".format(path=options.path,itr=it)
-		run("e2refine_postprocess.py --even {path}/threed_{it:02d}_even.hdf --odd {path}/threed_{it:02d}_odd.hdf --output {path}/threed_{it:02d}.hdf --automaskexpand {amaskxp} \
+		pl.add("postprocess","e2refine_postprocess.py --even {path}/threed_{it:02d}_even.hdf --odd {path}/threed_{it:02d}_odd.hdf --output {path}/threed_{it:02d}.hdf --automaskexpand {amaskxp} \
 --align --mass {mass} --iter {it} {amask3d} {amask3d2} {m3dpostproc} {setsf} {tophat} --sym {sym} --restarget {restarget} --underfilter --ampcorrect {ampcorrect} --threads {threads}".format(\
 path=options.path, it=it, mass=options.mass, amask3d=amask3d, sym=m3dsym, amask3d2=amask3d2, m3dpostproc=m3dpostproc, setsf=m3dsetsf, restarget=options.targetres, amaskxp=options.automaskexpand,\
-ampcorrect=ampcorrect,tophat=tophat,threads=options.threads))
+ampcorrect=ampcorrect,tophat=tophat,threads=options.threads),deps=[recdone["even"],recdone["odd"]],cores=options.threads)
+
+		### Convergence plot data
+		for eo in eos:
+			cmd="e2proc3d.py {path}/threed_{itr:02d}_{eo}.hdf {path}/converge_{eo}_{itrm1:02d}_{itr:02d}.txt --calcfsc {path}/threed_{itrm1:02d}_{eo}.hdf".format(path=options.path,itr=it,itrm1=it-1,eo=eo)
+			pl.add("convergence_"+eo,cmd,deps=["postprocess"])
+
+		ok=pl.run()
+		append_html(pl.timing_html("Time spent in each step of iteration {}".format(it)))
+		if not ok : sys.exit(1)
+		progress+=sum(weights.values())
+
+		if options.focused!=None:
+			for eo in eos:
+				try: os.unlink("{path}/tmp_{eo}.hdf".format(path=options.path,eo=eo))
+				except: pass
 
 		db.update({"last_map":combfile,"last_even":evenfile,"last_odd":oddfile})
 
@@ -1035,11 +998,6 @@ ampcorrect=ampcorrect,tophat=tophat,threads=options.threads))
 		### Generating FSC plots and other output for the report files ###
 
 		### Convergenece plot
-		if it>0:
-			cmd="e2proc3d.py {path}/threed_{itr:02d}_even.hdf {path}/converge_even_{itrm1:02d}_{itr:02d}.txt --calcfsc {path}/threed_{itrm1:02d}_even.hdf".format(path=options.path,itr=it,itrm1=it-1)
-			run(cmd)
-			cmd="e2proc3d.py {path}/threed_{itr:02d}_odd.hdf {path}/converge_odd_{itrm1:02d}_{itr:02d}.txt --calcfsc {path}/threed_{itrm1:02d}_odd.hdf".format(path=options.path,itr=it,itrm1=it-1)
-			run(cmd)
 
 		try:
 			plt.title("Convergence plot (not resolution)")
@@ -1262,6 +1220,28 @@ For the final completed iteration, the unmasked even and odd volumes are also re
 """.format(path=options.path,stars="*"*len(options.path)))
 
 
+def mask_map(mapfile,maskfile,outfile,sym=None):
+	"Multiplies a map by a mask, optionally symmetrizing the result. Used for --focused"
+	vol=EMData(mapfile,0)
+	vol.mult(EMData(maskfile,0))
+	if sym!=None : vol.process_inplace("xform.applysym",{"sym":sym})
+	vol.write_image(outfile,0)
+
+def make_simmask(path,it):
+	"Makes a similarity mask covering all of the even and odd projections from iteration it"
+	av=Averagers.get("minmax",{"max":1})
+	nprj=EMUtil.get_image_count("{path}/projections_{itr:02d}_odd.hdf".format(path=path,itr=it))
+	print("Mask from {} projections".format(nprj))
+	for i in range(nprj):
+		a=EMData("{path}/projections_{itr:02d}_even.hdf".format(path=path,itr=it),i)
+		av.add_image(a)
+		a=EMData("{path}/projections_{itr:02d}_odd.hdf".format(path=path,itr=it),i)
+		av.add_image(a)
+	msk=av.finish()
+#	msk.process_inplace("threshold.binary",{"value":msk["sigma"]/50.0})
+	msk.process_inplace("threshold.notzero")
+	msk.write_image("{path}/simmask.hdf".format(path=path),0)
+
 def run(command):
 	"Mostly here for debugging, allows you to control how commands are executed (os.system is normal)"
 
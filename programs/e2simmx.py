@@ -44,7 +44,8 @@ from math import *
 import os
 import sys
 import traceback
-from EMAN2_utils import cmponetomany
+import numpy as np
+from EMAN2_utils import cmponetomany,simmx_topk_init,simmx_topk_merge,simmx_topk_write
 
 a = EMUtil.ImageType.IMAGE_UNKNOWN
 
@@ -87,6 +88,22 @@ def opt_rectangular_subdivision(x,y,n):
 
 
 
+def read_candidates(fsp,r0,r1):
+	"""Reads rows r0:r1 of a --candidates file. Returns a sorted array of reference numbers for each row"""
+	hdr=EMData(fsp,0,True)
+	img=EMData()
+	img.read_image(fsp,0,False,Region(0,r0,hdr["nx"],r1-r0))
+	a=img.numpy().reshape(r1-r0,hdr["nx"])
+	return [np.unique(row[row>=0]).astype(int) for row in a]
+
+def candidate_ranges(r,cands,c0,c1):
+	"""Converts the candidate references of row r into the (row,first col,last col) inclusive ranges used by the
+	'partial' key of EMSimTaskDC, limited to columns c0:c1"""
+	c=cands[(cands>=c0)&(cands<c1)]
+	if len(c)==0 : return []
+	brk=np.flatnonzero(np.diff(c)>1)
+	return [(r,int(c[i]),int(c[j])) for i,j in zip(np.concatenate(([0],brk+1)),np.concatenate((brk,[len(c)-1])))]
+
 class EMParallelSimMX(object):
 	def __init__(self,options,args,logger=None):
 		'''
@@ -104,9 +121,7 @@ class EMParallelSimMX(object):
 		self.etc=EMTaskCustomer(options.parallel)
 		if options.colmasks!=None : self.etc.precache([args[0],args[1],options.colmasks])
 		else : self.etc.precache([args[0],args[1]])
-		self.num_cpus = self.etc.cpu_est()
-		if self.num_cpus < 32: # lower limit
-			self.num_cpus = 32
+		self.num_cpus = max(1,self.etc.cpu_est())
 
 		self.__task_options = None
 
@@ -128,6 +143,7 @@ class EMParallelSimMX(object):
 				d["ralign"] = None
 				d["raligncmp"] = None
 			d["prefilt"]=options.prefilt
+			d["topk"]=options.topk
 
 			if hasattr(options,"shrink") and options.shrink != None: d["shrink"] = options.shrink
 			else: d["shrink"] = None
@@ -158,6 +174,11 @@ class EMParallelSimMX(object):
 			if options.force: remove_file(output)
 			else: raise RuntimeError("The output file exists. Please remove it or specify the force option")
 
+		# with topk, results are accumulated in memory and written at the end
+		if options.topk>0 :
+			self.topk=simmx_topk_init(options.topk,self.rlen,options.saveali)
+			return
+
 		e = EMData(self.clen,self.rlen)
 		e.to_zero()
 		e.set_attr(PROJ_FILE_ATTR,self.args[0])
@@ -168,48 +189,98 @@ class EMParallelSimMX(object):
 		for i in range(1,n):
 			e.write_image(output,i)
 
-	def __get_blocks(self):
+	def __init_blocks(self):
 		'''
-		Gets the blocks that will be processed in parallel, these are essentially ranges
+		Sets up the block scheduler. The columns (references) are divided into strips once, then rows (particles) are
+		handed out from the strips on demand by __next_block(). Block sizes shrink as the remaining work drains (guided
+		self-scheduling), so the run starts with large blocks and ends with small ones, which keeps a few slow blocks
+		from determining the total run time.
 		'''
 
-		steve_factor = 3 # increase number of jobs a bit for better distribution
-		total_jobs = steve_factor*self.num_cpus
-
-		[col_div,row_div] = opt_rectangular_subdivision(self.clen,self.rlen,total_jobs)
-
-
-		block_c = old_div(self.clen,col_div)
-		block_r = old_div(self.rlen,row_div)
+		[col_div,row_div] = opt_rectangular_subdivision(self.clen,self.rlen,self.num_cpus)
 
+		self.strips=[]		# [first col, last col, next row] for each strip of columns
+		block_c = self.clen//col_div
 		residual_c = self.clen-block_c*col_div # residual left over by integer division
-
-		blocks = []
-
 		current_c = 0
-		for c in range(0,col_div):
+		for c in range(col_div):
 			last_c = current_c + block_c
 			if residual_c > 0:
 				last_c += 1
 				residual_c -= 1
+			self.strips.append([current_c,last_c,0])
+			current_c = last_c
+
+		# the smallest block we will produce, 1/4 the size of the fixed blocks we used to make. Smaller blocks
+		# would spend too much of their time reading references
+		self.min_cells = max(1,self.clen*self.rlen//(12*self.num_cpus))
 
-			current_r = 0
-			residual_r = self.rlen-block_r*row_div # residual left over by integer division
-			for r in range(0,row_div) :
-				last_r = current_r + block_r
-				if residual_r > 0:
-					last_r += 1
-					residual_r -= 1
+	def __remaining_cells(self):
+		return sum([(s[1]-s[0])*(self.rlen-s[2]) for s in self.strips])
 
+	def __next_block(self):
+		'''
+		Returns the next block to compute as [first col, last col, first row, last row] or None when all blocks have been
+		handed out. Each block gets ~1/2 of the remaining work per CPU, but no less than min_cells.
+		'''
+		strip=max(self.strips,key=lambda s:(s[1]-s[0])*(self.rlen-s[2]))
+		if strip[2]>=self.rlen : return None
 
-				blocks.append([current_c,last_c,current_r,last_r])
-				current_r = last_r
+		target=max(self.min_cells,self.__remaining_cells()//(2*self.num_cpus))
+		nrows=min(self.rlen-strip[2],max(1,int(ceil(target/float(strip[1]-strip[0])))))
+		block=[strip[0],strip[1],strip[2],strip[2]+nrows]
+		strip[2]+=nrows
+		return block
 
-			current_c = last_c
+	def __make_task(self,block):
+		'''
+		Makes the EMSimTaskDC for a single block. Returns None if there is nothing to compute in the block (fillzero)
+		'''
+		data = {}
+		data["references"] = ("cache",self.args[0],block[0],block[1])
+		data["particles"] = ("cache",self.args[1],block[2],block[3])
+		if self.options.colmasks!=None : data["colmasks"] = ("cache",self.options.colmasks,block[0],block[1])
+		if self.options.mask!=None : data["mask"] = ("cache",self.options.mask,0,1)
+		if self.options.candidates!=None :
+			rng=[]
+			for i,cands in enumerate(read_candidates(self.options.candidates,block[2],block[3])):
+				rng.extend(candidate_ranges(block[2]+i,cands,block[0],block[1]))
+			data["partial"]=rng
+
+			if len(rng)==0 : return None
+		elif self.options.fillzero :
+			# for each particle check to see which portion of the matrix we need to fill
+			rng=[]
+			for i in range(block[2],block[3]):
+				c=EMData()
+				c.read_image(self.args[2],0,False,Region(block[0],i,block[1]-block[0]+1,1))
+				inr=0
+				st=0
+				for j in range(c["nx"]):
+					if c[j]==0 and not inr:
+						st=j
+						inr=1
+					if c[j]!=0 and inr:
+						rng.append((i,st+block[0],j-1+block[0]))
+						inr=0
+				if inr :
+					rng.append((i,st+block[0],j+block[0]))
+			data["partial"]=rng
+
+			if len(rng)==0 : return None		# nothing to compute in this block, skip it completely
 
-#		print col_div,row_div,col_div*row_div
-#		print self.clen,self.rlen,residual_c,residual_r
-		return blocks
+		return EMSimTaskDC(data=data,options=self.__get_task_options(self.options))
+
+	def __write_timing(self,timing,fsp):
+		'''
+		Writes the per-block timing report. Each line is one block: c0 c1 r0 r1 cells, wall time from submission to
+		completion, time reported by the task itself.
+		'''
+		out=open(fsp,"w")
+		out.write("# c0\tc1\tr0\tr1\tcells\twall(s)\tcompute(s)\n")
+		for b,wall,comp in timing:
+			out.write("%d\t%d\t%d\t%d\t%d\t%1.2f\t%1.2f\n"%(b[0],b[1],b[2],b[3],(b[1]-b[0])*(b[3]-b[2]),wall,comp))
+		out.close()
 
 	def execute(self):
 		'''
@@ -217,64 +288,34 @@ class EMParallelSimMX(object):
 		'''
 		if len(self.options.parallel) > 1 :
 			self.__init_memory(self.options)
-			blocks = self.__get_blocks()
-#			print blocks
-
-#			self.check_blocks(blocks) # testing function can be removed at some point
-
-			tasks=[]
-			for bn,block in enumerate(blocks):
-
-				data = {}
-				data["references"] = ("cache",self.args[0],block[0],block[1])
-				data["particles"] = ("cache",self.args[1],block[2],block[3])
-				if self.options.colmasks!=None : data["colmasks"] = ("cache",self.options.colmasks,block[0],block[1])
-				if self.options.mask!=None : data["mask"] = ("cache",self.options.mask,0,1)
-				if self.options.fillzero :
-					# for each particle check to see which portion of the matrix we need to fill
-					if (bn%10==0) : print("%d/%d     \r"%(bn,len(blocks)), end=' ')
-					sys.stdout.flush()
-					rng=[]
-					for i in range(block[2],block[3]):
-						c=EMData()
-						c.read_image(self.args[2],0,False,Region(block[0],i,block[1]-block[0]+1,1))
-						inr=0
-						st=0
-						for j in range(c["nx"]):
-							if c[j]==0 and not inr:
-								st=j
-								inr=1
-							if c[j]!=0 and inr:
-								rng.append((i,st+block[0],j-1+block[0]))
-								inr=0
-						if inr :
-							rng.append((i,st+block[0],j+block[0]))
-					data["partial"]=rng
-#					print "%d) %s\t"%(bn,str(block)),rng
-
-				if self.options.fillzero and len(data["partial"])==0 : continue		# nothing to compute in this block, skip it completely
-				else :
-					task = EMSimTaskDC(data=data,options=self.__get_task_options(self.options))
-					#print "Est %d CPUs"%etc.cpu_est()
-					tasks.append(task)
-
-			# This just verifies that all particles have at least one class
-			#a=set()
-			#for i in tasks:
-				#for k in i.data["partial"] : a.add(k[0])
-
-			#b=set(range(self.rlen))
-			#b-=a
-			#print b
-
-			print("%d/%d         "%(bn,len(blocks)))
-			self.tids=self.etc.send_tasks(tasks)
-			print(len(self.tids)," tasks submitted")
-#
+			self.__init_blocks()
+			totcells=float(self.clen*self.rlen)
+			donecells=0
+
+			# Blocks are made and submitted on demand, keeping ~2 tasks per CPU queued. Whoever finishes first gets
+			# the next block, and completed blocks are written to the output matrix as soon as they arrive.
+			self.tids=[]
+			tinfo={}		# tid -> (block,submission time)
+			timing=[]		# (block,wall time,compute time) for each completed block
+			exhausted=False
 			while 1:
+				while not exhausted and len(self.tids)<2*self.num_cpus:
+					block=self.__next_block()
+					if block==None :
+						exhausted=True
+						break
+					task=self.__make_task(block)
+					if task==None :
+						donecells+=(block[1]-block[0])*(block[3]-block[2])
+						continue
+					tid=self.etc.send_task(task)
+					self.tids.append(tid)
+					tinfo[tid]=(block,time.time())
+
 				if len(self.tids) == 0: break
-				print(len(self.tids),"simmx tasks left in main loop   \r", end=' ')
+				print(len(self.tids),"simmx tasks running, %1.1f%% complete   \r"%(100.0*donecells/totcells), end=' ')
 				sys.stdout.flush()
+
 				st_vals = self.etc.check_task(self.tids)
 				for i in range(len(self.tids)-1,-1,-1):
 					st = st_vals[i]
@@ -283,27 +324,37 @@ class EMParallelSimMX(object):
 
 						try:
 							rslts = self.etc.get_results(tid)
-#							display(rslts[1]["rslt_data"][0])
 							self.__store_output_data(rslts[1])
 						except:
 							traceback.print_exc()
 							print("ERROR storing results for task %d. Rerunning."%tid)
 							self.etc.rerun_task(tid)
 							continue
+
+						block,t0=tinfo.pop(tid)
+						timing.append((block,time.time()-t0,rslts[1].get("time",0)))
+						donecells+=(block[1]-block[0])*(block[3]-block[2])
 						if self.logger != None:
-							E2progress(self.logger,1.0-old_div(len(self.tids),float(len(blocks))))
-							if self.options.verbose>0:
-								print("%d/%d\r"%(len(self.tids),len(blocks)))
+							E2progress(self.logger,donecells/totcells)
+							if self.options.verbose>1:
+								print("block %s done in %1.1f s"%(str(block),timing[-1][1]))
 								sys.stdout.flush()
 
 						self.tids.pop(i)
-					print(len(self.tids),"simmx tasks left in main loop   \r", end=' ')
-					sys.stdout.flush()
 
+				# the dc server may gain or lose clients while we run
+				if self.etc.servtype=="dc" :
+					n=self.etc.cpu_est(False)
+					if n>0 : self.num_cpus=n
 
-				time.sleep(10)
+				if len(self.tids)>0 : time.sleep(1)
 			print("\nAll simmx tasks complete ")
 
+			if len(timing)>0 :
+				walls=sorted([t[1] for t in timing])
+				print("%d blocks, time per block min %1.1f  median %1.1f  max %1.1f s"%(len(walls),walls[0],walls[len(walls)//2],walls[-1]))
+				if getattr(self.options,"blocktiming",None) : self.__write_timing(timing,self.options.blocktiming)
+
 			# if using fillzero, we must fix the -1.0e38 values placed into empty cells
 			if self.options.fillzero :
 				l=EMData(self.args[2],0,True)
@@ -320,7 +371,8 @@ class EMParallelSimMX(object):
 
 				print("Filling complete")
 
-
+			if self.options.topk>0 :
+				simmx_topk_write(self.args[2],self.topk,self.clen,self.args[0],self.args[1])
 
 		else: raise NotImplementedError("The parallelism option you specified (%s) is not supported" %self.options.parallel )
 
@@ -336,6 +388,11 @@ class EMParallelSimMX(object):
 		insertion_c = rslts["min_ref_idx"]
 		insertion_r = rslts["min_ptcl_idx"]
 		result_mx = result_data[0]
+
+		if self.options.topk>0 :
+			simmx_topk_merge(self.topk,insertion_r,insertion_c,[i.numpy().copy() for i in result_data])
+			return
+
 		r = Region(insertion_c,insertion_r,result_mx.get_xsize(),result_mx.get_ysize())
 
 		# Note this is region io - the init_memory function made sure the images exist and are the right dimensions (on disk)
@@ -526,6 +583,7 @@ class EMSimTaskDC(JSTask):
 	def execute(self,progress_callback=None):
 		if progress_callback==None: progress_callback=self.dummycb
 		if not progress_callback(0) : return None
+		t0=time.time()
 		refs,ptcls,shrink,mask = self.__init_memory(self.options)
 
 
@@ -559,6 +617,9 @@ class EMSimTaskDC(JSTask):
 			e.to_zero()
 			result_data.append(e)
 
+		# with topk, any cell which isn't set below must not be merged as a real score
+		if self.options.get("topk",0)>0 : result_data[0].to_value(-1.0e38)
+
 		min_ref_idx = None
 		for ref_idx in list(refs.keys()):
 			if min_ref_idx == None or ref_idx < min_ref_idx:
@@ -597,6 +658,7 @@ class EMSimTaskDC(JSTask):
 		d["rslt_data"] = result_data
 		d["min_ref_idx"] = min_ref_idx
 		d["min_ptcl_idx"] = min_ptcl_idx
+		d["time"] = time.time()-t0
 		return d
 
 jsonclasses["EMSimTaskDC"]=EMSimTaskDC.from_jsondict
@@ -630,10 +692,12 @@ def main():
 	parser.add_argument("--colmasks",type=str,help="File containing one mask for each column (projection) image, to be used when refining row (particle) image alignments.",default=None)
 	parser.add_argument("--range",type=str,help="Range of images to process (c0,r0,c1,r1) c0,r0 inclusive c1,r1 exclusive", default=None)
 	parser.add_argument("--saveali",action="store_true",help="Save alignment values, output is 5, c x r images instead of 1. Images are (score,dx,dy,da,flip). ",default=False)
+	parser.add_argument("--topk",type=int,help="Keep only the best k references for each particle. Output is a sparse matrix of k x r images (ref #,score, then dx,dy,da,flip,scale with --saveali), which e2classify.py and e2classaverage.py read directly",default=0)
 	parser.add_argument("--verbose", "-v", dest="verbose", action="store", metavar="n", type=int, default=0, help="verbose level [0-9], higner number means higher level of verboseness")
 #	parser.add_argument("--lowmem",action="store_true",help="prevent the bulk reading of the reference images - this will save memory but potentially increase CPU time",default=False)
 	parser.add_argument("--init",action="store_true",help="Initialize the output matrix file before performing 'range' calculations",default=False)
 	parser.add_argument("--fillzero",action="store_true",help="Checks the existing output file, and fills only matrix elements which are exactly zero.",default=False)
+	parser.add_argument("--candidates",type=str,help="With --topk, an image with one row per particle listing the reference numbers to compare it to (-1 for unused entries). Other cells are not computed.",default=None)
 	parser.add_argument("--force", "-f",dest="force",default=False, action="store_true",help="Force overwrite the output file if it exists")
 	parser.add_argument("--exclude", type=str,default=None,help="The named file should contain a set of integers, each representing an image from the input file to exclude. Matrix elements will still be created, but will be zeroed.")
 	parser.add_argument("--shrink", type=float,default=None,help="Optionally shrink the input particles by an integer amount prior to computing similarity scores. This will speed the process up.")
@@ -641,6 +705,7 @@ def main():
 	parser.add_argument("--check","-c",action="store_true",help="Performs a command line argument check only.",default=False)
 	parser.add_argument("--ppid", type=int, help="Set the PID of the parent process, used for cross platform PPID",default=-1)
 	parser.add_argument("--parallel",type=str,help="Parallelism string",default=None)
+	parser.add_argument("--blocktiming",type=str,help="With --parallel, write a per-block timing report to the named text file",default=None)
 
 	(options, args) = parser.parse_args()
 
@@ -725,17 +790,19 @@ def main():
 		rrange=[0,rlen]
 
 	# initialize output array
-	mxout=[EMData()]
-	mxout[0].set_attr(PROJ_FILE_ATTR,args[0])
-	mxout[0].set_attr(PART_FILE_ATTR,args[1])
-	mxout[0].set_size(crange[1]-crange[0],rrange[1]-rrange[0],1)
-	mxout[0].to_zero()
-	if options.saveali :
-		mxout.append(mxout[0].copy()) # dx
-		mxout.append(mxout[0].copy()) # dy
-		mxout.append(mxout[0].copy()) # alpha (angle)
-		mxout.append(mxout[0].copy()) # mirror
-		mxout.append(mxout[0].copy()) # scale
+	if options.topk>0 : topk=simmx_topk_init(options.topk,rlen,options.saveali)
+	else:
+		mxout=[EMData()]
+		mxout[0].set_attr(PROJ_FILE_ATTR,args[0])
+		mxout[0].set_attr(PART_FILE_ATTR,args[1])
+		mxout[0].set_size(crange[1]-crange[0],rrange[1]-rrange[0],1)
+		mxout[0].to_zero()
+		if options.saveali :
+			mxout.append(mxout[0].copy()) # dx
+			mxout.append(mxout[0].copy()) # dy
+			mxout.append(mxout[0].copy()) # alpha (angle)
+			mxout.append(mxout[0].copy()) # mirror
+			mxout.append(mxout[0].copy()) # scale
 	if options.verbose>0: print("Computing Similarities")
 
 	# Read all c images, then read and compare one r image at a time
@@ -779,7 +846,8 @@ def main():
 			sys.stdout.flush()
 
 		# With the fillzero option, we only compute values where there is a zero in the existing matrix
-		if options.fillzero :
+		if options.candidates!=None : subset=set(read_candidates(options.candidates,r,r+1)[0].tolist())
+		elif options.fillzero :
 			ss=EMData()
 			ss.read_image(args[2],0,False,Region(crange[0],r,crange[1]-crange[0]+1,1))
 			subset=[i for i in range(ss["nx"]) if ss[i,0]==0]
@@ -799,6 +867,13 @@ def main():
 		shrink = options.shrink
 		if options.verbose>1 : print("%d. "%r, end=' ')
 		row=cmponetomany(cimgs,rimg,options.align,options.aligncmp,options.cmp, options.ralign, options.raligncmp,options.shrink,mask,subset,options.prefilt,options.verbose)
+		if options.topk>0 :
+			nv=6 if options.saveali else 1
+			block=[np.array([[-1.0e38 if v==None else v[i] for v in row]],dtype=np.float32) for i in range(nv)]
+			block[0][~np.isfinite(block[0])]=1.0e24
+			simmx_topk_merge(topk,r,crange[0],block)
+			continue
+
 		for c,v in enumerate(row):
 			if v==None : mxout[0].set_value_at(c,r,0,-1.0e38)
 			else: mxout[0].set_value_at(c,r,0,v[0])
@@ -823,7 +898,9 @@ def main():
 	if options.verbose>0 : print("\nSimilarity computation complete")
 
 	# write the results into the full-sized matrix
-	if crange==[0,clen] and rrange==[0,rlen] :
+	if options.topk>0 :
+		simmx_topk_write(args[2],topk,clen,args[0],args[1])
+	elif crange==[0,clen] and rrange==[0,rlen] :
 		for i,j in enumerate(mxout) : j.write_image(args[2],i)
 	else :
 		for i,j in enumerate(mxout) : j.write_image(args[2],i,IMAGE_UNKNOWN,0,Region(crange[0],rrange[0],0,crange[1]-crange[0],rrange[1]-rrange[0],1))
@@ -915,6 +992,14 @@ def check(options,verbose):
 				if ( check_eman2_type(options.raligncmp,Cmps,"Comparitor") == False ):
 					error = True
 
+	if options.topk>0 and (options.fillzero or options.range or options.init):
+		print("Error: --topk cannot be combined with --fillzero, --range or --init")
+		error = True
+
+	if options.candidates!=None and options.topk<=0:
+		print("Error: --candidates requires --topk")
+		error = True
+
 	if hasattr(options,"parallel") and options.parallel != None:
   		if len(options.parallel) < 2:
   			print("The parallel option %s does not make sense" %options.parallel)
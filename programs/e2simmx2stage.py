@@ -42,6 +42,8 @@ from EMAN2 import *
 from math import *
 import os
 import sys
+import numpy as np
+from EMAN2_utils import is_simmx_topk,simmx_topk_read
 
 #a = EMUtil.ImageType.IMAGE_UNKNOWN
 
@@ -67,6 +69,7 @@ def main():
 	parser.add_argument("--mask",type=str,help="File containing a single mask image to apply before similarity comparison",default=None)
 	parser.add_argument("--colmasks",type=str,help="File containing one mask for each column (projection) image, to be used when refining row (particle) image alignments.",default=None)
 	parser.add_argument("--saveali",action="store_true",help="Save alignment values, output is c x r x 4 instead of c x r x 1",default=False)
+	parser.add_argument("--topk",type=int,help="Produce a sparse similarity matrix with only the best k references per particle (see e2simmx.py --topk). The stage 1 matrix is also kept sparse.",default=0)
 	parser.add_argument("--prefilt",action="store_true",help="Filter each reference (c) to match the power spectrum of each particle (r) before alignment and comparison",default=False)
 	parser.add_argument("--prectf",action="store_true",help="Apply CTF to each projection before comparison",default=False)
 	parser.add_argument("--verbose", "-v", dest="verbose", type=int, default=0, help="verbose level [0-9], higner number means higher level of verboseness")
@@ -181,6 +184,7 @@ def main():
 		if options.ralign!=None : cmd+=" --ralign=%s --raligncmp=%s"%(options.ralign,options.raligncmp)
 		if options.parallel!=None : cmd+=" --parallel="+options.parallel
 		if options.exclude!=None : cmd+=" --exclude="+options.exclude
+		if options.topk>0 : cmd+=" --topk=4"
 		print("executing ",cmd)
 		launch_childprocess(cmd)
 	else :
@@ -191,33 +195,55 @@ def main():
 	E2progress(E2n,0.60)
 	############### Step 3 - classify particles against subset of original projections
 	# Now we need to convert this small classification into a 'seed' for the large classification matrix for simplicity
-	print("Seeding full classification matrix (%d x %d) -> %s"%(clen,rlen,args[2]))
-	mxstg1=EMData(args[5],0)
-	mx=EMData(clen,rlen,1)
-	mx.add(-1.0e38)	# a large negative value to be replaced later
+	# a sparse stage 1 matrix already has the best classes for each particle in order
+	if is_simmx_topk(args[5]) : best1=simmx_topk_read(args[5])[0][0][:,:4].astype(int)
+	else :
+		best1=None
+		mxstg1=EMData(args[5],0)
 
-	for ptcl in range(rlen):
-		# find the best classes from the coarse search
+	def best_stg1(ptcl):
+		"""the best classes for ptcl from the coarse search"""
+		if best1 is not None : return [j for j in best1[ptcl] if j>=0]
 		vals=[(mxstg1[cls1,ptcl],cls1) for cls1 in range(clen_stg1)]
 		vals.sort()
+		return [v[1] for v in vals[:4]]
+
+	if options.topk>0 :
+		# with --topk the references in the best 4 stage 1 classes are passed as a list of candidates for each particle,
+		# and e2simmx keeps only the best k of them as it goes, so no full size matrix is ever made
+		fullmx=os.path.splitext(args[2])[0]+"_cand"+os.path.splitext(args[2])[1]
+		print("Writing candidate references for each particle -> %s"%fullmx)
+		cands=[sorted(set(i for j in best_stg1(ptcl) for i in classes[j])) for ptcl in range(rlen)]
+		candmx=np.full((rlen,max(1,max(len(c) for c in cands))),-1.0,dtype=np.float32)
+		for ptcl,c in enumerate(cands): candmx[ptcl,:len(c)]=c
+		if file_exists(fullmx) : remove_file(fullmx)
+		from_numpy(candmx).write_image(fullmx,0)
+		candmx=cands=None
+	else :
+		fullmx=args[2]
+		print("Seeding full classification matrix (%d x %d) -> %s"%(clen,rlen,fullmx))
+		mx=EMData(clen,rlen,1)
+		mx.add(-1.0e38)	# a large negative value to be replaced later
 
-		# then set the corresponding values in the best 4 stage 1 classes in the full matrix to 0
-		for j in range(4):
-			for i in classes[vals[j][1]]: mx[i,ptcl]=0.0
+		for ptcl in range(rlen):
+			# set the corresponding values in the best 4 stage 1 classes in the full matrix to 0
+			for j in best_stg1(ptcl):
+				for i in classes[j]: mx[i,ptcl]=0.0
 
-	mx.update()
-	mx.write_image(args[2],0)
-#	mx.write_image("bdb:refine_02#simmx_00_x",0)
+		mx.update()
+		mx.write_image(fullmx,0)
+#		mx.write_image("bdb:refine_02#simmx_00_x",0)
 
-	mx.to_zero()
-	if options.saveali:
-		for i in range(1,6):
-			mx.write_image(args[2],i)		# seed alignment data with nothing
-#			mx.write_image("bdb:refine_02#simmx_00_x",i)
+		mx.to_zero()
+		if options.saveali:
+			for i in range(1,6):
+				mx.write_image(fullmx,i)		# seed alignment data with nothing
+#				mx.write_image("bdb:refine_02#simmx_00_x",i)
 
 
 	# the actual final classification
-	cmd = "e2simmx.py %s %s %s -f --saveali --cmp=%s --align=%s --aligncmp=%s --fillzero --nofilecheck --force --verbose=%d"  %(args[0],args[1],args[2],options.cmp,options.align,options.aligncmp, options.verbose-1)
+	if options.topk>0 : cmd = "e2simmx.py %s %s %s -f --saveali --cmp=%s --align=%s --aligncmp=%s --topk=%d --candidates=%s --nofilecheck --force --verbose=%d"  %(args[0],args[1],args[2],options.cmp,options.align,options.aligncmp,options.topk,fullmx, options.verbose-1)
+	else : cmd = "e2simmx.py %s %s %s -f --saveali --cmp=%s --align=%s --aligncmp=%s --fillzero --nofilecheck --force --verbose=%d"  %(args[0],args[1],fullmx,options.cmp,options.align,options.aligncmp, options.verbose-1)
 	if options.mask!=None : cmd += " --mask=%s"%options.mask
 	if options.colmasks!=None : cmd += " --colmasks=%s"%options.colmasks
 
@@ -239,6 +265,8 @@ def main():
 	print("executing ",cmd)
 	launch_childprocess(cmd)
 
+	if options.topk>0 : remove_file(fullmx)
+
 	E2progress(E2n,1.0)
 
 #	E2progress(E2n,float(r-rrange[0])/(rrange[1]-rrange[0]))
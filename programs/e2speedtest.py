@@ -44,6 +44,7 @@ from random import uniform
 from numpy import array
 
 from EMAN2 import *
+from EMAN2_executor import EMExecutor
 
 def main():
 	progname = os.path.basename(sys.argv[0])
@@ -69,6 +70,7 @@ improved with time."""
 	parser.add_argument("--bispec",action="store_true",help="new rtf with usebispec",default=False)
 	parser.add_argument("--low",action="store_true",help="low level test",default=False)
 	parser.add_argument("--size",type=int,help="Size of particles, 192 default for comparisons",default=192)
+	parser.add_argument("--threadscale",type=str,help="Thread scaling test. Runs each multithreaded operation with each of these thread counts and reports the speed-up, eg - 1,2,4,8,16",default=None)
 	parser.add_argument("--simpleout",action="store_true",help="Simpler 2 column output file (appends)")
 	parser.add_argument("--ppid", type=int, help="Set the PID of the parent process, used for cross platform PPID",default=-1)
 	parser.add_argument("--verbose", "-v", dest="verbose", action="store", metavar="n", type=int, default=0, help="verbose level [0-9], higner number means higher level of verboseness")
@@ -96,6 +98,10 @@ improved with time."""
 
 	data = [None for i in range(NTT)]
 
+	if options.threadscale!=None :
+		thread_scaling(options,[int(i) for i in options.threadscale.split(",")])
+		return
+
 	tmpl=test_image(0,size=(SIZE,SIZE))
 	for i in range(NTT):
 		data[i]=tmpl.process("xform",{"transform":Transform({"type":"2d","alpha":uniform(0,360.0),"tx":uniform(-4.0,4.0),"ty":uniform(-4.0,4.0)})})
@@ -229,5 +235,63 @@ so in most cases it is not dealt with.')
 		out.write("speed: {}\tsize: {}\tOS: {}\tCPU: {}\n".format(old_div(2.3,tms.mean()),SIZE,get_platform(),cpu))
 #	print '\nThis represents %1.2f (RTFAlign+Refine)/sec\n' % (5.0 * (NTT - 5.0) / ti)
 
+def ts_align(a,b):
+	a.align("rotate_translate_tree",b,{"flip":True})
+
+def ts_process(a,b):
+	c=a.process("filter.lowpass.gauss",{"cutoff_abs":.2})
+	c.process_inplace("math.fft.resample",{"n":1.5})
+	c.process_inplace("normalize.edgemean")
+	a.cmp("frc",b,{})
+
+def ts_project(vol,xfs):
+	for xf in xfs:
+		Projectors.get("standard",{"transform":xf}).project3d(vol)
+
+def ts_reconstruct(size,slices):
+	recon=Reconstructors.get("fourier",{"sym":"c1","size":[size,size,size]})
+	recon.setup()
+	for im,xf in slices:
+		recon.insert_slice(recon.preprocess_slice(im,xf),xf,1.0)
+	recon.finish(True)
+
+def thread_scaling(options,nthreads):
+	"""Runs the same fixed set of jobs for each thread count and reports the speed-up over the first. With
+the GIL released inside the C++ bindings, these should scale nearly linearly up to the number of physical cores."""
+
+	size=options.size
+	nj=max(nthreads)*(2 if options.short else 8)		# enough jobs to keep the largest pool busy
+	print("Preparing {} jobs per test, size {}".format(nj,size))
+
+	imgs=[]
+	tmpl=test_image(0,size=(size,size))
+	for i in range(nj+1):
+		im=tmpl.process("xform",{"transform":Transform({"type":"2d","alpha":uniform(0,360.0),"tx":uniform(-4.0,4.0),"ty":uniform(-4.0,4.0)})})
+		im.process_inplace("math.addnoise",{"noise":0.2})
+		im.process_inplace("normalize.circlemean")
+		imgs.append(im)
+
+	vsize=good_size(old_div(size,2))
+	vol=test_image_3d(0,size=(vsize,vsize,vsize))
+	xfs=[Transform({"type":"eman","az":uniform(0,360.0),"alt":uniform(0,180.0),"phi":uniform(0,360.0)}) for i in range(8)]
+	projs=[(vol.project("standard",xf),xf) for xf in xfs]
+
+	tests=(("align",ts_align,[(imgs[i],imgs[i+1]) for i in range(nj)]),
+		("process+cmp",ts_process,[(imgs[i],imgs[i+1]) for i in range(nj)]*4),
+		("project3d",ts_project,[(vol,xfs) for i in range(nj)]),
+		("insert_slice",ts_reconstruct,[(vsize,projs) for i in range(nj)]))
+
+	print("\n{:<18s}".format("threads")+"".join(["{:>10d}".format(n) for n in nthreads]))
+	for name,fn,jobs in tests:
+		tms=[]
+		for n in nthreads:
+			with EMExecutor(n) as ex:
+				t0=time.time()
+				ex.run(fn,jobs)
+				tms.append(time.time()-t0)
+		print("{:<18s}".format(name+" (s)")+"".join(["{:>10.2f}".format(t) for t in tms]))
+		print("{:<18s}".format("  speed-up")+"".join(["{:>10.2f}".format(old_div(tms[0],t)) for t in tms]))
+		print("{:<18s}".format("  efficiency")+"".join(["{:>9.0f}%".format(100.0*tms[0]*nthreads[0]/(t*n)) for n,t in zip(nthreads,tms)]))
+
 if __name__ == "__main__":
 	main()
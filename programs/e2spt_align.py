@@ -38,11 +38,10 @@ from builtins import range
 from EMAN2 import *
 import time
 import os
-import threading
-import queue
+from EMAN2_executor import EMExecutor
 from sys import argv,exit
 
-def alifn(jsd,fsp,i,a,options):
+def alifn(fsp,i,a,options):
 	t=time.time()
 	b=EMData(fsp,i).do_fft()
 	b.process_inplace("xform.phaseorigin.tocorner")
@@ -52,8 +51,8 @@ def alifn(jsd,fsp,i,a,options):
 	c=a.xform_align_nbest("rotate_translate_3d_tree",b,{"verbose":0,"sym":options.sym,"sigmathis":0.1,"sigmato":1.0, "maxres":options.maxres},options.nsoln)
 	for cc in c : cc["xform.align3d"]=cc["xform.align3d"].inverse()
 
-	jsd.put((fsp,i,c[0]))
 	if options.verbose>1 : print("{}\t{}\t{}\t{}".format(fsp,i,time.time()-t,c[0]["score"]))
+	return (fsp,i,c[0])
 
 def main():
 	progname = os.path.basename(sys.argv[0])
@@ -92,7 +91,6 @@ This program will take an input stack of subtomograms and a reference volume, an
 		else: options.iter=max(fls)+1
 
 	reffile=args[1]
-	NTHREADS=max(options.threads+1,2)		# we have one thread just writing results
 
 	logid=E2init(sys.argv, options.ppid)
 
@@ -119,29 +117,14 @@ This program will take an input stack of subtomograms and a reference volume, an
 	ref[1]=ref[1].do_fft()
 	ref[1].process_inplace("xform.phaseorigin.tocorner")
 
-	angs=js_open_dict("{}/particle_parms_{:02d}.json".format(options.path,options.iter))
-	jsd=queue.Queue(0)
+	angs=js_open_dict("{}/particle_parms_{:02d}.json".format(options.path,options.iter),journal=True)
 
-	n=-1
 	N=EMUtil.get_image_count(args[0])
-	thrds=[threading.Thread(target=alifn,args=(jsd,args[0],i,ref[i%2],options)) for i in range(N)]
-
-	# here we run the threads and save the results, no actual alignment done here
-	print(len(thrds)," threads")
-	thrtolaunch=0
-	while thrtolaunch<len(thrds) or threading.active_count()>1:
-		# If we haven't launched all threads yet, then we wait for an empty slot, and launch another
-		# note that it's ok that we wait here forever, since there can't be new results if an existing
-		# thread hasn't finished.
-		if thrtolaunch<len(thrds) :
-			while (threading.active_count()==NTHREADS ) : time.sleep(.1)
-			if options.verbose : print("Starting thread {}/{}".format(thrtolaunch,len(thrds)))
-			thrds[thrtolaunch].start()
-			thrtolaunch+=1
-		else: time.sleep(1)
-
-		while not jsd.empty():
-			fsp,n,d=jsd.get()
+	print(N," particles")
+
+	# alignments run in the pool, results are saved here as they complete
+	with EMExecutor(options.threads) as ex:
+		for fsp,n,d in ex.map(alifn,[(args[0],i,ref[i%2],options) for i in range(N)],ordered=False,logid=logid,verbose=options.verbose):
 			angs[(fsp,n)]=d
 			if options.saveali:
 				v=EMData(fsp,n)
@@ -150,10 +133,6 @@ This program will take an input stack of subtomograms and a reference volume, an
 					v.process_inplace("math.meanshrink",{"n":options.savealibin})
 				v.write_image("{}/aliptcls_{:02d}.hdf".format(options.path, options.iter),n)
 
-
-	for t in thrds:
-		t.join()
-
 	E2end(logid)
 
 
@@ -791,7 +791,7 @@ def main():
 						findirinfo = os.listdir( infodir )
 						
 						for inf in findirinfo:
-							if '_info.json' in inf:
+							if inf.endswith('_info.json'):
 								infofile = infodir + '/' + inf
 								infofiles.append( infofile )
 						
@@ -1329,7 +1329,7 @@ def genctfparamlines( options, apix, nimgs, angles, imagefilenames, icethickness
 		ctflines = []
 		for inf in findirinfo:
 			#if kk not in indxstoexclude:
-			if '_info.json' in inf:
+			if inf.endswith('_info.json'):
 				infofile = options.infodir + '/' + inf
 				#infofstem = inf.split('_info')[0]
 				#infofiles.update( { infofstem:infofile } )
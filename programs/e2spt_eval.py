@@ -137,7 +137,7 @@ class SptEvalGUI(QtGui.QWidget):
 
 	def plot_params(self):
 		for f in sorted(os.listdir(self.path)):
-			if "particle_parms_" in f:
+			if "particle_parms_" in f and f.endswith(".json"):
 				parms = self.json_to_array("{}/{}".format(self.path,f))
 				try:
 					self.paramplot.set_data(parms,f)
@@ -7,9 +7,8 @@ from future import standard_library
 standard_library.install_aliases()
 from builtins import range
 from EMAN2 import *
+from EMAN2_executor import EMExecutor
 import numpy as np
-import queue
-import threading
 
 
 def main():
@@ -208,7 +207,6 @@ def main():
 		try: os.remove(options.output2d)
 		except: pass
 
-		jsd=queue.Queue(0)
 		jobs=[]
 		
 		batchsz=4
@@ -219,49 +217,35 @@ def main():
 			
 		for tid in range(0,nptcl,batchsz):
 			ids=list(range(tid, min(tid+batchsz, nptcl)))
-			jobs.append([jsd, ids, imgs, ttparams, ptclpos, options, ctf])
+			jobs.append((ids, imgs, ttparams, ptclpos, options, ctf))
 		
-		
-		thrds=[threading.Thread(target=make3d,args=(i)) for i in jobs]
-		thrtolaunch=0
-		tsleep=threading.active_count()
+		### batches come back in order, and each batch is written with one bulk write per output file
 		ndone=0
-		while thrtolaunch<len(thrds) or threading.active_count()>tsleep:
-			if thrtolaunch<len(thrds):
-				while (threading.active_count()==options.threads+tsleep ) : 
-					#print threading.active_count(), options.threads, tsleep, thrtolaunch, len(thrds)
-					time.sleep(.1)
-				thrds[thrtolaunch].start()
-				thrtolaunch+=1
-			else: time.sleep(.2)
-			
-			
-			while not jsd.empty():
-				pid, threed, projs=jsd.get()
-				#pjids=[pid*ntlt+i for i in range(ntlt)]
-				try: pji=EMUtil.get_image_count(options.output2d)
-				except: pji=0
-				pjids=[]
-				for i,pj in enumerate(projs):
-					pj.write_image(options.output2d, pji)
-					pjids.append(pji)
-					pji+=1
-				threed["class_ptcl_src"]=options.output2d
-				threed["class_ptcl_idxs"]=pjids
-				threed.write_image(options.output, pid)
-				ndone+=1
-				#if ndone%10==0:
+		with EMExecutor(options.threads) as ex:
+			for res in ex.map(make3d,jobs):
+				allprojs=[]
+				for pid, threed, projs in res:
+					allprojs.extend(projs)
+				pji=EMData.write_images(options.output2d, allprojs) if len(allprojs)>0 else 0
+				
+				threeds=[]
+				for pid, threed, projs in res:
+					threed["class_ptcl_src"]=options.output2d
+					threed["class_ptcl_idxs"]=list(range(pji, pji+len(projs)))
+					pji+=len(projs)
+					threeds.append(threed)
+				EMData.write_images(options.output, threeds)
+				
+				ndone+=len(res)
 				sys.stdout.write("\r{}/{} finished.".format(ndone, nptcl))
 				sys.stdout.flush()
 
-		for t in thrds: t.join()
-			
 		print("Particles written to {}".format(options.output))
 	
 	E2end(logid)
 	
 
-def make3d(jsd, ids, imgs, ttparams, ppos, options, ctfinfo=[]):
+def make3d(ids, imgs, ttparams, ppos, options, ctfinfo=[]):
 	
 	
 	bx=options.boxsz*2
@@ -274,6 +258,7 @@ def make3d(jsd, ids, imgs, ttparams, ppos, options, ctfinfo=[]):
 		ctf.from_dict({
 			"defocus":1.0, "voltage":voltage, "bfactor":50., "cs":cs,"ampcont":0, "apix":apix})
 	
+	ret=[]
 	for pid in ids:
 		
 		pos=ppos[pid]
@@ -357,9 +342,9 @@ def make3d(jsd, ids, imgs, ttparams, ppos, options, ctfinfo=[]):
 		threed["ptcl_source_coord"]=pos.tolist()
 		threed["file_twod"]=options.output2d
 		
-		jsd.put((pid, threed, projs))
+		ret.append((pid, threed, projs))
 
-	return threed
+	return ret
 	
 
 
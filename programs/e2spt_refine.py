@@ -98,8 +98,7 @@ def main():
 		#### in case e2spt_align get segfault....
 		ret=1
 		while ret>0:
-			try: os.remove(os.path.join(options.path, "particle_parms_{:02d}.json".format(itr)))
-			except:pass
+			js_remove_dict(os.path.join(options.path, "particle_parms_{:02d}.json".format(itr)))
 
 			ret=run(cmd)
 		
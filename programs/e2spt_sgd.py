@@ -9,11 +9,10 @@ from builtins import range
 from EMAN2 import *
 import sys
 import numpy as np
-import threading
-import queue
+from EMAN2_executor import EMExecutor
 #from e2spt_align import alifn
 
-def alifn(jsd,fsp,i,a,options):
+def alifn(fsp,i,a,options):
 	t=time.time()
 	b=EMData(fsp,i)#.do_fft()
 	if options.shrink>1:
@@ -25,8 +24,8 @@ def alifn(jsd,fsp,i,a,options):
 	c=a.xform_align_nbest("rotate_translate_3d_tree",b,{"verbose":0,"sym":"c1","sigmathis":1,"sigmato":1, "maxres":(1./options.filterto)*.8},1)
 	for cc in c : cc["xform.align3d"]=cc["xform.align3d"].inverse()
 
-	jsd.put((fsp,i,c[0]))
 	if options.verbose>1 : print("{}\t{}\t{}\t{}".format(fsp,i,time.time()-t,c[0]["score"]))
+	return (fsp,i,c[0])
 
 
 def main():
@@ -105,6 +104,7 @@ def main():
 
 	jspast=None
 	filterto=options.filterto
+	ex=EMExecutor(options.threads)
 	for itr in range(1, options.niter+1):
 
 		nbatch=options.nbatch
@@ -124,19 +124,11 @@ def main():
 		cc=[]
 		for ib in range(nbatch):
 
-			jsd=queue.Queue(0)
 			idx=np.arange(num)
 			np.random.shuffle(idx)
-			thrds=[threading.Thread(target=alifn,args=(jsd,fname,i,ref0,options)) for i in idx[:batchsize]]
-			#thrds=[threading.Thread(target=alifn,args=(jsd,fname,i,ref,options)) for i in idx[ib*batchsize:(ib+1)*batchsize]]
-			for t in thrds:
-				t.start()
 			angs={}
-			while threading.active_count()>1:
-				time.sleep(1)
-				while not jsd.empty():
-					fsp,n,d=jsd.get()
-					angs[(fsp,n)]=d
+			for fsp,n,d in ex.map(alifn,[(fname,i,ref0,options) for i in idx[:batchsize]],ordered=False):
+				angs[(fsp,n)]=d
 			avgr=Averagers.get("mean.tomo")
 			#print(angs)
 			for ks in list(angs.keys()):
@@ -198,6 +190,7 @@ def main():
 		
 		ref.write_image("{}/threed_{:02d}.hdf".format(path, itr), 0)
 
+	ex.shutdown()
 	#ref.write_image(os.path.join(path,"output.hdf"))
 	print("Done")
 	E2end(logid)
@@ -209,14 +202,8 @@ def sym_search(e, sym):
 
 	s=parsesym(sym)
 	oris=s.gen_orientations("rand",{"n":ntry, "phitoo":True})
-	jsd=queue.Queue(0)
-	thrds=[threading.Thread(target=sym_ali,args=([e, o, sym, jsd])) for o in oris]
-	for t in thrds: t.start()
-	for t in thrds: t.join()
-
-	alis=[]
-	while not jsd.empty():
-		alis.append(jsd.get())
+	with EMExecutor(ntry) as ex:
+		alis=list(ex.map(sym_ali,[(e, o, sym) for o in oris]))
 	#print alis
 	scr=[a["score"] for a in alis]
 	im=np.argmin(scr)
@@ -228,10 +215,10 @@ def sym_search(e, sym):
 	#a.write_image(outname)
 	return a
 
-def sym_ali(e,o,sym,jsd):
+def sym_ali(e,o,sym):
 	s=old_div(e["nx"],4)
 	a=e.align("symalignquat", e, {"sym":sym, "xform.align3d":o,"maxshift":s}, "ccc.tomo.thresh")
-	jsd.put(a)
+	return a
 
 
 def make_ref(fname, options):
@@ -32,202 +32,59 @@ from __future__ import division
 #
 #
 
-from past.utils import old_div
 from builtins import range
 from EMAN2 import *
-from math import *
+from EMAN2_tiles import EMTileFile,build_tiles,TILE_DTYPES
 import os
-import pickle
 import sys
 
 
 def main():
-	global tdim,pdim
-	global cmp_probe,cmp_target
 	progname = os.path.basename(sys.argv[0])
 	usage = """prog [options] <tile file>
 	
-	Operates on files containing sets of tiled JPEG images representing larger images. Used for 
-	interactive web browsing. Not generally useful to end-users."""
+	Operates on multiresolution tile files representing large images (montaged micrographs, tomogram slices). 
+	Each level of the pyramid is 2x2 mean shrunk from the previous one, and tiles are stored as uint8 or float16
+	with a fixed binary index, so viewers can read individual tiles for panning and zooming. See EMAN2_tiles.py
+	for the format and the EMTileFile.get_tile(level,x,y) API."""
 
 	parser = EMArgumentParser(usage=usage,version=EMANVERSION)
 
-	parser.add_argument("--build", type=str, help="Build a new tile file from the specified image")
-	parser.add_argument("--buildpspec",type=float,help="Builds 1D and 2D power spectra for the images when building, Value is A/pix for image.")
-	parser.add_argument("--tilesize", type=int,default=256, help="Build a new tile file from this image")
-	parser.add_argument("--dump",action="store_true",default=False,help="Dump the tile dictionary from the file")
+	parser.add_argument("--build", type=str, help="Build a new tile file from the specified image. The image is read in strips, so it need not fit in memory")
+	parser.add_argument("--buildpspec",action="store_true",default=False,help="Also store an averaged 2D power spectrum and its radial profile when building")
+	parser.add_argument("--tilesize", type=int,default=256, help="Size of the (square) tiles. Default=256")
+	parser.add_argument("--dtype", type=str,default="uint8",choices=sorted(TILE_DTYPES.keys()), help="Data type of the stored tiles. Default=uint8")
+	parser.add_argument("--zslice", type=int,default=None, help="For a 3D input, the z slice to tile. Default is the middle slice")
+	parser.add_argument("--threads", type=int,default=4, help="Number of threads used to encode and write tiles. Default=4")
+	parser.add_argument("--dump",action="store_true",default=False,help="Dump the level table of the file")
 	parser.add_argument("--display",type=str,default="",help="Displays a specific tile (level,x,y))")
 	parser.add_argument("--ppid", type=int, help="Set the PID of the parent process, used for cross platform PPID",default=-1)
 	parser.add_argument("--verbose", "-v", dest="verbose", action="store", metavar="n", type=int, default=0, help="verbose level [0-9], higner number means higher level of verboseness")
 	
 	(options, args) = parser.parse_args()
 	if len(args)<1 : parser.error("Tile file required")
-	try: chains=options.chains
-	except: chains=None
 		
 	if options.build:
-		# read the target and probe
-		orig=EMData()
-		orig.read_image(options.build)
-		orig.process_inplace("normalize")
-		opt={}
-		try: opt["pspec"]=options.buildpspec
-		except: pass
-	
-		build_tiles(orig,args[0],256,opt)
+		build_tiles(options.build,args[0],options.tilesize,options.dtype,options.threads,options.buildpspec,options.zslice,options.verbose)
 
 	if options.dump:
-		td=tile_list(args[0])
-		print(td)
-		k=list(td.keys())
-		k.sort()
-		for i in k: print(i,td[i])
+		tf=EMTileFile(args[0])
+		print("{} x {}, tile size {}, {}, source mean {:g} sigma {:g}".format(tf.nx,tf.ny,tf.tilesize,tf.dtype,tf.mean,tf.sigma))
+		for l in range(tf.nlevels):
+			print("level {}: {} x {}, {} x {} tiles, range {:.3g} - {:.3g}".format(l,tf.level_size(l)[0],tf.level_size(l)[1],tf.level_tiles(l)[0],tf.level_tiles(l)[1],*tf.level_range(l)))
+		if tf.get_pspec()!=None : print("power spectrum present")
 
 	if options.display!="" :
 		l,x,y=options.display.split(',')
-		try: img=get_tile(args[0],int(l),int(x),int(y))
-		except:
+		tf=EMTileFile(args[0])
+		try: img=from_numpy(tf.get_tile(int(l),int(x),int(y)).copy())
+		except KeyError:
 			print("Tile not present in file")
 			sys.exit(1)
-		o=open("/tmp/tile.jpg","w")
-		o.write(img)
-		o.close()
+		img["render_min"],img["render_max"]=tf.level_range(int(l))
+		img.write_image("/tmp/tile.jpg")
 		os.system("display /tmp/tile.jpg")
 		
 
-def tile_list(tilefile):
-	"""tile_list(tilefile)
-	Extract dictionary of tiles from a tilefile"""
-	
-	tf=open(tilefile,"r")
-	
-	td=pickle.load(tf)
-
-	tf.close()
-	return td
-
-def get_tile(tilefile,level,x,y):
-	"""get_tile(tilefile,level,x,y)
-	retrieve a tile from the file"""
-	
-	tf=open(tilefile,"r")
-	
-	td=pickle.load(tf)
-	a=td[(level,x,y)]
-	
-	tf.seek(a[0],1)
-	ret=tf.read(a[1])
-	
-	tf.close()
-	return ret
-	
-
-def build_tiles(img,tilefile,tilesize,options=[]):
-	"""build_tiles(img,tilefile,tilesize)
-	This will construct a new tile file from a source image.
-	options may include : pspec """
-	levels=ceil(old_div(log(old_div(max(img.get_xsize(),img.get_ysize()),tilesize)),log(2.0)))
-	
-	tf=open(tilefile,"w")
-	
-	tile_dict={}
-	pos=0
-	img2=img.copy()
-	xs,ys=img2.get_xsize(),img2.get_ysize()
-	for l in range(int(levels)):
-		rmin=img2.get_attr("mean")-img2.get_attr("sigma")*3.0
-		rmax=img2.get_attr("mean")+img2.get_attr("sigma")*3.0
-		for x in range(0,img2.get_xsize(),tilesize):
-			for y in range(0,img2.get_ysize(),tilesize):
-				i=img2.get_clip(Region(x,y,tilesize,tilesize))
-				i.set_attr("render_min",rmin)
-				i.set_attr("render_max",rmax)
-				i.set_attr("jpeg_quality",70)
-				fsp="tmpimg.%d.%03d.%03d.jpg"%(l,old_div(x,tilesize),old_div(y,tilesize))
-				i.write_image(fsp)
-				sz=os.stat(fsp).st_size
-				tile_dict[(l,old_div(x,tilesize),old_div(y,tilesize))]=(pos,sz)
-				pos+=sz
-		img2.process_inplace("math.meanshrink",{"n":2})
-	
-	# This will produce 2 power spectrum images in the tile file
-	# with scale factors -1 and -2
-	if "pspec" in options :
-		nx,ny=old_div(img.get_xsize(),512),old_div(img.get_ysize(),512)
-		a=EMData()
-		a.set_size(512,512)
-		if (ny>2 and nx>2) :
-			for y in range(1,ny-1):
-				for x in range(1,nx-1):
-					c=img.get_clip(Region(x*512,y*512,512,512))
-					c.process_inplace("normalize")
-					c.process_inplace("math.realtofft")
-					c.process_inplace("math.squared")
-					a+=c
-			a.set_value_at(256,256,0,.01)
-			a-=a.get_attr("minimum")-a.get_attr("sigma")*.01
-			a.process_inplace("math.log")
-			a-=a.get_attr("minimum")
-			a.set_attr("render_min",a.get_attr("minimum")-a.get_attr("sigma")*.1)
-			a.set_attr("render_max",a.get_attr("mean")+a.get_attr("sigma")*4.0)
-			a.set_attr("jepg_quality",80)
-			a.write_image("/tmp/tmpimg.mrc")
-			fsp="tmpimg.jpg"
-			a.write_image(fsp)
-			sz=os.stat(fsp).st_size
-			tile_dict[(-1,0,0)]=(pos,sz)
-			pos+=sz
-	
-#		try:
-			import matplotlib
-			matplotlib.use('Agg')
-			import pylab
-			manager = pylab.get_current_fig_manager()
-			apix=options["pspec"]
-			dx=old_div(1.0,(2.0*apix*256.0))
-			x=pylab.arange(dx,dx*255.9,dx)
-			y=a.calc_radial_dist(255,1,1,0)	# radial power spectrum (log)
-			pylab.figure(figsize=(8,6),dpi=96)
-			pylab.axes([.08,.08,.9,.9], axisbg='w')
-			pylab.plot(x,y)
-			pylab.axis([0,dx*256,min(y),max(y)])
-			pylab.xlabel("Spatial Freq. (1/A)")
-			pylab.ylabel("Log Intensity (10^x)")
-#			print y
-			
-			fsp="tmpimg2.png"
-			pylab.savefig(fsp,dpi=96)
-			sz=os.stat(fsp).st_size
-			tile_dict[(-2,0,0)]=(pos,sz)
-			pos+=sz
-
-#		except:
-#			print "Unable to generate plot (need matplotlib)"
-			
-	
-	pickle.dump(tile_dict,tf)
-	
-	for l in range(int(levels)):
-		for x in range(0,xs,tilesize):
-			for y in range(0,ys,tilesize):
-				fsp="tmpimg.%d.%03d.%03d.jpg"%(l,old_div(x,tilesize),old_div(y,tilesize))
-				a=open(fsp,"r")
-				b=a.read()
-				a.close()
-				tf.write(b)
-				os.remove(fsp)
-		xs/=2
-		ys/=2
-	
-	if "pspec" in options :
-		for fsp in ["tmpimg.jpg","tmpimg2.png"] :
-			a=open(fsp,"r")
-			b=a.read()
-			a.close()
-			tf.write(b)
-#			os.remove(fsp)
-	
-	tf.close()
-
 if __name__ == "__main__":
     main()
@@ -11,7 +11,7 @@ import numpy as np
 from scipy.optimize import minimize
 import scipy.spatial.distance as scidist
 from EMAN2_utils import *
-import queue
+from EMAN2_executor import EMExecutor
 from sklearn.decomposition import PCA
 
 def main():
@@ -604,8 +604,7 @@ def calc_tltax_rot(imgs, options):
 	return tltax
 
 #### subthread for making tomogram by tiles. similar to make_tomogram, just for small cubes
-def make_tile(args):
-	jsd, imgs, tpm, sz, pad, stepx, stepy, outz,options=args
+def make_tile(imgs, tpm, sz, pad, stepx, stepy, outz,options):
 	recon=Reconstructors.get("fourier", {"sym":'c1',"size":[pad,pad,pad], "mode":"gauss_2"})
 	recon.setup()
 
@@ -635,9 +634,8 @@ def make_tile(args):
 	threed.clip_inplace(Region((pad-sz)//2, (pad-sz)//2, (pad-outz)//2, sz, sz, outz))
 	threed.process_inplace("filter.lowpass.gauss",{"cutoff_abs":options.filterto})
 	#threed.process_inplace("filter.highpass.gauss",{"cutoff_pixels":2})
-	jsd.put( [stepx, stepy, threed])
 	
-	return
+	return (stepx, stepy, threed)
 
 
 #### make tomogram by tiles
@@ -699,29 +697,26 @@ def make_tomogram_tile(imgs, tltpm, options, errtlt=[], clipz=-1):
 	#wt=full3d.copy()
 	#wt.to_zero()
 	
-	jsd=queue.Queue(0)
-	jobs=[]
 	nstep=int(outxy/step/2)
-	for stepx in range(-nstep,nstep+1):
-		#### shift y by half a tile
-		for stepy in range(-nstep+stepx%2,nstep+1,2):
-			tiles=[]
-			for i in range(num):
-				if i in nrange:
-					t=tpm[i]
-					pxf=get_xf_pos(t, [stepx*step,stepy*step,0])
-					img=imgs[i]
-					m=img.get_clip(Region(img["nx"]//2-pad//2+pxf[0],img["ny"]//2-pad//2+pxf[1], pad, pad), fill=0)
-					tiles.append(m)
-				else:
-					tiles.append(EMData(1,1))
-
-			jobs.append((jsd, tiles, tpm, sz, pad, stepx, stepy, outz, options))
+	def tilejobs():
+		#### tiles are only clipped out as the pool is ready for them, so only a few sets of tiles are in memory at once
+		for stepx in range(-nstep,nstep+1):
+			#### shift y by half a tile
+			for stepy in range(-nstep+stepx%2,nstep+1,2):
+				tiles=[]
+				for i in range(num):
+					if i in nrange:
+						t=tpm[i]
+						pxf=get_xf_pos(t, [stepx*step,stepy*step,0])
+						img=imgs[i]
+						m=img.get_clip(Region(img["nx"]//2-pad//2+pxf[0],img["ny"]//2-pad//2+pxf[1], pad, pad), fill=0)
+						tiles.append(m)
+					else:
+						tiles.append(EMData(1,1))
+
+				yield (tiles, tpm, sz, pad, stepx, stepy, outz, options)
 	
-	thrds=[threading.Thread(target=make_tile,args=([i])) for i in jobs]
 	print("now start threads...")
-	thrtolaunch=0
-	tsleep=threading.active_count()
 	
 	#### non-round fall off. this is mathematically correct but seem to have grid artifacts
 	#f=np.zeros((sz,sz))
@@ -740,15 +735,8 @@ def make_tomogram_tile(imgs, tltpm, options, errtlt=[], clipz=-1):
 	#msk.process_inplace("mask.poly",{"2d":True, "k4":1/4, "k2":-1, "k0":1})
 	#msk.add(0.1)
 	#msk.write_image("tmp03_msk.hdf")
-	while thrtolaunch<len(thrds) or threading.active_count()>tsleep or jsd.empty()==False:
-		if thrtolaunch<len(thrds) :
-			while (threading.active_count()==options.threads ) : time.sleep(.1)
-			thrds[thrtolaunch].start()
-			thrtolaunch+=1
-		else: time.sleep(.1)
-		
-		if not jsd.empty():
-			stepx, stepy, threed=jsd.get()
+	with EMExecutor(options.threads,options.threads*2) as ex:
+		for stepx, stepy, threed in ex.map(make_tile,tilejobs(),ordered=False):
 			threed.mult(msk)
 			#### insert the cubes to corresponding tomograms
 			#full3d[stepx%2].insert_clip(
@@ -763,8 +751,6 @@ def make_tomogram_tile(imgs, tltpm, options, errtlt=[], clipz=-1):
 			
 			#wt.insert_scaled_sum(msk,(int(stepx*step+outxy//2),int(stepy*step+outxy//2), outz//2))
 				
-				
-	for t in thrds: t.join()
 	
 	#full3d[0].write_image("tmp00_full.hdf")
 	#full3d[1].write_image("tmp01_full.hdf")
@@ -830,17 +816,8 @@ def make_tomogram(imgs, tltpm, options, outname=None, padr=1.2,  errtlt=[], clip
 		jobs.append([nid,imgs[nid],  recon, pad, xform, exclude, options])
 			
 	#### starting threads
-	thrds=[threading.Thread(target=reconstruct,args=(i)) for i in jobs]
-	thrtolaunch=0
-	tsleep=threading.active_count()
-	while thrtolaunch<len(thrds) or threading.active_count()>tsleep:
-		if thrtolaunch<len(thrds) :
-			while (threading.active_count()==options.threads ) : time.sleep(.1)
-			if options.verbose : print("Inserting slice {}/{}".format(thrtolaunch,len(thrds)))
-			thrds[thrtolaunch].start()
-			thrtolaunch+=1
-		else: time.sleep(1)
-	for t in thrds: t.join()
+	with EMExecutor(options.threads) as ex:
+		ex.run(reconstruct,[tuple(j) for j in jobs],verbose=options.verbose)
 
 	threed=recon.finish(True)
 	threed.process_inplace("normalize")
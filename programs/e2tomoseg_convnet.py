@@ -13,8 +13,7 @@ import numpy as np
 from EMAN2 import *
 import pickle
 import time
-import threading
-from queue import Queue
+from EMAN2_executor import EMExecutor
 from multiprocessing import Array
 
 def import_theano():
@@ -284,23 +283,8 @@ def apply_neuralnet(options, tomogram=None):
 		jobs.append((tomo_in, nf, layers))
 		
 		
-	######### threading copied from e2spt_align.py
-	jsd=Queue(0)
-	NTHREADS=max(options.threads+1,2)
-	thrds=[threading.Thread(target=do_convolve,args=(jsd,job)) for job in jobs]
-	thrtolaunch=0
-	while thrtolaunch<len(thrds) or threading.active_count()>1:
-		#print thrtolaunch, len(thrds)
-		if thrtolaunch<len(thrds) :
-			 
-			while (threading.active_count()==NTHREADS ) : time.sleep(.1)
-			thrds[thrtolaunch].start()
-			print("starting: ", thrtolaunch)#, e0["nx"]
-			thrtolaunch+=1
-		else: time.sleep(1)
-	
-		while not jsd.empty():
-			idx,cout=jsd.get()
+	with EMExecutor(options.threads) as ex:
+		for idx,cout in ex.map(do_convolve,[(j,) for j in jobs],ordered=False,verbose=1):
 			cout.write_image("tmp.hdf",-1)
 			cout=cout.get_clip(Region(((cout["nx"]-enx)//2),((cout["ny"]-eny)//2) ,enx, eny))
 			cout.scale(labelshrink)
@@ -308,7 +292,7 @@ def apply_neuralnet(options, tomogram=None):
 			output.insert_clip(cout, [0,0,idx])
 	return output
 	
-def do_convolve(jsd, job):
+def do_convolve(job):
 	tomo_in, idx, layers= job
 	#idx=job
 	
@@ -346,9 +330,7 @@ def do_convolve(jsd, job):
 		imgs=imgout
 	#imgs[0].process_inplace("xform.phaseorigin.tocenter")
 
-	jsd.put((idx,imgs[0]))
-	#imgs[0].write_image(outname, idx)
-	return# (idx,imgs[0])
+	return (idx,imgs[0])
 	
 	
 def load_particles(ptcls,labelshrink,ncopy=5, rng=None):
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+from __future__ import print_function
+from __future__ import division
+
+#
+# Copyright (c) 2000-2006 Baylor College of Medicine
+#
+# This software is issued under a joint BSD/GNU license. You may use the
+# source code in this file under either license. However, note that the
+# complete EMAN2 and SPARX software packages have some GPL dependencies,
+# so you are responsible for compliance with the licenses of these packages
+# if you opt to use BSD licensing. The warranty disclaimer below holds
+# in either instance.
+#
+# This complete copyright notice must be included in any revised version of the
+# source code. Additional authorship citations may be added, but existing
+# author citations must be preserved.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  2111-1307 USA
+#
+#
+
+from builtins import range
+from EMAN2 import *
+from EMAN2_utils import ClassMxIndex
+import unittest
+import numpy as np
+import testlib
+import os
+
+def make_classmx(nptcl,sep,ncls,seed=1):
+    """a random classmx (class,weight,dx,dy,dalpha,mirror) with some unclassified (-1) cells"""
+    rng=np.random.RandomState(seed)
+    cls=rng.randint(-1,ncls,(nptcl,sep)).astype(np.float32)
+    ret=[from_numpy(cls)]
+    ret.append(from_numpy(rng.uniform(0,1,(nptcl,sep)).astype(np.float32)))
+    ret.append(from_numpy(rng.uniform(-10,10,(nptcl,sep)).astype(np.float32)))
+    ret.append(from_numpy(rng.uniform(-10,10,(nptcl,sep)).astype(np.float32)))
+    ret.append(from_numpy(rng.uniform(0,360,(nptcl,sep)).astype(np.float32)))
+    ret.append(from_numpy(rng.randint(0,2,(nptcl,sep)).astype(np.float32)))
+    return ret
+
+def brute_members(classmx,n,col=None):
+    """(ptcl,col) pairs in class n, scanning the whole classmx as the programs used to"""
+    ret=[]
+    for p in range(classmx[0]["ny"]):
+        for c in range(classmx[0]["nx"]):
+            if col!=None and c!=col : continue
+            if int(classmx[0][c,p])==n : ret.append((p,c))
+    return ret
+
+class TestClassMxIndex(unittest.TestCase):
+    """test ClassMxIndex against a brute force scan of the classmx"""
+
+    def check_index(self,idx,classmx):
+        sep,ncls=classmx[0]["nx"],int(max(classmx[0]["maximum"],-1))+1
+        self.assertEqual(idx.ncls,ncls)
+        self.assertEqual(idx.nptcl,classmx[0]["ny"])
+        self.assertEqual(idx.members(-1),[])  # unclassified cells are in no class
+        for n in range(ncls+1):
+            ref=brute_members(classmx,n)
+            self.assertEqual(idx.members(n),[p for p,c in ref])
+            for c in range(sep):
+                self.assertEqual(idx.members(n,c),[p for p,cc in brute_members(classmx,n,c)])
+
+            xfs=idx.xforms(n)
+            self.assertEqual(len(xfs),len(ref))
+            for xf,(p,c) in zip(xfs,ref):
+                self.assertEqual(idx.column(n,p),min(cc for pp,cc in ref if pp==p))  # first column if in the class more than once
+                ref_xf=Transform({"type":"2d","tx":classmx[2][c,p],"ty":classmx[3][c,p],"alpha":classmx[4][c,p],"mirror":int(classmx[5][c,p])})
+                a,b=xf.get_params("2d"),ref_xf.get_params("2d")
+                for k in ("tx","ty","alpha","mirror"):
+                    self.assertAlmostEqual(a[k],b[k],places=3)
+
+            inclass=set(p for p,c in ref)
+            for p in range(classmx[0]["ny"]):
+                if p not in inclass : self.assertEqual(idx.column(n,p),-1)
+
+    def test_members(self):
+        """test members/column/xforms vs brute force ........"""
+        classmx=make_classmx(50,1,7)
+        self.check_index(ClassMxIndex(classmx),classmx)
+
+    def test_members_sep(self):
+        """test members/column/xforms with --sep>1 ..........."""
+        classmx=make_classmx(40,3,5,seed=2)
+        self.check_index(ClassMxIndex(classmx),classmx)
+
+    def test_cache(self):
+        """test .idx.npz cache round trip ...................."""
+        file="test_classmx.hdf"
+        testlib.safe_unlink(file)
+        testlib.safe_unlink(file+".idx.npz")
+        classmx=make_classmx(30,2,4,seed=3)
+        for i,im in enumerate(classmx): im.write_image(file,i)
+
+        idx=ClassMxIndex(file)
+        self.assertTrue(os.path.isfile(file+".idx.npz"))
+        self.check_index(idx,classmx)
+
+        cached=ClassMxIndex.__new__(ClassMxIndex)
+        self.assertTrue(cached._read_cache(file))
+        self.check_index(cached,classmx)
+        self.check_index(ClassMxIndex(file),classmx)
+
+        # a changed classmx must not be served from the stale cache
+        testlib.safe_unlink(file)
+        classmx=make_classmx(35,2,6,seed=4)
+        for i,im in enumerate(classmx): im.write_image(file,i)
+        self.check_index(ClassMxIndex(file),classmx)
+
+        testlib.safe_unlink(file)
+        testlib.safe_unlink(file+".idx.npz")
+
+def test_main():
+    Log.logger().set_level(-1)
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestClassMxIndex)
+    unittest.TextTestRunner(verbosity=2).run(suite)
+
+if __name__ == '__main__':
+    test_main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+from __future__ import print_function
+from __future__ import division
+
+#
+# Copyright (c) 2000-2006 Baylor College of Medicine
+#
+# This software is issued under a joint BSD/GNU license. You may use the
+# source code in this file under either license. However, note that the
+# complete EMAN2 and SPARX software packages have some GPL dependencies,
+# so you are responsible for compliance with the licenses of these packages
+# if you opt to use BSD licensing. The warranty disclaimer below holds
+# in either instance.
+#
+# This complete copyright notice must be included in any revised version of the
+# source code. Additional authorship citations may be added, but existing
+# author citations must be preserved.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  2111-1307 USA
+#
+#
+
+
+from builtins import range
+from EMAN2_executor import EMExecutor
+import unittest
+import traceback
+import random
+import time
+import sys
+
+def work(n,delay):
+    time.sleep(delay)
+    return n*n
+
+def fail_at(n,bad):
+    time.sleep(0.001*(n%3))
+    if n==bad : raise ValueError("job {}".format(n))
+    return n
+
+class TestEMExecutor(unittest.TestCase):
+    """test the EMExecutor thread pool"""
+
+    def test_ordered(self):
+        """test ordered and unordered results ..............."""
+        rng=random.Random(1)
+        jobs=[(i,rng.uniform(0,0.01)) for i in range(40)]
+        with EMExecutor(4) as ex:
+            self.assertEqual(list(ex.map(work,jobs)),[i*i for i in range(40)])
+            self.assertEqual(sorted(ex.map(work,jobs,ordered=False)),[i*i for i in range(40)])
+            self.assertEqual(list(ex.map(abs,[-1,2,-3])),[1,2,3])  # non-tuple jobs are a single argument
+
+    def test_bounded(self):
+        """test jobs are consumed as results are returned ..."""
+        taken=[0]
+        def jobs():
+            for i in range(100):
+                taken[0]+=1
+                yield (i,0.001)
+        with EMExecutor(3,maxqueue=5) as ex:
+            for i,r in enumerate(ex.map(work,jobs())):
+                self.assertEqual(r,i*i)
+                self.assertTrue(taken[0]-i<=5+1)
+        self.assertEqual(taken[0],100)
+
+    def test_exception(self):
+        """test exceptions are re-raised with their traceback"""
+        ex=EMExecutor(3)
+        try:
+            for r in ex.map(fail_at,[(i,7) for i in range(30)]): pass
+        except ValueError as e:
+            self.assertEqual(str(e),"job 7")
+            self.assertEqual(traceback.extract_tb(sys.exc_info()[2])[-1][2],"fail_at")
+        else:
+            self.fail("no exception raised")
+
+        # the pool is still usable after a failed job
+        self.assertEqual(list(ex.map(fail_at,[(i,-1) for i in range(10)])),list(range(10)))
+        ex.shutdown()
+
+    def test_shutdown(self):
+        """test the pool shuts down after an exception ......"""
+        taken=[0]
+        def jobs():
+            for i in range(1000):
+                taken[0]+=1
+                yield (i,3)
+        try:
+            with EMExecutor(2,maxqueue=4) as ex:
+                threads=list(ex.threads)
+                for r in ex.map(fail_at,jobs()): pass
+        except ValueError:
+            pass
+        else:
+            self.fail("no exception raised")
+        self.assertEqual(ex.threads,None)
+        for t in threads: self.assertFalse(t.is_alive())
+        self.assertTrue(taken[0]<20)  # the remaining jobs are never started
+        ex.shutdown()  # a second shutdown does nothing
+
+def test_main():
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestEMExecutor)
+    unittest.TextTestRunner(verbosity=2).run(suite)
+
+if __name__ == '__main__':
+    test_main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+from __future__ import print_function
+from __future__ import division
+
+#
+# Copyright (c) 2000-2006 Baylor College of Medicine
+#
+# This software is issued under a joint BSD/GNU license. You may use the
+# source code in this file under either license. However, note that the
+# complete EMAN2 and SPARX software packages have some GPL dependencies,
+# so you are responsible for compliance with the licenses of these packages
+# if you opt to use BSD licensing. The warranty disclaimer below holds
+# in either instance.
+#
+# This complete copyright notice must be included in any revised version of the
+# source code. Additional authorship citations may be added, but existing
+# author citations must be preserved.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  2111-1307 USA
+#
+#
+
+
+from EMAN2jsondb import *
+import unittest
+import testlib
+import json
+import os
+
+def forget(path):
+    """drop a dictionary from the cache, as if it had been opened by another process"""
+    JSDict.opendicts.pop(os.path.abspath(path),None)
+
+class TestJSDict(unittest.TestCase):
+    """test the JSDict journal and sidecar index"""
+
+    fnam = "test_jsondb.json"
+    jnam = "test_jsondb_journal.jsonl"
+    inam = "test_jsondb.json.idx"
+
+    def setUp(self):
+        self.tearDown()
+
+    def tearDown(self):
+        forget(self.fnam)
+        for f in (self.fnam,self.jnam,self.inam,"test_jsondb_tmp.json"): testlib.safe_unlink(f)
+
+    def test_journal_replay(self):
+        """test journal replay after an interrupted write ..."""
+        db=js_open_dict(self.fnam,journal=True)
+        db["a"]=1
+        db["b"]=[1,2,3]
+        db.setval("c","x",deferupdate=True)
+        db.delete("a",deferupdate=True)
+        db.sync()
+        self.assertTrue(os.path.getsize(self.jnam)>0)
+        self.assertEqual(json.load(open(self.fnam)),{})  # nothing is folded into the JSON file yet
+        forget(self.fnam)
+
+        # a writer killed part way through a record leaves a partial last line behind
+        jfile=open(self.jnam,"ab")
+        jfile.write(b'{"del": [], "set": {"d": 4')
+        jfile.close()
+
+        db=js_open_dict(self.fnam)
+        self.assertEqual(sorted(db.keys()),["b","c"])
+        self.assertEqual(db["b"],[1,2,3])
+        self.assertEqual(db["c"],"x")
+        self.assertEqual(js_one_key(self.fnam,"c"),"x")  # the pending journal is not bypassed by the index
+
+        # folding the journal back in leaves a JSON file which is complete on its own
+        db.compact()
+        self.assertEqual(os.path.getsize(self.jnam),0)
+        self.assertEqual(json.load(open(self.fnam)),{"b":[1,2,3],"c":"x"})
+        forget(self.fnam)
+        self.assertEqual(js_one_key(self.fnam,"b"),[1,2,3])
+
+    def test_stale_index(self):
+        """test an out of date .idx is not used ..............."""
+        db=js_open_dict(self.fnam)
+        db["a"]=1111
+        db["b"]="abcd"
+        forget(self.fnam)
+        jfile=open(self.fnam,"r")
+        self.assertEqual(js_index_read(jfile,os.path.abspath(self.fnam),"b"),'"abcd"')
+        jfile=None
+        self.assertEqual(js_one_key(self.fnam,"a"),1111)
+
+        # rewrite the file with the same size within the mtime resolution, which the size/mtime check alone can't catch
+        size=os.path.getsize(self.fnam)
+        jss=open(self.fnam,"r").read()
+        jfile=open(self.fnam,"w")
+        jfile.write(jss.replace("1111","11").replace("abcd","abcdef"))  # the value of "a" is still at its old offset
+        jfile.close()
+        self.assertEqual(os.path.getsize(self.fnam),size)
+        idx=json.load(open(self.inam,"r"))
+        idx["mtime"]=os.stat(self.fnam).st_mtime
+        json.dump(idx,open(self.inam,"w"))
+
+        self.assertEqual(js_one_key(self.fnam,"a"),11)
+        self.assertEqual(js_one_key(self.fnam,"b"),"abcdef")
+        self.assertEqual(js_one_key(self.fnam,"c"),None)
+
+        # an index from a different size file is rejected outright
+        jfile=open(self.fnam,"w")
+        jfile.write('{\n"a": 3\n}')
+        jfile.close()
+        self.assertEqual(js_one_key(self.fnam,"a"),3)
+        self.assertEqual(js_one_key(self.fnam,"b"),None)
+
+    def test_remove(self):
+        """test js_remove_dict removes the sidecar files ...."""
+        db=js_open_dict(self.fnam,journal=True)
+        db["a"]=1
+        db.compact()
+        db["b"]=2
+        for f in (self.fnam,self.jnam,self.inam): self.assertTrue(os.path.isfile(f))
+        js_remove_dict(self.fnam)
+        for f in (self.fnam,self.jnam,self.inam): self.assertFalse(os.path.exists(f))
+
+        # a new dictionary at the same path must not see the old journal
+        db=js_open_dict(self.fnam)
+        self.assertEqual(db.keys(),[])
+
+def test_main():
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestJSDict)
+    unittest.TextTestRunner(verbosity=2).run(suite)
+
+if __name__ == '__main__':
+    test_main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+from __future__ import print_function
+from __future__ import division
+
+#
+# Copyright (c) 2000-2006 Baylor College of Medicine
+#
+# This software is issued under a joint BSD/GNU license. You may use the
+# source code in this file under either license. However, note that the
+# complete EMAN2 and SPARX software packages have some GPL dependencies,
+# so you are responsible for compliance with the licenses of these packages
+# if you opt to use BSD licensing. The warranty disclaimer below holds
+# in either instance.
+#
+# This complete copyright notice must be included in any revised version of the
+# source code. Additional authorship citations may be added, but existing
+# author citations must be preserved.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  2111-1307 USA
+#
+#
+
+
+from builtins import range
+from EMAN2 import *
+import unittest
+import numpy as np
+import testlib
+
+class TestLSXFile(unittest.TestCase):
+    """test LSXFile bulk reads and writes against the per-record methods"""
+
+    fnam = "test_lsx.lst"
+
+    def setUp(self):
+        testlib.safe_unlink(self.fnam)
+        self.ref=[]     # (image number, file, comment) for each record we expect in the file
+
+    def tearDown(self):
+        testlib.safe_unlink(self.fnam)
+        testlib.safe_unlink(self.fnam+".tmp")
+
+    def check(self,lsx):
+        self.assertEqual(len(lsx),len(self.ref))
+        for i,r in enumerate(self.ref):
+            self.assertEqual(tuple(lsx.read(i)),r)
+
+        imgnums,fileidx,filenames,comments=lsx.read_many()
+        self.assertEqual(filenames,sorted(set(r[1] for r in self.ref)))
+        self.assertEqual(list(imgnums),[r[0] for r in self.ref])
+        self.assertEqual([filenames[i] for i in fileidx],[r[1] for r in self.ref])
+        self.assertEqual([c.decode("utf-8") for c in comments],["" if r[2] is None else r[2] for r in self.ref])
+
+        # a range in the middle, and one running off the end
+        imgnums,fileidx,filenames,comments=lsx.read_many(3,8)
+        self.assertEqual(list(imgnums),[r[0] for r in self.ref[3:8]])
+        self.assertEqual([filenames[i] for i in fileidx],[r[1] for r in self.ref[3:8]])
+        self.assertEqual(list(lsx.read_many(len(self.ref)-2,len(self.ref)+5)[0]),[r[0] for r in self.ref[-2:]])
+        self.assertEqual(len(lsx.read_many(len(self.ref))[0]),0)
+
+    def test_round_trip(self):
+        """test write_many/read_many round trip ............."""
+        lsx=LSXFile(self.fnam)
+        nums=np.arange(10)*3
+        files=["a.hdf","b.hdf"]*5
+        comments=[None,"x",None,"","comment with spaces",None,"7",None,None,"z"]
+        lsx.write_many(-1,nums,files,comments)
+        self.ref=[(int(n),f,c if c else None) for n,f,c in zip(nums,files,comments)]     # read() returns None for an empty comment
+        self.check(lsx)
+
+        lsx.write_many(-1,[100,101,102],"c.hdf","same")
+        self.ref+=[(100,"c.hdf","same"),(101,"c.hdf","same"),(102,"c.hdf","same")]
+        self.check(lsx)
+
+        # overwrite the middle, running past the current end, with a longer line forcing a rewrite
+        lsx.write_many(11,[5,6,7],"a_much_longer_file_name.hdf")
+        self.ref[11:]=[(5,"a_much_longer_file_name.hdf",None),(6,"a_much_longer_file_name.hdf",None),(7,"a_much_longer_file_name.hdf",None)]
+        self.check(lsx)
+        lsx.close()
+
+    def test_append(self):
+        """test appending to an existing file ..............."""
+        lsx=LSXFile(self.fnam)
+        for i in range(5):
+            lsx.write(-1,i,"first.hdf","c{}".format(i))
+            self.ref.append((i,"first.hdf","c{}".format(i)))
+        lsx.close()
+
+        lsx=LSXFile(self.fnam,True)
+        self.check(lsx)
+        lsx.extend([(20,"second.hdf"),(21,"second.hdf","two")])
+        lsx.write_many(100,[30,31],"third.hdf")         # n past the end appends
+        self.ref+=[(20,"second.hdf",None),(21,"second.hdf","two"),(30,"third.hdf",None),(31,"third.hdf",None)]
+        self.check(lsx)
+        lsx.close()
+
+        lsx=LSXFile(self.fnam,True)
+        self.check(lsx)
+        lsx.close()
+
+    def test_normalize(self):
+        """test normalize skips the scan only when it can ..."""
+        lsx=LSXFile(self.fnam)
+        lsx.write_many(-1,list(range(12)),"a.hdf")
+        self.ref=[(i,"a.hdf",None) for i in range(12)]
+        linelen=lsx.linelen
+        lsx.close()
+
+        # a valid file is never rewritten
+        rewrite=LSXFile.rewrite
+        def norewrite(self,minlen=0): raise AssertionError("unexpected rewrite")
+        LSXFile.rewrite=norewrite
+        try: lsx=LSXFile(self.fnam,True)
+        finally: LSXFile.rewrite=rewrite
+        self.check(lsx)
+        lsx.close()
+
+        # a record added by hand with the wrong length, at the end and in the middle
+        for num,cmt in ((12,None),(13,"x"*linelen)):
+            line="{}\ta.hdf".format(num) if cmt is None else "{}\ta.hdf\t{}".format(num,cmt)
+            jss=open(self.fnam,"rb").read()
+            open(self.fnam,"wb").write(jss+(line+"\n").encode("utf-8"))
+            self.ref.append((num,"a.hdf",cmt))
+            lsx=LSXFile(self.fnam,True)
+            self.check(lsx)
+            lsx.close()
+
+        # a last line which is missing its newline, but happens to leave a valid file size
+        lsx=LSXFile(self.fnam,True)
+        linelen=lsx.linelen
+        lsx.close()
+        jss=open(self.fnam,"rb").read()
+        open(self.fnam,"wb").write(jss+"{:<{}}".format("14\ta.hdf",linelen).encode("utf-8"))
+        self.ref.append((14,"a.hdf",None))
+        lsx=LSXFile(self.fnam,True)
+        self.check(lsx)
+        lsx.write(-1,15,"a.hdf")
+        self.ref.append((15,"a.hdf",None))
+        self.check(lsx)
+        lsx.close()
+
+def test_main():
+    Log.logger().set_level(-1)
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestLSXFile)
+    unittest.TextTestRunner(verbosity=2).run(suite)
+
+if __name__ == '__main__':
+    test_main()
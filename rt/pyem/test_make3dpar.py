@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+from __future__ import print_function
+from __future__ import division
+
+#
+# Copyright (c) 2000-2006 Baylor College of Medicine
+#
+# This software is issued under a joint BSD/GNU license. You may use the
+# source code in this file under either license. However, note that the
+# complete EMAN2 and SPARX software packages have some GPL dependencies,
+# so you are responsible for compliance with the licenses of these packages
+# if you opt to use BSD licensing. The warranty disclaimer below holds
+# in either instance.
+#
+# This complete copyright notice must be included in any revised version of the
+# source code. Additional authorship citations may be added, but existing
+# author citations must be preserved.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  2111-1307 USA
+#
+#
+
+
+from builtins import range
+from EMAN2 import *
+import unittest
+import subprocess
+import numpy as np
+import testlib
+
+class TestMake3dAccumulate(unittest.TestCase):
+    """test e2make3dpar.py --accumulate thread/process against a single shared accumulator"""
+
+    infile = "test_make3dpar_proj.hdf"
+
+    def setUp(self):
+        self.outs=[]
+        testlib.safe_unlink(self.infile)
+        model=test_image_3d(1,(32,32,32))
+        for i,o in enumerate(Symmetries.get("c1").gen_orientations("eman",{"delta":15,"inc_mirror":True})):
+            p=model.project("standard",o)
+            p["xform.projection"]=o
+            p["ptcl_repr"]=1+i%3        # unequal weights, so the weights have to be summed correctly as well
+            p.write_image(self.infile,i)
+
+    def tearDown(self):
+        testlib.safe_unlink(self.infile)
+        for f in self.outs: testlib.safe_unlink(f)
+
+    def make3d(self,accumulate,threads):
+        out="test_make3dpar_{}_{}.hdf".format(accumulate,threads)
+        self.outs.append(out)
+        testlib.safe_unlink(out)
+        cmd="e2make3dpar.py --input {} --output {} --pad 48 --threads {} --accumulate {}".format(self.infile,out,threads,accumulate)
+        self.assertEqual(subprocess.call(cmd,shell=True),0)
+        return to_numpy(EMData(out,0)).copy()
+
+    def test_one_thread(self):
+        """test one worker is bitwise identical to shared ..."""
+        ref=self.make3d("shared",1)
+        for acc in ("thread","process"):
+            self.assertTrue(np.array_equal(self.make3d(acc,1),ref),"--accumulate {} --threads 1 differs from shared".format(acc))
+
+    def test_threads(self):
+        """test several workers agree with shared ............"""
+        ref=self.make3d("shared",1)
+        scale=np.abs(ref).max()
+        for acc in ("shared","thread","process"):
+            vol=self.make3d(acc,3)
+            self.assertTrue(np.allclose(vol,ref,rtol=1e-4,atol=1e-5*scale),"--accumulate {} --threads 3 differs from shared".format(acc))
+
+        # partials are summed in thread order, so repeated runs are identical
+        for acc in ("thread","process"):
+            self.assertTrue(np.array_equal(self.make3d(acc,3),self.make3d(acc,3)))
+
+def test_main():
+    Log.logger().set_level(-1)
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestMake3dAccumulate)
+    unittest.TextTestRunner(verbosity=2).run(suite)
+
+if __name__ == '__main__':
+    test_main()
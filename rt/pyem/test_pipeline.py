@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+from __future__ import print_function
+from __future__ import division
+
+#
+# Copyright (c) 2000-2006 Baylor College of Medicine
+#
+# This software is issued under a joint BSD/GNU license. You may use the
+# source code in this file under either license. However, note that the
+# complete EMAN2 and SPARX software packages have some GPL dependencies,
+# so you are responsible for compliance with the licenses of these packages
+# if you opt to use BSD licensing. The warranty disclaimer below holds
+# in either instance.
+#
+# This complete copyright notice must be included in any revised version of the
+# source code. Additional authorship citations may be added, but existing
+# author citations must be preserved.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  2111-1307 USA
+#
+#
+
+from EMAN2_pipeline import EMPipeline
+import unittest
+import tempfile
+import shutil
+import os
+
+class TestEMPipeline(unittest.TestCase):
+    """test the EMPipeline dependency graph scheduler"""
+
+    def setUp(self):
+        self.tmp=tempfile.mkdtemp()
+        # a minimal 'EMAN2 program' which exits with the status given on its command line
+        prog=open(os.path.join(self.tmp,"e2pipetest.py"),"w")
+        prog.write("import sys\nopen(sys.argv[2],'w').write(' '.join(sys.argv[3:]))\nsys.exit(int(sys.argv[1]))\n")
+        prog.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_order(self):
+        """test steps start after their dependencies ........"""
+        done=[]
+        pl=EMPipeline(4)
+        pl.add("a",lambda:done.append("a"))
+        pl.add("b",lambda:done.append("b"),deps=("a",))
+        pl.add("c",lambda:done.append("c"),deps=("a","b"))
+        pl.add("d",lambda:done.append("d"))
+        self.assertTrue(pl.run())
+        self.assertEqual(sorted(done),["a","b","c","d"])
+        self.assertTrue(done.index("a")<done.index("b")<done.index("c"))
+        self.assertEqual([n.status for n in pl.nodes],[0,0,0,0])
+        self.assertEqual(pl.failed(),[])
+
+    def test_bad_deps(self):
+        """test unknown and duplicate steps are refused ....."""
+        pl=EMPipeline(2)
+        pl.add("a",lambda:None)
+        self.assertRaises(ValueError,pl.add,"a",lambda:None)
+        self.assertRaises(ValueError,pl.add,"b",lambda:None,deps=("x",))
+
+    def test_core_budget(self):
+        """test running steps stay within the core budget ..."""
+        running=[0]
+        peak=[0]
+        def start(node):
+            running[0]+=node.cores
+            peak[0]=max(peak[0],running[0])
+        def finish(node):
+            running[0]-=node.cores
+        pl=EMPipeline(3,onstart=start,onfinish=finish)
+        for i in range(4): pl.add("s{}".format(i),"sleep 0.3; true",cores=2)
+        pl.add("big","sleep 0.1; true",cores=8)  # more than the budget, runs alone (--ppid is appended to the command)
+        self.assertTrue(pl.run(polltime=0.02))
+        self.assertEqual(peak[0],3)
+        self.assertEqual(pl["big"].cores,3)
+        for n in pl.nodes:
+            self.assertEqual(n.mode,"spawn")
+            self.assertEqual(n.status,0)
+        # two 2-core steps never overlap with a budget of 3
+        ss=sorted((pl["s{}".format(i)] for i in range(4)),key=lambda n:n.start)
+        for a,b in zip(ss,ss[1:]): self.assertTrue(b.start>=a.end)
+
+    def test_nonfatal(self):
+        """test non-fatal failures don't stop the pipeline .."""
+        done=[]
+        pl=EMPipeline(2)
+        pl.add("bad","exit 3",fatal=False)
+        pl.add("after",lambda:done.append(1),deps=("bad",))
+        self.assertTrue(pl.run(polltime=0.02))
+        self.assertEqual(pl["bad"].status,3)
+        self.assertEqual(done,[1])
+        self.assertEqual([n.name for n in pl.failed()],["bad"])
+
+    def test_fatal(self):
+        """test a fatal failure stops new steps ............"""
+        done=[]
+        def boom(): raise RuntimeError("expected")
+        pl=EMPipeline(1)
+        pl.add("bad",boom)
+        pl.add("after",lambda:done.append(1),deps=("bad",))
+        pl.add("other",lambda:done.append(2))
+        self.assertFalse(pl.run(polltime=0.02))
+        self.assertEqual(pl["bad"].status,1)
+        self.assertEqual(done,[])
+        self.assertEqual(pl["after"].status,None)
+
+    def test_fork(self):
+        """test in-process programs and their exit codes ..."""
+        if not hasattr(os,"fork") : return
+        out0,out3=os.path.join(self.tmp,"out0"),os.path.join(self.tmp,"out3")
+        pl=EMPipeline(2,progdir=self.tmp)
+        pl.add("ok","e2pipetest.py 0 {} hello".format(out0))
+        pl.add("fail","e2pipetest.py 3 {}".format(out3),fatal=False)
+        self.assertTrue(pl.run(polltime=0.02))
+        self.assertEqual(pl["ok"].mode,"fork")
+        self.assertEqual(pl["ok"].status,0)
+        self.assertEqual(pl["fail"].status,3)
+        self.assertTrue(open(out0).read().startswith("hello --ppid="))
+
+def test_main():
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestEMPipeline)
+    unittest.TextTestRunner(verbosity=2).run(suite)
+
+if __name__ == '__main__':
+    test_main()
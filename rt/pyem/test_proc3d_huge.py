@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+from __future__ import print_function
+from __future__ import division
+
+#
+# Copyright (c) 2000-2006 Baylor College of Medicine
+#
+# This software is issued under a joint BSD/GNU license. You may use the
+# source code in this file under either license. However, note that the
+# complete EMAN2 and SPARX software packages have some GPL dependencies,
+# so you are responsible for compliance with the licenses of these packages
+# if you opt to use BSD licensing. The warranty disclaimer below holds
+# in either instance.
+#
+# This complete copyright notice must be included in any revised version of the
+# source code. Additional authorship citations may be added, but existing
+# author citations must be preserved.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  2111-1307 USA
+#
+#
+
+from EMAN2 import *
+import unittest
+import subprocess
+import numpy as np
+import testlib
+
+class TestProc3dHuge(unittest.TestCase):
+    """test e2proc3d_huge.py bricks and slabs against processing the whole volume"""
+
+    infile = "test_proc3d_huge_in.hdf"
+    outfile = "test_proc3d_huge_out.hdf"
+
+    def setUp(self):
+        rng=np.random.RandomState(3)
+        a=(rng.rand(20,36,36)<0.4).astype(np.float32)      # z,y,x
+        from_numpy(a).write_image(self.infile,0)
+
+    def tearDown(self):
+        testlib.safe_unlink(self.infile)
+        testlib.safe_unlink(self.outfile)
+
+    def run_huge(self,procs):
+        # small bricks and slabs, so every processor sees many brick and slab boundaries
+        cmd="e2proc3d_huge.py {} {} --bricksize 8 --chunkmem 0.03 --threads 2 {}".format(self.infile,self.outfile," ".join("--process "+p for p in procs))
+        return subprocess.call(cmd,shell=True)
+
+    def check(self,*procs):
+        self.assertEqual(self.run_huge(procs),0)
+        ref=EMData(self.infile,0)
+        for p in procs:
+            name,parms=parsemodopt(p)
+            ref.process_inplace(name,parms)
+        out=EMData(self.outfile,0)
+        self.assertTrue(np.array_equal(to_numpy(out),to_numpy(ref)),"{} differs from whole volume processing".format(" ".join(procs)))
+
+    def test_pointwise(self):
+        """test pointwise processors ........................"""
+        self.check("math.linear:scale=2:shift=1","threshold.clampminmax:minval=1.5:maxval=2.5")
+
+    def test_local(self):
+        """test local neighbourhood processors ..............."""
+        self.check("math.localsigma:radius=2")
+
+    def test_morph(self):
+        """test binary morphology with several iterations ..."""
+        self.check("morph.dilate.binary:radius=1:iters=2")
+        self.check("morph.open.binary:radius=1:iters=2")
+        self.check("morph.close.binary:radius=2:iters=2")
+
+    def test_refused(self):
+        """test processors needing the whole volume ........."""
+        self.assertNotEqual(self.run_huge(["threshold.clampminmax:minval=0.2:maxval=0.8:tomean=1"]),0)
+        self.assertNotEqual(self.run_huge(["normalize"]),0)
+
+def test_main():
+    Log.logger().set_level(-1)
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestProc3dHuge)
+    unittest.TextTestRunner(verbosity=2).run(suite)
+
+if __name__ == '__main__':
+    test_main()
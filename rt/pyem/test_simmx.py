@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+from __future__ import print_function
+from __future__ import division
+
+#
+# Copyright (c) 2000-2006 Baylor College of Medicine
+#
+# This software is issued under a joint BSD/GNU license. You may use the
+# source code in this file under either license. However, note that the
+# complete EMAN2 and SPARX software packages have some GPL dependencies,
+# so you are responsible for compliance with the licenses of these packages
+# if you opt to use BSD licensing. The warranty disclaimer below holds
+# in either instance.
+#
+# This complete copyright notice must be included in any revised version of the
+# source code. Additional authorship citations may be added, but existing
+# author citations must be preserved.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  2111-1307 USA
+#
+#
+
+from builtins import range
+from EMAN2 import *
+from EMAN2_utils import simmx_topk_read
+import unittest
+import subprocess
+import numpy as np
+import testlib
+
+class TestSimmxTopk(unittest.TestCase):
+    """test e2simmx.py --topk --candidates, parallel vs. serial"""
+
+    files = ("test_simmx_refs.hdf","test_simmx_ptcls.hdf","test_simmx_cand.hdf","test_simmx_ser.hdf","test_simmx_par.hdf")
+
+    def setUp(self):
+        self.tearDown()
+        rng=np.random.RandomState(5)
+        refs,ptcls,cand=self.files[:3]
+        for i in range(12):
+            test_image(i%10,(32,32)).write_image(refs,i)
+        for i in range(20):
+            a=test_image(i%10,(32,32))
+            a.process_inplace("math.addnoise",{"noise":0.5,"seed":i+1})
+            a.write_image(ptcls,i)
+        # each particle is compared to 5 of the 12 references, some rows with unused (-1) entries
+        c=np.array([rng.permutation(12)[:5] for i in range(20)],dtype=np.float32)
+        c[::3,4]=-1
+        from_numpy(c).write_image(cand,0)
+
+    def tearDown(self):
+        for f in self.files: testlib.safe_unlink(f)
+
+    def run_simmx(self,out,extra):
+        refs,ptcls,cand=self.files[:3]
+        cmd="e2simmx.py {} {} {} --cmp=sqeuclidean --topk=3 --candidates={} --saveali --align=rotate_translate_flip {}".format(refs,ptcls,out,cand,extra)
+        self.assertEqual(subprocess.call(cmd,shell=True),0)
+        return simmx_topk_read(out)
+
+    def test_parallel_vs_serial(self):
+        """test parallel --candidates --topk vs serial ......."""
+        ser,nser=self.run_simmx(self.files[3],"")
+        par,npar=self.run_simmx(self.files[4],"--parallel=thread:2")
+        self.assertEqual(nser,npar)
+
+        # sqeuclidean is positive, so a skipped cell merged as 0.0 would always win
+        cand=EMData(self.files[2],0).numpy()
+        for r in range(20):
+            self.assertTrue(set(ser[0][r][ser[0][r]>=0].astype(int))<=set(cand[r].astype(int)))
+        for i in range(len(ser)):
+            self.assertTrue(np.allclose(ser[i],par[i],rtol=1e-4,atol=1e-3))
+
+def test_main():
+    Log.logger().set_level(-1)
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestSimmxTopk)
+    unittest.TextTestRunner(verbosity=2).run(suite)
+
+if __name__ == '__main__':
+    test_main()
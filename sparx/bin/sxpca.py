@@ -44,7 +44,7 @@ import sys
       
 def main():
 	progname = os.path.basename(sys.argv[0])
-	usage = progname + "  input_stack output_stack --subavg=average_image --rad=mask_radius --nvec=number_of_eigenvectors --incore --mask=maskfile --shuffle --usebuf --MPI"
+	usage = progname + "  input_stack output_stack --subavg=average_image --rad=mask_radius --nvec=number_of_eigenvectors --incore --mask=maskfile --shuffle --usebuf --MPI --rsvd"
 	parser = OptionParser(usage, version=SPARXVERSION)
 	parser.add_option("--subavg",  type="string",       default="",    help="subtract average")
 	parser.add_option("--rad",     type="int",          default=-1,    help="radius of mask")
@@ -54,6 +54,7 @@ def main():
 	parser.add_option("--shuffle", action="store_true", default=False, help="use shuffle")
 	parser.add_option("--incore",  action="store_true", default=False, help="no buffer on a disk" )
 	parser.add_option("--MPI",     action="store_true", default=False, help="run mpi version" )
+	parser.add_option("--rsvd",    action="store_true", default=False, help="randomized SVD, a few passes over the data (for large data sets)" )
 
 	(options, args) = parser.parse_args()
 
@@ -76,7 +77,7 @@ def main():
 	from applications import pca
 	global_def.BATCH = True
 	vecs = []
-	vecs = pca(input_stacks, options.subavg, options.rad, options.nvec, options.incore, options.shuffle, not(options.genbuf), options.mask, options.MPI)
+	vecs = pca(input_stacks, options.subavg, options.rad, options.nvec, options.incore, options.shuffle, not(options.genbuf), options.mask, options.MPI, rsvd = options.rsvd)
 	if isRoot:
 		for i in range(len(vecs)):
 			vecs[i].write_image(output_stack, i)
@@ -15540,7 +15540,7 @@ def ssnr3d_MPI(stack, output_volume = None, ssnr_text_file = None, mask = None,
 		vol_ssnr2, output_volume+"2.spi", "s")
 		"""
 
-def pca(input_stacks, subavg="", mask_radius=-1, nvec=3, incore=False, shuffle=False, genbuf=True, maskfile="", MPI=False, verbose=False):
+def pca(input_stacks, subavg="", mask_radius=-1, nvec=3, incore=False, shuffle=False, genbuf=True, maskfile="", MPI=False, verbose=False, rsvd=False):
 	"""
 		PCA of a set of images (can be 1-2-3-D).
 		input_stacks - 
@@ -15551,6 +15551,7 @@ def pca(input_stacks, subavg="", mask_radius=-1, nvec=3, incore=False, shuffle=F
 		shuffle      - Shuffle test (default False)
 		genbuf       - generate disk buffer (default True), to use the disk buffer with data set to False
 		maskfile     - name of the mask file 
+		rsvd         - use the randomized SVD, a few passes over the data instead of one per Lanczos step (default False)
 	"""
 	from utilities import get_image, get_im, model_circle, model_blank
 	from statistics import pcanalyzer
@@ -15587,7 +15588,7 @@ def pca(input_stacks, subavg="", mask_radius=-1, nvec=3, incore=False, shuffle=F
 			data = input_stacks[0]
 		mask = model_blank(data.get_xsize(), data.get_ysize(), data.get_zsize(), bckg=1.0)
 
-	pca = pcanalyzer(mask, nvec, incore, MPI)
+	pca = pcanalyzer(mask, nvec, incore, MPI, rsvd = rsvd)
 
 	if subavg != "":
 		if(verbose): print("Subtracting ", subavg, " from each image")
@@ -17748,9 +17749,10 @@ def plot_projs_distrib(stack, outplot, wnx = 256):
 # 2008-12-08 12:46:46 JB
 # Wrap for the HAC part of py_cluster in the statistics.py file
 def HAC_clustering(stack, dendoname, maskname, kind_link, kind_dist, flag_diss):
-	from statistics   import ccc, py_cluster_HierarchicalClustering
+	from statistics   import ccc, py_cluster_HierarchicalClustering, py_cluster_pdist
 	from copy         import deepcopy
-	from utilities    import get_im, get_params2D, get_params3D
+	from utilities    import get_im, get_params2D, get_params3D, get_image_data
+	import numpy as np
 	from fundamentals import rot_shift2D, rot_shift3D
 
 	N    = EMUtil.get_image_count(stack)
@@ -17774,12 +17776,22 @@ def HAC_clustering(stack, dendoname, maskname, kind_link, kind_dist, flag_diss):
 		if mask != None: Util.mul_img(IM[n], mask)
 		IM[n].set_attr('ID_hclus', n)
 
+	# all distances at once, from the images packed in one array
+	X = np.empty((N, IM[0].get_xsize()*ny*nz), np.float32)
+	for n in range(N): X[n] = get_image_data(IM[n]).reshape(-1)
+	if kind_dist   == 'SqEuc':  D = py_cluster_pdist(X, 'SqEuclidean')
+	elif kind_dist == 'CCC':
+		if mask != None: D = py_cluster_pdist(X, 'ccc', get_image_data(mask))
+		else:            D = py_cluster_pdist(X, 'ccc')
+	del X
+	if flag_diss: D *= -1.0
+
 	if kind_dist   == 'SqEuc':
-		if flag_diss: cl = py_cluster_HierarchicalClustering(IM, lambda x,y: -x.cmp("SqEuclidean", y), linkage = kind_link)
-		else:        cl = py_cluster_HierarchicalClustering(IM, lambda x,y: x.cmp("SqEuclidean", y), linkage = kind_link)
+		if flag_diss: cl = py_cluster_HierarchicalClustering(IM, lambda x,y: -x.cmp("SqEuclidean", y), linkage = kind_link, distances = D)
+		else:        cl = py_cluster_HierarchicalClustering(IM, lambda x,y: x.cmp("SqEuclidean", y), linkage = kind_link, distances = D)
 	elif kind_dist == 'CCC':
-		if flag_diss: cl = py_cluster_HierarchicalClustering(IM, lambda x,y: -ccc(x, y, mask), linkage = kind_link)
-		else:        cl = py_cluster_HierarchicalClustering(IM, lambda x,y: ccc(x, y, mask), linkage = kind_link)
+		if flag_diss: cl = py_cluster_HierarchicalClustering(IM, lambda x,y: -ccc(x, y, mask), linkage = kind_link, distances = D)
+		else:        cl = py_cluster_HierarchicalClustering(IM, lambda x,y: ccc(x, y, mask), linkage = kind_link, distances = D)
 
 	k     = N
 	Dendo = {}
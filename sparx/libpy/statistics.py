@@ -2686,6 +2686,367 @@ def select_kmeans(dJe, T):
 
 	return s
 
+#  Largest number of distances (images x clusters) computed at once by the vectorized k-means
+KMEANS_BLOCK_SIZE = 1<<22
+
+def k_means_stack(im_M, shared = False, comm = -1):
+	"""
+	  Pack the (masked) images of im_M into one contiguous float32 matrix, one image per row, for k_means_vec.
+	  If shared is set, all processes of comm have to call it with the same images, and the processes of
+	  a node get a single copy of the matrix held in an MPI-3 shared memory window.
+	  Returns (matrix, handle), the handle has to be released with k_means_free_stack.
+	"""
+	import numpy as np
+	from utilities import get_image_data
+
+	N = len(im_M)
+	m = im_M[0].get_xsize()*im_M[0].get_ysize()*im_M[0].get_zsize()
+	if not shared:
+		X = np.empty((N, m), np.float32)
+		for i in range(N):  X[i] = get_image_data(im_M[i]).reshape(-1)
+		return X, None
+
+	from mpi import mpi_comm_rank, mpi_comm_split_type, mpi_comm_free, mpi_barrier
+	from mpi import mpi_win_allocate_shared, mpi_win_shared_query, MPI_COMM_WORLD, MPI_COMM_TYPE_SHARED, MPI_INFO_NULL, MPI_PROC_NULL
+
+	if comm == -1 or comm == None: comm = MPI_COMM_WORLD
+	shared_comm  = mpi_comm_split_type(comm, MPI_COMM_TYPE_SHARED,  0, MPI_INFO_NULL)
+	myid_on_node = mpi_comm_rank(shared_comm)
+	disp_unit = 4
+	if myid_on_node == 0:  win, base_ptr = mpi_win_allocate_shared(N*m*disp_unit, disp_unit, MPI_INFO_NULL, shared_comm)
+	else:
+		win, base_ptr = mpi_win_allocate_shared(0, disp_unit, MPI_INFO_NULL, shared_comm)
+		base_ptr, = mpi_win_shared_query(win, MPI_PROC_NULL)
+	X = np.frombuffer(np.core.multiarray.int_asbuffer(base_ptr, N*m*disp_unit), dtype = 'f4').reshape(N, m)
+	if myid_on_node == 0:
+		for i in range(N):  X[i] = get_image_data(im_M[i]).reshape(-1)
+	mpi_barrier(shared_comm)
+	mpi_comm_free(shared_comm)
+	return X, win
+
+def k_means_free_stack(handle):
+	#  Releases a matrix obtained from k_means_stack; has to be called on all processes if it is shared
+	if handle != None:
+		from mpi import mpi_win_free
+		mpi_win_free(handle)
+
+def k_means_dist(X, x2, C, c2):
+	#  Mean squared distances (as Util.min_dist_real) between the rows of X and of C, x2 and c2 are their
+	#  squared norms.  |x|^2 - 2 x.c + |c|^2, the cross terms from a single matrix product.  The product is
+	#  done in double precision, a block of rows at a time: in single precision its rounding error grows with
+	#  |x|^2 rather than with the distance, and is enough to swap close averages of images with a large mean.
+	import numpy as np
+	d    = np.empty((len(X), len(C)))
+	C    = C.astype(np.float64)
+	rows = max(1, KMEANS_BLOCK_SIZE//X.shape[1])
+	for i in range(0, len(X), rows):  np.dot(X[i:i+rows].astype(np.float64), C.T, d[i:i+rows])
+	d *= -2.0
+	d += x2[:, None]
+	d += c2
+	np.maximum(d, 0.0, d)
+	d /= X.shape[1]
+	return d
+
+def k_means_nearest(X, x2, C, c2):
+	#  Index of the nearest row of C for each row of X
+	import numpy as np
+	rows   = max(1, KMEANS_BLOCK_SIZE//len(C))
+	assign = np.empty(len(X), np.int32)
+	for i in range(0, len(X), rows):  assign[i:i+rows] = k_means_dist(X[i:i+rows], x2[i:i+rows], C, c2).argmin(axis = 1)
+	return assign
+
+def k_means_sums(X, assign, K, squares = False):
+	#  Sum (or sum of squares) of the rows of X in each cluster, in double precision
+	import numpy as np
+	S = np.zeros((K, X.shape[1]))
+	for k in range(K):
+		Xk = X[assign == k]
+		if squares:  S[k] = np.einsum('ij,ij->j', Xk, Xk, dtype = np.float64)
+		else:        S[k] = Xk.sum(axis = 0, dtype = np.float64)
+	return S
+
+def k_means_init_pp(X, x2, K, rng):
+	#  k-means++ seeding (D2 weighting), returns the assignment of each image to its nearest seed
+	import numpy as np
+	N     = len(X)
+	seeds = [rng.randint(N)]
+	D     = k_means_dist(X, x2, X[seeds], x2[seeds])[:, 0]
+	for k in range(1, K):
+		cum = np.cumsum(D)
+		if cum[-1] > 0.0:  i = min(int(np.searchsorted(cum, rng.random_sample()*cum[-1], side = 'right')), N-1)
+		else:              i = rng.randint(N)
+		seeds.append(i)
+		D = np.minimum(D, k_means_dist(X, x2, X[i:i+1], x2[i:i+1])[:, 0])
+	return k_means_nearest(X, x2, X[seeds], x2[seeds])
+
+def k_means_select(dJe, T, rng):
+	#  select_kmeans for each row of dJe, the rows being normalized first as in k_means_cla
+	import numpy as np
+	mindJe = dJe.min(axis = 1)[:, None]
+	scale  = dJe.max(axis = 1)[:, None] - mindJe
+	scale[scale == 0.0] = 1.0
+	p   = np.exp(np.clip(((dJe - mindJe)/scale - 1.0)/T, -30.0, 30.0))
+	p   = np.cumsum(p, axis = 1)
+	rnd = rng.random_sample(len(p))*p[:, -1]
+	return np.minimum((p < rnd[:, None]).sum(axis = 1), dJe.shape[1]-1)
+
+def k_means_vec_trial(X, x2, K, maxit, method, F, T0, rnd_method, rng, batch, verbose, DEBUG, part):
+	#  One trial of k_means_vec, returns (assign, n, S, Q, Je) or None if a cluster became empty
+	import numpy as np
+	from utilities import print_msg, reduce_array_to_root, bcast_array_to_all
+
+	if part == None:  myid, main_node, N_start, N_stop, N = 0, 0, 0, len(X), len(X)
+	else:             myid, main_node, N_start, N_stop, N = part
+	norm = X.shape[1]
+
+	def allsum(a):
+		#  global sum over the processes holding parts of the images
+		if part != None:
+			reduce_array_to_root(a, myid, main_node)
+			bcast_array_to_all(a, main_node)
+		return a
+
+	def criterion(S, n, Q):
+		#  Ji = S |im - ave|**2 / norm**2 = (S |im|**2 - |S im|**2 / n) / norm**2
+		Ji = np.maximum(Q - (S*S).sum(axis = 1)/n, 0.0)/norm/norm
+		return Ji.sum()
+
+	def averages(S, n):
+		C = (S/n[:, None]).astype(np.float32)
+		return C, np.einsum('ij,ij->i', C, C, dtype = np.float64)
+
+	def empty():
+		if verbose: print_msg('>>> WARNING: Empty cluster, restart with new partition.\n\n')
+		return None
+
+	if method == 'cla':  SA = F  != 0
+	else:                SA = T0 != 0
+	if SA: T = T0
+
+	if part != None:
+		assign = np.zeros(N, np.int32)
+		if myid == main_node:  assign[:] = k_means_init_asg_rnd(N, K)[0]
+		bcast_array_to_all(assign, main_node)
+		assign = assign[N_start:N_stop].copy()
+	elif rnd_method == 'd2w':  assign = k_means_init_pp(X, x2, K, rng)
+	else:                      assign = np.array(k_means_init_asg_rnd(N, K)[0], np.int32)
+
+	n = allsum(np.bincount(assign, minlength = K).astype(np.float64))
+	if n.min() <= 1: return empty()
+	S     = allsum(k_means_sums(X, assign, K))
+	Q     = allsum(np.bincount(assign, weights = x2, minlength = K))
+	Je    = criterion(S, n, Q)
+	C, c2 = averages(S, n)
+
+	if DEBUG: print('init Je', Je)
+	if verbose: print_msg('Criterion: %11.6e \n' % Je)
+
+	ite       = 0
+	watch_dog = 0
+	old_Je    = 0
+	change    = True
+	rows      = max(1, KMEANS_BLOCK_SIZE//K)
+	while change and watch_dog < maxit:
+		ite       += 1
+		watch_dog += 1
+		moved      = 0
+		ct_pert    = 0
+
+		if method == 'cla':
+			# reassign all images to the current averages, then update the averages
+			new = np.empty_like(assign)
+			for i in range(0, len(X), rows):
+				d   = k_means_dist(X[i:i+rows], x2[i:i+rows], C, c2)
+				pos = d.argmin(axis = 1)
+				if SA:
+					a   = assign[i:i+rows]
+					r   = np.arange(len(a))
+					dJe = (n[a]/(n[a]-1)*d[r, a])[:, None] - n/(n+1)*d
+					dJe[r, a] = 0.0
+					sel = k_means_select(dJe, T, rng)
+					ct_pert += int((sel != pos).sum())
+					pos = sel
+				new[i:i+rows] = pos
+			moved  = int((new != assign).sum())
+			assign = new
+			n = allsum(np.bincount(assign, minlength = K).astype(np.float64))
+			if n.min() <= 1: return empty()
+			S = allsum(k_means_sums(X, assign, K))
+		else:
+			# move the images in random order, a mini-batch at a time, averages updated after each batch
+			order = rng.permutation(len(X))
+			for b in range(0, len(X), batch):
+				idx = order[b:b+batch]
+				a   = assign[idx]
+				r   = np.arange(len(idx))
+				d   = k_means_dist(X[idx], x2[idx], C, c2)
+				dJe = (n[a]/(n[a]-1)*d[r, a])[:, None] - n/(n+1)*d
+				dJe[r, a] = 0.0
+				if SA:
+					sel = k_means_select(dJe, T, rng)
+					ct_pert += int((sel != d.argmin(axis = 1)).sum())
+				else:
+					sel = dJe.argmax(axis = 1)
+					sel = np.where(dJe[r, sel] > 0.0, sel, a)
+				mv = np.nonzero(sel != a)[0]
+				if len(mv) == 0: continue
+				src, dst = a[mv], sel[mv]
+				Xmv = X[idx[mv]]
+				np.subtract.at(S, src, Xmv)
+				np.add.at(S, dst, Xmv)
+				n -= np.bincount(src, minlength = K)
+				n += np.bincount(dst, minlength = K)
+				assign[idx[mv]] = dst
+				moved += len(mv)
+				if n.min() <= 1: return empty()
+				upd = np.unique(np.concatenate((src, dst)))
+				C[upd], c2[upd] = averages(S[upd], n[upd])
+
+		Q      = allsum(np.bincount(assign, weights = x2, minlength = K))
+		Je     = criterion(S, n, Q)
+		C, c2  = averages(S, n)
+		counts = allsum(np.array([moved, ct_pert], np.float64))
+		change = counts[0] > 0
+		ct_pert = int(counts[1])
+
+		# threshold convergence control
+		if Je != 0: thd = abs(Je - old_Je) / Je
+		else:       thd = 0
+
+		# Simulated annealing, update temperature
+		if SA:
+			if thd < 1.0e-12 and ct_pert == 0: watch_dog = maxit
+			T *= F
+			if T < 0.009 and (method != 'cla' or ct_pert < 5): SA = False
+			if verbose: print_msg('> iteration: %5d    criterion: %11.6e    T: %13.8f  ct disturb: %5d\n' % (ite, Je, T, ct_pert))
+			if DEBUG: print('> iteration: %5d    criterion: %11.6e    T: %13.8f  ct disturb: %5d' % (ite, Je, T, ct_pert))
+		else:
+			if thd < 1.0e-8: watch_dog = maxit
+			if verbose: print_msg('> iteration: %5d    criterion: %11.6e\n' % (ite, Je))
+			if DEBUG: print('> iteration: %5d    criterion: %11.6e' % (ite, Je))
+
+		old_Je = Je
+
+	if method != 'cla':
+		# the averages were updated incrementally, recompute them
+		S  = k_means_sums(X, assign, K)
+		Je = criterion(S, n, Q)
+
+	return assign, n, S, Q, Je
+
+def k_means_vec(im_M, mask, K, maxit, trials, method = 'cla', F = 0, T0 = 0, rnd_method = 'rnd', DEBUG = False,
+		verbose = True, shared = False, part = None, batch = 0):
+	"""
+	  Vectorized k-means without CTF, used by k_means_cla, k_means_SSE and their MPI versions.
+	  The images are packed in one float32 matrix (k_means_stack, shared between the processes
+	  of a node if shared is set), the averages are kept as sums, and the distances of a block of images
+	  to all averages are obtained with one matrix product.
+	    method      'cla' reassigns all images then updates the averages, 'SSE' moves the images in
+	                random order, in mini-batches of batch images (default N/(4K), at most 256;
+	                1 gives the original one image at a time updates)
+	    rnd_method  'd2w' k-means++ seeding, otherwise random assignment
+	    part        (myid, main_node, N_start, N_stop, N): 'cla' distributed over MPI_COMM_WORLD,
+	                im_M holding images N_start to N_stop only
+	  The random generator is taken from the state of module random, seeded by the caller.  Without
+	  simulated annealing, 'cla' reassigns the images exactly as the per-image loop did, so from the same
+	  initial partition it converges to the same one, barring ties within rounding.  A given seed doesn't
+	  give the partitions of the old code though: a numpy RandomState (for the annealing selections and
+	  'SSE' orders) is seeded from module random before the first initial partition is drawn.
+	  Returns Cls, assign and Je as the k-means functions (Cls and assign on main_node only if part
+	  is given), or None if all trials ended with an empty cluster.
+	"""
+	import numpy as np
+	from random    import randint
+	from utilities import print_msg, model_blank, get_image_data, running_time, reduce_array_to_root
+	import time
+
+	t_start = time.time()
+	if part == None:  myid, main_node, N_start, N_stop, N = 0, 0, 0, len(im_M), len(im_M)
+	else:             myid, main_node, N_start, N_stop, N = part
+	nx  = im_M[0].get_xsize()
+	ny  = im_M[0].get_ysize()
+	nz  = im_M[0].get_zsize()
+	rng = np.random.RandomState(randint(0, 2**31-2))
+	if batch <= 0: batch = min(256, max(1, N//(4*K)))
+	if trials < 1: trials = 1
+
+	X, handle = k_means_stack(im_M, shared)
+	try:
+		x2 = np.einsum('ij,ij->i', X, X, dtype = np.float64)
+
+		best      = None
+		ntrials   = 0
+		wd_trials = 0
+		while ntrials < trials:
+			ntrials += 1
+			if verbose: print_msg('\n__ Trials: %2d _________________________________%s\n'%(ntrials, time.strftime('%a_%d_%b_%Y_%H_%M_%S', time.localtime())))
+			res = k_means_vec_trial(X, x2, K, maxit, method, F, T0, rnd_method, rng, batch, verbose, DEBUG, part)
+			if res != None:
+				if trials > 1 and verbose: print_msg('# Criterion: %11.6e \n' % res[-1])
+				if best == None or res[-1] < best[-1]: best = res
+				wd_trials = 0
+			else:
+				wd_trials += 1
+				if wd_trials > 10:
+					if trials == 1:
+						if verbose: print_msg('>>> WARNING: After ran 10 times with different partitions, one cluster is still empty, STOP k-means.\n\n')
+						return None
+					if verbose:
+						if ntrials == trials: print_msg('>>> WARNING: After ran 10 times with different partitions, one cluster is still empty. \n\n')
+						else:	              print_msg('>>> WARNING: After ran 10 times with different partitions, one cluster is still empty, start the next trial.\n\n')
+					wd_trials = 0
+				else:
+					ntrials -= 1
+		if best == None:
+			if verbose: print_msg('>>> WARNING: All trials resulted in empty clusters, STOP k-means.\n\n')
+			return None
+
+		assign, n, S, Q, Je = best
+		Sq = k_means_sums(X, assign, K, squares = True)
+	finally:
+		del X
+		k_means_free_stack(handle)
+
+	norm = nx*ny*nz
+	Ji   = np.maximum(Q - (S*S).sum(axis = 1)/n, 0.0)/norm/norm
+	# k_means_cla always accumulated the final Ji on top of those of its last iteration
+	if method == 'cla': Ji *= 2
+
+	if part != None:
+		full = np.zeros(N, np.int32)
+		full[N_start:N_stop] = assign
+		reduce_array_to_root(full, myid, main_node)
+		reduce_array_to_root(Sq, myid, main_node)
+		assign = full
+		if myid != main_node: return None, None, Je
+
+	# ave = S im / n, var = 1/n S(im-ave)**2 = 1/n (S im**2 - n ave**2)
+	ave = S/n[:, None]
+	var = Sq/n[:, None] - ave*ave
+	Cls = {}
+	Cls['n']   = list(map(int, n))
+	Cls['ave'] = [0]*K
+	Cls['var'] = [0]*K
+	Cls['Ji']  = list(map(float, Ji))
+	Cls['k']   = K
+	Cls['N']   = N
+	for k in range(K):
+		for key, val in [['ave', ave[k]], ['var', var[k]]]:
+			img = model_blank(nx, ny, nz)
+			get_image_data(img).flat[:] = val
+			img.update()
+			# Uncompress ave and var images if the mask is used
+			if mask != None: img = Util.reconstitute_image_mask(img, mask)
+			Cls[key][k] = img
+
+	if verbose:
+		running_time(t_start)
+		print_msg('Criterion = %11.6e \n' % Je)
+		for k in range(K):	print_msg('Cls[%i]: %i\n'%(k, Cls['n'][k]))
+	if DEBUG: print(Cls['n'])
+
+	return Cls, list(map(int, assign)), Je
+
 # K-means with classical method
 def k_means_cla(im_M, mask, K, rand_seed, maxit, trials, CTF, F=0, T0=0, DEBUG=False, rnd_method = 'rnd'):
 	from utilities 		import model_blank, get_im, running_time
@@ -2741,6 +3102,12 @@ def k_means_cla(im_M, mask, K, rand_seed, maxit, trials, CTF, F=0, T0=0, DEBUG=F
 	# Variables			
 	if rand_seed > 0:  seed(rand_seed)
 	else:              seed()
+
+	if not CTF:
+		res = k_means_vec(im_M, mask, K, maxit, trials, 'cla', F, T0, rnd_method, DEBUG)
+		if res == None: sys.exit()
+		return res[0], res[1]
+
 	Cls        = {}
 	Cls['n']   = [0]*K   # number of objects in a given cluster
 	Cls['ave'] = [0]*K   # value of cluster average
@@ -3094,6 +3461,12 @@ def k_means_SSE(im_M, mask, K, rand_seed, maxit, trials, CTF, F=0, T0=0, DEBUG=F
 	# Variables
 	if(rand_seed > 0):  seed(rand_seed)
 	else:               seed()
+
+	if not CTF:
+		res = k_means_vec(im_M, mask, K, maxit, trials, 'SSE', F, T0, rnd_method, DEBUG)
+		if res == None: sys.exit()
+		return res[0], res[1]
+
 	Cls = {}
 	Cls['n']   = [0]*K     # number of objects in a given cluster
 	Cls['ave'] = [0]*K     # value of cluster average
@@ -3748,6 +4121,13 @@ def k_means_SSE_MPI(im_M, mask, K, rand_seed, maxit, trials, CTF, F=0, T0=0, DEB
 	if jumping ==1:
 		from random import jumpahead
 		if(myid != main_node):  jumpahead(17*myid+123)
+
+	if not CTF:
+		# one copy of the images per node for all the processes
+		res = k_means_vec(im_M, mask, K, maxit, trials, 'SSE', F, T0, rnd_method, DEBUG, verbose = False, shared = True)
+		if res == None: return 0.0, 0.0, -1e30
+		return res
+
 	Cls = {}
 	Cls['n']   = [0]*K     # number of objects in a given cluster
 	Cls['ave'] = [0]*K     # value of cluster average
@@ -4198,6 +4578,12 @@ def k_means_cla_MPI(IM, mask, K, rand_seed, maxit, trials, CTF, F, T0, myid, mai
 	if rand_seed > 0: seed(rand_seed)
 	else:             seed()
 	if(myid != main_node):  jumpahead(17*myid+123)
+
+	if not CTF:
+		res = k_means_vec(IM, mask, K, maxit, trials, 'cla', F, T0, verbose = (myid == main_node), part = (myid, main_node, N_start, N_stop, N))
+		if res == None: sys.exit()
+		return res[0], res[1]
+
 	Cls={}
 	Cls['n']   = [0]*K   # number of objects in a given cluster
 	Cls['ave'] = [0]*K   # value of cluster average
@@ -7495,6 +7881,183 @@ def py_cluster_genmatrix(list, combinfunc, symmetric=False, diagonal=None):
       row_index += 1
    return matrix
 
+#  Condensed distance matrices larger than this (in bytes) are kept in a memory-mapped temporary file
+PY_CLUSTER_MEMMAP_BYTES = 1<<30
+
+def py_cluster_condensed_index(N, i, j):
+   """
+   Position of the distance between items i < j (integers or arrays) in a
+   condensed distance matrix of N items, which holds the upper triangle of
+   the distance matrix row by row.
+   """
+   return N*i - i*(i+1)//2 + j - i - 1
+
+def py_cluster_condensed_empty(N, dirname = None):
+   """
+   Returns an uninitialized condensed distance matrix of N items (float64),
+   memory-mapped to a temporary file (in dirname) if it is larger than
+   PY_CLUSTER_MEMMAP_BYTES.
+   """
+   import numpy as np
+   size = N*(N-1)//2
+   if size*8 > PY_CLUSTER_MEMMAP_BYTES:
+      from tempfile import TemporaryFile
+      return np.memmap(TemporaryFile(dir = dirname), dtype = np.float64, mode = 'w+', shape = (size,))
+   return np.empty(size)
+
+def py_cluster_condensed(data, distance_function):
+   """
+   Condensed distance matrix of the items of data, calling distance_function
+   once for each pair.
+   """
+   N = len(data)
+   D = py_cluster_condensed_empty(N)
+   pos = 0
+   for i in range(N):
+      for j in range(i+1, N):
+         D[pos] = distance_function(data[i], data[j])
+         pos += 1
+   return D
+
+def py_cluster_pdist(X, metric = 'SqEuclidean', mask = None):
+   """
+   Condensed distance matrix between the rows of the 2D array X (one image
+   per row), computed with matrix products on blocks of rows.
+
+   PARAMETERS
+      metric - 'SqEuclidean' mean squared difference, as EMData.cmp("SqEuclidean")
+               'ccc' cross-correlation coefficient, as statistics.ccc
+      mask   - optional 1D array, only the pixels where mask > 0.5 are used
+   """
+   import numpy as np
+   if mask is not None: X = X[:, np.asarray(mask).reshape(-1) > 0.5]
+   X = np.asarray(X, np.float64)
+   N, n = X.shape
+   if metric == 'ccc':
+      avg = X.mean(axis = 1)
+      var = (X*X).mean(axis = 1) - avg*avg
+      bad = ~(var > 0.0)
+      X   = (X - avg[:, None])/np.sqrt(np.where(bad, 1.0, var))[:, None]
+   elif metric == 'SqEuclidean':
+      x2  = (X*X).sum(axis = 1)
+   else:
+      raise ValueError('metric must be SqEuclidean or ccc')
+
+   D = py_cluster_condensed_empty(N)
+   rows = max(1, (1<<24)//max(N, 1))
+   for i0 in range(0, N-1, rows):
+      i1 = min(i0 + rows, N-1)
+      G  = np.dot(X[i0:i1], X[i0:].T)
+      for i in range(i0, i1):
+         g = G[i-i0, i-i0+1:]
+         if metric == 'ccc':
+            g = g/n
+            g[bad[i+1:] | bad[i]] = -2.0
+         else:
+            g = np.maximum(x2[i] + x2[i+1:] - 2.0*g, 0.0)/n
+         pos = py_cluster_condensed_index(N, i, i+1)
+         # cmp() returns single precision values
+         D[pos:pos+N-i-1] = g.astype(np.float32)
+   return D
+
+def py_cluster_linkage(D, N, method = 'single'):
+   """
+   Agglomerative clustering on the condensed distance matrix D of N items.
+   At each step the two clusters at the smallest distance are merged, taking
+   the first pair in the order used by py_cluster_HierarchicalClustering if
+   several are at the same distance, so the same tree is obtained. The
+   nearest following neighbour of each cluster is cached, a merge only
+   rescans the clusters whose neighbour was merged, O(N**2) in general.
+
+   PARAMETERS
+      D      - condensed distance matrix (py_cluster_condensed), used as
+               work space, its content is destroyed
+      method - 'single', 'complete', 'average' or 'uclus' (median)
+
+   For 'average' D holds the sums of the distances between the members of
+   the clusters, divided by the numbers of pairs when compared.
+
+   Returns the list of merges (i, j, level), i and j being the ids of the
+   merged clusters, the items having ids 0 to N-1 and the cluster created by
+   merge n the id N+n.
+   """
+   import numpy as np
+
+   if method not in ['single', 'complete', 'average', 'uclus']:
+      raise ValueError('distance method must be one of single, complete, average of uclus')
+   if method == 'uclus':
+      R = D.copy()
+      members = [np.array([k]) for k in range(N)]
+   slots  = np.arange(N)
+   active = np.ones(N, bool)
+   sid    = np.arange(N)        # cluster id in each slot, also the order of the clusters
+   size   = np.ones(N)
+   nnd    = np.empty(N)
+   nnj    = np.empty(N, np.int64)
+
+   def row(k):
+      # positions in D of the distances between slot k and all the slots
+      ind = np.where(slots < k, py_cluster_condensed_index(N, slots, k), py_cluster_condensed_index(N, k, slots))
+      ind[k] = 0
+      return ind
+
+   def scan(k):
+      # nearest neighbour of slot k among the clusters which follow it
+      cand = np.nonzero(active & (sid > sid[k]))[0]
+      if len(cand) == 0:
+         nnd[k], nnj[k] = np.inf, -1
+         return
+      vals = D[row(k)[cand]]
+      if method == 'average': vals = vals/(size[k]*size[cand])
+      best = cand[vals == vals.min()]
+      nnj[k] = best[np.argmin(sid[best])]
+      nnd[k] = vals.min()
+
+   for k in range(N-1):
+      pos = py_cluster_condensed_index(N, k, k+1)
+      j   = int(np.argmin(D[pos:pos+N-k-1]))
+      nnd[k], nnj[k] = D[pos+j], k+1+j
+   nnd[N-1], nnj[N-1] = np.inf, -1
+
+   merges = []
+   for n in range(N-1):
+      act  = np.nonzero(active)[0]
+      m    = nnd[act].min()
+      cand = act[nnd[act] == m]
+      a    = cand[np.argmin(sid[cand])]
+      b    = nnj[a]
+      merges.append((int(sid[a]), int(sid[b]), float(nnd[a])))
+
+      # distances of the new cluster, kept in slot a
+      others = act[(act != a) & (act != b)]
+      ia = row(a)[others]
+      if   method == 'single':   new = np.minimum(D[ia], D[row(b)[others]])
+      elif method == 'complete': new = np.maximum(D[ia], D[row(b)[others]])
+      elif method == 'average':  new = D[ia] + D[row(b)[others]]
+      else:
+         members[a] = np.concatenate((members[a], members[b]))
+         new = np.empty(len(others))
+         for o in range(len(others)):
+            x = members[a][:, None]
+            y = members[others[o]][None, :]
+            new[o] = np.median(R[py_cluster_condensed_index(N, np.minimum(x, y), np.maximum(x, y))])
+      D[ia] = new
+      active[b] = False
+      sid[a]    = N + n
+      size[a]  += size[b]
+      nnd[a], nnj[a] = np.inf, -1
+      nnd[b], nnj[b] = np.inf, -1
+      if method == 'average': new = new/(size[a]*size[others])
+
+      # the new cluster comes after all the others
+      stale  = others[(nnj[others] == a) | (nnj[others] == b)]
+      closer = new < nnd[others]
+      nnd[others[closer]] = new[closer]
+      nnj[others[closer]] = a
+      for k in stale: scan(k)
+
+   return merges
+
 class py_Cluster(object):
    """
    A collection of items. This is internally used to detect clustered items in
@@ -7740,16 +8303,22 @@ class py_cluster_HierarchicalClustering(py_cluster_BaseClusterMethod):
 
    """
 
-   def __init__(self, data, distance_function, linkage='single'):
+   def __init__(self, data, distance_function, linkage='single', distances=None):
       """
       Constructor
 
+      PARAMETERS
+         distances - optional condensed distance matrix of data (see
+                     py_cluster_condensed, py_cluster_pdist), otherwise it is
+                     computed with distance_function. It is used as work space.
+
       See BaseClusterMethod.__init__ for more details.
       """
       py_cluster_BaseClusterMethod.__init__(self, data, distance_function)
 
       # set the linkage type to single
       self.setLinkageMethod(linkage)
+      self.distances = distances
       self.__clusterCreated = False
 
    def setLinkageMethod(self, method):
@@ -7760,6 +8329,7 @@ class py_cluster_HierarchicalClustering(py_cluster_BaseClusterMethod):
          method - The name of the method to use. It must be one of 'single',
                   'complete', 'average' or 'uclus'
       """
+      self.method = method
       if method == 'single':
          self.linkage = self.singleLinkageDistance
       elif method == 'complete':
@@ -7878,53 +8448,18 @@ class py_cluster_HierarchicalClustering(py_cluster_BaseClusterMethod):
       Perform hierarchical clustering. This method is automatically called by
       the constructor so you should not need to call it explicitly.
 
-      PARAMETERS
-         matrix   -  The 2D list that is currently under processing. The matrix
-                     contains the distances of each item with each other
-         level    -  The current level of clustering
-         sequence -  The sequence number of the clustering
+      The distances between the items are computed once (unless given to the
+      constructor), the merges are done by py_cluster_linkage. The
+      parameters are not used anymore.
       """
 
-      if matrix is None:
-         # create level 0, first iteration (sequence)
-         level    = 0
-         sequence = 0
-         matrix   = []
-
-      # if the matrix only has two rows left, we are done
-      while len(matrix) > 2 or matrix == []:
-
-         matrix = py_cluster_genmatrix(self._data, self.linkage, True, 0)
-
-         smallestpair = None
-         mindistance  = None
-         rowindex = 0   # keep track of where we are in the matrix
-         # find the minimum distance
-         for row in matrix:
-            cellindex = 0 # keep track of where we are in the matrix
-            for cell in row:
-               # if we are not on the diagonal (which is always 0)
-               # and if this cell represents a new minimum...
-               if (rowindex != cellindex) and ( cell < mindistance or smallestpair is None ):
-                  smallestpair = ( rowindex, cellindex )
-                  mindistance  = cell
-               cellindex += 1
-            rowindex += 1
-
-         sequence += 1
-         level     = matrix[smallestpair[1]][smallestpair[0]]
-         cluster   = py_Cluster(level, self._data[smallestpair[0]], self._data[smallestpair[1]])
-
-         # maintain the data, by combining the the two most similar items in the list
-         # we use the min and max functions to ensure the integrity of the data.
-         # imagine: if we first remove the item with the smaller index, all the
-         # rest of the items shift down by one. So the next index will be
-         # wrong. We could simply adjust the value of the second "remove" call,
-         # but we don't know the order in which they come. The max and min
-         # approach clarifies that
-         self._data.remove(self._data[max(smallestpair[0], smallestpair[1])]) # remove item 1
-         self._data.remove(self._data[min(smallestpair[0], smallestpair[1])]) # remove item 2
-         self._data.append(cluster)               # append item 1 and 2 combined
+      if self.distances is None: self.distances = py_cluster_condensed(self._data, self.distance)
+
+      nodes = list(self._data)
+      for i, j, level in py_cluster_linkage(self.distances, len(nodes), self.method):
+         nodes.append(py_Cluster(level, nodes[i], nodes[j]))
+      self.distances = None
+      self._data     = [nodes[-1]]
 
       # all the data is in one single cluster. We return that and stop
       self.__clusterCreated = True
@@ -9559,8 +10094,16 @@ def cluster_equalsize(d, m):
 	return  groupping,cent,disp
 
 
+#  Size of the blocks of images read at once by the randomized SVD of pcanalyzer
+PCA_BLOCK_BYTES = 1<<26
+
 class pcanalyzer(object):
-	def __init__(self, mask, nvec=3, incore=False, MPI=False, scratch=None):
+	def __init__(self, mask, nvec=3, incore=False, MPI=False, scratch=None, rsvd=False, npower=2, oversample=10):
+		"""
+		  rsvd        - use a block randomized SVD instead of Lanczos, npower+1 passes over the data
+		  npower      - number of power iterations of the randomized SVD
+		  oversample  - number of additional vectors of the randomized SVD
+		"""
 		import os
 		self.mask = mask.copy()
 		if MPI:
@@ -9587,6 +10130,9 @@ class pcanalyzer(object):
 		self.myBuff = []
 		self.myBuffPos = 0
 		self.incore = incore
+		self.rsvd   = rsvd
+		self.npower = npower
+		self.oversample = oversample
 
 	def writedat( self, data ):
 		import array
@@ -9722,6 +10268,7 @@ class pcanalyzer(object):
 	def analyze( self ):
 		#if self.myid==0:
 		#	print "analyze: ", self.ncov, " nvec: ", self.nvec
+		if self.rsvd:  return self.analyze_rsvd()
 		from time import time
 		from numpy import zeros, float32, int32, int64
 		ncov = self.ncov
@@ -9761,6 +10308,72 @@ class pcanalyzer(object):
 
 			return eigimgs
 
+	def blocks( self ):
+		#  The images (average subtracted) in float32 arrays of about PCA_BLOCK_BYTES, one image per row.
+		#  The disk buffer is a single float32 matrix, memory-mapped.
+		import numpy as np
+		nimg = int(self.nimg)
+		rows = max(1, PCA_BLOCK_BYTES//(4*self.ncov))
+		if not self.incore:
+			self.close_dat()
+			if nimg > 0:  data = np.memmap( self.file, dtype = np.float32, mode = 'r', shape = (nimg, self.ncov) )
+		for i in range(0, nimg, rows):
+			if self.incore:  blk = np.array( self.myBuff[i:i+rows], np.float32 )
+			else:            blk = np.array( data[i:i+rows] )
+			if not(self.avgdat is None):  blk -= self.avgdat
+			yield blk
+
+	def analyze_rsvd( self ):
+		"""
+		  Same as analyze, using a block randomized SVD: subspace iterations on nvec+oversample
+		  random vectors followed by Rayleigh-Ritz, npower+1 passes over the data in total.
+		  With MPI the images are distributed over the processes, returns the eigenimages on the main node.
+		"""
+		import numpy as np
+		from utilities import model_blank, get_image_data, reduce_array_to_root, bcast_array_to_all
+
+		ncov = self.ncov
+		l = min(self.nvec + self.oversample, ncov)
+		#  the same starting vectors on all processes
+		Q = np.linalg.qr( np.random.RandomState(12345).standard_normal( (ncov, l) ) )[0]
+		for it in range(self.npower + 1):
+			Y = np.zeros( (ncov, l) )
+			T = np.zeros( (l, l) )
+			Qf = Q.astype(np.float32)
+			for blk in self.blocks():
+				Z  = np.dot( blk, Qf )
+				Y += np.dot( blk.T, Z )
+				T += np.dot( Z.T, Z )
+			if self.MPI:
+				for a in [Y, T]:
+					reduce_array_to_root( a, self.myid, 0 )
+					bcast_array_to_all( a, 0 )
+			#  T = Q' C Q, C being the covariance matrix, and C Q spans the next subspace
+			if it < self.npower:  Q = np.linalg.qr( Y )[0]
+
+		if self.MPI and self.myid != 0:  return None
+		eigval, W = np.linalg.eigh( T )
+		order = np.argsort( eigval )[::-1][:self.nvec]
+		V = np.dot( Q, W[:, order] )
+
+		eigimgs = []
+		for j in range(self.nvec):
+			tmpimg = model_blank(ncov, 1, 1)
+			get_image_data( tmpimg )[:] = V[:, j]
+			tmpimg.update()
+			eigimg = Util.reconstitute_image_mask(tmpimg, self.mask)
+			eigimg.set_attr( "eigval", float(eigval[order[j]])/(self.nimg - 1) )
+			eigimgs.append( eigimg )
+		return eigimgs
+
+	def project( self, eigimgs ):
+		#  Projections of the images (of this process with MPI) on eigimgs, one row per image
+		import numpy as np
+		from utilities import get_image_data
+		V = np.array( [get_image_data( Util.compress_image_mask(eig, self.mask) ).reshape(-1) for eig in eigimgs], np.float32 ).T
+		prj = [np.dot( blk, V ) for blk in self.blocks()]
+		if len(prj) == 0:  return np.zeros( (0, len(eigimgs)), np.float32 )
+		return np.concatenate( prj )
 
 	def lanczos( self, kstep, diag, subdiag, V ):
 		from numpy import zeros, float32, array
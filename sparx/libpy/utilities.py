@@ -1782,7 +1782,215 @@ def chooseformat(t):
     else: ouo = "e"
     return ouo
 
-def read_text_row(fnam, format="", skip=";"):
+def _text_value(word):
+	"""Convert a token the way the text readers always have: int, else float, else the string itself."""
+	try:  return int(word)
+	except:
+		try:  	return float(word)
+		except:	return word
+
+def _text_field(tpt):
+	"""Format a single value of a text parameter file."""
+	qtp = type(tpt)
+	if qtp == int:		return "  %12d"%tpt
+	elif qtp == float:
+		frmt = chooseformat(tpt)
+		if( frmt == "f" ):	return "  %12.5f"%tpt
+		else:				return "  %12.5e"%tpt
+	else:					return "  %s"%tpt
+
+def _text_floats(vals):
+	"""
+		Format a list of floats exactly as _text_field, but with the chooseformat comparisons done in NumPy.
+	"""
+	import numpy as np
+	ff  = ["  %12.5f"%t for t in vals]
+	t   = np.array(vals, dtype=np.float64)
+	#  For 0.1 <= |t| < 1e5 the %12.5f string fits, and the %12.4e grid is coarser than and contained in the
+	#  %12.5f grid, so unless t is close to the midpoint of two %12.5f values, "f" is at least as accurate.
+	with np.errstate(invalid="ignore"):
+		at    = np.abs(t)
+		check = np.flatnonzero(~((at >= 0.1) & (at < 99999.0) & (np.abs(t - np.round(t, 5)) < 4.98e-6)))
+	for i in check:
+		if chooseformat(vals[i]) == "e":  ff[i] = "  %12.5e"%vals[i]
+	return ff
+
+def _text_column_fields(col):
+	"""Format a column (NumPy array or list) of a text parameter file, one string per row."""
+	import numpy as np
+	if isinstance(col, np.ndarray):
+		if   col.dtype.kind in "iu":  return ["  %12d"%t for t in col.tolist()]
+		elif col.dtype.kind == "f":   return _text_floats(col.tolist())
+		else:                         return ["  %s"%t for t in col.tolist()]
+	types = set(map(type, col))
+	if   types == set([int]):    return ["  %12d"%t for t in col]
+	elif types == set([float]):  return _text_floats(col)
+	else:                        return [_text_field(t) for t in col]
+
+def _write_text_columns(columns, file_name):
+	nrow = len(columns[0]) if len(columns) > 0 else 0
+	fields = [_text_column_fields(col) for col in columns]
+	outf = open(file_name, "w")
+	if nrow > 0:
+		outf.write("\n".join(["".join(line) for line in zip(*fields)]))
+		outf.write("\n")
+	outf.close()
+
+def _text_cache_name(fnam):
+	import os
+	return os.path.join(os.path.dirname(fnam), "." + os.path.basename(fnam) + ".cols.npz")
+
+def _text_cache_key(fnam, skip):
+	import os
+	st = os.stat(fnam)
+	return [repr(st.st_mtime), str(st.st_size), skip or ""]
+
+def _write_text_cache(fnam, skip, columns, masks):
+	"""Store the parsed columns of fnam in a binary sidecar, valid while fnam is unmodified. Failures are ignored."""
+	import os
+	import numpy as np
+	#  object columns would have to be pickled, these are rare enough to just be parsed every time
+	if any(col.dtype == object for col in columns):  return
+	cname = _text_cache_name(fnam)
+	tmp   = cname + ".%d"%os.getpid()
+	try:
+		arrays = {"key":np.array(_text_cache_key(fnam, skip)), "ncol":np.array(len(columns))}
+		for i in range(len(columns)):
+			arrays["c%d"%i] = columns[i]
+			if masks[i] is not None:  arrays["m%d"%i] = masks[i]
+		outf = open(tmp, "wb")
+		np.savez(outf, **arrays)
+		outf.close()
+		os.rename(tmp, cname)
+	except:
+		try:	os.remove(tmp)
+		except:	pass
+
+def _read_text_cache(fnam, skip):
+	"""Return (columns, masks) from the sidecar of fnam if it is current, otherwise None."""
+	import os
+	import numpy as np
+	cname = _text_cache_name(fnam)
+	if not os.path.exists(cname):  return None
+	try:
+		npz = np.load(cname)
+		if npz["key"].tolist() != _text_cache_key(fnam, skip):  return None
+		ncol    = int(npz["ncol"])
+		columns = [npz["c%d"%i] for i in range(ncol)]
+		masks   = [npz["m%d"%i] if "m%d"%i in npz.files else None for i in range(ncol)]
+		npz.close()
+		return columns, masks
+	except:
+		return None
+
+def _text_rectangular(text, nrow, ncol):
+	"""Check that each of the nrow lines of text has ncol whitespace separated words, without splitting every line."""
+	import numpy as np
+	if not isinstance(text, bytes):  text = text.encode("utf-8")
+	b     = np.frombuffer(text, dtype=np.uint8)
+	white = np.zeros(256, dtype=bool)
+	white[[9, 10, 11, 12, 13, 28, 29, 30, 31, 32]] = True
+	space = white[b]
+	start = ~space
+	start[1:] &= space[:-1]
+	ends  = np.flatnonzero(b == 10)
+	if ends.size != nrow - 1:  return False
+	count = np.diff(np.searchsorted(np.flatnonzero(start), np.concatenate(([0], ends, [b.size]))))
+	return (count == ncol).all()
+
+def _parse_text_columns(fnam, skip):
+	"""
+		Parse a text file into typed columns. Returns (columns, masks), masks[i] being None, or for a float column
+		the entries which were written as integers. Raises ValueError if the rows are not all of the same length.
+	"""
+	import numpy as np
+	inf   = open(fnam, "r")
+	lines = inf.read().split("\n")
+	inf.close()
+	if lines[-1] == "":  del lines[-1]
+	if skip:  lines = [line for line in lines if skip not in line]
+	nrow = len(lines)
+	if nrow == 0:  return [], []
+	text  = "\n".join(lines)
+	words = text.split()
+	ncol  = len(lines[0].split())
+	if ncol == 0 or len(words) != nrow*ncol or not _text_rectangular(text, nrow, ncol):
+		raise ValueError("%s: rows have different numbers of entries"%fnam)
+
+	columns = []
+	masks   = []
+	for i in range(ncol):
+		word = words[i::ncol]
+		mask = None
+		try:
+			col = np.array(list(map(int, word)), dtype=np.int64)
+		except OverflowError:
+			col = None
+		except ValueError:
+			try:
+				col = np.array(list(map(float, word)), dtype=np.float64)
+			except ValueError:
+				col = np.array(word)
+			else:
+				#  remember which entries were integers, only integral values need to be checked
+				for j in np.flatnonzero(col == np.floor(col)):
+					try:     v = int(word[j])
+					except ValueError:  continue
+					if v != int(col[j]):
+						col = None
+						break
+					if mask is None:  mask = np.zeros(nrow, dtype=bool)
+					mask[j] = True
+		if col is None:
+			#  integers which int64 or float64 can't hold exactly are kept as Python objects
+			col  = np.array([_text_value(w) for w in word], dtype=object)
+			mask = None
+		columns.append(col)
+		masks.append(mask)
+	return columns, masks
+
+def _text_columns(fnam, skip, cache):
+	if cache:
+		ret = _read_text_cache(fnam, skip)
+		if ret is not None:  return ret
+	columns, masks = _parse_text_columns(fnam, skip)
+	if cache:  _write_text_cache(fnam, skip, columns, masks)
+	return columns, masks
+
+def _column_values(col, mask):
+	"""Column as a list with the element types read_text_row has always returned."""
+	import numpy as np
+	if col.dtype.kind in "SU":  return [_text_value(word) for word in col.tolist()]
+	vals = col.tolist()
+	if mask is not None:
+		for i in np.flatnonzero(mask):  vals[i] = int(vals[i])
+	return vals
+
+def read_text_columns(fnam, skip=";", cache=False):
+	"""
+		Read a column-listed txt file into NumPy arrays.
+		INPUT:
+			fnam:  name of the text file
+			skip:  lines containing this character are comments (None to keep all lines)
+			cache: keep a binary copy of the columns next to the file (.<fnam>.cols.npz), which is used
+			       instead of parsing the file as long as the file is not modified
+		OUTPUT:
+			list of columns, int64 if all entries of a column are integers, float64 if all are numbers,
+			otherwise strings. Columns with integers too large for int64/float64 are object arrays of the exact
+			values. ValueError is raised if the rows are not all of the same length.
+	"""
+	return _text_columns(fnam, skip, cache)[0]
+
+def write_text_columns(columns, file_name, cache=False):
+	"""
+	   Write a list of columns (NumPy arrays or lists of equal length) to an ASCII file, in the same format
+	   as write_text_row. If cache is set, the binary copy used by read_text_columns(cache=True) is also written.
+	"""
+	_write_text_columns(columns, file_name)
+	#  the cache has to match what is read back from the text, which is rounded
+	if cache:  _write_text_cache(file_name, ";", *_parse_text_columns(file_name, ";"))
+
+def read_text_row(fnam, format="", skip=";", cache=False):
 	"""
 	 	Read a column-listed txt file.
 		INPUT: filename: name of the Doc file
@@ -1790,9 +1998,16 @@ def read_text_row(fnam, format="", skip=";"):
 	    	nc : number of entries in each lines (number of columns)
 	    	len(data)/nc : number of lines (rows)
 	    	data: List of numbers from the doc file
+		Files with the same number of entries in each line are read by read_text_columns (see cache there).
  	"""
 	from string import split
 
+	if format != "s":
+		try:
+			columns, masks = _text_columns(fnam, skip, cache)
+			return [list(row) for row in zip(*[_column_values(col, mask) for col, mask in zip(columns, masks)])]
+		except ValueError:  pass
+
 	inf  = open(fnam, "r")
 	strg = inf.readline()
 	x    = []
@@ -1816,10 +2031,7 @@ def read_text_row(fnam, format="", skip=";"):
 						word.append(strg[k_start : k_stop])
 			line=[]
 			for i in range(len(word)):
-				try:  line.append(int(word[i]))
-				except:
-					try:  	line.append(float(word[i]))
-					except:	line.append(word[i])
+				line.append(_text_value(word[i]))
 			data.append(line)
 		strg=inf.readline()
 	inf.close
@@ -1835,34 +2047,20 @@ def write_text_row(data, file_name):
 	         First list will be written as a first line, second as a second, and so on...
 		 If only one list is given, the file will contain one line
 	"""
-	import types
-	outf = open(file_name, "w")
 	if (type(data[0]) == list):
 		# It is a list of lists
+		if len(data[0]) > 0 and len(set(map(len, data))) == 1:
+			_write_text_columns([list(col) for col in zip(*data)], file_name)
+			return
+		outf = open(file_name, "w")
 		for i in range(len(data)):
 			for j in range(len(data[i])):
-				tpt = data[i][j]
-				qtp = type(tpt)
-				if qtp == int:		outf.write("  %12d"%tpt)
-				elif qtp == float:
-					frmt = chooseformat(tpt)
-					if( frmt == "f" ):			outf.write("  %12.5f"%tpt)
-					else:						outf.write("  %12.5e"%tpt)
-				else:                   		outf.write("  %s"%tpt)
+				outf.write(_text_field(data[i][j]))
 			outf.write("\n")
+		outf.close()
 	else:
 		# Single list
-		for j in range(len(data)):
-			tpt = data[j]
-			qtp = type(tpt)
-			if qtp == int :			outf.write("  %12d\n"%tpt)
-			elif qtp == float:
-				frmt = chooseformat(tpt)
-				if( frmt == "f" ):				outf.write("  %12.5f\n"%tpt)
-				else:							outf.write("  %12.5e\n"%tpt)
-			else:								outf.write("  %s\n"%tpt)
-	outf.flush()
-	outf.close()
+		_write_text_columns([data], file_name)
 
 
 def read_text_file(file_name, ncol = 0):
@@ -1872,6 +2070,13 @@ def read_text_file(file_name, ncol = 0):
 	"""
 
 	from string import split
+	try:
+		columns, masks = _parse_text_columns(file_name, None)
+		if ncol == -1:  return [_column_values(col, mask) for col, mask in zip(columns, masks)]
+		if len(columns) > 0:  return _column_values(columns[ncol], masks[ncol])
+		return []
+	except ValueError:  pass
+
 	inf = open(file_name, "r")
 	line = inf.readline()
 	data = []
@@ -1880,22 +2085,13 @@ def read_text_file(file_name, ncol = 0):
 			vdata = split(line)
 			if data == []:
 				for i in range(len(vdata)):
-					try:     data.append([int(vdata[i])])
-					except:
-						try:  	 data.append([float(vdata[i])])
-						except:  data.append([vdata[i]])
+					data.append([_text_value(vdata[i])])
 			else:
 				for i in range(len(vdata)):
-					try:  data[i].append(int(vdata[i]))
-					except:
-						try:  data[i].append(float(vdata[i]))
-						except:  data[i].append(vdata[i])
+					data[i].append(_text_value(vdata[i]))
 		else:
 			vdata = split(line)[ncol]
-			try:     data.append(int(vdata))
-			except:
-				try:  	data.append(float(vdata))
-				except:  data.append(vdata)
+			data.append(_text_value(vdata))
 		line = inf.readline()
 	return data
 
@@ -1914,33 +2110,20 @@ def write_text_file(data, file_name):
 		outf.close()
 		return
 
-	import types
-	outf = open(file_name, "w")
 	if (type(data[0]) == list):
 		# It is a list of lists
+		if len(set(map(len, data))) == 1:
+			_write_text_columns(data, file_name)
+			return
+		outf = open(file_name, "w")
 		for i in range(len(data[0])):
 			for j in range(len(data)):
-				tpt = data[j][i]
-				qtp = type(tpt)
-				if qtp == int:			outf.write("  %12d"%tpt)
-				elif qtp == float:
-					frmt = chooseformat(tpt)
-					if( frmt == "f" ):				outf.write("  %12.5f"%tpt)
-					else:							outf.write("  %12.5e"%tpt)
-				else:                   			outf.write("  %s"%tpt)
+				outf.write(_text_field(data[j][i]))
 			outf.write("\n")
+		outf.close()
 	else:
 		# Single list
-		for j in range(len(data)):
-			tpt = data[j]
-			qtp = type(tpt)
-			if qtp == int :			outf.write("  %12d\n"%tpt)
-			elif qtp == float:
-				frmt = chooseformat(tpt)
-				if( frmt == "f" ):				outf.write("  %12.5f\n"%tpt)
-				else:							outf.write("  %12.5e\n"%tpt)
-			else:                   			outf.write("  %s\n"%tpt)
-	outf.close()
+		_write_text_columns([data], file_name)
 
 def reconstitute_mask(image_mask_applied_file, new_mask_file, save_file_on_disk = True, saved_file_name = "image_in_reconstituted_mask.hdf"):
 	import types
@@ -2246,27 +2429,53 @@ def reduce_array_to_root(data, myid, main_node = 0, comm = -1):
         		array1d[block_begin:block_end] = tmpsum[0:block_size]
 '''
 
-def reduce_EMData_to_root(data, myid, main_node = 0, comm = -1):
-	from numpy import shape, reshape
-	from mpi   import mpi_reduce, MPI_FLOAT, MPI_SUM, MPI_COMM_WORLD, mpi_barrier
+#  Largest number of elements sent in a single MPI message by the array/EMData broadcast and reduce functions.
+#  Keeps counts well below the 2**31 limit of MPI and bounds the temporary buffers to 64MB (float32).
+MPI_CHUNK_SIZE = 1<<24
 
-	if comm == -1 or comm == None:  comm = MPI_COMM_WORLD
+def mpi_type_of(array):
+	from mpi import MPI_FLOAT, MPI_INT, MPI_DOUBLE
+	if   array.dtype.char == "f":  return MPI_FLOAT
+	elif array.dtype.char == "i":  return MPI_INT
+	elif array.dtype.char == "d":  return MPI_DOUBLE
+	ERROR("Unsupported array type %s"%str(array.dtype), "mpi_type_of", 1)
 
-	array = get_image_data(data)
-	n     = shape(array)
-	ntot  = 1
-	for i in n: ntot *= i
-	count = (75*4+2)*(75*4)**2
-	array1d = reshape( array, (ntot,))
-	ntime = (ntot-1) /count + 1
-	for i in range(ntime):
-		block_begin = i*count
-		block_end   = min(block_begin + count, ntot)
-		block_size  = block_end - block_begin
-		tmpsum = mpi_reduce(array1d[block_begin:block_begin+block_size], block_size, MPI_FLOAT, MPI_SUM, main_node, comm)
-		mpi_barrier(comm)
+def bcast_array_to_all(array, source_node = 0, comm = -1):
+	"""
+	  Broadcast the contents of a contiguous numpy array (float32, int32 or float64) in place,
+	  in messages of at most MPI_CHUNK_SIZE elements.  The array must have the same size on all nodes.
+	"""
+	from mpi import mpi_bcast, MPI_COMM_WORLD
+
+	if comm == -1 or comm == None: comm = MPI_COMM_WORLD
+	array1d = array.reshape(-1)
+	mtype = mpi_type_of(array1d)
+	for block_begin in range(0, len(array1d), MPI_CHUNK_SIZE):
+		block_end = min(block_begin + MPI_CHUNK_SIZE, len(array1d))
+		tmp = mpi_bcast(array1d[block_begin:block_end], block_end-block_begin, mtype, source_node, comm)
+		array1d[block_begin:block_end] = tmp[0:block_end-block_begin]
+
+def reduce_array_to_root(array, myid, main_node = 0, comm = -1, op = None):
+	"""
+	  Reduce (default MPI_SUM) a contiguous numpy array in place on main_node,
+	  in messages of at most MPI_CHUNK_SIZE elements.  The array on the other nodes is not modified.
+	"""
+	from mpi import mpi_reduce, MPI_SUM, MPI_COMM_WORLD
+
+	if comm == -1 or comm == None: comm = MPI_COMM_WORLD
+	if op == None: op = MPI_SUM
+	array1d = array.reshape(-1)
+	mtype = mpi_type_of(array1d)
+	for block_begin in range(0, len(array1d), MPI_CHUNK_SIZE):
+		block_end = min(block_begin + MPI_CHUNK_SIZE, len(array1d))
+		tmpsum = mpi_reduce(array1d[block_begin:block_end], block_end-block_begin, mtype, op, main_node, comm)
 		if myid == main_node:
-			array1d[block_begin:block_end] = tmpsum[0:block_size]
+			array1d[block_begin:block_end] = tmpsum[0:block_end-block_begin]
+
+def reduce_EMData_to_root(data, myid, main_node = 0, comm = -1):
+	#  data is summed in place on main_node, chunked, without allocating a new image
+	reduce_array_to_root(get_image_data(data), myid, main_node, comm)
+	if myid == main_node:  data.update()
 
 def bcast_compacted_EMData_all_to_all(list_of_em_objects, myid, comm=-1):
 
@@ -2712,19 +2921,67 @@ def gather_compacted_EMData_to_root(number_of_all_em_objects_distributed_across_
 
 
 def bcast_EMData_to_all(tavg, myid, source_node = 0, comm = -1):
+	#  tavg has to have the correct size on all nodes, its data is overwritten in place, chunked
+	bcast_array_to_all(get_image_data(tavg), source_node, comm)
+	if(myid != source_node):  tavg.update()
+
+def bcast_EMData_to_shared(img, myid, main_node = 0, comm = -1, shared_comm = None):
+	"""
+	  Broadcast an image so that all processes on a node share a single copy of it, held in an MPI-3 shared
+	  memory window (as done for the reference volume in sxmeridien).  Only main_node needs to provide img,
+	  and main_node has to be the first process on its node.  The full header of img is broadcast as well.
+	  The returned image must not be resized, and has to be released with free_shared_EMData.
+	  Returns (image, handle)
+	"""
+	import numpy as np
 	from EMAN2 import EMNumPy
-	from numpy import array, shape, reshape
-	from mpi   import mpi_bcast, MPI_FLOAT, MPI_COMM_WORLD
+	from mpi   import mpi_comm_rank, mpi_comm_split, mpi_comm_split_type, mpi_comm_free, mpi_barrier
+	from mpi   import mpi_win_allocate_shared, mpi_win_shared_query, MPI_COMM_WORLD, MPI_COMM_TYPE_SHARED, MPI_INFO_NULL, MPI_PROC_NULL
 
 	if comm == -1 or comm == None: comm = MPI_COMM_WORLD
-	tavg_data = EMNumPy.em2numpy(tavg)
-	n = shape(tavg_data)
-	ntot = 1
-	for i in n: ntot *= i
-	tavg_tmp = mpi_bcast(tavg_data, ntot, MPI_FLOAT, source_node, comm)
-	if(myid != source_node):
-		tavg_data1d = reshape(tavg_data,(ntot,))
-		tavg_data1d[0:ntot] = tavg_tmp[0:ntot]
+	own_shared = shared_comm == None
+	if own_shared:  shared_comm = mpi_comm_split_type(comm, MPI_COMM_TYPE_SHARED,  0, MPI_INFO_NULL)
+	myid_on_node = mpi_comm_rank(shared_comm)
+	if( myid == main_node and myid_on_node != 0 ):  ERROR("main_node has to be the first process on its node", "bcast_EMData_to_shared", 1, myid)
+	masters_comm = mpi_comm_split(comm, int(myid_on_node != 0), myid)
+
+	if myid == main_node:  header = img.get_attr_dict()
+	else:                  header = None
+	header = wrap_mpi_bcast(header, main_node, comm)
+	size = header["nx"]*header["ny"]*header["nz"]
+	disp_unit = 4
+
+	if myid_on_node == 0:  win, base_ptr = mpi_win_allocate_shared(size*disp_unit, disp_unit, MPI_INFO_NULL, shared_comm)
+	else:
+		win, base_ptr = mpi_win_allocate_shared(0, disp_unit, MPI_INFO_NULL, shared_comm)
+		base_ptr, = mpi_win_shared_query(win, MPI_PROC_NULL)
+	buf = np.frombuffer(np.core.multiarray.int_asbuffer(base_ptr, size*disp_unit), dtype = 'f4')
+	buf = buf.reshape(header["nz"], header["ny"], header["nx"])
+
+	#  one copy per node, exchanged between the first processes of each node only
+	if myid == main_node:  root = mpi_comm_rank(masters_comm)
+	else:                  root = 0
+	root = bcast_number_to_all(root, main_node, comm)
+	if myid_on_node == 0:
+		if myid == main_node:  np.copyto(buf, get_image_data(img).reshape(buf.shape))
+		bcast_array_to_all(buf, root, masters_comm)
+	mpi_barrier(shared_comm)
+
+	emnumpy = EMNumPy()
+	shared = emnumpy.register_numpy_to_emdata(buf)
+	#  setting the size attributes would reallocate the image
+	for key in ["nx", "ny", "nz"]:  del header[key]
+	shared.set_attr_dict(header)
+	mpi_comm_free(masters_comm)
+	if own_shared:  mpi_comm_free(shared_comm)
+	return shared, (win, emnumpy)
+
+def free_shared_EMData(handle):
+	#  Releases an image obtained from bcast_EMData_to_shared; has to be called on all processes
+	from mpi import mpi_win_free
+	win, emnumpy = handle
+	emnumpy.unregister_numpy_from_emdata()
+	mpi_win_free(win)
 
 '''
 def bcast_EMData_to_all(img, myid, main_node = 0, comm = -1):
@@ -3607,122 +3864,33 @@ def assign_projangles_slow(projangles, refangles):
 	return assignments
 
 
-def nearest_many_full_k_projangles(reference_normals, angles, howmany = 1, sym_class=None):
-	# 
-	from utilities import getfvec, angles_to_normals
-	#refnormal = normals[:]
-	assignments = [-1]*len(angles)
-	if( sym_class.sym[:2] == "c1"):
-		for i,q in enumerate(angles):
-			ref = getfvec(q[0],q[1])
-			assignments[i] = Util.nearest_fang_select(reference_normals, ref[0],ref[1],ref[2], howmany)
-	else:
-		for i,q in enumerate(angles):
-			ancordir = angles_to_normals(sym_class.symmetry_neighbors([q[:3]]))
-			assignments[i] = Util.nearest_fang_sym(ancordir, reference_normals, len(ancordir), howmany)
+_projdir_index_cache = {}
 
-	return assignments
+def _cached_projdir_index(normals, sym):
+	#  projdir_index of the given reference normals, reused when the same references are searched again
+	import numpy as np
+	from hashlib import sha1
+	normals = np.ascontiguousarray(normals, dtype = np.float64).reshape(-1,3)
+	key = (getattr(sym, "sym", sym), sha1(normals.tobytes()).hexdigest())
+	if key not in _projdir_index_cache:
+		if( len(_projdir_index_cache) >= 8 ):  _projdir_index_cache.clear()
+		_projdir_index_cache[key] = projdir_index(sym = sym, normals = normals)
+	return _projdir_index_cache[key]
+
+def nearest_many_full_k_projangles(reference_normals, angles, howmany = 1, sym_class=None):
+	#  For each of angles, the howmany nearest reference_normals, considering all symmetry related copies.
+	#  Equivalent to Util.nearest_fang_select/nearest_fang_sym, for all angles at once.
+	if( sym_class == None ):  sym_class = "c1"
+	asg = _cached_projdir_index(reference_normals, sym_class).nearest(angles, howmany)[0]
+	return asg.tolist()
 
 
 def nearestk_projangles(projangles, whichone = 0, howmany = 1, sym="c1"):
 	# In both cases mirrored should be treated the same way as straight as they carry the same structural information
-	from utilities import getfvec, getvec
-	lookup = list(range(len(projangles)))
-	if( sym == "c1"):
-		from utilities import getvec
-		refnormal = [None]*(len(projangles)*3)
-		for i in range(len(projangles)):
-			ref = getvec(projangles[i][0], projangles[i][1])
-			for k in range(3):
-				refnormal[3*i+k] = ref[k]
-		# remove the reference projection from the list
-		ref = [0.0,0.0,0.0]
-		for k in range(3):
-			ref[k] = refnormal[3*whichone+k]
-		for k in range(3): del refnormal[3*whichone+2-k]
-		del lookup[whichone]
-		assignments = [-1]*howmany
-		for i in range(howmany):
-			k = Util.nearest_ang(refnormal, ref[0],ref[1],ref[2])
-			assignments[i] = lookup[k]
-			for l in range(3): del refnormal[3*k+2-l]
-			del lookup[k]
-
-	elif( sym[:1] == "d" ):
-		from utilities import get_symt, getvec
-		from EMAN2 import Transform
-		t = get_symt(sym)
-		phir = 360.0/int(sym[1:])
-		for i in range(len(t)):  t[i] = t[i].inverse()
-		a = Transform({"type":"spider","phi":projangles[whichone][0], "theta":projangles[whichone][1]})
-		for l in range(len(t)):
-			q = a*t[l]
-			q = q.get_params("spider")
-			if(q["phi"]<phir and q["theta"] <= 90.0): break
-		refvec = getfvec(q["phi"], q["theta"])
-		#print  "refvec   ",q["phi"], q["theta"]
-
-		tempan = projangles[:]
-		del tempan[whichone], lookup[whichone]
-		assignments = [-1]*howmany
-
-		for i in range(howmany):
-			best = -1
-			for j in range(len(tempan)):
-				nearest = -1.
-				a = Transform({"type":"spider","phi":tempan[j][0], "theta":tempan[j][1]})
-				for l in range(len(t)):
-					q = a*t[l]
-					q = q.get_params("spider")
-					vecs = getfvec(q["phi"], q["theta"])
-					s = abs(vecs[0]*refvec[0] + vecs[1]*refvec[1] + vecs[2]*refvec[2])
-					if( s > nearest ):
-						nearest = s
-						#ttt = (q["phi"], q["theta"])
-				if( nearest > best ):
-					best = nearest
-					best_j = j
-					#print  j,tempan[j][0], tempan[j][1],best,lookup[j],ttt
-			assignments[i] = lookup[best_j]
-			del tempan[best_j], lookup[best_j]
-
-	elif( sym[:1] == "c" ):
-		from utilities import get_symt, getvec
-		from EMAN2 import Transform
-		t = get_symt(sym)
-		#phir = 360.0/int(sym[1:])
-
-		tempan =  projangles[:]
-		del tempan[whichone], lookup[whichone]
-		assignments = [-1]*howmany
-		refvec = getvec(projangles[whichone][0], projangles[whichone][1])
-
-		for i in range(howmany):
-			best = -1
-			for j in range(len(tempan)):
-				nearest = -1.
-				a = Transform({"type":"spider","phi":tempan[j][0], "theta":tempan[j][1]})
-				for l in range(len(t)):
-					q = a*t[l]
-					q = q.get_params("spider")
-					vecs = getfvec(q["phi"], q["theta"])
-					s = abs(vecs[0]*refvec[0] + vecs[1]*refvec[1] + vecs[2]*refvec[2])
-					if( s > nearest ):
-						nearest = s
-						#ttt = (q["phi"], q["theta"])
-				if( nearest > best ):
-					best = nearest
-					best_j = j
-					#print  j,tempan[j][0], tempan[j][1],best,lookup[j],ttt
-			assignments[i] = lookup[best_j]
-			del tempan[best_j], lookup[best_j]
-
-	else:
-		print("  ERROR:  symmetry not supported  ",sym)
-		assignments = []
-
-
-	return assignments
+	asg = projdir_index(projangles, sym, mirror = True).nearest([projangles[whichone]], min(howmany+1, len(projangles)))[0][0].tolist()
+	#  exclude the reference projection itself
+	if whichone in asg:  asg.remove(whichone)
+	return asg[:howmany]
 
 
 def nearest_full_k_projangles(reference_ang, angles, howmany = 1, sym_class=None):
@@ -3799,23 +3967,13 @@ def assign_projangles(projangles, refangles, return_asg = False):
 """
 
 def assign_projangles(projangles, refangles, return_asg = False):
-
-	nproj = len(projangles)
-	nref = len(refangles)
-	proj_ang = [0.0]*(nproj*2)
-	ref_ang = [0.0]*(nref*2)
-	for i in range(nproj):
-		proj_ang[i*2] = projangles[i][0]
-		proj_ang[i*2+1] = projangles[i][1]
-	for i in range(nref):
-		ref_ang[i*2] = refangles[i][0]
-		ref_ang[i*2+1] = refangles[i][1]
-
-	asg = Util.assign_projangles(proj_ang, ref_ang)
+	#  Same as Util.assign_projangles (mirrored directions are equivalent), using projdir_index
+	index = projdir_index(normals = angles_to_normals_np(refangles, True), mirror = True)
+	asg = index.nearest_normals(angles_to_normals_np(projangles, True))[0][:,0].tolist()
 	if return_asg: return asg
-	assignments = [[] for i in range(nref)]
-	for i in range(nproj):
-		assignments[asg[i]].append(i)
+	assignments = [[] for i in range(len(refangles))]
+	for i,k in enumerate(asg):
+		assignments[k].append(i)
 
 	return assignments
 
@@ -3858,53 +4016,33 @@ def assign_projdirs_f(projdirs, refdirs, neighbors):
 
 
 def cone_ang( projangles, phi, tht, ant, symmetry = 'c1'):
-	from utilities import getvec, getfvec
-	from math import cos, pi, degrees, radians
+	#  Vectorized over projangles
+	import numpy as np
+	from math import cos, radians
 
+	if( symmetry != 'c1' and symmetry[:1] not in "cd" ):
+		print("Symmetry not supported ",symmetry)
+		return []
 	cone = cos(radians(ant))
-	la = []
 	if( symmetry == 'c1' ):
-		vec = getfvec( phi, tht )
-		for i in range( len(projangles) ):
-			vecs = getvec( projangles[i][0], projangles[i][1] )
-			s = vecs[0]*vec[0] + vecs[1]*vec[1] + vecs[2]*vec[2]
-			if s >= cone:
-				la.append(projangles[i])
-	elif( symmetry[:1] == "c" ):
-		nsym = int(symmetry[1:])
-		qt = 360.0/nsym
-		dvec = 	[0.0]*nsym
-		for nsm in range(nsym):
-			dvec[nsm] = getvec(phi+nsm*qt, tht)
-		for i in range( len(projangles) ):
-			vecs = getfvec( projangles[i][0], projangles[i][1] )
-			qt = -2.0
-			for nsm in range(nsym):
-				vc = dvec[nsm][0]*vecs[0] + dvec[nsm][1]*vecs[1] + dvec[nsm][2]*vecs[2]
-				if(vc > qt):  qt = vc
-			if(qt >= cone):
-				la.append(projangles[i])
-	elif( symmetry[:1] == "d" ):
-		nsym = int(symmetry[1:])
-		qt = 360.0/nsym
-		dvec = 	[0.0]*2*nsym
-		for nsm in range(nsym):
-			dvec[2*nsm] = getvec(phi+nsm*qt, tht)
-			dvec[2*nsm+1] = getvec(-(phi+nsm*qt), 180.0-tht)
-		for i in range( len(projangles) ):
-			vecs = getfvec( projangles[i][0], projangles[i][1] )
-			qt = -2.0
-			qk = -1
-			for nsm in range(2*nsym):
-				vc = dvec[nsm][0]*vecs[0] + dvec[nsm][1]*vecs[1] + dvec[nsm][2]*vecs[2]
-				if(vc > qt):
-					qt = vc
-					qk = nsm
-			if(qt >= cone):
-				if(qk<nsym):  la.append(projangles[i])
-				else:         la.append([projangles[i][0],projangles[i][1],(projangles[i][2]+180.0)%360.0])
-	
-	else:  print("Symmetry not supported ",symmetry)
+		#  projangles are folded onto the upper hemisphere (getvec)
+		vecs = angles_to_normals_np(projangles, True)
+		return [projangles[i] for i in np.nonzero(vecs.dot(getfvec(phi, tht)) >= cone)[0]]
+
+	vecs = angles_to_normals_np(projangles)
+	nsym = int(symmetry[1:])
+	qt = 360.0/nsym
+	if( symmetry[:1] == "c" ):  dvec = [getvec(phi+nsm*qt, tht) for nsm in range(nsym)]
+	else:
+		dvec = []
+		for nsm in range(nsym):  dvec += [getvec(phi+nsm*qt, tht), getvec(-(phi+nsm*qt), 180.0-tht)]
+	dots = vecs.dot(np.array(dvec).T)
+	#  the first of equal maxima, and the index test on it decides whether psi is flipped
+	qk = np.argmax(dots, axis = 1)
+	la = []
+	for i in np.nonzero(dots.max(axis = 1) >= cone)[0]:
+		if( qk[i] < nsym ):  la.append(projangles[i])
+		else:                la.append([projangles[i][0],projangles[i][1],(projangles[i][2]+180.0)%360.0])
 	return la
 
 #  Push to C.  PAP  11/25/2016
@@ -4039,6 +4177,135 @@ def cone_vectors( normvectors, phi, tht, ant ):
 def angles_to_normals(angles):
 	temp = Util.angles_to_normals(angles)
 	return [[temp[l*3+i] for i in range(3)] for l in range(len(angles)) ]
+
+def angles_to_normals_np(angles, fold = False):
+	"""
+	  Same as angles_to_normals (getfvec), but returns an (n,3) numpy array
+	  angles - list of [phi, theta, ...] or numpy array with phi and theta in the first two columns
+	  fold   - if True, fold directions onto the upper hemisphere as getvec does
+	"""
+	import numpy as np
+	try:     a = np.array(angles, dtype = np.float64)
+	except ValueError:  a = np.array([[q[0],q[1]] for q in angles], dtype = np.float64)
+	a = a.reshape(len(a), -1)[:,:2]
+	if fold:
+		m = a[:,1] > 180.0
+		a[m] += [180.0, -180.0]
+		m = a[:,1] > 90.0
+		a[m,0] += 180.0
+		a[m,1] = 180.0 - a[m,1]
+	a = np.radians(a)
+	st = np.sin(a[:,1])
+	return np.column_stack((st*np.cos(a[:,0]), st*np.sin(a[:,0]), np.cos(a[:,1])))
+
+class projdir_index(object):
+	"""
+	  Index over reference projection directions for batched nearest and cone searches.
+	  refangles - list of [phi, theta, ...] (or numpy array) reference angles, alternatively
+	  normals   - (n,3) reference normals
+	  sym       - point-group symmetry, string or symclass.  All symmetry related copies of the references
+	              are indexed, so a query finds the closest symmetry related copy of each reference.
+	  mirror    - if True, a direction and its opposite are equivalent (as getvec/Util.nearest_ang)
+	  Queries take lists of angles or (n,3) normals and return numpy arrays of reference indexes.
+	  Large batches use a scipy cKDTree over the unit normals, small ones blocked matrix products.
+	"""
+	def __init__(self, refangles = None, sym = "c1", mirror = False, normals = None):
+		import numpy as np
+		from fundamentals import symclass
+		if( type(sym) == type("") ):  sym = symclass(sym)
+		self.sym = sym
+		self.mirror = mirror
+		if normals is None:  ref = angles_to_normals_np(refangles)
+		else:                ref = np.asarray(normals, dtype = np.float64).reshape(-1,3)
+		self.nref = len(ref)
+		#  copy-major, normals[c*nref + i] is copy c of reference i.  n.S is the normal of recmat(rotmatrix*S)
+		copies = [ref.dot(np.array(m)) for m in sym.symatrix]
+		if mirror:  copies += [-q for q in copies]
+		self.ncopy  = len(copies)
+		self.normals = np.concatenate(copies)
+		self.tree = None
+
+	def _kdtree(self, nq):
+		#  building the tree only pays off for larger batches of queries
+		if( self.tree is None and nq >= 32 ):
+			try:
+				from scipy.spatial import cKDTree
+				self.tree = cKDTree(self.normals)
+			except ImportError:  self.tree = False
+		return self.tree
+
+	def nearest_normals(self, vecs, howmany = 1):
+		"""
+		  For each normal in vecs returns the howmany nearest references, closest first.
+		  Output: (index, cosine) arrays, both of shape (len(vecs), howmany)
+		"""
+		import numpy as np
+		q = np.asarray(vecs, dtype = np.float64).reshape(-1,3)
+		if( howmany > self.nref ):  ERROR("number of neighbors cannot be larger than number of reference directions","projdir_index.nearest",1)
+		rows = np.arange(len(q))[:,None]
+		if self._kdtree(len(q)):
+			#  the closest copies of the howmany nearest references are always among the howmany*ncopy nearest copies
+			m = min(howmany*self.ncopy, len(self.normals))
+			d, idx = self.tree.query(q, k = m)
+			d, idx = d.reshape(len(q), m), idx.reshape(len(q), m)
+			owner = idx%self.nref
+			#  keep only the closest copy of each reference
+			order = np.argsort(owner*m + np.arange(m), axis = 1)
+			so = owner[rows, order]
+			first = np.ones(so.shape, dtype = bool)
+			first[:,1:] = so[:,1:] != so[:,:-1]
+			pos = np.sort(np.where(first, order, m), axis = 1)[:,:howmany]
+			return owner[rows, pos], 1.0 - 0.5*d[rows, pos]**2
+
+		asg = np.empty((len(q), howmany), dtype = np.int64)
+		cs  = np.empty((len(q), howmany))
+		block = max(1, (1<<24)//len(self.normals))
+		for i in range(0, len(q), block):
+			dots = q[i:i+block].dot(self.normals.T).reshape(-1, self.ncopy, self.nref).max(axis = 1)
+			if( howmany < self.nref ):  best = np.argpartition(-dots, howmany-1, axis = 1)[:,:howmany]
+			else:                       best = np.tile(np.arange(self.nref), (len(dots),1))
+			r = rows[:len(dots)]
+			best = best[r, np.argsort(-dots[r, best], axis = 1, kind = "mergesort")]
+			asg[i:i+block] = best
+			cs[i:i+block]  = dots[r, best]
+		return asg, cs
+
+	def nearest(self, angles, howmany = 1):
+		"""  As nearest_normals, for a list of [phi, theta, ...]  """
+		return self.nearest_normals(angles_to_normals_np(angles), howmany)
+
+	def assign(self, angles):
+		"""  Returns an array with the index of the nearest reference for each of angles  """
+		return self.nearest(angles)[0][:,0]
+
+	def cone_normals(self, vecs, ant):
+		"""
+		  For each normal in vecs returns a sorted array of the references within ant degrees of it
+		  Output: list of arrays
+		"""
+		import numpy as np
+		from math import radians, sin, cos
+		q = np.asarray(vecs, dtype = np.float64).reshape(-1,3)
+		if self._kdtree(len(q)):
+			#  chord length corresponding to ant, the small margin is removed by the exact test below
+			hits = self.tree.query_ball_point(q, 2.0*sin(radians(min(ant,180.0))/2.0)+1.0e-6)
+			cone = cos(radians(ant))
+			la = []
+			for i,h in enumerate(hits):
+				h = np.asarray(h, dtype = np.int64)
+				h = h[self.normals[h].dot(q[i]) >= cone]
+				la.append(np.unique(h%self.nref))
+			return la
+		cone = cos(radians(ant))
+		la = []
+		for v in q:
+			dots = self.normals.dot(v).reshape(self.ncopy, self.nref).max(axis = 0)
+			la.append(np.nonzero(dots >= cone)[0])
+		return la
+
+	def cone(self, angles, ant):
+		"""  As cone_normals, for a list of [phi, theta, ...]  """
+		return self.cone_normals(angles_to_normals_np(angles), ant)
 """
 def symmetry_related(angles, symmetry):  # replace by s.symmetry_related
 	if( (symmetry[0] == "c") or (symmetry[0] == "d") ):
@@ -5042,22 +5309,118 @@ def update_tag(communicator, target_rank):   # TODO - it doesn't work when commu
 
 # ===================================== WRAPPER FOR MPI
 
+#  NumPy arrays and long lists (or lists of equal length lists) of all int or all float are sent by the wrappers below
+#  as a small pickled header ("A", dtype and shape) followed by the raw data, reinterpreted as MPI_INT and sent in
+#  chunks of MPI_CHUNK_SIZE, without pickling or compression.  Smaller objects are cheaper to pickle.
+MPI_TYPED_MIN_BYTES = 4096
+#  Pickled messages longer than this are sent in several MPI_CHAR messages
+MPI_CHAR_CHUNK_SIZE = 1<<30
+
+#  Cost of the wrap_mpi_* calls on this node, (wrapper, calling function) : [calls, bytes, seconds]
+mpi_comm_statistics = dict()
+
+def _mpi_comm_count(name, nbytes, t0):
+	import sys
+	from time import time
+	key = (name, sys._getframe(2).f_code.co_name)
+	st = mpi_comm_statistics.setdefault(key, [0, 0, 0.0])
+	st[0] += 1
+	st[1] += nbytes
+	st[2] += time() - t0
+
+def print_mpi_comm_statistics(myid = 0, reset = True):
+	"""
+	  Print the number of calls, bytes and time of the wrap_mpi_* functions on this node, per calling function.
+	"""
+	for key in sorted(mpi_comm_statistics.keys()):
+		st = mpi_comm_statistics[key]
+		print("  node %4d  %-18s %-40s %8d calls %12.3f MB %10.3f s"%(myid, key[0], key[1], st[0], st[1]/1.0e6, st[2]))
+	if reset:  mpi_comm_statistics.clear()
+
+def _typed_message(data):
+	"""
+	  (header, array) for data to be sent by the typed path, None if data has to be pickled.
+	  header is (dtype, shape, is_list), is_list meaning that the receiver gets array.tolist()
+	"""
+	import numpy as np
+	from itertools import chain
+
+	if isinstance(data, np.ndarray):
+		if data.dtype.kind not in "biufc" or data.nbytes < MPI_TYPED_MIN_BYTES:  return None
+		return (data.dtype.str, data.shape, False), data
+	if type(data) is not list or len(data) < MPI_TYPED_MIN_BYTES//8:  return None
+
+	types = set(map(type, data))
+	if types == set([list]):
+		if len(set(map(len, data))) != 1:  return None
+		types = set(map(type, chain.from_iterable(data)))
+	if   types == set([int]):    dtype = np.int64
+	elif types == set([float]):  dtype = np.float64
+	else:                        return None
+	try:     array = np.array(data, dtype = dtype)
+	except:  return None      # integers too large for int64
+	return (array.dtype.str, array.shape, True), array
+
+def _typed_carrier(array):
+	"""
+	  The bytes of array as int32 (padded to a multiple of 4), a view whenever possible
+	"""
+	import numpy as np
+	buf = np.ascontiguousarray(array).reshape(-1).view(np.uint8)
+	if buf.size%4:  buf = np.concatenate((buf, np.zeros(4 - buf.size%4, dtype = np.uint8)))
+	return buf.view(np.int32)
+
+def _typed_empty(header):
+	"""
+	  (array, carrier) for receiving the data described by header, carrier is the int32 view of array
+	"""
+	import numpy as np
+	dtype, shape, is_list = header
+	nbytes  = int(np.prod(shape))*np.dtype(dtype).itemsize
+	carrier = np.empty((nbytes + 3)//4, dtype = np.int32)
+	return carrier.view(np.uint8)[:nbytes].view(dtype).reshape(shape), carrier
+
+def _typed_result(header, array):
+	if header[2]:  return array.tolist()
+	return array
+
 def wrap_mpi_send(data, destination, communicator = None):
-	from mpi import mpi_send, MPI_COMM_WORLD, MPI_CHAR
+	from mpi import mpi_send, MPI_COMM_WORLD, MPI_CHAR, MPI_INT
+	from time import time
 
+	t0 = time()
 	if communicator == None:
 		communicator = MPI_COMM_WORLD
 
-	msg = pack_message(data)
+	typed = _typed_message(data)
+	if typed:  msg = "A" + dumps(typed[0], -1)
+	else:      msg = pack_message(data)
 	tag = update_tag(communicator, destination)
 	#from mpi import mpi_comm_rank
 	#print communicator, mpi_comm_rank(communicator), "send to", destination, tag
-	mpi_send(msg, len(msg), MPI_CHAR, destination, tag, communicator) # int MPI_Send( void *buf, int count, MPI_Datatype datatype, int dest, int tag, MPI_Comm comm )
+	if len(msg) > MPI_CHAR_CHUNK_SIZE:
+		lmsg = "L" + pack("Q", len(msg))
+		mpi_send(lmsg, len(lmsg), MPI_CHAR, destination, tag, communicator)
+		for i in range(0, len(msg), MPI_CHAR_CHUNK_SIZE):
+			mpi_send(msg[i:i+MPI_CHAR_CHUNK_SIZE], len(msg[i:i+MPI_CHAR_CHUNK_SIZE]), MPI_CHAR, destination, tag, communicator)
+	else:
+		mpi_send(msg, len(msg), MPI_CHAR, destination, tag, communicator) # int MPI_Send( void *buf, int count, MPI_Datatype datatype, int dest, int tag, MPI_Comm comm )
+	nbytes = len(msg)
+	if typed:
+		carrier = _typed_carrier(typed[1])
+		for i in range(0, carrier.size, MPI_CHUNK_SIZE):
+			n = min(MPI_CHUNK_SIZE, carrier.size - i)
+			mpi_send(carrier[i:i+n], n, MPI_INT, destination, tag, communicator)
+		nbytes += carrier.nbytes
+	_mpi_comm_count("wrap_mpi_send", nbytes, t0)
 
 
 def wrap_mpi_recv(source, communicator = None):
-	from mpi import mpi_recv, MPI_COMM_WORLD, MPI_CHAR, mpi_probe, mpi_get_count
+	from mpi import mpi_recv, MPI_COMM_WORLD, MPI_CHAR, MPI_INT, mpi_probe, mpi_get_count
+	from time import time
+	import numpy as np
 
+	t0 = time()
 	if communicator == None:
 		communicator = MPI_COMM_WORLD
 
@@ -5067,33 +5430,76 @@ def wrap_mpi_recv(source, communicator = None):
 	mpi_probe(source, tag, communicator)
 	n = mpi_get_count(MPI_CHAR)
 	msg = mpi_recv(n, MPI_CHAR, source, tag, communicator)
+	if msg[0] == "L":
+		n = unpack("Q", msg[1:].tostring())[0]
+		msg = "".join([mpi_recv(min(MPI_CHAR_CHUNK_SIZE, n - i), MPI_CHAR, source, tag, communicator).tostring() for i in range(0, n, MPI_CHAR_CHUNK_SIZE)])
+		msg = np.frombuffer(msg, dtype = "S1")
+	nbytes = len(msg)
+	if msg[0] == "A":
+		header = loads(msg[1:].tostring())
+		array, carrier = _typed_empty(header)
+		for i in range(0, carrier.size, MPI_CHUNK_SIZE):
+			n = min(MPI_CHUNK_SIZE, carrier.size - i)
+			carrier[i:i+n] = mpi_recv(n, MPI_INT, source, tag, communicator)
+		_mpi_comm_count("wrap_mpi_recv", nbytes + carrier.nbytes, t0)
+		return _typed_result(header, array)
+	_mpi_comm_count("wrap_mpi_recv", nbytes, t0)
 	return unpack_message(msg)
 
 
 def wrap_mpi_bcast(data, root, communicator = None):
-	from mpi import mpi_bcast, MPI_COMM_WORLD, mpi_comm_rank, MPI_CHAR
+	from mpi import mpi_bcast, MPI_COMM_WORLD, mpi_comm_rank, MPI_CHAR, MPI_INT
+	from time import time
+	import numpy as np
 
+	t0 = time()
 	if communicator == None:
 		communicator = MPI_COMM_WORLD
 
 	rank = mpi_comm_rank(communicator)
 
+	typed = None
 	if rank == root:
-		msg = pack_message(data)
-		n = pack("I",len(msg))
+		typed = _typed_message(data)
+		if typed:  msg = "A" + dumps(typed[0], -1)
+		else:      msg = pack_message(data)
+		n = pack("Q",len(msg))
 	else:
 		msg = None
 		n = None
 
-	n = mpi_bcast(n, 4, MPI_CHAR, root, communicator)  # int MPI_Bcast ( void *buffer, int count, MPI_Datatype datatype, int root, MPI_Comm comm )
-	n=unpack("I",n)[0]
-	msg = mpi_bcast(msg, n, MPI_CHAR, root, communicator)  # int MPI_Bcast ( void *buffer, int count, MPI_Datatype datatype, int root, MPI_Comm comm )
+	n = mpi_bcast(n, 8, MPI_CHAR, root, communicator)  # int MPI_Bcast ( void *buffer, int count, MPI_Datatype datatype, int root, MPI_Comm comm )
+	n=unpack("Q",n.tostring())[0]
+	if n > MPI_CHAR_CHUNK_SIZE:
+		if rank == root:  chunks = [msg[i:i+MPI_CHAR_CHUNK_SIZE] for i in range(0, n, MPI_CHAR_CHUNK_SIZE)]
+		else:             chunks = [None]*len(range(0, n, MPI_CHAR_CHUNK_SIZE))
+		msg = [mpi_bcast(chunks[k], min(MPI_CHAR_CHUNK_SIZE, n - k*MPI_CHAR_CHUNK_SIZE), MPI_CHAR, root, communicator).tostring() for k in range(len(chunks))]
+		msg = np.frombuffer("".join(msg), dtype = "S1")
+	else:
+		msg = mpi_bcast(msg, n, MPI_CHAR, root, communicator)  # int MPI_Bcast ( void *buffer, int count, MPI_Datatype datatype, int root, MPI_Comm comm )
+	if msg[0] == "A":
+		header = loads(msg[1:].tostring())
+		if rank == root:
+			carrier = _typed_carrier(typed[1])
+			array = typed[1]
+		else:
+			array, carrier = _typed_empty(header)
+		for i in range(0, carrier.size, MPI_CHUNK_SIZE):
+			k = min(MPI_CHUNK_SIZE, carrier.size - i)
+			tmp = mpi_bcast(carrier[i:i+k], k, MPI_INT, root, communicator)
+			if rank != root:  carrier[i:i+k] = tmp
+		_mpi_comm_count("wrap_mpi_bcast", n + carrier.nbytes, t0)
+		#  like the pickled path, the root gets a copy rather than its own object back
+		if rank == root and not header[2]:  return array.copy()
+		return _typed_result(header, array)
+	_mpi_comm_count("wrap_mpi_bcast", n, t0)
 	return unpack_message(msg)
 
 
-# data must be a python list (numpy array also should be implemented)
+#  data must be a python list or a numpy array, arrays are concatenated along the first axis
 def wrap_mpi_gatherv(data, root, communicator = None):
 	from mpi import mpi_comm_rank, mpi_comm_size, MPI_COMM_WORLD
+	import numpy as np
 
 	if communicator == None:
 		communicator = MPI_COMM_WORLD
@@ -5111,6 +5517,12 @@ def wrap_mpi_gatherv(data, root, communicator = None):
 				else:
 					recv_data = wrap_mpi_recv(p, communicator)
 					out_array.extend(recv_data)
+		elif isinstance(data, np.ndarray):
+			out_array = []
+			for p in range(procs):
+				if p == rank:  out_array.append(data)
+				else:          out_array.append(np.asarray(wrap_mpi_recv(p, communicator)))
+			out_array = np.concatenate(out_array)
 		else:
 			raise Exception("wrap_mpi_gatherv: type of data not supported")
 	else:
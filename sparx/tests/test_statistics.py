@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+from __future__ import print_function
+
+#
+# Copyright (c) 2000-2006 The University of Texas - Houston Medical School
+#
+# This software is issued under a joint BSD/GNU license. You may use the
+# source code in this file under either license. However, note that the
+# complete EMAN2 and SPARX software packages have some GPL dependencies,
+# so you are responsible for compliance with the licenses of these packages
+# if you opt to use BSD licensing. The warranty disclaimer below holds
+# in either instance.
+#
+# This complete copyright notice must be included in any revised version of the
+# source code. Additional authorship citations may be added, but existing
+# author citations must be preserved.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  2111-1307 USA
+#
+#
+
+import unittest
+import numpy as np
+from random import seed
+
+IS_TEST_EXCEPTION = False
+
+def old_k_means_cla(X, K, maxit):
+	#  the per-image loop of k_means_cla before k_means_vec, without CTF or simulated annealing
+	from statistics import k_means_init_asg_rnd
+	N, norm = X.shape
+	assign, nc = k_means_init_asg_rnd(N, K)
+
+	def averages():
+		ave = np.zeros((K, norm), np.float32)
+		for im in range(N):  ave[assign[im]] += X[im]					# Util.add_img
+		for k in range(K):   ave[k] *= np.float32(1.0/float(nc[k]))		# Util.mult_scalar
+		return ave
+
+	ave = averages()
+	watch_dog, old_Je, change = 0, 0, True
+	while change and watch_dog < maxit:
+		watch_dog += 1
+		change     = False
+		for im in range(N):
+			dist = ((X[im] - ave).astype(np.float64)**2).sum(axis = 1)/norm		# Util.min_dist_real
+			pos  = int(dist.argmin())
+			if pos != assign[im]:
+				nc[assign[im]] -= 1
+				assign[im]      = pos
+				nc[pos]        += 1
+				change          = True
+		if min(nc) <= 1:  return None
+		ave = averages()
+		Je  = sum([((X[im] - ave[assign[im]]).astype(np.float64)**2).mean() for im in range(N)])/norm
+		if Je != 0: thd = abs(Je - old_Je) / Je
+		else:       thd = 0
+		if thd < 1.0e-8: watch_dog = maxit
+		old_Je = Je
+	return assign
+
+# ====================================================================================================================
+class TestKMeans(unittest.TestCase):
+	"""this is unit test for the vectorized k-means (k_means_vec_trial) from statistics.py"""
+
+	def internal_data(self, N, m, K, offset, rseed):
+		#  overlapping clusters on a large mean, where |x|^2 is much larger than the distances
+		rng     = np.random.RandomState(rseed)
+		centers = rng.normal(0.0, 0.3, (K, m))
+		X       = offset + centers[rng.randint(0, K, N)] + rng.normal(0.0, 1.0, (N, m))
+		return X.astype(np.float32)
+
+	def test_dist(self):
+		from statistics import k_means_dist
+		X  = self.internal_data(50, 400, 3, 1000.0, 1)
+		C  = X[:7] + np.float32(0.01)
+		x2 = np.einsum('ij,ij->i', X, X, dtype = np.float64)
+		c2 = np.einsum('ij,ij->i', C, C, dtype = np.float64)
+		d  = k_means_dist(X, x2, C, c2)
+		ref = ((X[:, None, :] - C[None, :, :]).astype(np.float64)**2).mean(axis = 2)
+		self.assertTrue(np.allclose(d, ref, rtol = 1.0e-6, atol = 1.0e-6))
+		self.assertTrue((d >= 0.0).all())
+		self.assertEqual(d.argmin(axis = 1).tolist(), ref.argmin(axis = 1).tolist())
+
+	def test_cla_vs_loop(self):
+		from statistics import k_means_vec_trial
+		for offset, rseed in ((0.0, 2), (100.0, 3), (1000.0, 4)):
+			X  = self.internal_data(200, 256, 4, offset, rseed)
+			x2 = np.einsum('ij,ij->i', X, X, dtype = np.float64)
+			seed(rseed)
+			ref = old_k_means_cla(X, 4, 100)
+			seed(rseed)
+			res = k_means_vec_trial(X, x2, 4, 100, 'cla', 0, 0, 'rnd', np.random.RandomState(1), 0, False, False, None)
+			self.assertEqual(res == None, ref == None)
+			if ref == None:  continue
+			self.assertEqual(res[0].tolist(), ref)
+
+def test_main():
+	from EMAN2 import Log
+	from optparse import OptionParser
+	p = OptionParser()
+	p.add_option('--t', action='store_true', help='test exception', default=False )
+	global IS_TEST_EXCEPTION
+	opt, args = p.parse_args()
+	if opt.t:
+		IS_TEST_EXCEPTION = True
+	Log.logger().set_level(-1)  #perfect solution for quenching the Log error information, thank Liwei
+	suite = unittest.TestLoader().loadTestsFromTestCase(TestKMeans)
+	unittest.TextTestRunner(verbosity=2).run(suite)
+
+if __name__ == '__main__':
+	test_main()
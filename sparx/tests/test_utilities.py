@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+from __future__ import print_function
+
+#
+# Copyright (c) 2000-2006 The University of Texas - Houston Medical School
+#
+# This software is issued under a joint BSD/GNU license. You may use the
+# source code in this file under either license. However, note that the
+# complete EMAN2 and SPARX software packages have some GPL dependencies,
+# so you are responsible for compliance with the licenses of these packages
+# if you opt to use BSD licensing. The warranty disclaimer below holds
+# in either instance.
+#
+# This complete copyright notice must be included in any revised version of the
+# source code. Additional authorship citations may be added, but existing
+# author citations must be preserved.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  2111-1307 USA
+#
+#
+
+import unittest
+import os
+from optparse import OptionParser
+
+IS_TEST_EXCEPTION = False
+
+# ====================================================================================================================
+class TestTextColumns(unittest.TestCase):
+	"""this is unit test for read_text_row(...) and read_text_columns(...) from utilities.py"""
+
+	fnam = "test_text_columns.txt"
+
+	def internal_write(self, text):
+		outf = open(self.fnam, "w")
+		outf.write(text)
+		outf.close()
+
+	def internal_line_by_line(self):
+		# what read_text_row returned before it was backed by read_text_columns
+		from utilities import _text_value
+		data = []
+		for line in open(self.fnam, "r"):
+			if ";" in line:  continue
+			data.append([_text_value(word) for word in line.split()])
+		return data
+
+	def internal_check(self, text):
+		from utilities import read_text_row, read_text_columns
+		self.internal_write(text)
+		ref = self.internal_line_by_line()
+		for cache in (False, True, True):	# the second cached read comes from the sidecar, if one was written
+			data = read_text_row(self.fnam, cache=cache)
+			self.assertEqual(data, ref)
+			self.assertEqual([[type(v) for v in row] for row in data], [[type(v) for v in row] for row in ref])
+			columns = read_text_columns(self.fnam, cache=cache)
+			self.assertEqual([col.tolist() for col in columns], [list(col) for col in zip(*ref)])
+		return columns
+
+	def tearDown(self):
+		from utilities import _text_cache_name
+		for f in (self.fnam, _text_cache_name(self.fnam)):
+			if os.path.exists(f):  os.unlink(f)
+
+	def test_mixed_int_float(self):
+		columns = self.internal_check("; comment\n1  2.5  abc\n3  4  def\n-7  1e3  ghi\n")
+		self.assertEqual(columns[0].dtype.kind, "i")
+		self.assertEqual(columns[1].dtype.kind, "f")
+		self.assertEqual(columns[2].dtype.kind, "U" if str is not bytes else "S")
+
+	def test_large_integers(self):
+		columns = self.internal_check("99999999999999999999999  9007199254740993  1\n-99999999999999999999999  0.5  2\n12  3  3\n")
+		self.assertEqual(columns[0].tolist(), [99999999999999999999999, -99999999999999999999999, 12])
+		self.assertEqual(columns[1].tolist()[0], 9007199254740993)
+		self.assertEqual(columns[2].dtype.kind, "i")
+
+	def test_ragged(self):
+		from utilities import read_text_row, read_text_columns
+		self.internal_write("1  2\n3\n")
+		self.assertEqual(read_text_row(self.fnam), [[1, 2], [3]])
+		self.assertRaises(ValueError, read_text_columns, self.fnam)
+
+def test_main():
+	from EMAN2 import Log
+	p = OptionParser()
+	p.add_option('--t', action='store_true', help='test exception', default=False )
+	global IS_TEST_EXCEPTION
+	opt, args = p.parse_args()
+	if opt.t:
+		IS_TEST_EXCEPTION = True
+	Log.logger().set_level(-1)  #perfect solution for quenching the Log error information, thank Liwei
+	suite = unittest.TestLoader().loadTestsFromTestCase(TestTextColumns)
+	unittest.TextTestRunner(verbosity=2).run(suite)
+
+if __name__ == '__main__':
+	test_main()